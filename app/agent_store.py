@@ -0,0 +1,204 @@
+"""
+Agent 状态存储（写回缓存）
+
+内存中保存权威的 ONLINE/OFFLINE 状态和最后心跳时间，心跳只标记脏数据，
+由后台任务每隔几秒把脏记录合并成分块的多行 INSERT ... ON DUPLICATE KEY UPDATE 写入数据库。
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AgentStateStore:
+    """Agent 状态写回存储"""
+
+    # 参与写回的字段（对应 agents 表的列）
+    FIELDS = ('id', 'hostname', 'ip_address', 'external_ip', 'os_type',
+              'status', 'last_heartbeat', 'register_time')
+
+    def __init__(self, db, flush_interval: float = 3.0, batch_size: int = 500):
+        """
+        初始化状态存储
+
+        Args:
+            db: AsyncDatabase 实例（数据库调用在专用线程池中执行）
+            flush_interval: 刷盘间隔（秒）
+            batch_size: 单条多行语句包含的最大行数
+        """
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._dirty = set()
+        self._dirty_since: Optional[float] = None  # 最早一条未刷盘修改的单调时间
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self.running = False
+        self._stats = {
+            'flush_count': 0,
+            'flush_failures': 0,
+            'rows_flushed': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'last_flush_lag': 0.0,
+            'max_flush_lag': 0.0,
+            'last_flush_duration': 0.0,
+            'last_flush_at': None,
+        }
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._states
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """获取Agent的内存状态"""
+        return self._states.get(agent_id)
+
+    def put(self, agent_data: Dict[str, Any], dirty: bool = True):
+        """
+        写入Agent状态
+
+        Args:
+            agent_data: 至少包含 id 的Agent字段
+            dirty: 是否需要写回数据库（调用方已直接落库时传 False）
+        """
+        agent_id = agent_data['id']
+        state = self._states.get(agent_id)
+        if state is None:
+            state = {
+                'id': agent_id,
+                'hostname': '',
+                'ip_address': '',
+                'external_ip': '',
+                'os_type': 'unknown',
+                'status': 'OFFLINE',
+                'last_heartbeat': None,
+                'register_time': None,
+            }
+            self._states[agent_id] = state
+        for field in self.FIELDS:
+            if field in agent_data and agent_data[field] is not None:
+                state[field] = agent_data[field]
+        if dirty:
+            self._mark_dirty(agent_id)
+        else:
+            self._dirty.discard(agent_id)
+
+    def touch(self, agent_id: str, heartbeat_time: str, hostname: str = None, ip_address: str = None):
+        """记录一次心跳：只更新内存并标记为脏"""
+        state = self._states.get(agent_id)
+        if state is None:
+            self.put({'id': agent_id, 'hostname': hostname, 'ip_address': ip_address,
+                      'status': 'ONLINE', 'last_heartbeat': heartbeat_time,
+                      'register_time': heartbeat_time})
+            return
+        state['status'] = 'ONLINE'
+        state['last_heartbeat'] = heartbeat_time
+        self._mark_dirty(agent_id)
+
+    def set_status(self, agent_id: str, status: str) -> bool:
+        """修改Agent状态，状态发生变化时返回 True"""
+        state = self._states.get(agent_id)
+        if state is None or state['status'] == status:
+            return False
+        state['status'] = status
+        self._mark_dirty(agent_id)
+        return True
+
+    def mark_offline(self, agent_id: str) -> bool:
+        """标记Agent离线"""
+        return self.set_status(agent_id, 'OFFLINE')
+
+    def _mark_dirty(self, agent_id: str):
+        if not self._dirty:
+            self._dirty_since = time.monotonic()
+        self._dirty.add(agent_id)
+
+    @property
+    def pending(self) -> int:
+        """待刷盘的Agent数量"""
+        return len(self._dirty)
+
+    async def flush(self) -> int:
+        """把所有脏记录写入数据库，返回写入行数"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+
+            dirty_ids = self._dirty
+            dirty_since = self._dirty_since
+            self._dirty = set()
+            self._dirty_since = None
+            # 在事件循环线程中拍快照，数据库线程只接触副本
+            rows = [dict(self._states[agent_id]) for agent_id in dirty_ids if agent_id in self._states]
+
+            started = time.monotonic()
+            lag = started - dirty_since if dirty_since else 0.0
+            try:
+                written = await self.db.save_agents_batch(rows, self.batch_size)
+            except Exception as e:
+                logger.error(f"Agent状态写回失败: {e}")
+                written = -1
+
+            if written < 0:
+                # 写入失败，重新标记为脏，下一轮重试
+                self._stats['flush_failures'] += 1
+                for row in rows:
+                    self._mark_dirty(row['id'])
+                return 0
+
+            finished = time.monotonic()
+            stats = self._stats
+            stats['flush_count'] += 1
+            stats['rows_flushed'] += written
+            stats['last_batch_size'] = len(rows)
+            stats['max_batch_size'] = max(stats['max_batch_size'], len(rows))
+            stats['last_flush_lag'] = lag
+            stats['max_flush_lag'] = max(stats['max_flush_lag'], lag)
+            stats['last_flush_duration'] = finished - started
+            stats['last_flush_at'] = time.time()
+            logger.debug(f"Agent状态已写回: {len(rows)} 行, 延迟 {lag:.2f}s, 耗时 {finished - started:.3f}s")
+            return written
+
+    async def _flush_loop(self):
+        """定期刷盘"""
+        while self.running:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Agent状态刷盘任务出错: {e}")
+
+    def start(self):
+        """启动后台刷盘任务"""
+        self.running = True
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Agent状态写回任务已启动: 间隔 {self.flush_interval}s, 批大小 {self.batch_size}")
+
+    async def close(self):
+        """停止后台任务并把剩余脏数据写入数据库"""
+        self.running = False
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        written = await self.flush()
+        logger.info(f"Agent状态写回任务已停止，关闭前写回 {written} 行")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取写回统计信息"""
+        stats = dict(self._stats)
+        stats['tracked_agents'] = len(self._states)
+        stats['pending'] = len(self._dirty)
+        stats['current_lag'] = time.monotonic() - self._dirty_since if self._dirty_since else 0.0
+        return stats
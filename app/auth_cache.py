@@ -0,0 +1,120 @@
+"""
+认证缓存
+
+每个已认证请求原本都要查询一次 user_sessions JOIN users，权限检查再查询 users 和 user_permissions。
+AuthCache 在进程内缓存：
+- 会话：按令牌哈希保存用户ID、用户名、角色和令牌过期时间
+- 用户访问信息：按用户ID保存角色、启用状态和 user_permissions 中的权限
+
+缓存时间有上限（默认5分钟，且不超过令牌过期时间）。登出、修改密码、禁用用户、修改角色等操作
+立即清理本节点的缓存，并通过 ClusterManager 广播给其他节点；广播丢失时以缓存时间为上限。
+"""
+import logging
+import time
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from app.cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_TTL = 300  # 会话缓存时间上限（秒）
+USER_CACHE_TTL = 300  # 用户角色/权限缓存时间（秒）
+
+
+class AuthCache:
+    """令牌会话和用户访问信息缓存"""
+
+    def __init__(self, session_ttl: int = SESSION_CACHE_TTL, user_ttl: int = USER_CACHE_TTL,
+                 max_sessions: int = 100000, max_users: int = 20000):
+        self.session_ttl = session_ttl
+        self.user_ttl = user_ttl
+        self.sessions = LocalCache(max_size=max_sessions)
+        self.users = LocalCache(max_size=max_users)
+        self.sessions.start()
+        self.users.start()
+        self.cluster = None
+        self._revocations = {'tokens': 0, 'users': 0, 'remote': 0}
+
+    # ==================== 会话 ====================
+
+    def get_session(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的会话（返回副本，调用方可以修改），未命中或令牌已过期返回None"""
+        session = self.sessions.get(token_hash)
+        if session is None:
+            return None
+        if session['expires_at'] <= time.time():
+            self.sessions.delete(token_hash)
+            return None
+        return dict(session['user'])
+
+    def put_session(self, token_hash: str, user: Dict[str, Any], expires_at: float):
+        """缓存会话，expires_at 为令牌过期时间（Unix时间戳）"""
+        ttl = min(self.session_ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+        self.sessions.set(token_hash, {'user': dict(user), 'expires_at': expires_at}, ttl)
+
+    # ==================== 用户访问信息 ====================
+
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """获取缓存的用户角色和权限：{'role', 'is_active', 'permissions'}"""
+        return self.users.get(user_id)
+
+    def put_user(self, user_id: int, role: str, is_active: bool,
+                 permissions: FrozenSet[Tuple[str, Optional[str]]]):
+        self.users.set(user_id, {'role': role, 'is_active': is_active, 'permissions': permissions},
+                       self.user_ttl)
+
+    # ==================== 撤销 ====================
+
+    def revoke_token(self, token_hash: str, broadcast: bool = True):
+        """撤销单个令牌的缓存（登出）"""
+        self.sessions.delete(token_hash)
+        self._revocations['tokens'] += 1
+        if broadcast:
+            self._broadcast({'token_hashes': [token_hash]})
+
+    def revoke_user(self, user_id: int, broadcast: bool = True):
+        """撤销用户的所有会话缓存和访问信息（修改密码、禁用、修改角色、删除用户）"""
+        self._drop_user(user_id)
+        self._revocations['users'] += 1
+        if broadcast:
+            self._broadcast({'user_ids': [user_id]})
+
+    def _drop_user(self, user_id: int):
+        self.users.delete(user_id)
+        self.sessions.delete_where(lambda _, session: session['user']['user_id'] == user_id)
+
+    def clear(self):
+        self.sessions.clear()
+        self.users.clear()
+
+    # ==================== 集群 ====================
+
+    def attach_cluster(self, cluster):
+        """接收其他节点的撤销广播，并在本节点撤销时广播"""
+        if cluster is None or not cluster.is_cluster_mode:
+            return
+        self.cluster = cluster
+        cluster.register_handler('auth_revoke', self._on_cluster_revoke)
+
+    def _broadcast(self, payload: Dict[str, Any]):
+        if self.cluster is None:
+            return
+        self.cluster.broadcast_threadsafe({'type': 'auth_revoke', **payload})
+
+    async def _on_cluster_revoke(self, data: dict):
+        """其他节点撤销了令牌或用户，清理本节点的缓存（不再广播）"""
+        for token_hash in data.get('token_hashes') or ():
+            self.sessions.delete(token_hash)
+        for user_id in data.get('user_ids') or ():
+            self._drop_user(user_id)
+        self._revocations['remote'] += 1
+        logger.debug(f"收到认证撤销广播: {data}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sessions': self.sessions.stats(),
+            'users': self.users.stats(),
+            'revocations': dict(self._revocations),
+        }
@@ -1,185 +1,546 @@
 """
-Redis 缓存管理器
+缓存管理
+
+CacheManager 是两级缓存：进程内的 L1（LocalCache）在前，Redis L2 在后（未配置Redis时只有L1）。
+缓存键按命名空间组织，形如 qk:cache:<namespace>:<key>，可以按命名空间、按键或按标签失效；
+失效操作除了清理本节点的 L1 和共享的 L2，还会通过 ClusterManager 广播给其他节点清理它们的 L1。
+同一个键的并发未命中只执行一次加载（single-flight），值使用 msgpack 编码。
 """
+import asyncio
 import json
 import logging
-import hashlib
-from typing import Any, Optional, Callable
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 from functools import wraps
-from datetime import timedelta
+
+try:
+    import msgpack
+except ImportError:  # msgpack 未安装时退回 JSON 编码
+    msgpack = None
 
 logger = logging.getLogger(__name__)
 
+KEY_PREFIX = 'qk:cache:'
+TAG_PREFIX = 'qk:cache-tag:'
+_MISSING = object()
+
+
+def _encode_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def encode_value(value: Any) -> bytes:
+    """序列化缓存值（日期转为 ISO 字符串，与原先 json.dumps(default=str) 的结果一致）"""
+    if msgpack is not None:
+        return msgpack.packb(value, default=_encode_default, use_bin_type=True)
+    return json.dumps(value, default=_encode_default).encode('utf-8')
+
+
+def decode_value(data: bytes) -> Any:
+    if msgpack is not None:
+        # 允许非字符串键（如以整数为键的结果字典），默认的 strict_map_key 会直接拒绝整帧
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return json.loads(data)
+
+
+def make_key(*parts, **kwargs) -> str:
+    """由参数生成可读的缓存键，如 make_key(1, 'abc', role='admin') -> '1:abc:role=admin'"""
+    items = [str(p) for p in parts]
+    items.extend(f"{k}={v}" for k, v in sorted(kwargs.items()))
+    return ':'.join(items)
+
 
 class CacheManager:
-    """Redis 缓存管理器"""
-    
-    def __init__(self, redis_client=None):
+    """两级缓存管理器"""
+
+    def __init__(self, redis_client=None, cluster=None, l1_size: int = 10000,
+                 l1_max_bytes: Optional[int] = None, l1_ttl: int = 30):
         """
         初始化缓存管理器
-        
+
         Args:
-            redis_client: Redis 客户端实例（可选，如果为None则禁用缓存）
+            redis_client: Redis 客户端实例（可选，需要返回 bytes，即 decode_responses=False；为None时只使用L1）
+            cluster: 集群管理器（可选，用于广播失效消息）
+            l1_size: L1 最大条目数
+            l1_max_bytes: L1 内存上限（字节），None 表示只按条目数限制
+            l1_ttl: L1 最长缓存时间（秒），其他节点的失效广播丢失时以此为上限
         """
         self.redis = redis_client
-        self.enabled = redis_client is not None
+        self.cluster = None
+        self.enabled = True
         self.default_ttl = 300  # 默认缓存时间5分钟
-        
-        if self.enabled:
-            logger.info("缓存管理器已启用")
+        self.l1_ttl = l1_ttl
+        self.tag_ttl = 86400  # Redis 中标签集合的过期时间
+        self.l1 = LocalCache(max_size=l1_size, max_bytes=l1_max_bytes)
+        self.l1.start()
+        self._redis_loop = None
+        self._inflight: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+            'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'loads': 0, 'coalesced': 0,
+            'sets': 0, 'evictions': 0, 'invalidations': 0, 'errors': 0,
+        })
+
+        if cluster is not None:
+            self.attach_cluster(cluster)
+
+        if self.redis is not None:
+            logger.info("缓存管理器已启用（本地L1 + Redis L2）")
         else:
-            logger.info("缓存管理器未启用（Redis未配置）")
-    
-    def _make_key(self, prefix: str, *args, **kwargs) -> str:
-        """生成缓存key"""
-        key_data = f"{prefix}:{str(args)}:{str(sorted(kwargs.items()))}"
-        return f"cache:{hashlib.md5(key_data.encode()).hexdigest()}"
-    
-    async def get(self, key: str) -> Optional[Any]:
-        """获取缓存"""
-        if not self.enabled:
-            return None
-        
-        try:
-            data = await self.redis.get(key)
-            if data:
-                return json.loads(data)
-            return None
-        except Exception as e:
-            logger.error(f"获取缓存失败: {e}")
-            return None
-    
-    async def set(self, key: str, value: Any, ttl: int = None):
-        """设置缓存"""
-        if not self.enabled:
-            return
-        
-        try:
-            ttl = ttl or self.default_ttl
-            await self.redis.setex(key, ttl, json.dumps(value, default=str))
-        except Exception as e:
-            logger.error(f"设置缓存失败: {e}")
-    
-    async def delete(self, key: str):
-        """删除缓存"""
-        if not self.enabled:
-            return
-        
+            logger.info("缓存管理器已启用（仅本地L1，Redis未配置）")
+
+    # ==================== 键与统计 ====================
+
+    @staticmethod
+    def full_key(namespace: str, key: str) -> str:
+        return f"{namespace}:{key}"
+
+    @staticmethod
+    def _namespace_of(full_key: str) -> str:
+        return full_key.split(':', 1)[0]
+
+    def _count(self, namespace: str, name: str, amount: int = 1):
+        self._stats[namespace][name] += amount
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """按命名空间返回命中/未命中/淘汰等计数"""
+        result = {}
+        for namespace, counters in list(self._stats.items()):
+            item = dict(counters)
+            lookups = item['l1_hits'] + item['l2_hits'] + item['misses']
+            item['hit_rate'] = round((item['l1_hits'] + item['l2_hits']) / lookups, 4) if lookups else 0.0
+            result[namespace] = item
+        return result
+
+    def _l2_usable(self) -> bool:
+        """
+        Redis 异步客户端的连接绑定在首次使用它的事件循环上，
+        其他事件循环中的调用只使用 L1
+        """
+        if self.redis is None:
+            return False
+        loop = asyncio.get_running_loop()
+        if self._redis_loop is None:
+            self._redis_loop = loop
+        return loop is self._redis_loop
+
+    # ==================== L1 ====================
+
+    # L1 中保存 (值, 标签)；按标签失效时扫描 L1（容量有限，失效操作远少于读取）
+
+    def _l1_get(self, full_key: str) -> Any:
+        entry = self.l1.get(full_key, _MISSING)
+        return entry if entry is _MISSING else entry[0]
+
+    def _l1_set(self, full_key: str, value: Any, ttl: int, tags: Iterable[str] = ()):
+        evicted = self.l1.set(full_key, (value, frozenset(tags)), min(ttl, self.l1_ttl))
+        for key in evicted:
+            self._count(self._namespace_of(key), 'evictions')
+
+    def _l1_invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = (),
+                       namespaces: Iterable[str] = ()) -> int:
+        removed = 0
+        for key in keys:
+            removed += self.l1.delete(key)
+        if tags:
+            tags = set(tags)
+            removed += self.l1.delete_where(lambda _, entry: bool(entry[1] & tags))
+        for namespace in namespaces:
+            removed += self.l1.delete_prefix(f"{namespace}:")
+        return removed
+
+    # ==================== 读写 ====================
+
+    async def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """获取缓存，先查 L1 再查 L2（L2 命中时回填 L1）"""
+        fkey = self.full_key(namespace, key)
+        value = self._l1_get(fkey)
+        if value is not _MISSING:
+            self._count(namespace, 'l1_hits')
+            return value
+        if self._l2_usable():
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.get(KEY_PREFIX + fkey)
+                pipe.ttl(KEY_PREFIX + fkey)
+                data, ttl = await pipe.execute()
+                if data is not None:
+                    value = decode_value(data)
+                    self._l1_set(fkey, value, ttl if ttl and ttl > 0 else self.l1_ttl)
+                    self._count(namespace, 'l2_hits')
+                    return value
+            except Exception as e:
+                self._count(namespace, 'errors')
+                logger.error(f"获取缓存失败 {fkey}: {e}")
+        self._count(namespace, 'misses')
+        return default
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: int = None, tags: Iterable[str] = ()) -> Any:
+        """
+        设置缓存，可以附带标签用于批量失效
+
+        L1 保存编码再解码后的值，使本节点读到的结果与从 L2 读到的一致（如日期为 ISO 字符串），
+        返回该值。
+        """
+        ttl = ttl or self.default_ttl
+        tags = list(tags)
+        fkey = self.full_key(namespace, key)
+        data = encode_value(value)
+        value = decode_value(data)
+        self._l1_set(fkey, value, ttl, tags)
+        self._count(namespace, 'sets')
+        if self._l2_usable():
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.set(KEY_PREFIX + fkey, data, ex=ttl)
+                for tag in tags:
+                    # 标签集合比成员活得久没有影响（失效时删除不存在的键），过期时间取较大值
+                    pipe.sadd(TAG_PREFIX + tag, fkey)
+                    pipe.expire(TAG_PREFIX + tag, max(ttl, self.tag_ttl))
+                await pipe.execute()
+            except Exception as e:
+                self._count(namespace, 'errors')
+                logger.error(f"设置缓存失败 {fkey}: {e}")
+        return value
+
+    async def get_or_load(self, namespace: str, key: str, loader: Callable[[], Awaitable[Any]],
+                          ttl: int = None, tags: Iterable[str] = (), cache_none: bool = False) -> Any:
+        """
+        获取缓存，未命中时调用 loader 加载并写入缓存
+
+        同一事件循环中同一个键的并发未命中只调用一次 loader，其余调用等待同一个结果。
+        """
+        value = await self.get(namespace, key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        fkey = self.full_key(namespace, key)
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(fkey)
+        if inflight is not None and inflight[0] is loop:
+            self._count(namespace, 'coalesced')
+            return await asyncio.shield(inflight[1])
+
+        future = loop.create_future()
+        self._inflight[fkey] = (loop, future)
         try:
-            await self.redis.delete(key)
+            self._count(namespace, 'loads')
+            value = await loader()
+            if value is not None or cache_none:
+                value = await self.set(namespace, key, value, ttl, tags)
+            future.set_result(value)
+            return value
         except Exception as e:
-            logger.error(f"删除缓存失败: {e}")
-    
-    async def delete_pattern(self, pattern: str):
-        """删除匹配模式的缓存"""
-        if not self.enabled:
-            return
-        
-        try:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "Future exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            if self._inflight.get(fkey, (None, None))[1] is future:
+                del self._inflight[fkey]
+
+    # ==================== 失效 ====================
+
+    async def delete(self, namespace: str, key: str):
+        """删除单个缓存"""
+        await self._invalidate(keys=[self.full_key(namespace, key)])
+
+    async def invalidate_tags(self, *tags: str):
+        """使带有指定标签的缓存失效"""
+        await self._invalidate(tags=list(tags))
+
+    async def invalidate_namespace(self, namespace: str):
+        """使整个命名空间的缓存失效"""
+        await self._invalidate(namespaces=[namespace])
+
+    async def invalidate(self, key_prefix: str):
+        """使指定命名空间的缓存失效（兼容旧接口）"""
+        await self.invalidate_namespace(key_prefix)
+
+    async def _invalidate(self, keys: List[str] = (), tags: List[str] = (), namespaces: List[str] = ()):
+        keys, tags, namespaces = list(keys), list(tags), list(namespaces)
+        self._l1_invalidate(keys, tags, namespaces)
+        for key in keys:
+            self._count(self._namespace_of(key), 'invalidations')
+        for namespace in namespaces:
+            self._count(namespace, 'invalidations')
+        if self._l2_usable():
+            try:
+                await self._l2_invalidate(keys, tags, namespaces)
+            except Exception as e:
+                logger.error(f"删除缓存失败: {e}")
+        self._broadcast(keys, tags, namespaces)
+
+    async def _l2_invalidate(self, keys: List[str], tags: List[str], namespaces: List[str]):
+        doomed = [KEY_PREFIX + key for key in keys]
+        for tag in tags:
+            members = await self.redis.smembers(TAG_PREFIX + tag)
+            for member in members:
+                member = member.decode('utf-8') if isinstance(member, bytes) else member
+                doomed.append(KEY_PREFIX + member)
+                self._count(self._namespace_of(member), 'invalidations')
+            doomed.append(TAG_PREFIX + tag)
+        for namespace in namespaces:
             cursor = 0
             while True:
-                cursor, keys = await self.redis.scan(cursor, match=pattern, count=100)
-                if keys:
-                    await self.redis.delete(*keys)
+                cursor, found = await self.redis.scan(cursor, match=f"{KEY_PREFIX}{namespace}:*", count=500)
+                doomed.extend(found)
                 if cursor == 0:
                     break
-        except Exception as e:
-            logger.error(f"删除缓存模式失败: {e}")
-    
-    def cached(self, ttl: int = None, key_prefix: str = None):
+        for i in range(0, len(doomed), 500):
+            await self.redis.delete(*doomed[i:i + 500])
+
+    # ==================== 集群失效广播 ====================
+
+    def attach_cluster(self, cluster):
+        """接收其他节点的失效广播，并在本节点失效时广播"""
+        if cluster is None or not cluster.is_cluster_mode:
+            return
+        self.cluster = cluster
+        cluster.register_handler('cache_invalidate', self._on_cluster_invalidate)
+
+    def _broadcast(self, keys: List[str], tags: List[str], namespaces: List[str]):
+        if self.cluster is None:
+            return
+        self.cluster.broadcast_threadsafe({
+            'type': 'cache_invalidate',
+            'keys': keys,
+            'tags': tags,
+            'namespaces': namespaces,
+        })
+
+    async def _on_cluster_invalidate(self, data: dict):
+        """其他节点发来的失效消息：只清理本节点的 L1（L2 已由发起节点清理）"""
+        removed = self._l1_invalidate(data.get('keys') or (), data.get('tags') or (),
+                                      data.get('namespaces') or ())
+        logger.debug(f"收到缓存失效广播 from node:{data.get('from_node')}，清理本地缓存 {removed} 条")
+
+    # ==================== 装饰器 ====================
+
+    def cached(self, ttl: int = None, key_prefix: str = None, tags: Iterable[str] = ()):
         """
         缓存装饰器
-        
+
         Args:
             ttl: 缓存时间（秒）
-            key_prefix: 缓存key前缀
+            key_prefix: 命名空间，默认为函数名
+            tags: 缓存标签
         """
         def decorator(func: Callable):
+            namespace = key_prefix or func.__name__
+
             @wraps(func)
             async def wrapper(*args, **kwargs):
-                if not self.enabled:
-                    return await func(*args, **kwargs)
-                
-                # 生成缓存key
-                prefix = key_prefix or func.__name__
-                cache_key = self._make_key(prefix, *args, **kwargs)
-                
-                # 尝试从缓存获取
-                cached_result = await self.get(cache_key)
-                if cached_result is not None:
-                    logger.debug(f"缓存命中: {prefix}")
-                    return cached_result
-                
-                # 执行函数
-                result = await func(*args, **kwargs)
-                
-                # 存入缓存
-                await self.set(cache_key, result, ttl)
-                logger.debug(f"缓存设置: {prefix}")
-                
-                return result
+                return await self.get_or_load(
+                    namespace, make_key(*args, **kwargs),
+                    lambda: func(*args, **kwargs), ttl=ttl, tags=tags
+                )
             return wrapper
         return decorator
-    
-    async def invalidate(self, key_prefix: str):
-        """使指定前缀的缓存失效"""
-        await self.delete_pattern(f"cache:{key_prefix}*")
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """估算值占用的内存字节数（递归统计常见容器，最多3层）"""
+    size = sys.getsizeof(value)
+    if _depth >= 3:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+    return size
+
+
+class _Shard:
+    """LocalCache 的一个分片：OrderedDict 按访问顺序保存 键 -> (值, 过期时间, 字节数)"""
+
+    __slots__ = ('lock', 'data', 'bytes', 'max_size', 'max_bytes', 'stats')
+
+    def __init__(self, max_size: int, max_bytes: Optional[int]):
+        self.lock = threading.Lock()
+        self.data: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self.bytes = 0
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expirations': 0}
+
+    def pop(self, key: str):
+        entry = self.data.pop(key)
+        self.bytes -= entry[2]
+        return entry
 
 
 class LocalCache:
-    """本地内存缓存（用于单节点模式或无Redis场景）"""
-    
-    def __init__(self, max_size: int = 1000):
-        self.cache = {}
+    """
+    本地内存缓存（用于单节点模式或无Redis场景，也是 CacheManager 的 L1）
+
+    WebSocket 核心线程和 API 线程会同时访问，因此按键哈希分片、每个分片一把锁。
+    每个分片是一个 OrderedDict 实现的 LRU，读写都是 O(1)；容量（条目数和可选的字节数上限）
+    按分片平均分配，超出时淘汰该分片中最久未访问的条目。过期条目在读取时惰性删除，
+    后台线程（start() 启动）定期清理未再被读取的过期条目。
+    """
+
+    def __init__(self, max_size: int = 1000, max_bytes: Optional[int] = None,
+                 shards: int = 16, sweep_interval: float = 60.0,
+                 sizeof: Callable[[Any], int] = estimate_size):
+        """
+        Args:
+            max_size: 最大条目数
+            max_bytes: 内存上限（字节，按 sizeof 估算），None 表示不限制
+            shards: 分片数（不超过 max_size）
+            sweep_interval: 后台清理过期条目的间隔（秒）
+            sizeof: 估算值大小的函数，仅在设置了 max_bytes 时调用
+        """
         self.max_size = max_size
-        self.access_order = []
-    
-    def get(self, key: str) -> Optional[Any]:
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._sizeof = sizeof
+        count = max(1, min(shards, max_size))
+        shard_size = -(-max_size // count)
+        shard_bytes = -(-max_bytes // count) if max_bytes else None
+        self._shards = [_Shard(shard_size, shard_bytes) for _ in range(count)]
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def get(self, key: str, default: Any = None) -> Optional[Any]:
         """获取缓存"""
-        import time
-        if key in self.cache:
-            value, expire_at = self.cache[key]
-            if expire_at > time.time():
-                # 更新访问顺序
-                if key in self.access_order:
-                    self.access_order.remove(key)
-                self.access_order.append(key)
-                return value
-            else:
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.data.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    shard.data.move_to_end(key)
+                    shard.stats['hits'] += 1
+                    return entry[0]
                 # 过期了，删除
-                del self.cache[key]
-                if key in self.access_order:
-                    self.access_order.remove(key)
-        return None
-    
-    def set(self, key: str, value: Any, ttl: int = 300):
-        """设置缓存"""
-        import time
-        
-        # 检查容量，使用LRU淘汰
-        while len(self.cache) >= self.max_size and self.access_order:
-            oldest_key = self.access_order.pop(0)
-            if oldest_key in self.cache:
-                del self.cache[oldest_key]
-        
-        expire_at = time.time() + ttl
-        self.cache[key] = (value, expire_at)
-        
-        if key in self.access_order:
-            self.access_order.remove(key)
-        self.access_order.append(key)
-    
-    def delete(self, key: str):
-        """删除缓存"""
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.access_order:
-            self.access_order.remove(key)
-    
+                shard.pop(key)
+                shard.stats['expirations'] += 1
+            shard.stats['misses'] += 1
+        return default
+
+    def set(self, key: str, value: Any, ttl: int = 300) -> List[str]:
+        """设置缓存，返回因容量不足被淘汰的键"""
+        shard = self._shard(key)
+        size = self._sizeof(value) if shard.max_bytes else 0
+        evicted = []
+        with shard.lock:
+            if key in shard.data:
+                shard.pop(key)
+            shard.data[key] = (value, time.monotonic() + ttl, size)
+            shard.bytes += size
+            # 使用LRU淘汰（刚写入的条目在末尾，单个超限的条目也会被淘汰）
+            while shard.data and (len(shard.data) > shard.max_size
+                                  or (shard.max_bytes and shard.bytes > shard.max_bytes)):
+                oldest_key = next(iter(shard.data))
+                shard.pop(oldest_key)
+                evicted.append(oldest_key)
+            shard.stats['sets'] += 1
+            shard.stats['evictions'] += len(evicted)
+        return evicted
+
+    def delete(self, key: str) -> int:
+        """删除缓存，返回删除的条目数"""
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.data:
+                shard.pop(key)
+                return 1
+        return 0
+
+    def delete_where(self, predicate: Callable[[str, Any], bool]) -> int:
+        """删除满足 predicate(键, 值) 的条目，返回删除的条目数"""
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                keys = [key for key, entry in shard.data.items() if predicate(key, entry[0])]
+                for key in keys:
+                    shard.pop(key)
+            removed += len(keys)
+        return removed
+
+    def delete_prefix(self, prefix: str) -> int:
+        """删除指定前缀的缓存"""
+        return self.delete_where(lambda key, _: key.startswith(prefix))
+
+    def purge_expired(self) -> int:
+        """清理所有过期条目，返回清理的条目数（逐个分片加锁，不会长时间阻塞读写）"""
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                now = time.monotonic()
+                keys = [key for key, entry in shard.data.items() if entry[1] <= now]
+                for key in keys:
+                    shard.pop(key)
+                shard.stats['expirations'] += len(keys)
+            removed += len(keys)
+        return removed
+
     def clear(self):
         """清空缓存"""
-        self.cache.clear()
-        self.access_order.clear()
+        for shard in self._shards:
+            with shard.lock:
+                shard.data.clear()
+                shard.bytes = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard.data) for shard in self._shards)
+
+    # ==================== 后台清理 ====================
+
+    def start(self):
+        """启动后台清理线程（重复调用无副作用）"""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="local-cache-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop(self):
+        """停止后台清理线程"""
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+            self._sweeper = None
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                removed = self.purge_expired()
+                if removed:
+                    logger.debug(f"本地缓存清理过期条目 {removed} 个")
+            except Exception as e:
+                logger.error(f"本地缓存清理失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中/未命中/淘汰/过期计数和当前占用"""
+        result = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expirations': 0}
+        for shard in self._shards:
+            for name, value in shard.stats.items():
+                result[name] += value
+        lookups = result['hits'] + result['misses']
+        result['hit_rate'] = round(result['hits'] / lookups, 4) if lookups else 0.0
+        result['size'] = len(self)
+        result['bytes'] = sum(shard.bytes for shard in self._shards)
+        result['max_size'] = self.max_size
+        result['max_bytes'] = self.max_bytes
+        return result
 
 
 # 全局缓存实例
@@ -195,10 +556,10 @@ def get_cache() -> CacheManager:
     return _cache_manager
 
 
-def init_cache(redis_client=None) -> CacheManager:
+def init_cache(redis_client=None, cluster=None) -> CacheManager:
     """初始化缓存管理器"""
     global _cache_manager
-    _cache_manager = CacheManager(redis_client)
+    _cache_manager = CacheManager(redis_client, cluster)
     return _cache_manager
 
 
@@ -207,5 +568,5 @@ def get_local_cache() -> LocalCache:
     global _local_cache
     if _local_cache is None:
         _local_cache = LocalCache()
+        _local_cache.start()
     return _local_cache
-
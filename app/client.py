@@ -9,6 +9,7 @@ import logging
 import platform
 import psutil
 import hashlib
+import codecs
 import subprocess
 import os
 from datetime import datetime
@@ -39,10 +40,173 @@ import base64
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class TaskSlots:
+    """脚本任务槽：限制同时执行的任务数，并记录排队和执行中的任务"""
+    
+    def __init__(self, max_tasks=4):
+        self.max_tasks = max(1, int(max_tasks))
+        self.semaphore = asyncio.Semaphore(self.max_tasks)
+        self.queued = 0
+        self.running = 0
+        self.tasks = {}  # task_id -> asyncio.Task
+        self.processes = {}  # task_id -> asyncio.subprocess.Process
+    
+    def stats(self):
+        """任务槽状态（随心跳上报）"""
+        return {
+            'max_tasks': self.max_tasks,
+            'running': self.running,
+            'queued': self.queued
+        }
+    
+    async def kill_all(self):
+        """终止所有执行中的脚本进程组（Agent退出时调用）"""
+        for task_id, process in list(self.processes.items()):
+            await kill_process_tree(process)
+        for task in list(self.tasks.values()):
+            task.cancel()
+
+
+class TaskOutputStreamer:
+    """脚本输出流式上报：合并小分片后按序号发送 task_output，本地只保留输出末尾用于最终结果"""
+    
+    def __init__(self, agent, task_id, chunk_size=32 * 1024, flush_interval=0.2, tail_limit=64 * 1024):
+        self.agent = agent
+        self.task_id = task_id
+        self.streaming = task_id is not None
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        # 不上报时没有其他地方保存输出，保留完整内容
+        self.tail_limit = tail_limit if self.streaming else None
+        self.seq = 0
+        self.send_failures = 0
+        self.sizes = {'stdout': 0, 'stderr': 0}
+        self._tails = {'stdout': [], 'stderr': []}
+        self._tail_sizes = {'stdout': 0, 'stderr': 0}
+    
+    async def pump(self, reader, stream):
+        """读取一个输出管道直到EOF"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        pending = []
+        pending_size = 0
+        last_flush = time.monotonic()
+        while True:
+            try:
+                data = await asyncio.wait_for(reader.read(65536), self.flush_interval if pending else None)
+            except asyncio.TimeoutError:
+                data = None  # 等待新输出超时，先发送已缓存的部分
+            if data == b'':
+                break
+            if data:
+                text = decoder.decode(data)
+                if text:
+                    self._keep_tail(stream, text)
+                    pending.append(text)
+                    pending_size += len(text)
+            if pending and (data is None or pending_size >= self.chunk_size
+                            or time.monotonic() - last_flush >= self.flush_interval):
+                await self._send(stream, ''.join(pending))
+                pending = []
+                pending_size = 0
+                last_flush = time.monotonic()
+        text = decoder.decode(b'', final=True)
+        if text:
+            self._keep_tail(stream, text)
+            pending.append(text)
+        if pending:
+            await self._send(stream, ''.join(pending))
+    
+    def _keep_tail(self, stream, text):
+        self.sizes[stream] += len(text)
+        tail = self._tails[stream]
+        tail.append(text)
+        self._tail_sizes[stream] += len(text)
+        if self.tail_limit is None:
+            return
+        while self._tail_sizes[stream] - len(tail[0]) >= self.tail_limit:
+            self._tail_sizes[stream] -= len(tail.pop(0))
+    
+    async def _send(self, stream, data):
+        if not self.streaming:
+            return
+        message = {
+            'type': 'task_output',
+            'task_id': self.task_id,
+            'agent_id': self.agent.agent_id,
+            'seq': self.seq,
+            'stream': stream,
+            'data': data
+        }
+        self.seq += 1
+        try:
+            await self.agent.websocket.send(json.dumps(message))
+        except Exception as e:
+            # 连接断开时输出只保留在本地末尾缓冲中，脚本继续执行
+            self.send_failures += 1
+            if self.send_failures == 1:
+                logger.warning("任务 {} 输出发送失败: {}".format(self.task_id, e))
+    
+    def tail(self, stream):
+        """输出末尾（超过tail_limit时截断开头）"""
+        text = ''.join(self._tails[stream])
+        if self.tail_limit is not None and len(text) > self.tail_limit:
+            text = text[-self.tail_limit:]
+        return text
+    
+    def summary(self):
+        """随最终结果上报的输出概况"""
+        truncated = self.tail_limit is not None and any(size > self.tail_limit for size in self.sizes.values())
+        return {
+            'streamed': self.streaming,
+            'output_chunks': self.seq,
+            'stdout_size': self.sizes['stdout'],
+            'stderr_size': self.sizes['stderr'],
+            'output_truncated': truncated
+        }
+
+
+async def kill_process_tree(process, grace=5):
+    """终止脚本进程及其子进程：先SIGTERM整个进程组，超过grace秒仍未退出则SIGKILL"""
+    if process.returncode is not None:
+        return
+    if platform.system() == 'Windows':
+        # Windows 没有进程组信号，使用 taskkill 结束进程树
+        try:
+            killer = await asyncio.create_subprocess_exec(
+                'taskkill', '/F', '/T', '/PID', str(process.pid),
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+            )
+            await killer.wait()
+        except Exception:
+            process.kill()
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        except Exception:
+            process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), grace)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            return
+        except Exception:
+            process.kill()
+    try:
+        await asyncio.wait_for(process.wait(), grace)
+    except asyncio.TimeoutError:
+        logger.warning("脚本进程 {} 未能在终止后退出".format(process.pid))
+
+
 class QunkongAgent:
     """Qunkong Agent 客户端"""
     
-    def __init__(self, server_host="localhost", server_port=8765, agent_id=None, log_level="INFO"):
+    def __init__(self, server_host="localhost", server_port=8765, agent_id=None, log_level="INFO", max_tasks=4):
         self.server_host = server_host
         self.server_port = server_port
         self.hostname = platform.node()
@@ -72,6 +236,8 @@ class QunkongAgent:
         self.current_directory = os.path.expanduser("~")  # 当前工作目录
         # 命令缓冲区，用于记录完整的用户命令
         self.command_buffers = {}  # session_id -> current_command_buffer
+        # 脚本任务槽，脚本在子进程中异步执行，不阻塞消息循环和心跳
+        self.task_slots = TaskSlots(max_tasks)
 
     def get_local_ip(self):
         """获取本地内网IP地址"""
@@ -543,7 +709,8 @@ class QunkongAgent:
                 'memory_total': memory.total,
                 'memory_used': memory.used,
                 'memory_available': memory.available,
-                'disk_info': disk_info  # 添加磁盘信息
+                'disk_info': disk_info,  # 添加磁盘信息
+                'task_slots': self.task_slots.stats()  # 任务槽占用和排队深度
             }
             message_json = json.dumps(heartbeat_message)
             await websocket.send(message_json)
@@ -661,37 +828,73 @@ class QunkongAgent:
                         raise FileNotFoundError("Shell interpreter not found: tried /bin/bash and /bin/sh")
             
             # 执行脚本
-            # Windows下如果不使用shell=True，可能需要完整的路径或PATH中存在
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
+            # 使用asyncio子进程，等待期间事件循环继续处理心跳和其他消息；
+            # 非Windows系统下脚本运行在独立的进程组中，超时时可以连同子进程一起终止
+            popen_kwargs = {}
+            if system_type == 'Windows':
+                popen_kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+            else:
+                popen_kwargs['start_new_session'] = True
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
                 cwd=os.getcwd(),
-                encoding='utf-8', # 尝试使用utf-8捕获输出
-                errors='replace'  # 遇到编码错误时替换为?
+                **popen_kwargs
             )
+            if task_id:
+                self.task_slots.processes[task_id] = process
             
-            execution_time = time.time() - start_time
+            # 运行期间持续读取并上报输出，避免完整输出积压在内存和最终结果消息中
+            streamer = TaskOutputStreamer(self, task_id)
+            pumps = asyncio.gather(
+                streamer.pump(process.stdout, 'stdout'),
+                streamer.pump(process.stderr, 'stderr')
+            )
+            timed_out = False
+            try:
+                try:
+                    await asyncio.wait_for(process.wait(), timeout)
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    await kill_process_tree(process)
+                    logger.error(f'脚本执行超时 (>{timeout}秒)，已终止进程组 {process.pid}')
+                # 进程退出后读完管道中剩余的输出（脱离进程组的子进程可能仍持有管道，最多等待5秒）
+                try:
+                    await asyncio.wait_for(pumps, 5)
+                except asyncio.TimeoutError:
+                    logger.warning("任务 {} 的输出管道未关闭，停止读取".format(task_id))
+            except asyncio.CancelledError:
+                await kill_process_tree(process)
+                raise
+            finally:
+                if not pumps.done():
+                    pumps.cancel()
+                if task_id:
+                    self.task_slots.processes.pop(task_id, None)
             
-            logger.info("脚本执行完成: exit_code={}, time={:.2f}s".format(result.returncode, execution_time))
+            execution_time = time.time() - start_time
             
-            return {
-                'exit_code': result.returncode,
-                'stdout': result.stdout,
-                'stderr': result.stderr,
-                'execution_time': execution_time
-            }
+            if timed_out:
+                stderr = streamer.tail('stderr')
+                result = {
+                    'exit_code': -1,
+                    'stdout': streamer.tail('stdout'),
+                    'stderr': (stderr + '\n' if stderr else '') + f'脚本执行超时 (>{timeout}秒)',
+                    'execution_time': execution_time
+                }
+            else:
+                logger.info("脚本执行完成: exit_code={}, time={:.2f}s".format(process.returncode, execution_time))
+                result = {
+                    'exit_code': process.returncode,
+                    'stdout': streamer.tail('stdout'),
+                    'stderr': streamer.tail('stderr'),
+                    'execution_time': execution_time
+                }
+            result.update(streamer.summary())
+            return result
             
-        except subprocess.TimeoutExpired:
-            execution_time = time.time() - start_time
-            logger.error(f'脚本执行超时 (>{timeout}秒)')
-            return {
-                'exit_code': -1,
-                'stdout': '',
-                'stderr': f'脚本执行超时 (>{timeout}秒)',
-                'execution_time': execution_time
-            }
         except FileNotFoundError as e:
             execution_time = time.time() - start_time
             logger.error(f'执行错误 - 文件未找到: {str(e)}')
@@ -719,6 +922,43 @@ class QunkongAgent:
                 except Exception as e:
                     logger.warning("删除临时脚本文件失败: {}".format(e))
 
+    async def run_task(self, task_id, script, script_params="", timeout=7200, execution_user="root"):
+        """在任务槽中执行脚本并上报结果"""
+        slots = self.task_slots
+        slots.queued += 1
+        if slots.running >= slots.max_tasks:
+            logger.info("任务 {} 排队等待执行槽 (执行中 {}, 排队 {})".format(task_id, slots.running, slots.queued))
+        try:
+            await slots.semaphore.acquire()
+        finally:
+            slots.queued -= 1
+        slots.running += 1
+        try:
+            # 执行脚本，传递task_id用于生成临时文件名
+            result = await self.execute_script(
+                script=script,
+                script_params=script_params,
+                timeout=timeout,
+                execution_user=execution_user,
+                task_id=task_id
+            )
+        finally:
+            slots.running -= 1
+            slots.semaphore.release()
+        
+        # 发送结果（使用当前连接，执行期间发生过重连时结果发送到新连接）
+        result_message = {
+            'type': 'task_result',
+            'task_id': task_id,
+            'agent_id': self.agent_id,
+            'result': result
+        }
+        try:
+            await self.websocket.send(json.dumps(result_message))
+            logger.info("任务 {} 执行完成".format(task_id))
+        except Exception as e:
+            logger.error("任务 {} 结果发送失败: {}".format(task_id, e))
+
     async def handle_server_message(self, message):
         """处理服务器消息"""
         try:
@@ -737,25 +977,17 @@ class QunkongAgent:
                 
                 logger.info("收到执行任务: {}".format(task_id))
                 
-                # 执行脚本，传递task_id用于生成临时文件名
-                result = await self.execute_script(
+                # 放入任务槽后台执行，消息循环立即返回
+                task = asyncio.create_task(self.run_task(
+                    task_id=task_id,
                     script=script,
                     script_params=script_params,
                     timeout=timeout,
-                    execution_user=execution_user,
-                    task_id=task_id
-                )
-                
-                # 发送结果
-                result_message = {
-                    'type': 'task_result',
-                    'task_id': task_id,
-                    'agent_id': self.agent_id,
-                    'result': result
-                }
-                
-                await self.websocket.send(json.dumps(result_message))
-                logger.info("任务 {} 执行完成".format(task_id))
+                    execution_user=execution_user
+                ))
+                task_key = task_id or id(task)
+                self.task_slots.tasks[task_key] = task
+                task.add_done_callback(lambda _t, key=task_key: self.task_slots.tasks.pop(key, None))
             elif msg_type == 'restart_agent':
                 # 重启Agent
                 logger.info("收到重启Agent命令")
@@ -1747,6 +1979,7 @@ class QunkongAgent:
                 break
         
         self.running = False
+        await self.task_slots.kill_all()
         logger.info("Agent 已停止")
 
 def main():
@@ -1762,6 +1995,8 @@ def main():
                        help='Agent ID (默认: 使用IP的MD5值)')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='详细日志输出')
+    parser.add_argument('--max-tasks', '-t', type=int, default=4,
+                       help='同时执行的脚本任务数 (默认: 4)')
     
     args = parser.parse_args()
     
@@ -1774,7 +2009,8 @@ def main():
         server_host=args.server,
         server_port=args.port,
         agent_id=args.agent_id,
-        log_level="DEBUG" if args.verbose else "INFO"
+        log_level="DEBUG" if args.verbose else "INFO",
+        max_tasks=args.max_tasks
     )
     
     try:
@@ -9,8 +9,17 @@ import time
 from typing import Dict, Optional, Callable
 from datetime import datetime
 
+from app.metrics import get_registry
+
 logger = logging.getLogger(__name__)
 
+PUBLISH_TIME = get_registry().histogram(
+    'qunkong_cluster_publish_seconds', '发布节点消息到Redis的耗时')
+RECEIVE_DELAY = get_registry().histogram(
+    'qunkong_cluster_receive_delay_seconds', '节点消息从发送到本节点收到的延迟（依赖节点间时钟同步）')
+CLUSTER_MESSAGES = get_registry().counter(
+    'qunkong_cluster_messages_total', '节点间消息数（按方向和类型）', ['direction', 'type'])
+
 class ClusterManager:
     """集群管理器 - 处理节点间通信和状态同步"""
     
@@ -35,6 +44,9 @@ class ClusterManager:
         
         # 运行状态
         self.running = False
+        # 集群任务所在的事件循环（其他线程通过 broadcast_threadsafe 提交广播）
+        self.loop = None
+        self._background_tasks = set()
         
         logger.info(f"集群管理器初始化: node_id={self.node_id}, cluster_mode={self.is_cluster_mode}")
     
@@ -50,6 +62,7 @@ class ClusterManager:
             return
         
         self.running = True
+        self.loop = asyncio.get_running_loop()
         
         # 注册节点
         await self._register_node()
@@ -157,6 +170,9 @@ class ClusterManager:
                     if message and message['type'] == 'message':
                         try:
                             data = json.loads(message['data'])
+                            sent_at = data.get('sent_at')
+                            if isinstance(sent_at, (int, float)):
+                                RECEIVE_DELAY.observe(max(0.0, time.time() - sent_at))
                             await self._handle_message(data)
                         except json.JSONDecodeError as e:
                             logger.error(f"消息解析失败: {e}")
@@ -181,9 +197,11 @@ class ClusterManager:
             msg_type = data.get('type')
             
             if msg_type in self.message_handlers:
+                CLUSTER_MESSAGES.labels('received', msg_type).inc()
                 handler = self.message_handlers[msg_type]
                 await handler(data)
             else:
+                CLUSTER_MESSAGES.labels('received', 'other').inc()
                 logger.warning(f"未知的消息类型: {msg_type}")
         except Exception as e:
             logger.error(f"处理消息失败: {e}")
@@ -274,12 +292,17 @@ class ClusterManager:
             # 添加发送者信息
             message['from_node'] = self.node_id
             message['timestamp'] = datetime.now().isoformat()
+            message['sent_at'] = time.time()  # 接收方据此统计传递延迟
             
             # 发布消息到目标节点频道
+            started = time.perf_counter()
             await self.redis.publish(
                 f'node:{target_node_id}',
                 json.dumps(message)
             )
+            PUBLISH_TIME.observe(time.perf_counter() - started)
+            msg_type = message.get('type')
+            CLUSTER_MESSAGES.labels('sent', msg_type if msg_type in self.message_handlers else 'other').inc()
             
             logger.debug(f"消息已发送: {self.node_id} -> {target_node_id}, type={message.get('type')}")
         except Exception as e:
@@ -310,6 +333,25 @@ class ClusterManager:
         except Exception as e:
             logger.error(f"广播消息失败: {e}")
     
+    def broadcast_threadsafe(self, message: dict, exclude_self=True):
+        """
+        从任意线程或事件循环发起广播，不等待完成
+        
+        Redis 连接绑定在集群任务所在的事件循环上，其他循环（如API）的广播需要提交过去执行。
+        """
+        if not self.is_cluster_mode or self.loop is None or self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            task = asyncio.create_task(self.broadcast(message, exclude_self))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        else:
+            asyncio.run_coroutine_threadsafe(self.broadcast(message, exclude_self), self.loop)
+    
     async def get_online_nodes(self) -> list:
         """获取所有在线节点列表"""
         if not self.is_cluster_mode:
@@ -324,7 +366,9 @@ class ClusterManager:
                 cursor, keys = await self.redis.scan(cursor, match='node:*', count=100)
                 
                 for key in keys:
-                    node_id = key.decode('utf-8').split(':')[1]
+                    if isinstance(key, bytes):
+                        key = key.decode('utf-8')
+                    node_id = key.split(':')[1]
                     nodes.append(node_id)
                 
                 if cursor == 0:
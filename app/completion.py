@@ -0,0 +1,155 @@
+"""
+任务完成通知
+
+按 (task_id, agent_id) 登记等待项：结果到达时直接唤醒对应的 Future，
+截止时间统一由一个时间轮调度，超时的等待项由单个后台协程处理，
+不需要为每台主机保留一个轮询/休眠的协程。
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.liveness import TimerWheel
+from app.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+# 下发到结果返回的耗时（秒级任务为主，分桶覆盖到1小时）
+RESULT_LATENCY = get_registry().histogram(
+    'qunkong_task_result_latency_seconds', '任务下发到Agent返回结果的耗时',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 3600))
+RESULT_TIMEOUTS = get_registry().counter(
+    'qunkong_task_result_timeouts_total', '超过截止时间仍未返回结果的等待项数')
+
+WaiterKey = Tuple[str, str]
+
+
+class TaskCompletionTracker:
+    """任务结果等待与截止时间调度"""
+
+    def __init__(self, tick: float = 1.0, slots: int = 4096):
+        """
+        Args:
+            tick: 截止时间检测精度（秒）
+            slots: 时间轮槽位数
+        """
+        self._deadlines = TimerWheel(tick=tick, slots=slots)
+        self._futures: Dict[WaiterKey, asyncio.Future] = {}
+        self._by_agent: Dict[str, Set[str]] = {}  # agent_id -> 等待中的 task_id
+        self._started: Dict[WaiterKey, float] = {}  # 登记时间（单调时钟），用于下发到结果的耗时
+        self._task = None
+        self.running = False
+        self.expired_count = 0
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def track(self, task_id: str, agent_id: str, timeout: float):
+        """登记一个等待项（只调度截止时间，不创建 Future）"""
+        self._deadlines.schedule((task_id, agent_id), timeout)
+        self._started[(task_id, agent_id)] = time.monotonic()
+        self._by_agent.setdefault(agent_id, set()).add(task_id)
+
+    def expect(self, task_id: str, agent_id: str, timeout: float) -> asyncio.Future:
+        """登记等待项并返回在结果到达或超时时完成的 Future"""
+        future = self._futures.get((task_id, agent_id))
+        if future is None or future.done():
+            future = asyncio.get_running_loop().create_future()
+            self._futures[(task_id, agent_id)] = future
+        self.track(task_id, agent_id, timeout)
+        return future
+
+    def is_pending(self, task_id: str, agent_id: str) -> bool:
+        return (task_id, agent_id) in self._deadlines
+
+    def pending_tasks_for_agent(self, agent_id: str) -> Set[str]:
+        """指定Agent上仍在等待结果的任务"""
+        return set(self._by_agent.get(agent_id, ()))
+
+    def resolve(self, task_id: str, agent_id: str, result: Any) -> bool:
+        """结果到达：取消截止时间并唤醒等待者，返回该等待项是否存在"""
+        key = (task_id, agent_id)
+        existed = self._deadlines.cancel(key)
+        started = self._started.pop(key, None)
+        if started is not None:
+            RESULT_LATENCY.observe(time.monotonic() - started)
+        tasks = self._by_agent.get(agent_id)
+        if tasks is not None:
+            tasks.discard(task_id)
+            if not tasks:
+                del self._by_agent[agent_id]
+        future = self._futures.pop(key, None)
+        if future is not None and not future.done():
+            loop = future.get_loop()
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if loop is running:
+                future.set_result(result)
+            else:
+                loop.call_soon_threadsafe(self._set_result, future, result)
+        return existed or future is not None
+
+    def discard(self, task_id: str, agent_id: str):
+        """放弃等待（不唤醒等待者）"""
+        key = (task_id, agent_id)
+        self._deadlines.cancel(key)
+        self._started.pop(key, None)
+        tasks = self._by_agent.get(agent_id)
+        if tasks is not None:
+            tasks.discard(task_id)
+            if not tasks:
+                del self._by_agent[agent_id]
+        future = self._futures.pop(key, None)
+        if future is not None and not future.done():
+            future.cancel()
+
+    @staticmethod
+    def _set_result(future: asyncio.Future, result: Any):
+        if not future.done():
+            future.set_result(result)
+
+    async def run(self, on_expire: Callable[[str, str], Awaitable[None]]):
+        """
+        截止时间调度循环
+
+        Args:
+            on_expire: 等待项超时时调用，负责生成超时结果（并通过 resolve 唤醒等待者）
+        """
+        self.running = True
+        while self.running:
+            try:
+                for task_id, agent_id in self._deadlines.advance():
+                    self.expired_count += 1
+                    RESULT_TIMEOUTS.inc()
+                    self._started.pop((task_id, agent_id), None)
+                    try:
+                        await on_expire(task_id, agent_id)
+                    except Exception as e:
+                        logger.error(f"处理任务超时失败 {task_id}/{agent_id}: {e}")
+                    # 回调没有处理的等待项在这里收尾，避免等待者永远挂起
+                    if (task_id, agent_id) in self._futures or task_id in self._by_agent.get(agent_id, ()):
+                        self.resolve(task_id, agent_id, None)
+                await asyncio.sleep(self._deadlines.tick)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"任务截止时间调度出错: {e}")
+                await asyncio.sleep(self._deadlines.tick)
+
+    def start(self, on_expire: Callable[[str, str], Awaitable[None]]):
+        """启动截止时间调度任务"""
+        self._task = asyncio.create_task(self.run(on_expire))
+
+    async def stop(self):
+        """停止调度任务"""
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,411 @@
+"""
+核心进程与 API worker 进程之间的本地 RPC（Unix 套接字）
+
+拆分模式下由一个核心进程持有全部 Agent 连接、任务和终端会话，N 个无状态的 API worker 进程
+直接访问数据库，需要核心状态时（分发任务、Agent状态、终端会话、任务输出）通过本模块调用
+核心进程 QunkongServer 上的同名协程（CORE_METHODS）。
+
+帧格式：4 字节大端长度 + msgpack 编码的数组
+    请求  [REQUEST, 请求ID, 方法名, 位置参数, 关键字参数]
+    响应  [RESPONSE, 请求ID, 是否成功, 结果或错误信息]
+    广播  [BROADCAST, 0, 消息]
+
+每个 worker 只建立一条连接，请求按ID多路复用，核心进程为每个请求单独创建任务执行。
+缓存失效、认证撤销和权限变更等广播也走这条连接：核心进程实现了集群管理器的广播接口
+（register_handler / broadcast_threadsafe），转发给其他 worker，启用 Redis 集群时同时转发到其他节点。
+"""
+import asyncio
+import itertools
+import logging
+import os
+import struct
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+from app.cache import encode_value, decode_value
+from app.db_async import AsyncDatabase
+from app.job_logs import ExecutionLogBuffer
+from app.metrics import get_registry
+from app.models import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+REQUEST = 0
+RESPONSE = 1
+BROADCAST = 2
+
+_HEADER = struct.Struct('>I')
+# 单帧上限（任务输出单次最多读取 4MB，留出余量）
+MAX_FRAME = 64 * 1024 * 1024
+
+# 允许 API worker 调用的 QunkongServer 协程
+CORE_METHODS = (
+    'agent_states', 'remove_agent', 'set_agent_project', 'agent_system_info',
+    'send_agent_restart', 'send_agent_update', 'send_host_restart', 'send_agents_command',
+    'create_task', 'dispatch_task', 'execute_script_on_agent',
+    'running_task_summaries', 'has_task', 'task_detail', 'stop_task',
+    'read_task_output', 'wait_task_output',
+    'terminal_sessions', 'has_terminal_session', 'terminal_policy', 'close_terminal_session',
+    'metrics_text',
+)
+
+RPC_CALLS = get_registry().counter(
+    'qunkong_core_rpc_calls_total', '核心进程处理的RPC调用数（按方法和结果）', ['method', 'result'])
+RPC_TIME = get_registry().histogram(
+    'qunkong_core_rpc_duration_seconds', 'API worker 调用核心进程的耗时（按方法）', ['method'])
+
+
+class CoreRPCError(Exception):
+    """核心进程返回错误或连接断开"""
+
+
+def pack_frame(frame) -> bytes:
+    body = encode_value(frame)
+    return _HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """读取一帧，连接关闭时抛出 asyncio.IncompleteReadError"""
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise CoreRPCError(f"帧长度超过上限: {length}")
+    return decode_value(await reader.readexactly(length))
+
+
+def _on_loop(loop: Optional[asyncio.AbstractEventLoop], callback: Callable, *args):
+    """在指定事件循环中执行回调（可以从任意线程调用）"""
+    if loop is None or loop.is_closed():
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        callback(*args)
+    else:
+        loop.call_soon_threadsafe(callback, *args)
+
+
+class CoreRPCServer:
+    """
+    核心进程的 RPC 服务
+
+    同时作为本进程缓存/认证/权限失效广播的出口（接口与 ClusterManager 相同），
+    本进程和任一 worker 发起的广播都会转发给其余 worker，启用集群时再转发到其他节点。
+    """
+
+    is_cluster_mode = True
+
+    def __init__(self, path: str, cluster=None):
+        self.path = path
+        self.cluster = cluster
+        self.server = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.message_handlers: Dict[str, Callable] = {}
+        self._listener: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self, server):
+        """在核心服务器的事件循环中启动监听"""
+        self.server = server
+        self.loop = asyncio.get_running_loop()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._listener = await asyncio.start_unix_server(self._handle_connection, path=self.path)
+        os.chmod(self.path, 0o600)
+        logger.info(f"核心RPC服务已启动: {self.path}")
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.close()
+            await self._listener.wait_closed()
+            self._listener = None
+        for writer in list(self._writers):
+            writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        logger.info("核心RPC服务已停止")
+
+    @property
+    def connections(self) -> int:
+        return len(self._writers)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        logger.info(f"API worker 已连接，当前连接数: {len(self._writers)}")
+        try:
+            while True:
+                frame = await read_frame(reader)
+                kind = frame[0]
+                if kind == REQUEST:
+                    task = asyncio.create_task(self._dispatch(writer, *frame[1:]))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                elif kind == BROADCAST:
+                    await self._deliver(frame[2], source=writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"核心RPC连接异常: {e!r}")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+            logger.info(f"API worker 已断开，当前连接数: {len(self._writers)}")
+
+    async def _dispatch(self, writer: asyncio.StreamWriter, request_id: int, method: str, args, kwargs):
+        if method not in CORE_METHODS:
+            RPC_CALLS.labels(method, 'unknown').inc()
+            response = [RESPONSE, request_id, False, f"未知的方法: {method}"]
+        else:
+            try:
+                result = await getattr(self.server, method)(*args, **kwargs)
+                RPC_CALLS.labels(method, 'ok').inc()
+                response = [RESPONSE, request_id, True, result]
+            except Exception as e:
+                RPC_CALLS.labels(method, 'error').inc()
+                logger.error(f"核心RPC调用失败: {method}: {e!r}")
+                response = [RESPONSE, request_id, False, f"{type(e).__name__}: {e}"]
+        if writer.is_closing():
+            return
+        try:
+            data = pack_frame(response)
+        except Exception as e:
+            # 结果无法序列化时只让这一次调用失败
+            logger.error(f"核心RPC结果序列化失败: {method}: {e!r}")
+            data = pack_frame([RESPONSE, request_id, False, f"结果无法序列化: {e}"])
+        try:
+            writer.write(data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    # ==================== 广播（ClusterManager 接口） ====================
+
+    def register_handler(self, message_type: str, handler: Callable):
+        """注册本进程的广播处理函数；启用集群时同时接收其他节点的消息并转发给 worker"""
+        self.message_handlers[message_type] = handler
+        if self.cluster is not None and self.cluster.is_cluster_mode:
+            async def from_cluster(data: dict):
+                await handler(data)
+                self._relay(data, None)
+            self.cluster.register_handler(message_type, from_cluster)
+
+    def broadcast_threadsafe(self, message: dict, exclude_self=True):
+        """本进程发起的广播：转发给所有 worker 和其他节点"""
+        _on_loop(self.loop, self._relay, message, None)
+        if self.cluster is not None and self.cluster.is_cluster_mode:
+            self.cluster.broadcast_threadsafe(message, exclude_self)
+
+    async def _deliver(self, message: dict, source: asyncio.StreamWriter):
+        """worker 发起的广播：本进程处理，再转发给其他 worker 和其他节点"""
+        handler = self.message_handlers.get(message.get('type'))
+        if handler is not None:
+            try:
+                await handler(message)
+            except Exception as e:
+                logger.error(f"处理worker广播失败: {e!r}")
+        self._relay(message, source)
+        if self.cluster is not None and self.cluster.is_cluster_mode:
+            self.cluster.broadcast_threadsafe(message)
+
+    def _relay(self, message: dict, source: Optional[asyncio.StreamWriter]):
+        data = pack_frame([BROADCAST, 0, message])
+        for writer in list(self._writers):
+            if writer is not source and not writer.is_closing():
+                writer.write(data)
+
+
+class CoreClient:
+    """
+    API worker 进程到核心进程的 RPC 客户端
+
+    一条连接上多路复用所有请求；连接断开时未完成的调用抛出 CoreRPCError，下一次调用自动重连。
+    同时实现 ClusterManager 的广播接口，本进程的缓存失效等广播经核心进程转发。
+    """
+
+    is_cluster_mode = True
+
+    def __init__(self, path: str, connect_timeout: float = 30):
+        self.path = path
+        self.connect_timeout = connect_timeout
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.message_handlers: Dict[str, Callable] = {}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        """连接核心进程（核心进程刚启动时套接字可能还不存在，在超时内重试）"""
+        if self._connect_lock is None:
+            self.loop = asyncio.get_running_loop()
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.connected:
+                return
+            deadline = time.monotonic() + self.connect_timeout
+            while True:
+                try:
+                    self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                    break
+                except (FileNotFoundError, ConnectionError) as e:
+                    if time.monotonic() >= deadline:
+                        raise CoreRPCError(f"无法连接核心进程 {self.path}: {e}") from e
+                    await asyncio.sleep(0.2)
+            self._read_task = asyncio.create_task(self._read_loop(self._reader))
+            logger.info(f"已连接核心进程: {self.path}")
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._read_task is not None:
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._read_task = None
+
+    async def call(self, method: str, *args, _timeout: Optional[float] = None, **kwargs) -> Any:
+        """调用核心进程的方法并等待结果"""
+        if not self.connected:
+            await self.connect()
+        request_id = next(self._ids)
+        future = self.loop.create_future()
+        self._pending[request_id] = future
+        started = time.perf_counter()
+        try:
+            self._writer.write(pack_frame([REQUEST, request_id, method, list(args), kwargs]))
+            await self._writer.drain()
+            return await asyncio.wait_for(future, _timeout)
+        except ConnectionError as e:
+            raise CoreRPCError(f"核心进程连接已断开: {e}") from e
+        finally:
+            self._pending.pop(request_id, None)
+            RPC_TIME.labels(method).observe(time.perf_counter() - started)
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame[0] == RESPONSE:
+                    _, request_id, ok, result = frame
+                    future = self._pending.get(request_id)
+                    if future is None or future.done():
+                        continue
+                    if ok:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(CoreRPCError(result))
+                elif frame[0] == BROADCAST:
+                    self._on_broadcast(frame[2])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.error("核心进程连接已断开")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"读取核心进程响应失败: {e!r}")
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(CoreRPCError("核心进程连接已断开"))
+
+    # ==================== 广播（ClusterManager 接口） ====================
+
+    def register_handler(self, message_type: str, handler: Callable):
+        self.message_handlers[message_type] = handler
+
+    def broadcast_threadsafe(self, message: dict, exclude_self=True):
+        """发起广播（由核心进程转发给其他进程），不等待完成"""
+        _on_loop(self.loop, self._send_broadcast, message)
+
+    def _send_broadcast(self, message: dict):
+        if self.connected:
+            self._writer.write(pack_frame([BROADCAST, 0, message]))
+        else:
+            logger.warning(f"核心进程未连接，丢弃广播: {message.get('type')}")
+
+    def _on_broadcast(self, message: dict):
+        handler = self.message_handlers.get(message.get('type'))
+        if handler is None:
+            return
+        task = asyncio.create_task(handler(message))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+
+def _remote_method(name: str):
+    async def method(self, *args, **kwargs):
+        return await self.client.call(name, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = f"经 RPC 调用核心进程的 QunkongServer.{name}"
+    return method
+
+
+class CoreProxy:
+    """
+    API worker 进程中代替 QunkongServer 的对象
+
+    数据库直接访问（每个 worker 自己的连接池和后台线程池），核心状态接口经 RPC 调用核心进程。
+    作业编排（简单作业的 run_job）在发起请求的 worker 中执行，对 Agent 的操作仍由核心进程完成。
+    """
+
+    def __init__(self, client: CoreClient, port: int = 8765, db=None):
+        self.client = client
+        self.port = port
+        self.db = db or DatabaseManager()
+        self.adb = AsyncDatabase(self.db, max_workers=8)
+        self.job_logs = ExecutionLogBuffer(self._write_job_logs)
+        self._job_manager = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.running = False
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        await self.client.connect()
+        self.job_logs.start()
+        self.running = True
+
+    async def stop(self):
+        self.running = False
+        await self.job_logs.close()
+        await self.adb.drain(timeout=10)
+        await self.client.close()
+
+    def submit(self, coro):
+        """在本进程事件循环中执行协程，不等待完成（对核心状态的调用本身经 RPC 完成）"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def call(self, coro, timeout: Optional[float] = None):
+        return await asyncio.wait_for(coro, timeout)
+
+    async def _write_job_logs(self, rows) -> bool:
+        """批量写入作业执行日志"""
+        if self._job_manager is None:
+            from app.models.simple_jobs import SimpleJobManager
+            self._job_manager = SimpleJobManager(self.db)
+        return await self.adb.run(self._job_manager.append_execution_logs, rows)
+
+
+for _name in CORE_METHODS:
+    setattr(CoreProxy, _name, _remote_method(_name))
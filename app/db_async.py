@@ -0,0 +1,217 @@
+"""
+异步数据库访问门面
+
+DatabaseManager 基于同步 pymysql，直接在协程中调用会阻塞整个事件循环。
+AsyncDatabase 把调用放到专用的有界线程池中执行，并对每次调用施加超时，
+方法名与 DatabaseManager 保持一致: await adb.save_agent(...)。
+
+排队已满时，交互调用（请求路径上的 await adb.xxx()）直接抛出 DatabaseBusyError；
+后台写入（spawn）和必须落库的调用（run(..., _wait=True)）则等待空位，不会被丢弃。
+空位释放时直接交给最早的等待者，等待者可以在不同线程的事件循环中。
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseBusyError(RuntimeError):
+    """数据库线程池排队已满"""
+
+
+class AsyncDatabase:
+    """DatabaseManager 的异步门面"""
+
+    def __init__(self, db, max_workers: int = 8, max_pending: int = 1000,
+                 timeout: float = 10.0, timeouts: Dict[str, float] = None):
+        """
+        初始化异步门面
+
+        Args:
+            db: DatabaseManager 实例
+            max_workers: 数据库线程数（不应超过连接池大小）
+            max_pending: 最大排队+执行中的调用数，超出时交互调用抛出 DatabaseBusyError，后台写入等待
+            timeout: 默认单次调用超时（秒）
+            timeouts: 按方法名覆盖的超时时间
+        """
+        self.db = db
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.timeouts = dict(timeouts or {})
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='qunkong-db')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._waiters = deque()  # 等待空位的 (loop, future)
+        self._chains: Dict[Hashable, asyncio.Future] = {}  # 按key串行的后台写入
+        self._background = set()  # 持有后台任务引用，避免被回收
+        self._stats = {
+            'calls': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'rejected': 0,
+            'waited': 0,
+            'total_time': 0.0,
+            'max_time': 0.0,
+        }
+
+    def __getattr__(self, name: str):
+        # 只有在实例属性中找不到时才会进入这里，代理到 DatabaseManager 的同名方法
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, _timeout=self.timeouts.get(name), **kwargs)
+
+        return call
+
+    @property
+    def pending(self) -> int:
+        """排队和执行中的调用数"""
+        return self._pending
+
+    async def run(self, func: Callable, *args, _timeout: Optional[float] = None, _wait: bool = False,
+                  **kwargs) -> Any:
+        """
+        在数据库线程池中执行同步函数
+
+        Args:
+            _timeout: 单次调用超时（秒），不含等待空位的时间
+            _wait: 排队已满时等待空位而不是抛出 DatabaseBusyError（后台写入使用）
+
+        Raises:
+            DatabaseBusyError: 排队已满（_wait=False）
+            asyncio.TimeoutError: 超过调用超时（后台线程中的调用仍会执行完）
+        """
+        await self._acquire(_wait)
+
+        timeout = self.timeout if _timeout is None else _timeout
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        future = loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            logger.error(f"数据库调用超时({timeout}s): {getattr(func, '__name__', func)}")
+            raise
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                stats = self._stats
+                stats['calls'] += 1
+                stats['total_time'] += elapsed
+                if elapsed > stats['max_time']:
+                    stats['max_time'] = elapsed
+
+    async def _acquire(self, wait: bool):
+        """占用一个空位；已满时按 wait 抛出异常或排队等待释放的空位"""
+        with self._lock:
+            if self._pending < self.max_pending and not self._waiters:
+                self._pending += 1
+                return
+            if not wait:
+                self._stats['rejected'] += 1
+                raise DatabaseBusyError(f"数据库调用排队已满: {self._pending}")
+            self._stats['waited'] += 1
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+                    raise
+            if future.done() and not future.cancelled():
+                self._release(None)  # 空位已经交给本调用，取消时归还
+            raise
+
+    def _release(self, _future):
+        """释放空位：有等待者时直接交给最早的等待者（计数不变），否则减少计数"""
+        with self._lock:
+            if not self._waiters:
+                self._pending -= 1
+                return
+            loop, future = self._waiters.popleft()
+        try:
+            loop.call_soon_threadsafe(self._hand_over, future)
+        except RuntimeError:
+            self._release(None)  # 等待者所在的事件循环已关闭，交给下一个
+
+    def _hand_over(self, future: asyncio.Future):
+        if future.done():
+            self._release(None)  # 等待者已取消，空位继续传递
+        else:
+            future.set_result(None)
+
+    def spawn(self, name: str, *args, key: Hashable = None, **kwargs) -> asyncio.Task:
+        """
+        以后台任务方式执行数据库方法（不等待结果，异常只记录日志）
+
+        排队已满时等待空位，不会因为瞬时的写入高峰被拒绝。
+
+        指定 key 时，同一 key 的调用按提交顺序串行执行，保证同一条记录的写入不乱序。
+        """
+        func = getattr(self.db, name)
+        timeout = self.timeouts.get(name)
+        previous = self._chains.get(key) if key is not None else None
+
+        async def runner():
+            if previous is not None:
+                try:
+                    await previous
+                except Exception:
+                    pass
+            try:
+                # 后台写入必须落库：排队已满时等待空位
+                return await self.run(func, *args, _timeout=timeout, _wait=True, **kwargs)
+            except Exception as e:
+                logger.error(f"后台数据库调用失败 {name}: {e!r}")
+            finally:
+                if key is not None and self._chains.get(key) is task:
+                    del self._chains[key]
+
+        task = asyncio.ensure_future(runner())
+        if key is not None:
+            self._chains[key] = task
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def drain(self, timeout: float = None):
+        """等待所有后台写入完成（关闭时调用）"""
+        if self._background:
+            await asyncio.wait(list(self._background), timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取调用统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._pending
+        stats['waiting'] = len(self._waiters)
+        stats['background'] = len(self._background)
+        stats['max_workers'] = self.max_workers
+        stats['avg_time'] = stats['total_time'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        self.executor.shutdown(wait=wait)
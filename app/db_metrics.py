@@ -0,0 +1,304 @@
+"""
+数据库连接池和查询监控
+
+DatabaseManager._get_connection() 返回的连接经过 DBInstrumentation 包装，记录：
+- 取连接的等待时间和连接占用时间（PooledDB 耗尽时 blocking=True 会一直等待）
+- 使用中/空闲/等待中的连接数
+- 按归一化SQL统计的执行耗时分布、返回/影响的行数和错误数
+- 慢查询日志（附带发起查询的代码位置）
+
+指标注册到 app.metrics，通过 GET /metrics 输出；汇总和慢查询列表通过 /api/system/db 查看。
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_SECONDS = 0.5
+MAX_STATEMENTS = 500  # 超过后新的语句归入 other，限制指标标签数量
+STATEMENT_MAX_LENGTH = 200
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_PROJECT_DIR = os.path.dirname(_APP_DIR)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"(?:%s|\?)(?:\s*,\s*(?:%s|\?))+")
+_ROW_LIST = re.compile(r"(\([^()]*\))(?:\s*,\s*\([^()]*\))+")
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql: str) -> str:
+    """归一化SQL：合并空白，字面量替换为 ?，IN (...) 和多行 VALUES 折叠"""
+    text = _WHITESPACE.sub(' ', sql).strip().rstrip(';')
+    text = _STRING.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _PLACEHOLDER_LIST.sub('?, ...', text)
+    text = _ROW_LIST.sub(r'\1, ...', text)
+    if len(text) > STATEMENT_MAX_LENGTH:
+        text = text[:STATEMENT_MAX_LENGTH] + '...'
+    return text
+
+
+def _caller_location() -> str:
+    """发起查询的项目代码位置（跳过本模块和第三方库）"""
+    frame = sys._getframe(1)
+    this_file = os.path.abspath(__file__)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename != this_file and filename.startswith(_PROJECT_DIR):
+            return f"{os.path.relpath(filename, _PROJECT_DIR)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class _StatementStats:
+    __slots__ = ('calls', 'errors', 'rows', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class DBInstrumentation:
+    """连接池和查询监控"""
+
+    def __init__(self, pool=None, slow_query_seconds: float = SLOW_QUERY_SECONDS,
+                 slow_log_size: int = 200, registry=None):
+        self.pool = pool
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._checkouts = 0
+        self._statements: Dict[str, _StatementStats] = {}
+        self._slow_log = deque(maxlen=slow_log_size)
+
+        registry = registry or get_registry()
+        self.checkout_wait = registry.histogram(
+            'qunkong_db_checkout_wait_seconds', '从连接池获取连接的等待时间')
+        self.hold_time = registry.histogram(
+            'qunkong_db_connection_hold_seconds', '连接从取出到归还的占用时间')
+        self.query_time = registry.histogram(
+            'qunkong_db_query_duration_seconds', 'SQL执行耗时（按归一化语句）', ['statement'])
+        self.query_rows = registry.counter(
+            'qunkong_db_query_rows_total', 'SQL返回或影响的行数（按归一化语句）', ['statement'])
+        self.query_errors = registry.counter(
+            'qunkong_db_query_errors_total', 'SQL执行失败次数（按归一化语句）', ['statement'])
+        self.slow_queries = registry.counter(
+            'qunkong_db_slow_queries_total', '超过慢查询阈值的SQL次数')
+        registry.register_collector(self._collect_pool)
+
+    # ==================== 连接 ====================
+
+    def checkout(self, pool=None):
+        """从连接池取出连接并包装"""
+        pool = pool or self.pool
+        with self._lock:
+            self._waiting += 1
+        started = time.perf_counter()
+        try:
+            conn = pool.connection()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        now = time.perf_counter()
+        self.checkout_wait.observe(now - started)
+        with self._lock:
+            self._checkouts += 1
+        return InstrumentedConnection(conn, self, now)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """连接池状态（读取 PooledDB 内部计数，SQLite 后端由 stats() 提供）"""
+        pool = self.pool
+        if hasattr(pool, 'stats'):
+            return dict(pool.stats(), waiting=self._waiting, checkouts=self._checkouts)
+        return {
+            'in_use': getattr(pool, '_connections', 0) if pool else 0,
+            'idle': len(getattr(pool, '_idle_cache', ())) if pool else 0,
+            'max': getattr(pool, '_maxconnections', 0) if pool else 0,
+            'waiting': self._waiting,
+            'checkouts': self._checkouts,
+        }
+
+    def _collect_pool(self):
+        stats = self.pool_stats()
+        return [
+            ('qunkong_db_pool_connections', 'gauge', '连接池连接数（按状态）',
+             [({'state': 'in_use'}, stats['in_use']), ({'state': 'idle'}, stats['idle'])]),
+            ('qunkong_db_pool_max_connections', 'gauge', '连接池最大连接数', [({}, stats['max'])]),
+            ('qunkong_db_pool_waiting', 'gauge', '正在等待连接的线程数', [({}, stats['waiting'])]),
+        ]
+
+    # ==================== 查询 ====================
+
+    def _statement_key(self, sql) -> str:
+        if isinstance(sql, bytes):
+            sql = sql.decode('utf-8', 'replace')
+        statement = normalize_sql(sql)
+        if statement not in self._statements and len(self._statements) >= MAX_STATEMENTS:
+            return 'other'
+        return statement
+
+    def record_query(self, sql, elapsed: float, rows: int, error: bool = False):
+        statement = self._statement_key(sql)
+        self.query_time.labels(statement).observe(elapsed)
+        if rows > 0:
+            self.query_rows.labels(statement).inc(rows)
+        if error:
+            self.query_errors.labels(statement).inc()
+        with self._lock:
+            stats = self._statements.get(statement)
+            if stats is None:
+                stats = self._statements[statement] = _StatementStats()
+            stats.calls += 1
+            stats.total_time += elapsed
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
+            if rows > 0:
+                stats.rows += rows
+            if error:
+                stats.errors += 1
+        if elapsed >= self.slow_query_seconds:
+            caller = _caller_location()
+            self.slow_queries.inc()
+            self._slow_log.append({
+                'time': datetime.now().isoformat(),
+                'duration_ms': round(elapsed * 1000, 1),
+                'rows': rows,
+                'error': error,
+                'caller': caller,
+                'statement': statement,
+            })
+            logger.warning(f"慢查询 {elapsed * 1000:.0f}ms [{caller}] {statement}")
+
+    # ==================== 汇总 ====================
+
+    def statements(self, top: int = 50, order_by: str = 'total_time') -> List[Dict[str, Any]]:
+        """按总耗时（或 calls/max_time/rows/errors）排序的语句统计"""
+        with self._lock:
+            items = [(statement, stats) for statement, stats in self._statements.items()]
+        result = [{
+            'statement': statement,
+            'calls': stats.calls,
+            'errors': stats.errors,
+            'rows': stats.rows,
+            'total_ms': round(stats.total_time * 1000, 1),
+            'avg_ms': round(stats.total_time * 1000 / stats.calls, 2) if stats.calls else 0.0,
+            'max_ms': round(stats.max_time * 1000, 1),
+        } for statement, stats in items]
+        key = {'total_time': 'total_ms', 'max_time': 'max_ms'}.get(order_by, order_by)
+        if result and key not in result[0]:
+            key = 'total_ms'
+        result.sort(key=lambda item: item[key], reverse=True)
+        return result[:top]
+
+    def slow_log(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """最近的慢查询（新的在前）"""
+        return list(self._slow_log)[::-1][:limit]
+
+    def snapshot(self, top: int = 50, order_by: str = 'total_time') -> Dict[str, Any]:
+        return {
+            'pool': self.pool_stats(),
+            'slow_query_ms': round(self.slow_query_seconds * 1000),
+            'statements': self.statements(top, order_by),
+            'slow_queries': self.slow_log(),
+        }
+
+    def reset(self):
+        """清空语句统计和慢查询日志（Prometheus 指标保持单调，不清空）"""
+        with self._lock:
+            self._statements.clear()
+            self._slow_log.clear()
+
+
+class InstrumentedCursor:
+    """记录 execute/executemany 耗时的游标代理"""
+
+    __slots__ = ('_cursor', '_instrumentation')
+
+    def __init__(self, cursor, instrumentation: DBInstrumentation):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(query, args)
+        except Exception:
+            self._instrumentation.record_query(query, time.perf_counter() - started, 0, error=True)
+            raise
+        self._instrumentation.record_query(query, time.perf_counter() - started, self._cursor.rowcount or 0)
+        return result
+
+    def executemany(self, query, args):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.executemany(query, args)
+        except Exception:
+            self._instrumentation.record_query(query, time.perf_counter() - started, 0, error=True)
+            raise
+        self._instrumentation.record_query(query, time.perf_counter() - started, self._cursor.rowcount or 0)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class InstrumentedConnection:
+    """记录占用时间的连接代理，close() 时归还连接池"""
+
+    __slots__ = ('_conn', '_instrumentation', '_checked_out', '_closed')
+
+    def __init__(self, conn, instrumentation: DBInstrumentation, checked_out: float):
+        self._conn = conn
+        self._instrumentation = instrumentation
+        self._checked_out = checked_out
+        self._closed = False
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._instrumentation)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._instrumentation.hold_time.observe(time.perf_counter() - self._checked_out)
+        self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_slow_query_seconds(config_value: Optional[int]) -> float:
+    """配置中的慢查询阈值（毫秒）转换为秒"""
+    if config_value is None:
+        return SLOW_QUERY_SECONDS
+    return max(0, config_value) / 1000.0
@@ -0,0 +1,362 @@
+"""
+SQLite 存储后端
+
+单节点部署和性能测试使用，不需要 MySQL 服务，启动时没有连接池预热。
+DatabaseManager 和各模型管理器的 SQL 按 MySQL 语法编写，这里提供与 PooledDB + pymysql DictCursor
+相同的接口（connection() / cursor() / execute / fetchall 返回字典），执行前把 MySQL 专有语法改写为 SQLite 语法：
+- %s 占位符 -> ?
+- INSERT IGNORE -> INSERT OR IGNORE
+- ON DUPLICATE KEY UPDATE c = VALUES(c) -> ON CONFLICT DO UPDATE SET c = excluded.c
+- IF(...) -> iif(...)，CURRENT_TIMESTAMP -> NOW()
+NOW() 和 JSON_LENGTH() 注册为连接上的函数，按 MySQL 语义返回本地时间和 JSON 数组/对象的元素数。
+
+并发：WAL 模式下读写互不阻塞，但同一时间只能有一个写事务。
+- 写语句都在同一个写连接上执行，由锁串行，不会出现多个连接争抢写锁的 database is locked
+- 读语句使用每个线程自己的只读连接，与写并发执行
+- executemany 在一个事务中执行，批量写入只提交一次
+- 与 pymysql 的 autocommit=True 一致，单条写语句立即提交；begin() 之后到 commit()/rollback()
+  之间的语句都在写连接的同一事务中执行
+
+数据库路径为 :memory: 时所有语句都在写连接上执行（内存库不能跨连接共享），用于测试和基准测试。
+表结构见 scripts/init_sqlite.sql。
+"""
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+MIN_SQLITE_VERSION = (3, 35, 0)  # ON CONFLICT DO UPDATE 省略冲突目标
+
+_PLACEHOLDER = re.compile(r'%([s%])')
+_UPSERT = re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.IGNORECASE)
+_VALUES_REF = re.compile(r'\bVALUES\s*\(\s*`?(\w+)`?\s*\)', re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE)
+_IF_CALL = re.compile(r'\bIF\s*\(', re.IGNORECASE)
+_CURRENT_TIMESTAMP = re.compile(r'\bCURRENT_TIMESTAMP\b(?!\s*\()', re.IGNORECASE)
+_READ_PREFIXES = ('SELECT', 'WITH')
+
+
+# ==================== 类型转换 ====================
+
+def _convert_datetime(value: bytes):
+    text = value.decode()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+def _convert_date(value: bytes):
+    text = value.decode()
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        return text
+
+
+# 与 pymysql 一致：DATETIME/TIMESTAMP 列读出为 datetime，写入时 datetime 转为 'YYYY-MM-DD HH:MM:SS'
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter('DATETIME', _convert_datetime)
+sqlite3.register_converter('TIMESTAMP', _convert_datetime)
+sqlite3.register_converter('DATE', _convert_date)
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _json_length(value) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        data = json.loads(value)
+    except (TypeError, ValueError):
+        return None
+    return len(data) if isinstance(data, (list, dict)) else 1
+
+
+# ==================== SQL 改写 ====================
+
+@functools.lru_cache(maxsize=2048)
+def translate_sql(query: str, has_params: bool = True) -> str:
+    """把 MySQL 语法改写为 SQLite 语法（结果按语句缓存）"""
+    sql = query
+    if has_params:
+        # pymysql 只在有参数时做 % 格式化
+        sql = _PLACEHOLDER.sub(lambda m: '?' if m.group(1) == 's' else '%', sql)
+    sql = _INSERT_IGNORE.sub('INSERT OR IGNORE', sql)
+    match = _UPSERT.search(sql)
+    if match:
+        tail = _VALUES_REF.sub(r'excluded.\1', sql[match.end():])
+        sql = f"{sql[:match.start()]}ON CONFLICT DO UPDATE SET{tail}"
+    sql = _IF_CALL.sub('iif(', sql)
+    sql = _CURRENT_TIMESTAMP.sub('NOW()', sql)
+    return sql
+
+
+def is_read(sql: str) -> bool:
+    return sql.lstrip(' \t\r\n(').upper().startswith(_READ_PREFIXES)
+
+
+def _normalize_args(args):
+    if args is None or isinstance(args, (tuple, list, dict)):
+        return args
+    return (args,)
+
+
+# ==================== 游标和连接 ====================
+
+class SQLiteCursor:
+    """pymysql DictCursor 兼容游标（结果在 execute 时全部读出，与 pymysql 的缓冲游标一致）"""
+
+    def __init__(self, connection: 'SQLiteConnection'):
+        self.connection = connection
+        self.rowcount = -1
+        self.lastrowid = None
+        self.description = None
+        self._rows: List[Dict[str, Any]] = []
+        self._index = 0
+
+    def execute(self, query: str, args=None) -> int:
+        args = _normalize_args(args)
+        sql = translate_sql(query, args is not None)
+        self._load(self.connection.database.run(self.connection, sql, args, is_read(sql)))
+        return self.rowcount
+
+    def executemany(self, query: str, args) -> int:
+        sql = translate_sql(query, True)
+        self._load(self.connection.database.run(self.connection, sql, [_normalize_args(a) for a in args],
+                                                False, many=True))
+        return self.rowcount
+
+    def _load(self, result):
+        self.description, self._rows, self.rowcount, self.lastrowid = result
+        self._index = 0
+
+    def fetchone(self) -> Optional[Dict[str, Any]]:
+        if self._index >= len(self._rows):
+            return None
+        row = self._rows[self._index]
+        self._index += 1
+        return row
+
+    def fetchmany(self, size: int = 1) -> List[Dict[str, Any]]:
+        rows = self._rows[self._index:self._index + size]
+        self._index += len(rows)
+        return rows
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        rows = self._rows[self._index:]
+        self._index = len(self._rows)
+        return rows
+
+    def close(self):
+        self._rows = []
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteConnection:
+    """一次取出的连接（轻量句柄，实际的 sqlite3 连接由 SQLiteDatabase 按读写分配）"""
+
+    def __init__(self, database: 'SQLiteDatabase'):
+        self.database = database
+        self.in_transaction = False
+
+    def cursor(self, *args, **kwargs) -> SQLiteCursor:
+        return SQLiteCursor(self)
+
+    def begin(self):
+        """开始显式事务（持有写锁直到 commit/rollback）"""
+        if not self.in_transaction:
+            self.database.begin(self)
+
+    def commit(self):
+        if self.in_transaction:
+            self.database.end(self, commit=True)
+
+    def rollback(self):
+        if self.in_transaction:
+            self.database.end(self, commit=False)
+
+    def close(self):
+        # 未提交的显式事务回滚（与连接归还连接池时的行为一致）
+        self.rollback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ==================== 数据库 ====================
+
+class SQLiteDatabase:
+    """SQLite 数据库（替代 PooledDB 作为 DatabaseManager 的连接池）"""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        """
+        Args:
+            path: 数据库文件路径，:memory: 为内存库
+            timeout: 等待写锁的超时时间（秒）
+        """
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite 版本过低: {sqlite3.sqlite_version}，需要 "
+                f"{'.'.join(str(v) for v in MIN_SQLITE_VERSION)} 以上"
+            )
+        self.path = path
+        self.timeout = timeout
+        self.memory = path == ':memory:'
+        if not self.memory:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._writer = self._connect(readonly=False)
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._in_use = 0
+        self._stats = {'reads': 0, 'writes': 0, 'batches': 0, 'write_wait': 0.0, 'max_write_wait': 0.0}
+
+    def _connect(self, readonly: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                               isolation_level=None, check_same_thread=False)
+        conn.create_function('NOW', 0, _now)
+        conn.create_function('JSON_LENGTH', 1, _json_length, deterministic=True)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        if not self.memory:
+            if not readonly:
+                conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'reader', None)
+        if conn is None:
+            conn = self._local.reader = self._connect(readonly=True)
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    # ==================== 连接池接口 ====================
+
+    def connection(self) -> SQLiteConnection:
+        return SQLiteConnection(self)
+
+    def _acquire_writer(self):
+        started = time.perf_counter()
+        self._write_lock.acquire()
+        waited = time.perf_counter() - started
+        stats = self._stats
+        stats['write_wait'] += waited
+        if waited > stats['max_write_wait']:
+            stats['max_write_wait'] = waited
+
+    @staticmethod
+    def _result(cursor):
+        """读出结果（在持有连接时调用）: (description, rows, rowcount, lastrowid)"""
+        description = cursor.description
+        if description:
+            columns = [column[0] for column in description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return description, rows, len(rows), cursor.lastrowid
+        return None, [], cursor.rowcount, cursor.lastrowid
+
+    def _execute(self, conn: sqlite3.Connection, sql: str, args, many: bool):
+        if many:
+            return self._result(conn.executemany(sql, args))
+        return self._result(conn.execute(sql, args or ()))
+
+    def run(self, connection: SQLiteConnection, sql: str, args, read: bool, many: bool = False):
+        """执行一条语句，返回 (description, rows, rowcount, lastrowid)"""
+        if connection.in_transaction:
+            # 显式事务已持有写锁
+            return self._execute(self._writer, sql, args, many)
+        if read and not self.memory:
+            self._stats['reads'] += 1
+            return self._execute(self._reader(), sql, args, False)
+
+        self._acquire_writer()
+        self._in_use += 1
+        try:
+            self._stats['reads' if read else 'writes'] += 1
+            if not many:
+                return self._execute(self._writer, sql, args, False)
+            # 批量写入在一个事务中提交
+            self._stats['batches'] += 1
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                result = self._execute(self._writer, sql, args, True)
+            except Exception:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+            return result
+        finally:
+            self._in_use -= 1
+            self._write_lock.release()
+
+    def begin(self, connection: SQLiteConnection):
+        self._acquire_writer()
+        try:
+            self._writer.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self._write_lock.release()
+            raise
+        self._in_use += 1
+        connection.in_transaction = True
+
+    def end(self, connection: SQLiteConnection, commit: bool):
+        try:
+            self._writer.execute("COMMIT" if commit else "ROLLBACK")
+        finally:
+            connection.in_transaction = False
+            self._in_use -= 1
+            self._write_lock.release()
+
+    def executescript(self, script: str):
+        """执行建表脚本"""
+        with self._write_lock:
+            self._writer.executescript(script)
+
+    def stats(self) -> Dict[str, Any]:
+        """连接状态（DBInstrumentation.pool_stats 读取）"""
+        with self._readers_lock:
+            readers = len(self._readers)
+        return {
+            'in_use': self._in_use,
+            'idle': readers + 1 - self._in_use,
+            'max': readers + 1,
+            'reads': self._stats['reads'],
+            'writes': self._stats['writes'],
+            'batches': self._stats['batches'],
+            'write_wait_seconds': round(self._stats['write_wait'], 3),
+            'max_write_wait_seconds': round(self._stats['max_write_wait'], 3),
+        }
+
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        self._writer.close()
@@ -0,0 +1,147 @@
+"""
+执行目标写缓冲
+
+任务下发和每台主机的结果只更新内存中按 (task_id, agent_id) 合并的记录，由后台任务
+每隔几百毫秒把待写记录合并成分块的多行 INSERT ... ON DUPLICATE KEY UPDATE 写入
+execution_targets 表。大规模分发或同一时刻大量主机超时的结果不再各占一个数据库调用，
+写入失败的记录留在缓冲中下一轮重试。
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TargetKey = Tuple[str, str]  # (task_id, agent_id)
+
+
+def _merge(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """合并同一目标的两条待写记录：下发时间取最早的非空值，结果取最新的"""
+    merged = dict(newer)
+    if merged.get('dispatched_at') is None:
+        merged['dispatched_at'] = older.get('dispatched_at')
+    if merged.get('finished_at') is None and older.get('finished_at') is not None:
+        for field in ('status', 'exit_code', 'duration', 'finished_at'):
+            merged[field] = older[field]
+    return merged
+
+
+class ExecutionTargetBuffer:
+    """执行目标写缓冲"""
+
+    def __init__(self, db, flush_interval: float = 0.5, batch_size: int = 500):
+        """
+        初始化写缓冲
+
+        Args:
+            db: AsyncDatabase 实例（数据库调用在专用线程池中执行）
+            flush_interval: 刷盘间隔（秒）
+            batch_size: 单条多行语句包含的最大行数
+        """
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: Dict[TargetKey, Dict[str, Any]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self.running = False
+        self._stats = {
+            'flush_count': 0,
+            'flush_failures': 0,
+            'rows_flushed': 0,
+            'max_batch_size': 0,
+            'last_flush_duration': 0.0,
+        }
+
+    @property
+    def pending(self) -> int:
+        """待写入的目标数"""
+        return len(self._pending)
+
+    def _put(self, row: Dict[str, Any]):
+        key = (row['task_id'], row['agent_id'])
+        older = self._pending.get(key)
+        self._pending[key] = _merge(older, row) if older is not None else row
+
+    def dispatch(self, task_id: str, agent_ids: Iterable[str], dispatched_at: str = None):
+        """记录任务下发到的主机"""
+        for agent_id in agent_ids:
+            self._put({'task_id': task_id, 'agent_id': agent_id, 'status': 'RUNNING',
+                       'exit_code': None, 'duration': None,
+                       'dispatched_at': dispatched_at or None, 'finished_at': None})
+
+    def finish(self, task_id: str, agent_id: str, status: str, exit_code: Optional[int] = None,
+               duration: Optional[float] = None, finished_at: str = None):
+        """记录任务在单台主机上的执行结果"""
+        self._put({'task_id': task_id, 'agent_id': agent_id, 'status': status,
+                   'exit_code': exit_code, 'duration': duration,
+                   'dispatched_at': None, 'finished_at': finished_at or datetime.now().isoformat()})
+
+    async def flush(self) -> int:
+        """写入所有待写记录，返回写入行数"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            rows = list(self._pending.values())
+            self._pending = {}
+
+            started = time.monotonic()
+            try:
+                written = await self.db.save_execution_targets_batch(rows, self.batch_size)
+            except Exception as e:
+                logger.error(f"执行目标写入失败: {e}")
+                written = -1
+
+            if written < 0:
+                # 写入失败，放回缓冲（期间到达的新记录优先），下一轮重试
+                self._stats['flush_failures'] += 1
+                for row in rows:
+                    key = (row['task_id'], row['agent_id'])
+                    newer = self._pending.get(key)
+                    self._pending[key] = _merge(row, newer) if newer is not None else row
+                return 0
+
+            stats = self._stats
+            stats['flush_count'] += 1
+            stats['rows_flushed'] += written
+            stats['max_batch_size'] = max(stats['max_batch_size'], len(rows))
+            stats['last_flush_duration'] = time.monotonic() - started
+            return written
+
+    async def _flush_loop(self):
+        """定期刷盘"""
+        while self.running:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"执行目标刷盘任务出错: {e}")
+
+    def start(self):
+        """启动后台刷盘任务"""
+        self.running = True
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """停止后台任务并写入剩余记录"""
+        self.running = False
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        written = await self.flush()
+        if written:
+            logger.info(f"执行目标写缓冲已停止，关闭前写入 {written} 行")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['pending'] = len(self._pending)
+        return stats
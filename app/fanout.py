@@ -0,0 +1,123 @@
+"""
+作业步骤并发分发
+
+把一个步骤的目标主机切分为滚动批次（按数量或百分比），批内按并发上限同时执行，
+失败数超过阈值时中止剩余批次。每台主机的结果到达时立即回调，便于实时记录。
+"""
+import asyncio
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FanoutPolicy:
+    """分发策略"""
+    concurrency: int = 50  # 同时执行的主机数上限
+    batch_size: Optional[int] = None  # 每批主机数
+    batch_percent: Optional[float] = None  # 每批占总主机数的百分比（batch_size 未设置时生效）
+    failure_threshold: Optional[int] = None  # 允许的最大失败主机数，超过后中止剩余批次
+    failure_percent: Optional[float] = None  # 允许的最大失败百分比（failure_threshold 未设置时生效）
+
+    def batches(self, hosts: List[str]) -> List[List[str]]:
+        """按策略切分批次，未配置批次时所有主机为一批"""
+        total = len(hosts)
+        if total == 0:
+            return []
+        size = total
+        if self.batch_size and self.batch_size > 0:
+            size = self.batch_size
+        elif self.batch_percent and self.batch_percent > 0:
+            size = max(1, math.ceil(total * min(self.batch_percent, 100) / 100))
+        return [hosts[i:i + size] for i in range(0, total, size)]
+
+    def max_failures(self, total: int) -> Optional[int]:
+        """允许的最大失败数，None 表示不限制"""
+        if self.failure_threshold is not None and self.failure_threshold >= 0:
+            return self.failure_threshold
+        if self.failure_percent is not None and self.failure_percent >= 0:
+            return math.floor(total * min(self.failure_percent, 100) / 100)
+        return None
+
+
+@dataclass
+class FanoutReport:
+    """分发结果汇总"""
+    results: Dict[str, Any] = field(default_factory=dict)
+    succeeded: int = 0
+    failed: int = 0
+    skipped: List[str] = field(default_factory=list)
+    aborted: bool = False
+    batches: int = 0
+
+
+def default_is_failure(result: Any) -> bool:
+    """exit_code 不为 0 视为失败"""
+    return not isinstance(result, dict) or result.get('exit_code') != 0
+
+
+async def run_fanout(hosts: List[str],
+                     run_host: Callable[[str], Awaitable[Any]],
+                     policy: FanoutPolicy = None,
+                     on_result: Callable[[str, Any], Any] = None,
+                     on_batch: Callable[[int, int, List[str]], Any] = None,
+                     is_failure: Callable[[Any], bool] = default_is_failure) -> FanoutReport:
+    """
+    在当前事件循环中并发执行
+
+    Args:
+        hosts: 目标主机列表
+        run_host: 单台主机的执行协程，返回结果
+        policy: 分发策略
+        on_result: 每台主机结果到达时回调 (host, result)，可以是协程函数
+        on_batch: 每批开始时回调 (批次序号, 批次总数, 批内主机)，可以是协程函数
+        is_failure: 判断结果是否失败
+    """
+    policy = policy or FanoutPolicy()
+    report = FanoutReport()
+    # 失败阈值按去重后的主机数计算，重复的主机只执行一次
+    hosts = list(dict.fromkeys(hosts))
+    batches = policy.batches(hosts)
+    max_failures = policy.max_failures(len(hosts))
+    semaphore = asyncio.Semaphore(max(1, policy.concurrency))
+
+    async def notify(callback, *args):
+        if callback is None:
+            return
+        try:
+            outcome = callback(*args)
+            if asyncio.iscoroutine(outcome):
+                await outcome
+        except Exception as e:
+            logger.error(f"分发回调执行失败: {e}")
+
+    async def run_one(host: str):
+        async with semaphore:
+            try:
+                result = await run_host(host)
+            except Exception as e:
+                result = {'exit_code': -1, 'output': '', 'error': str(e)}
+        report.results[host] = result
+        if is_failure(result):
+            report.failed += 1
+        else:
+            report.succeeded += 1
+        await notify(on_result, host, result)
+
+    for index, batch in enumerate(batches):
+        if max_failures is not None and report.failed > max_failures:
+            report.aborted = True
+            for remaining in batches[index:]:
+                report.skipped.extend(remaining)
+            break
+        report.batches += 1
+        await notify(on_batch, index + 1, len(batches), batch)
+        await asyncio.gather(*(run_one(host) for host in batch))
+
+    if not report.aborted and max_failures is not None and report.failed > max_failures:
+        # 最后一批超过阈值时同样视为中止（没有剩余批次可跳过）
+        report.aborted = True
+    return report
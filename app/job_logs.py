@@ -0,0 +1,138 @@
+"""
+作业执行日志缓冲
+
+作业执行过程中的日志按执行分配递增序号后先放入内存缓冲，由后台任务每隔几百毫秒
+合并成一条多行 INSERT 写入 simple_job_execution_logs 表，避免逐条写库。
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+LogRow = Tuple[str, int, datetime, str]  # (execution_id, seq, created_at, message)
+
+
+class ExecutionLogBuffer:
+    """作业执行日志写缓冲"""
+
+    def __init__(self, writer: Callable[[List[LogRow]], Awaitable[bool]],
+                 flush_interval: float = 0.3, batch_size: int = 500, max_pending: int = 50000):
+        """
+        初始化日志缓冲
+
+        Args:
+            writer: 批量写入协程函数，接收日志行列表，返回是否成功
+            flush_interval: 刷盘间隔（秒）
+            batch_size: 单次写入的最大行数
+            max_pending: 最大缓冲行数，写库持续失败时丢弃最早的日志
+        """
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: List[LogRow] = []
+        self._seq: Dict[str, int] = {}  # execution_id -> 最后分配的序号
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self.running = False
+        self._stats = {
+            'appended': 0,
+            'flush_count': 0,
+            'flush_failures': 0,
+            'rows_flushed': 0,
+            'dropped': 0,
+            'last_flush_duration': 0.0,
+        }
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def append(self, execution_id: str, message: str) -> int:
+        """追加一条日志，返回分配的序号"""
+        seq = self._seq.get(execution_id, 0) + 1
+        self._seq[execution_id] = seq
+        self._pending.append((execution_id, seq, datetime.now(), message))
+        self._stats['appended'] += 1
+        if len(self._pending) > self.max_pending:
+            overflow = len(self._pending) - self.max_pending
+            del self._pending[:overflow]
+            self._stats['dropped'] += overflow
+            logger.error(f"作业日志缓冲已满，丢弃 {overflow} 条最早的日志")
+        return seq
+
+    def last_seq(self, execution_id: str) -> int:
+        return self._seq.get(execution_id, 0)
+
+    async def flush(self) -> int:
+        """写入所有缓冲的日志，返回写入行数"""
+        async with self._flush_lock:
+            written = 0
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                started = time.monotonic()
+                try:
+                    ok = await self.writer(batch)
+                except Exception as e:
+                    logger.error(f"作业日志写入失败: {e}")
+                    ok = False
+                if not ok:
+                    # 保留在缓冲中，下一轮重试
+                    self._stats['flush_failures'] += 1
+                    break
+                # 写入期间可能有新日志追加到末尾，只移除已写入的部分
+                del self._pending[:len(batch)]
+                written += len(batch)
+                self._stats['flush_count'] += 1
+                self._stats['rows_flushed'] += len(batch)
+                self._stats['last_flush_duration'] = time.monotonic() - started
+            return written
+
+    def release(self, execution_id: str):
+        """
+        释放执行的序号计数
+
+        只能在结束状态写入成功之后调用：之后再追加的日志序号会从1重新开始，
+        与已写入的序号冲突而被 INSERT IGNORE 丢弃。
+        """
+        self._seq.pop(execution_id, None)
+
+    async def _flush_loop(self):
+        """定期刷盘"""
+        while self.running:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                if self._pending:
+                    await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"作业日志刷盘任务出错: {e}")
+
+    def start(self):
+        """启动后台刷盘任务"""
+        self.running = True
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """停止后台任务并写入剩余日志"""
+        self.running = False
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        written = await self.flush()
+        if written:
+            logger.info(f"作业日志缓冲已停止，关闭前写入 {written} 条")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['pending'] = len(self._pending)
+        stats['executions'] = len(self._seq)
+        return stats
@@ -0,0 +1,185 @@
+"""
+存活检测模块
+
+基于单调时钟和哈希时间轮：刷新（心跳、终端活动）只重新调度对应条目的截止时间，
+推进时间轮时只访问到期槽位中的条目，每次刷新的摊还开销为 O(1)。
+"""
+import math
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TimerWheel:
+    """哈希时间轮"""
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化时间轮
+
+        Args:
+            tick: 每个槽位代表的时间长度（秒），即到期检测精度
+            slots: 槽位数量，tick * slots 为一轮覆盖的时长，超出的条目会在多轮后到期
+            clock: 单调时钟函数
+        """
+        if tick <= 0 or slots <= 0:
+            raise ValueError("tick 和 slots 必须为正数")
+        self.tick = tick
+        self.slots = slots
+        self.clock = clock
+        self._wheel: List[Dict[Hashable, Tuple[int, float]]] = [{} for _ in range(slots)]
+        self._index: Dict[Hashable, int] = {}  # key -> 所在槽位
+        self._current = int(clock() // tick)  # 已处理到的 tick 序号
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def schedule(self, key: Hashable, delay: float, now: float = None) -> float:
+        """
+        调度（或重新调度）条目在 delay 秒后到期
+
+        Returns:
+            float: 到期的单调时间
+        """
+        now = self.clock() if now is None else now
+        deadline = now + delay
+        # 向上取整，保证槽位第一次被访问时条目已经到期
+        tick_no = math.ceil(deadline / self.tick)
+        if tick_no <= self._current:
+            tick_no = self._current + 1
+        slot = tick_no % self.slots
+
+        old_slot = self._index.get(key)
+        if old_slot is not None and old_slot != slot:
+            del self._wheel[old_slot][key]
+        self._wheel[slot][key] = (tick_no, deadline)
+        self._index[key] = slot
+        return deadline
+
+    def cancel(self, key: Hashable) -> bool:
+        """取消条目"""
+        slot = self._index.pop(key, None)
+        if slot is None:
+            return False
+        del self._wheel[slot][key]
+        return True
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """获取条目的到期时间"""
+        slot = self._index.get(key)
+        if slot is None:
+            return None
+        return self._wheel[slot][key][1]
+
+    def advance(self, now: float = None) -> List[Hashable]:
+        """
+        推进时间轮到当前时间，弹出并返回所有已到期的条目
+
+        只访问自上次推进以来经过的槽位；落后超过一整轮时每个槽位最多访问一次。
+        """
+        now = self.clock() if now is None else now
+        target = int(now // self.tick)
+        if target <= self._current:
+            return []
+
+        steps = min(target - self._current, self.slots)
+        expired = []
+        for offset in range(1, steps + 1):
+            slot = (self._current + offset) % self.slots
+            bucket = self._wheel[slot]
+            if not bucket:
+                continue
+            # 同一槽位中可能有多轮之后才到期的条目，按 tick 序号判断
+            due = [key for key, (tick_no, _) in bucket.items() if tick_no <= target]
+            for key in due:
+                del bucket[key]
+                del self._index[key]
+            expired.extend(due)
+        self._current = target
+        return expired
+
+
+class LivenessTracker:
+    """
+    存活跟踪器
+
+    每个 key 维护两个截止时间：警告（可选）和超时，刷新时同时重新调度。
+    """
+
+    WARN = 'warn'
+    EXPIRE = 'expire'
+
+    def __init__(self, timeout: float, warning: float = None, tick: float = 1.0,
+                 slots: int = None, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化存活跟踪器
+
+        Args:
+            timeout: 超时时间（秒）
+            warning: 警告阈值（秒），为 None 时不产生警告
+            tick: 检测精度（秒）
+            slots: 时间轮槽位数，默认覆盖一个完整超时周期
+        """
+        self.timeout = timeout
+        self.warning = warning
+        self.tick = tick
+        self.clock = clock
+        if slots is None:
+            slots = max(8, int(timeout / tick) + 2)
+        self._wheel = TimerWheel(tick=tick, slots=slots, clock=clock)
+        self._last_seen: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._last_seen
+
+    def touch(self, key: Hashable, now: float = None):
+        """记录一次活动，重新调度该 key 的警告和超时"""
+        now = self.clock() if now is None else now
+        self._last_seen[key] = now
+        if self.warning is not None:
+            self._wheel.schedule((key, self.WARN), self.warning, now)
+        self._wheel.schedule((key, self.EXPIRE), self.timeout, now)
+
+    def remove(self, key: Hashable):
+        """停止跟踪"""
+        if self._last_seen.pop(key, None) is not None:
+            self._wheel.cancel((key, self.WARN))
+            self._wheel.cancel((key, self.EXPIRE))
+
+    def last_seen(self, key: Hashable) -> Optional[float]:
+        """最后活动的单调时间"""
+        return self._last_seen.get(key)
+
+    def idle_time(self, key: Hashable, now: float = None) -> Optional[float]:
+        """距最后一次活动经过的秒数"""
+        seen = self._last_seen.get(key)
+        if seen is None:
+            return None
+        now = self.clock() if now is None else now
+        return now - seen
+
+    def poll(self, now: float = None) -> Tuple[List[Hashable], List[Hashable]]:
+        """
+        推进时间并返回 (进入警告的key列表, 已超时的key列表)
+
+        超时的 key 会停止跟踪，再次 touch 后重新加入。
+        """
+        now = self.clock() if now is None else now
+        warnings = []
+        expired = []
+        for key, kind in self._wheel.advance(now):
+            if kind == self.EXPIRE:
+                if self._last_seen.pop(key, None) is not None:
+                    self._wheel.cancel((key, self.WARN))
+                    expired.append(key)
+            else:
+                warnings.append(key)
+        if expired and warnings:
+            # 长时间未推进时警告和超时可能同时到期，只报告超时
+            warnings = [key for key in warnings if key in self._last_seen]
+        return warnings, expired
@@ -0,0 +1,335 @@
+"""
+事件循环延迟监控
+
+进程里有两个事件循环：uvicorn 的 API 循环和 WebSocket 核心在守护线程中运行的循环。
+同步的 pymysql 调用、future.result()、PBKDF2 等一旦在循环线程里执行，就会卡住该循环上的所有协程。
+
+每个循环一个 LoopMonitor：
+- 循环内的心跳协程每 interval 秒醒来一次，实际醒来时间与预期的差即调度延迟（lag）
+- 独立的看门狗线程检查心跳是否超时，超过阈值时用 sys._current_frames() 抓取循环线程的调用栈，
+  按阻塞位置（调用栈中最内层的项目代码）汇总采样次数和阻塞时长
+
+延迟分布和阻塞位置通过 /metrics 输出，详细调用栈通过 /api/system/loops 查看。
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.1
+DEFAULT_THRESHOLD = 0.1
+MAX_SITES = 200  # 超过后新的阻塞位置归入 other
+METRIC_SITES = 20  # /metrics 只输出阻塞时长最多的位置
+
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+LOOP_LAG = get_registry().histogram(
+    'qunkong_event_loop_lag_seconds', '事件循环调度延迟（心跳实际醒来时间与预期之差）', ['loop'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+LOOP_BLOCKED = get_registry().counter(
+    'qunkong_event_loop_blocked_total', '事件循环阻塞超过阈值的次数', ['loop'])
+
+
+def _relative(filename: str) -> str:
+    if filename.startswith(_PROJECT_DIR):
+        return os.path.relpath(filename, _PROJECT_DIR)
+    return filename
+
+
+def describe_stack(frame) -> Dict[str, Any]:
+    """
+    从循环线程当前的栈帧提取阻塞位置
+
+    site 为最内层的项目代码（第三方库和标准库中的帧向外跳过），leaf 为最内层帧，
+    即实际阻塞的调用（如 pymysql 的 socket 读取、hashlib、Future.result 的等待）。
+    """
+    stack = traceback.extract_stack(frame)
+    leaf = stack[-1] if stack else None
+    site = None
+    for entry in reversed(stack):
+        filename = os.path.abspath(entry.filename)
+        if filename.startswith(_PROJECT_DIR) and filename != _THIS_FILE and '/site-packages/' not in filename:
+            site = entry
+            break
+    site = site or leaf
+    return {
+        'site': f"{_relative(site.filename)}:{site.lineno} {site.name}" if site else 'unknown',
+        'leaf': f"{_relative(leaf.filename)}:{leaf.lineno} {leaf.name}" if leaf else 'unknown',
+        'stack': [f"{_relative(entry.filename)}:{entry.lineno} {entry.name}" for entry in stack[-25:]],
+    }
+
+
+class _Site:
+    __slots__ = ('samples', 'episodes', 'blocked_time', 'max_block', 'last_seen', 'leaf', 'stack', '_episode',
+                 'total_time')
+
+    def __init__(self):
+        self.total_time = 0.0  # 进程启动以来的累计阻塞时长（/metrics 计数器，reset 不清零）
+        self.samples = 0
+        self.episodes = 0
+        self.blocked_time = 0.0
+        self.max_block = 0.0
+        self.last_seen = 0.0
+        self.leaf = ''
+        self.stack: List[str] = []
+        self._episode = None
+
+
+class LoopMonitor:
+    """单个事件循环的延迟监控和阻塞采样"""
+
+    def __init__(self, name: str, interval: float = DEFAULT_INTERVAL, threshold: float = DEFAULT_THRESHOLD,
+                 history: int = 600):
+        """
+        Args:
+            name: 循环名称（指标标签）
+            interval: 心跳间隔（秒）
+            threshold: 超过预期醒来时间多少秒视为阻塞
+            history: 保留最近多少次延迟用于分位数
+        """
+        self.name = name
+        self.interval = interval
+        self.threshold = threshold
+        self.check_interval = max(0.01, min(interval, threshold) / 2)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread_id: Optional[int] = None
+        self.running = False
+        self._lock = threading.Lock()
+        self._task = None
+        self._watchdog = None
+        self._stop_event = threading.Event()
+        self._last_beat = 0.0  # 心跳最近一次醒来的单调时间
+        self._lags = deque(maxlen=history)
+        self._sites: Dict[str, _Site] = {}
+        self._episode = None  # 当前阻塞的开始时间（看门狗发现阻塞时设置）
+        self._episode_sampled = 0.0  # 当前阻塞已采样到的时间点
+        self._stats = {'beats': 0, 'blocked': 0, 'blocked_time': 0.0, 'max_lag': 0.0}
+        self._lag_metric = LOOP_LAG.labels(name)
+        self._blocked_metric = LOOP_BLOCKED.labels(name)
+
+    # ==================== 启停 ====================
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        """在指定（或当前运行的）事件循环上启动心跳，并启动看门狗线程"""
+        if self.running:
+            return
+        self.loop = loop or asyncio.get_running_loop()
+        self.running = True
+        self._stop_event.clear()
+        self._last_beat = time.monotonic()
+        self._task = self.loop.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name=f'qunkong-loop-monitor-{self.name}', daemon=True)
+        self._watchdog.start()
+        logger.info(f"事件循环监控已启动: {self.name}, 心跳 {self.interval * 1000:.0f}ms, 阈值 {self.threshold * 1000:.0f}ms")
+
+    def stop(self):
+        """停止心跳和看门狗（在循环线程中调用）"""
+        self.running = False
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # ==================== 心跳（循环线程） ====================
+
+    async def _beat(self):
+        self.thread_id = threading.get_ident()
+        interval = self.interval
+        while self.running:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._record_lag(max(0.0, now - expected), now)
+
+    def _record_lag(self, lag: float, now: float):
+        self._lag_metric.observe(lag)
+        with self._lock:
+            self._last_beat = now
+            self._lags.append(lag)
+            self._stats['beats'] += 1
+            if lag > self._stats['max_lag']:
+                self._stats['max_lag'] = lag
+            if lag >= self.threshold:
+                self._stats['blocked'] += 1
+                self._stats['blocked_time'] += lag
+            episode_started = self._episode
+            self._episode = None
+        if lag >= self.threshold:
+            self._blocked_metric.inc()
+            if episode_started is None:
+                # 看门狗没来得及采样（阻塞略高于阈值），只记录延迟
+                logger.warning(f"事件循环 {self.name} 延迟 {lag * 1000:.0f}ms")
+
+    # ==================== 看门狗（独立线程） ====================
+
+    def _watch(self):
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                self._check(time.monotonic())
+            except Exception as e:
+                logger.error(f"事件循环 {self.name} 阻塞采样失败: {e}")
+
+    def _check(self, now: float):
+        with self._lock:
+            block_start = self._last_beat + self.interval
+        blocked_for = now - block_start
+        if blocked_for < self.threshold or self.thread_id is None:
+            return
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        info = describe_stack(frame)
+        del frame
+
+        first = False
+        with self._lock:
+            if self._last_beat + self.interval != block_start:
+                return  # 采样期间循环已经恢复
+            if self._episode != block_start:
+                self._episode = block_start
+                self._episode_sampled = block_start
+                first = True
+            sampled = now - self._episode_sampled
+            self._episode_sampled = now
+            key = info['site']
+            site = self._sites.get(key)
+            if site is None:
+                if len(self._sites) >= MAX_SITES:
+                    key = 'other'
+                    site = self._sites.get(key)
+                if site is None:
+                    site = self._sites[key] = _Site()
+            site.samples += 1
+            site.blocked_time += sampled
+            site.total_time += sampled
+            site.last_seen = time.time()
+            site.leaf = info['leaf']
+            site.stack = info['stack']
+            if blocked_for > site.max_block:
+                site.max_block = blocked_for
+            if site._episode != block_start:
+                site._episode = block_start
+                site.episodes += 1
+        if first:
+            logger.warning(f"事件循环 {self.name} 阻塞超过 {blocked_for * 1000:.0f}ms: {info['site']} -> {info['leaf']}")
+
+    # ==================== 汇总 ====================
+
+    def blocked_now(self) -> float:
+        """当前已阻塞的时长（未阻塞时为 0）"""
+        if not self.running:
+            return 0.0
+        blocked_for = time.monotonic() - (self._last_beat + self.interval)
+        return blocked_for if blocked_for >= self.threshold else 0.0
+
+    def top_sites(self, limit: int = 20, with_stack: bool = True) -> List[Dict[str, Any]]:
+        """按累计阻塞时长（上次 reset 以来）排序的阻塞位置"""
+        with self._lock:
+            items = sorted(((key, site) for key, site in self._sites.items() if site.samples),
+                           key=lambda item: item[1].blocked_time, reverse=True)[:limit]
+            result = []
+            for key, site in items:
+                entry = {
+                    'site': key,
+                    'leaf': site.leaf,
+                    'samples': site.samples,
+                    'episodes': site.episodes,
+                    'blocked_seconds': round(site.blocked_time, 3),
+                    'max_block_seconds': round(site.max_block, 3),
+                    'last_seen': site.last_seen,
+                }
+                if with_stack:
+                    entry['stack'] = list(site.stack)
+                result.append(entry)
+        return result
+
+    def snapshot(self, limit: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            lags = sorted(self._lags)
+            stats = dict(self._stats)
+        return {
+            'name': self.name,
+            'running': self.running,
+            'interval_ms': round(self.interval * 1000),
+            'threshold_ms': round(self.threshold * 1000),
+            'blocked_now_seconds': round(self.blocked_now(), 3),
+            'beats': stats['beats'],
+            'blocked': stats['blocked'],
+            'blocked_seconds': round(stats['blocked_time'], 3),
+            'lag_ms': {
+                'p50': round(lags[len(lags) // 2] * 1000, 2) if lags else 0.0,
+                'p99': round(lags[int(len(lags) * 0.99) - 1] * 1000, 2) if len(lags) >= 100 else (
+                    round(lags[-1] * 1000, 2) if lags else 0.0),
+                'max': round(stats['max_lag'] * 1000, 2),
+            },
+            'top_sites': self.top_sites(limit),
+        }
+
+    def site_totals(self, limit: int = METRIC_SITES) -> List[Tuple[str, float]]:
+        """进程启动以来累计阻塞时长最多的位置（不受 reset 影响，用于 /metrics 计数器）"""
+        with self._lock:
+            items = sorted(self._sites.items(), key=lambda item: item[1].total_time, reverse=True)[:limit]
+            return [(key, round(site.total_time, 3)) for key, site in items]
+
+    def reset(self):
+        """
+        清空阻塞位置统计和延迟历史
+
+        只清空 /api/system/loops 看到的统计；/metrics 中的计数器保持单调递增，位置记录本身保留。
+        """
+        with self._lock:
+            for site in self._sites.values():
+                site.samples = 0
+                site.episodes = 0
+                site.blocked_time = 0.0
+                site.max_block = 0.0
+            self._lags.clear()
+            self._stats = {'beats': 0, 'blocked': 0, 'blocked_time': 0.0, 'max_lag': 0.0}
+
+
+# 进程内所有循环的监控
+_monitors: Dict[str, LoopMonitor] = {}
+
+
+def start_loop_monitor(name: str, loop: asyncio.AbstractEventLoop = None, interval: float = DEFAULT_INTERVAL,
+                       threshold: float = DEFAULT_THRESHOLD) -> LoopMonitor:
+    """创建并启动指定循环的监控（同名的旧监控会先停止）"""
+    old = _monitors.get(name)
+    if old is not None:
+        old.stop()
+    monitor = LoopMonitor(name, interval=interval, threshold=threshold)
+    monitor.start(loop)
+    _monitors[name] = monitor
+    return monitor
+
+
+def get_loop_monitors() -> Dict[str, LoopMonitor]:
+    """获取所有循环监控"""
+    return dict(_monitors)
+
+
+def _collect():
+    sites = []
+    current = []
+    for name, monitor in list(_monitors.items()):
+        current.append(({'loop': name}, monitor.blocked_now()))
+        for site, total in monitor.site_totals(METRIC_SITES):
+            sites.append(({'loop': name, 'site': site}, total))
+    return [
+        ('qunkong_event_loop_blocked_now_seconds', 'gauge', '事件循环当前已阻塞的时长', current),
+        ('qunkong_event_loop_blocking_site_seconds_total', 'counter',
+         '各阻塞位置的累计阻塞时长（看门狗采样，按时长取前20）', sites),
+    ]
+
+
+get_registry().register_collector(_collect)
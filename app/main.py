@@ -5,23 +5,38 @@ import asyncio
 import threading
 import configparser
 import logging
+import signal
+import socket
+import sys
+import time
 import uvicorn
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 import os
 
 from app.fastapi_app import create_fastapi_app
 from app.server_core import QunkongServer
+from app.core_rpc import CoreRPCServer, CoreClient, CoreProxy
 from app.cluster import ClusterManager
+from app.cache import init_cache
 from app.models.auth import AuthManager
-from app.routers.deps import set_server_instance, set_auth_manager
+from app.password_hasher import PasswordHasher, PasswordHasherBusy, DEFAULT_ITERATIONS
+from app.models.jobs import JobManager
+from app.models.simple_jobs import SimpleJobManager
+from app.models.project import ProjectManager
+from app.models.tenant import TenantManager
+from app.routers.deps import set_server_instance, set_auth_manager, set_model_managers
 from app.routers.rbac import PermissionChecker
+from app.permissions import get_permission_versions
+from app.metrics import get_registry
+from app.server_metrics import register_server_metrics
+from app.loop_monitor import start_loop_monitor, DEFAULT_THRESHOLD
 from app.routers import (
     auth_router, agents_router, agent_install_router, tasks_router, jobs_router,
-    simple_jobs_router, users_router, projects_router, tenants_router
+    simple_jobs_router, users_router, projects_router, tenants_router, system_router
 )
 
 # 配置日志
@@ -31,9 +46,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 拆分模式下 API worker 进程通过该环境变量得到核心进程的 RPC 套接字
+CORE_SOCKET_ENV = 'QUNKONG_CORE_SOCKET'
+
 # 全局变量
 websocket_server = None
 websocket_thread = None
+websocket_task = None
+core_rpc = None
+
+HTTP_REQUEST_TIME = get_registry().histogram(
+    'qunkong_http_request_duration_seconds', 'API请求处理耗时（按路由模板）', ['method', 'route', 'status'])
 
 
 def load_config():
@@ -101,16 +124,69 @@ def create_cluster_manager(config):
         return None
 
 
-def start_websocket_server(server):
+def create_cache_manager(config, cluster_manager=None):
+    """创建两级缓存（启用Redis时使用Redis作为L2，否则只有本地L1）"""
+    redis_client = None
+    if config and config.getboolean('redis', 'enabled', fallback=False):
+        try:
+            import redis.asyncio as redis
+            
+            redis_password = config.get('redis', 'password', fallback=None) or None
+            # 缓存值是msgpack二进制，使用单独的连接池（decode_responses=False）
+            redis_client = redis.Redis(connection_pool=redis.ConnectionPool(
+                host=config.get('redis', 'host', fallback='localhost'),
+                port=config.getint('redis', 'port', fallback=6379),
+                db=config.getint('redis', 'db', fallback=0),
+                password=redis_password,
+                max_connections=config.getint('redis', 'max_connections', fallback=10)
+            ))
+        except ImportError:
+            logger.error("redis包未安装，缓存只使用本地内存")
+        except Exception as e:
+            logger.error(f"创建缓存Redis客户端失败: {e}，缓存只使用本地内存")
+    
+    return init_cache(redis_client, cluster_manager)
+
+
+def start_websocket_server(server, lag_threshold: float = DEFAULT_THRESHOLD):
     """启动WebSocket服务器"""
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
+    # WebSocket核心循环的延迟监控（阻塞时采样该线程的调用栈）
+    start_loop_monitor('websocket', loop, threshold=lag_threshold)
     loop.run_until_complete(server.start())
 
 
+def _log_server_exit(task: asyncio.Task):
+    """单循环模式下WebSocket服务器任务异常退出时记录错误"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"WebSocket服务器异常退出: {task.exception()!r}")
+
+
+def create_password_hasher(config) -> PasswordHasher:
+    """根据 [auth] 配置创建密码哈希线程池"""
+    iterations = DEFAULT_ITERATIONS
+    max_workers = 2
+    max_pending = 32
+    if config and config.has_section('auth'):
+        iterations = config.getint('auth', 'password_iterations', fallback=iterations)
+        max_workers = config.getint('auth', 'hash_workers', fallback=max_workers)
+        max_pending = config.getint('auth', 'hash_max_pending', fallback=max_pending)
+    logger.info(f"密码哈希线程池: {max_workers} 线程, 最多 {max_pending} 个排队, 迭代 {iterations} 次")
+    return PasswordHasher(iterations=iterations, max_workers=max_workers, max_pending=max_pending)
+
+
 def create_app() -> FastAPI:
-    """创建 FastAPI 应用"""
-    global websocket_server, websocket_thread
+    """
+    创建 FastAPI 应用
+
+    进程角色：
+        - 默认：本进程同时运行 API 和 WebSocket 服务器
+        - 核心进程（[server] api_workers > 0，只在 python -m app.main 启动时）：运行 WebSocket 服务器和 RPC 服务，
+          不提供 API；直接用 uvicorn 加载 app.main:app 时按默认模式运行
+        - API worker（设置了 QUNKONG_CORE_SOCKET）：只提供 API，核心状态通过 RPC 访问核心进程
+    """
+    global websocket_server, websocket_thread, core_rpc
     
     # 加载配置
     config = load_config()
@@ -118,6 +194,10 @@ def create_app() -> FastAPI:
     # 读取端口配置
     websocket_port = 8765
     api_port = 5000
+    lag_threshold = DEFAULT_THRESHOLD
+    single_loop = False
+    api_workers = 0
+    rpc_socket = 'data/qunkong-core.sock'
     
     if config:
         try:
@@ -125,35 +205,90 @@ def create_app() -> FastAPI:
             api_port = config.getint('server', 'api_port', fallback=5000)
         except Exception as e:
             logger.warning(f"读取端口配置失败，使用默认端口: {e}")
+        lag_threshold = config.getint('monitor', 'loop_lag_threshold_ms', fallback=100) / 1000
+        # 单循环模式：WebSocket服务器与API共用uvicorn的事件循环，路由直接在循环内分发，不再跨线程
+        single_loop = config.getboolean('server', 'single_loop', fallback=False)
+        # 拆分模式：核心进程 + N 个 API worker 进程，通过 Unix 套接字 RPC 通信
+        api_workers = config.getint('server', 'api_workers', fallback=0)
+        rpc_socket = config.get('server', 'rpc_socket', fallback=rpc_socket)
     
-    # 创建集群管理器
-    cluster_manager = create_cluster_manager(config)
+    worker_socket = os.environ.get(CORE_SOCKET_ENV)
+    split_core = not worker_socket and api_workers > 0 and hasattr(socket, 'AF_UNIX')
+    if split_core and __name__ != '__main__':
+        # 拆分模式的核心进程由 main() 运行并拉起 worker；直接用 uvicorn 加载 app.main:app 时
+        # 没有人启动 RPC 服务，退回单进程模式
+        logger.warning("[server] api_workers > 0 需要通过 python -m app.main 启动，"
+                       "当前由外部加载 app.main:app，按单进程模式运行")
+        split_core = False
     
-    # 创建 WebSocket 服务器
-    websocket_server = QunkongServer(
-        host="0.0.0.0",
-        port=websocket_port,
-        web_port=api_port,
-        cluster_manager=cluster_manager
-    )
+    # 创建集群管理器（API worker 不作为集群节点，集群消息由核心进程转发）
+    cluster_manager = None if worker_socket else create_cluster_manager(config)
+    
+    # 缓存失效、认证撤销和权限变更的广播出口：拆分模式下经核心进程转发给其他进程（及其他节点）
+    if worker_socket:
+        broadcaster = CoreClient(worker_socket)
+    elif split_core:
+        core_rpc = CoreRPCServer(rpc_socket, cluster=cluster_manager)
+        broadcaster = core_rpc
+    else:
+        broadcaster = cluster_manager
+    
+    # 创建缓存（失效消息通过集群管理器广播到其他节点）
+    create_cache_manager(config, broadcaster)
+    
+    if worker_socket:
+        # API worker：核心状态接口经 RPC 调用核心进程
+        websocket_server = CoreProxy(broadcaster, port=websocket_port)
+    else:
+        # 创建 WebSocket 服务器
+        websocket_server = QunkongServer(
+            host="0.0.0.0",
+            port=websocket_port,
+            web_port=api_port,
+            cluster_manager=cluster_manager
+        )
     
-    # 初始化认证管理器
-    auth_manager = AuthManager(websocket_server.db)
+    # 初始化认证管理器（数据库迁移已在创建 DatabaseManager 时执行）
+    auth_manager = AuthManager(websocket_server.db, hasher=create_password_hasher(config))
+    # 登出、改密、禁用等撤销通过集群广播到其他节点的认证缓存
+    auth_manager.cache.attach_cluster(broadcaster)
+    
+    # 注册模型管理器（整个进程共用，请求中不再新建）
+    set_model_managers(
+        jobs=JobManager(websocket_server.db),
+        simple_jobs=SimpleJobManager(websocket_server.db),
+        projects=ProjectManager(websocket_server.db),
+        tenants=TenantManager(websocket_server.db)
+    )
     
     # 初始化权限检查器
     PermissionChecker.initialize(websocket_server.db)
+    get_permission_versions().attach_cluster(broadcaster)
     logger.info("RBAC权限检查器已初始化")
     
     # 设置全局实例
     set_server_instance(websocket_server)
     set_auth_manager(auth_manager)
     
+    # 抓取 /metrics 时计算的状态指标（在线Agent、发送缓冲、缓存命中等）
+    register_server_metrics(None if worker_socket else websocket_server, auth_manager)
+    
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         """应用生命周期管理"""
-        global websocket_thread
+        global websocket_thread, websocket_task
         
         # 启动时
+        if worker_socket:
+            # API worker：连接核心进程，不启动 WebSocket 服务器
+            await websocket_server.start()
+            logger.info(f"API worker 进程 {os.getpid()} 已连接核心进程: {worker_socket}")
+            api_loop_monitor = start_loop_monitor('api', threshold=lag_threshold)
+            yield
+            api_loop_monitor.stop()
+            await websocket_server.stop()
+            return
+        
         logger.info("=" * 60)
         logger.info(f"Web API 服务器启动在 http://0.0.0.0:{api_port}")
         logger.info(f"WebSocket 服务器启动在 ws://0.0.0.0:{websocket_port}")
@@ -162,22 +297,52 @@ def create_app() -> FastAPI:
             logger.info(f"集群模式已启用 - 节点ID: {cluster_manager.node_id}")
         else:
             logger.info("单节点模式运行")
+        if single_loop:
+            logger.info("单事件循环模式: WebSocket服务器与API共用事件循环")
         logger.info("默认管理员账户: admin/admin123")
         logger.info("=" * 60)
         
-        # 启动 WebSocket 服务器线程
-        websocket_thread = threading.Thread(
-            target=start_websocket_server,
-            args=(websocket_server,),
-            daemon=True
-        )
-        websocket_thread.start()
+        # API 事件循环的延迟监控（单循环模式下同时覆盖WebSocket服务器）
+        api_loop_monitor = start_loop_monitor('api', threshold=lag_threshold)
+        
+        if single_loop:
+            # 在当前事件循环中启动 WebSocket 服务器
+            websocket_task = asyncio.create_task(websocket_server.start())
+            websocket_task.add_done_callback(_log_server_exit)
+        else:
+            # 启动 WebSocket 服务器线程
+            websocket_thread = threading.Thread(
+                target=start_websocket_server,
+                args=(websocket_server, lag_threshold),
+                daemon=True
+            )
+            websocket_thread.start()
         
         yield
         
         # 关闭时
         logger.info("正在关闭服务...")
+        api_loop_monitor.stop()
         websocket_server.running = False
+
+        if websocket_task is not None:
+            # 取消服务器任务，start() 的 finally 中会停止后台任务并写回剩余状态
+            websocket_task.cancel()
+            try:
+                await asyncio.wait_for(websocket_task, timeout=15)
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error(f"关闭WebSocket服务器失败: {e}")
+        # WebSocket线程是守护线程，退出前在其事件循环上写回剩余的Agent状态和后台数据库写入
+        elif websocket_server.loop and websocket_server.loop.is_running():
+            try:
+                future = asyncio.run_coroutine_threadsafe(
+                    websocket_server.flush_state(), websocket_server.loop
+                )
+                await asyncio.wait_for(asyncio.wrap_future(future), timeout=15)
+            except Exception as e:
+                logger.error(f"关闭时写回Agent状态失败: {e}")
     
     # 创建 FastAPI 应用
     app = FastAPI(
@@ -197,8 +362,38 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],  # 分页游标（/api/agents/{id}/tasks）
     )
     
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        """按路由模板记录请求耗时（不用原始路径，避免ID进入指标标签）"""
+        start_time = time.perf_counter()
+        response = await call_next(request)
+        process_time = time.perf_counter() - start_time
+        route = request.scope.get('route')
+        HTTP_REQUEST_TIME.labels(
+            request.method,
+            route.path if route is not None else 'unmatched',
+            f"{response.status_code // 100}xx"
+        ).observe(process_time)
+        
+        # 记录慢请求
+        if process_time > 1.0:
+            logger.warning(f"慢请求: {request.method} {request.url.path} - {process_time:.3f}s")
+        
+        return response
+    
+    @app.exception_handler(PasswordHasherBusy)
+    async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+        """密码哈希排队已满时快速拒绝，避免登录洪峰拖垮其他接口"""
+        logger.warning(f"密码哈希繁忙，拒绝请求: {request.method} {request.url.path}")
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "认证请求过多，请稍后重试"},
+            headers={"Retry-After": "1"}
+        )
+    
     # 注册路由（注意顺序：更具体的路由要先注册，避免被通配路由匹配）
     app.include_router(auth_router)
     app.include_router(agent_install_router)  # 先注册，避免被agents_router的通配路由匹配
@@ -209,6 +404,7 @@ def create_app() -> FastAPI:
     app.include_router(users_router)
     app.include_router(projects_router)
     app.include_router(tenants_router)
+    app.include_router(system_router)
     
     # 健康检查
     @app.get("/health", tags=["System"])
@@ -221,6 +417,17 @@ def create_app() -> FastAPI:
             "cluster_mode": cluster_manager is not None
         }
     
+    @app.get("/metrics", tags=["System"], include_in_schema=False)
+    async def metrics():
+        """Prometheus 指标"""
+        return PlainTextResponse(get_registry().render(), media_type="text/plain; version=0.0.4")
+    
+    if worker_socket:
+        @app.get("/metrics/core", tags=["System"], include_in_schema=False)
+        async def core_metrics():
+            """核心进程的 Prometheus 指标（Agent、WebSocket、任务等；/metrics 只包含本 worker 进程）"""
+            return PlainTextResponse(await websocket_server.metrics_text(), media_type="text/plain; version=0.0.4")
+    
     @app.get("/", tags=["System"])
     async def root():
         """根路径"""
@@ -250,6 +457,63 @@ def create_app() -> FastAPI:
 app = create_app()
 
 
+def run_core(api_port: int, api_workers: int, lag_threshold: float = DEFAULT_THRESHOLD):
+    """
+    拆分模式：本进程作为核心进程运行 WebSocket 服务器和 RPC 服务，
+    API 由 api_workers 个 uvicorn worker 进程提供（通过 QUNKONG_CORE_SOCKET 连接本进程）
+    """
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    
+    async def serve():
+        loop = asyncio.get_running_loop()
+        monitor = start_loop_monitor('websocket', loop, threshold=lag_threshold)
+        server_task = asyncio.create_task(websocket_server.start())
+        await core_rpc.start(websocket_server)
+        
+        logger.info(f"启动 {api_workers} 个 API worker 进程: http://0.0.0.0:{api_port}")
+        env = dict(os.environ, **{CORE_SOCKET_ENV: os.path.abspath(core_rpc.path)})
+        workers = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'uvicorn', 'app.main:app',
+            '--host', '0.0.0.0', '--port', str(api_port),
+            '--workers', str(api_workers), '--log-level', 'info',
+            env=env
+        )
+        
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        waiters = [server_task, asyncio.create_task(workers.wait()), asyncio.create_task(stop.wait())]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        
+        logger.info("正在关闭服务...")
+        if workers.returncode is None:
+            workers.terminate()
+            try:
+                await asyncio.wait_for(workers.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                workers.kill()
+        await core_rpc.stop()
+        
+        # 取消服务器任务，start() 的 finally 中会停止后台任务并写回剩余状态
+        websocket_server.running = False
+        server_task.cancel()
+        try:
+            await asyncio.wait_for(server_task, timeout=15)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"关闭WebSocket服务器失败: {e}")
+        for waiter in waiters:
+            waiter.cancel()
+        monitor.stop()
+    
+    asyncio.run(serve())
+
+
 def main():
     """主函数"""
     config = load_config()
@@ -261,13 +525,18 @@ def main():
         except:
             pass
     
+    if core_rpc is not None:
+        lag_threshold = config.getint('monitor', 'loop_lag_threshold_ms', fallback=100) / 1000
+        run_core(api_port, config.getint('server', 'api_workers'), lag_threshold)
+        return
+    
     # 使用 uvicorn 启动
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=api_port,
         reload=False,
-        workers=1,  # 单进程模式，WebSocket 需要共享状态
+        workers=1,  # 单进程模式，WebSocket 需要共享状态（多进程见 [server] api_workers）
         log_level="info"
     )
 
@@ -0,0 +1,229 @@
+"""
+数据库结构迁移
+
+版本 1 是基线，执行 scripts/init_complete.sql 中的建表语句；之后的结构变更按编号放在
+app/migrations/versions 目录下，文件名格式为 NNNN_说明.sql 或 NNNN_说明.py
+（Python 迁移定义 upgrade(cursor, db) 函数）。
+
+已应用的版本记录在 schema_migrations 表中。服务启动时由 DatabaseManager 执行一次
+尚未应用的迁移，多个节点同时启动时通过 MySQL 命名锁串行执行。请求路径上不再执行DDL。
+
+SQLite 后端不执行这些迁移（使用 SHOW COLUMNS、GET_LOCK 等 MySQL 语法），而是执行
+scripts/init_sqlite.sql 中的最新结构，新增迁移时需要同步修改该文件。
+"""
+import importlib.util
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Set
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASELINE_SQL = os.path.join(BASE_DIR, 'scripts', 'init_complete.sql')
+SQLITE_SCHEMA = os.path.join(BASE_DIR, 'scripts', 'init_sqlite.sql')
+VERSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'versions')
+
+LOCK_NAME = 'qunkong_schema_migrations'
+LOCK_TIMEOUT = 120
+
+_FILENAME = re.compile(r'^(\d{4})_(\w+)\.(sql|py)$')
+# 基线脚本中由初始化工具处理、迁移时跳过的语句（建库、切换库、提示信息）
+_SKIP_STATEMENT = re.compile(r'^\s*(CREATE\s+DATABASE|USE\s|SELECT\s)', re.IGNORECASE)
+
+
+@dataclass
+class Migration:
+    """单个迁移"""
+    version: int
+    name: str
+    path: str
+
+    @property
+    def kind(self) -> str:
+        return 'py' if self.path.endswith('.py') else 'sql'
+
+
+def split_sql(content: str) -> List[str]:
+    """按行尾分号拆分SQL脚本（跳过注释行和空行），与 scripts/init_database.py 的规则一致"""
+    statements = []
+    current = []
+    for line in content.split('\n'):
+        stripped = line.strip()
+        if stripped.startswith('--') or not stripped:
+            continue
+        current.append(line)
+        if stripped.endswith(';'):
+            statements.append('\n'.join(current).strip())
+            current = []
+    if current:
+        statements.append('\n'.join(current).strip())
+    return [s for s in statements if s and not _SKIP_STATEMENT.match(s)]
+
+
+def discover(versions_dir: str = VERSIONS_DIR, baseline: str = BASELINE_SQL) -> List[Migration]:
+    """按版本号列出所有迁移（含基线）"""
+    migrations = [Migration(1, 'baseline', baseline)]
+    if os.path.isdir(versions_dir):
+        for filename in os.listdir(versions_dir):
+            match = _FILENAME.match(filename)
+            if not match:
+                continue
+            version = int(match.group(1))
+            if version <= 1:
+                raise ValueError(f"迁移版本号必须大于1: {filename}")
+            migrations.append(Migration(version, match.group(2), os.path.join(versions_dir, filename)))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"迁移版本号重复: {versions}")
+    return migrations
+
+
+# ==================== Python 迁移中使用的辅助函数 ====================
+
+def table_exists(cursor, table: str) -> bool:
+    cursor.execute("SHOW TABLES LIKE %s", (table,))
+    return cursor.fetchone() is not None
+
+
+def column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute(f"SHOW COLUMNS FROM `{table}` LIKE %s", (column,))
+    return cursor.fetchone() is not None
+
+
+def index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute(f"SHOW INDEX FROM `{table}` WHERE Key_name = %s", (index,))
+    return cursor.fetchone() is not None
+
+
+def add_column(cursor, table: str, column: str, definition: str) -> bool:
+    """列不存在时添加，返回是否执行了变更"""
+    if column_exists(cursor, table, column):
+        return False
+    cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+    logger.info(f"数据库迁移：添加 {column} 字段到 {table} 表")
+    return True
+
+
+def add_index(cursor, table: str, index: str, columns: str) -> bool:
+    """索引不存在时添加，返回是否执行了变更"""
+    if index_exists(cursor, table, index):
+        return False
+    cursor.execute(f"ALTER TABLE `{table}` ADD INDEX `{index}` ({columns})")
+    logger.info(f"数据库迁移：添加 {index} 索引到 {table} 表")
+    return True
+
+
+# ==================== 迁移执行 ====================
+
+class MigrationRunner:
+    """迁移执行器"""
+
+    def __init__(self, db, versions_dir: str = VERSIONS_DIR, baseline: str = BASELINE_SQL):
+        self.db = db
+        self.versions_dir = versions_dir
+        self.baseline = baseline
+
+    def _ensure_table(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at DATETIME NOT NULL,
+                duration_ms INT DEFAULT 0
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        ''')
+
+    def applied_versions(self, cursor) -> Set[int]:
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row['version'] for row in cursor.fetchall()}
+
+    def _apply(self, cursor, migration: Migration):
+        if migration.kind == 'sql':
+            with open(migration.path, 'r', encoding='utf-8') as f:
+                statements = split_sql(f.read())
+            for statement in statements:
+                cursor.execute(statement)
+        else:
+            spec = importlib.util.spec_from_file_location(
+                f"app.migrations.versions.m{migration.version:04d}", migration.path
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            module.upgrade(cursor, self.db)
+
+    def run(self) -> List[int]:
+        """执行所有未应用的迁移，返回本次应用的版本号"""
+        migrations = discover(self.versions_dir, self.baseline)
+        conn = self.db._get_connection()
+        cursor = conn.cursor()
+        applied_now = []
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (LOCK_NAME, LOCK_TIMEOUT))
+            row = cursor.fetchone()
+            if not row or not row['locked']:
+                raise RuntimeError(f"等待数据库迁移锁超时（{LOCK_TIMEOUT}秒）")
+            try:
+                self._ensure_table(cursor)
+                applied = self.applied_versions(cursor)
+                for migration in migrations:
+                    if migration.version in applied:
+                        continue
+                    started = time.monotonic()
+                    try:
+                        self._apply(cursor, migration)
+                    except Exception as e:
+                        raise RuntimeError(f"数据库迁移 {migration.version:04d}_{migration.name} 失败: {e}") from e
+                    duration_ms = int((time.monotonic() - started) * 1000)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name, applied_at, duration_ms) VALUES (%s, %s, %s, %s)",
+                        (migration.version, migration.name, datetime.now(), duration_ms)
+                    )
+                    applied_now.append(migration.version)
+                    logger.info(f"数据库迁移已应用: {migration.version:04d}_{migration.name} ({duration_ms}ms)")
+            finally:
+                # 基线脚本会临时关闭外键检查，失败时也要恢复后再归还连接
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+                cursor.fetchone()
+        finally:
+            conn.close()
+        return applied_now
+
+
+def run_sqlite_schema(db, schema: str = SQLITE_SCHEMA, versions_dir: str = VERSIONS_DIR) -> List[int]:
+    """
+    SQLite 后端：执行 init_sqlite.sql（可重复执行），并把所有迁移版本记为已应用
+
+    init_sqlite.sql 已是所有迁移之后的结构，返回本次新记录的版本号。
+    """
+    with open(schema, 'r', encoding='utf-8') as f:
+        db._pool.executescript(f.read())
+    conn = db._get_connection()
+    cursor = conn.cursor()
+    try:
+        runner = MigrationRunner(db, versions_dir)
+        applied = runner.applied_versions(cursor)
+        marked = []
+        for migration in discover(versions_dir, schema):
+            if migration.version in applied:
+                continue
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at, duration_ms) VALUES (%s, %s, %s, %s)",
+                (migration.version, migration.name, datetime.now(), 0)
+            )
+            marked.append(migration.version)
+    finally:
+        conn.close()
+    return marked
+
+
+def run_migrations(db) -> List[int]:
+    """执行未应用的迁移（服务启动时调用一次）"""
+    if getattr(db, 'backend', 'mysql') == 'sqlite':
+        return run_sqlite_schema(db)
+    return MigrationRunner(db).run()
@@ -0,0 +1,47 @@
+"""
+补齐旧库结构
+
+基线使用 CREATE TABLE IF NOT EXISTS，已有的表不会被修改。这里补齐两类旧库的差异：
+- 由各模型管理器在请求中建表的旧版本：agents/users 后来追加的字段和执行历史的分页索引
+- 由旧版 init_complete.sql 初始化的库：execution_history 使用 task_name/start_time/end_time
+  结构，缺少代码读写的 script_content、created_at 等字段
+"""
+from app.migrations import add_column, add_index, column_exists
+
+
+def upgrade(cursor, db):
+    # Agent 表追加的字段
+    add_column(cursor, 'agents', 'os_type', "VARCHAR(50) DEFAULT 'unknown' AFTER external_ip")
+    add_index(cursor, 'agents', 'idx_os_type', 'os_type')
+    add_column(cursor, 'agents', 'tags', "JSON AFTER websocket_info")
+    add_column(cursor, 'agents', 'tenant_id', "INT AFTER status")
+    add_index(cursor, 'agents', 'idx_tenant_id', 'tenant_id')
+
+    # 用户表的默认租户字段（保留字段）
+    add_column(cursor, 'users', 'default_tenant_id', "INT DEFAULT NULL AFTER role")
+    add_index(cursor, 'users', 'idx_default_tenant_id', 'default_tenant_id')
+
+    # 旧版 init_complete.sql 的执行历史表结构
+    legacy_history = column_exists(cursor, 'execution_history', 'start_time')
+    add_column(cursor, 'execution_history', 'script_content', "LONGTEXT AFTER script_name")
+    add_column(cursor, 'execution_history', 'script_params', "TEXT AFTER script_content")
+    add_column(cursor, 'execution_history', 'created_at', "DATETIME")
+    add_column(cursor, 'execution_history', 'started_at', "DATETIME")
+    add_column(cursor, 'execution_history', 'completed_at', "DATETIME")
+    add_column(cursor, 'execution_history', 'timeout', "INT DEFAULT 7200")
+    add_column(cursor, 'execution_history', 'created_timestamp', "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+    add_column(cursor, 'execution_history', 'updated_timestamp',
+               "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+    if legacy_history:
+        cursor.execute('''
+            UPDATE execution_history
+            SET created_at = COALESCE(created_at, start_time),
+                started_at = COALESCE(started_at, start_time),
+                completed_at = COALESCE(completed_at, end_time)
+        ''')
+        cursor.execute("UPDATE execution_history SET script_name = task_name WHERE script_name IS NULL")
+
+    add_index(cursor, 'execution_history', 'idx_script_name', 'script_name')
+    add_index(cursor, 'execution_history', 'idx_created_at', 'created_at')
+    add_index(cursor, 'execution_history', 'idx_created_id', 'created_at, id')
+    add_index(cursor, 'execution_history', 'idx_project_created_id', 'project_id, created_at, id')
@@ -0,0 +1,15 @@
+"""
+从执行历史回填执行目标表
+
+execution_targets 在已有执行历史的库上新建时为空，按Agent查询执行记录会缺少历史数据。
+"""
+
+
+def upgrade(cursor, db):
+    cursor.execute("SELECT 1 FROM execution_targets LIMIT 1")
+    if cursor.fetchone():
+        return
+    cursor.execute("SELECT 1 FROM execution_history LIMIT 1")
+    if cursor.fetchone():
+        backfilled = db.backfill_execution_targets()
+        print(f"数据库迁移：从执行历史回填 execution_targets {backfilled} 条")
@@ -9,27 +9,49 @@ from datetime import datetime
 from typing import List, Dict, Any, Optional
 import json
 from dbutils.pooled_db import PooledDB
+from app.migrations import run_migrations
+from app.db_metrics import DBInstrumentation, load_slow_query_seconds
+from app.db_sqlite import SQLiteDatabase
 
 class DatabaseManager:
     """数据库管理器 - 使用连接池优化性能"""
     
-    _pool = None  # 类级别的连接池单例
+    _pool = None  # 类级别的连接池单例（SQLite 后端为 SQLiteDatabase）
+    _instrumentation = None  # 连接池和查询监控（与连接池一起创建）
     
-    def __init__(self, config_path: str = "config/database.conf"):
+    def __init__(self, config_path: str = "config/database.conf", db_config: Dict[str, Any] = None):
+        """
+        Args:
+            config_path: 配置文件路径
+            db_config: 直接指定的配置（不读取配置文件），如 {'backend': 'sqlite', 'path': ':memory:'}
+        """
         self.config_path = config_path
-        self.db_config = self._load_config()
+        self.db_config = db_config or self._load_config()
+        self.backend = self.db_config.get('backend', 'mysql')
         self._init_pool()  # 初始化连接池
         self.init_database()
     
     def _load_config(self) -> Dict[str, Any]:
-        """加载数据库配置"""
+        """加载数据库配置（[database] backend 选择 mysql 或 sqlite）"""
         if not os.path.exists(self.config_path):
             raise FileNotFoundError(f"数据库配置文件不存在: {self.config_path}")
         
         config = configparser.ConfigParser()
         config.read(self.config_path, encoding='utf-8')
         
+        backend = config.get('database', 'backend', fallback='mysql').strip().lower()
+        if backend == 'sqlite':
+            return {
+                'backend': 'sqlite',
+                'path': config.get('sqlite', 'path', fallback='data/qunkong.db'),
+                'timeout': config.getint('connection', 'timeout', fallback=30),
+                'slow_query_ms': config.getint('connection', 'slow_query_ms', fallback=500)
+            }
+        if backend != 'mysql':
+            raise ValueError(f"不支持的数据库后端: {backend}（可选 mysql、sqlite）")
+        
         return {
+            'backend': 'mysql',
             'host': config.get('mysql', 'host'),
             'port': config.getint('mysql', 'port'),
             'database': config.get('mysql', 'database'),
@@ -38,12 +60,21 @@ class DatabaseManager:
             'charset': config.get('mysql', 'charset', fallback='utf8mb4'),
             'max_connections': config.getint('connection', 'max_connections', fallback=20),
             'min_connections': config.getint('connection', 'min_connections', fallback=5),
-            'timeout': config.getint('connection', 'timeout', fallback=30)
+            'timeout': config.getint('connection', 'timeout', fallback=30),
+            'slow_query_ms': config.getint('connection', 'slow_query_ms', fallback=500)
         }
     
     def _init_pool(self):
         """初始化数据库连接池"""
-        if DatabaseManager._pool is None:
+        if DatabaseManager._pool is None and self.backend == 'sqlite':
+            # 单个写连接 + 每线程只读连接，没有连接池预热
+            DatabaseManager._pool = SQLiteDatabase(self.db_config['path'], timeout=self.db_config.get('timeout', 30))
+            DatabaseManager._instrumentation = DBInstrumentation(
+                DatabaseManager._pool,
+                slow_query_seconds=load_slow_query_seconds(self.db_config.get('slow_query_ms'))
+            )
+            print(f"SQLite 数据库已打开: {self.db_config['path']}")
+        elif DatabaseManager._pool is None:
             DatabaseManager._pool = PooledDB(
                 creator=pymysql,
                 maxconnections=self.db_config['max_connections'],  # 最大连接数
@@ -63,141 +94,31 @@ class DatabaseManager:
                 autocommit=True,
                 cursorclass=pymysql.cursors.DictCursor
             )
+            DatabaseManager._instrumentation = DBInstrumentation(
+                DatabaseManager._pool,
+                slow_query_seconds=load_slow_query_seconds(self.db_config.get('slow_query_ms'))
+            )
             print(f"数据库连接池已初始化: max={self.db_config['max_connections']}, min={self.db_config.get('min_connections', 5)}")
     
     def _get_connection(self):
-        """从连接池获取数据库连接"""
+        """从连接池获取数据库连接（记录等待时间、占用时间和每条SQL的耗时）"""
         if DatabaseManager._pool is None:
             self._init_pool()
-        return DatabaseManager._pool.connection()
+        return DatabaseManager._instrumentation.checkout(DatabaseManager._pool)
+    
+    @property
+    def instrumentation(self) -> DBInstrumentation:
+        """连接池和查询监控"""
+        return DatabaseManager._instrumentation
     
     def init_database(self):
-        """初始化数据库表"""
+        """执行未应用的数据库迁移（建表和结构变更见 app/migrations，只在启动时执行一次）"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            # 创建Agent基本信息表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS agents (
-                    id VARCHAR(64) PRIMARY KEY,
-                    hostname VARCHAR(255) NOT NULL,
-                    ip_address VARCHAR(45) NOT NULL,
-                    external_ip VARCHAR(45) DEFAULT '',
-                    os_type VARCHAR(50) DEFAULT 'unknown',
-                    status VARCHAR(20) DEFAULT 'OFFLINE',
-                    tenant_id INT,
-                    project_id INT,
-                    last_heartbeat DATETIME,
-                    register_time DATETIME,
-                    websocket_info JSON,
-                    tags JSON,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    INDEX idx_hostname (hostname),
-                    INDEX idx_ip_address (ip_address),
-                    INDEX idx_external_ip (external_ip),
-                    INDEX idx_status (status),
-                    INDEX idx_last_heartbeat (last_heartbeat),
-                    INDEX idx_tenant_id (tenant_id),
-                    INDEX idx_project_id (project_id),
-                    INDEX idx_os_type (os_type)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 检查并添加 os_type 字段（如果表已存在但没有该字段）
-            cursor.execute("SHOW COLUMNS FROM agents LIKE 'os_type'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE agents ADD COLUMN os_type VARCHAR(50) DEFAULT 'unknown' AFTER external_ip")
-                cursor.execute("ALTER TABLE agents ADD INDEX idx_os_type (os_type)")
-                print("数据库迁移：添加 os_type 字段到 agents 表")
-            
-            # 检查并添加 tags 字段（如果表已存在但没有该字段）
-            cursor.execute("SHOW COLUMNS FROM agents LIKE 'tags'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE agents ADD COLUMN tags JSON AFTER websocket_info")
-                print("数据库迁移：添加 tags 字段到 agents 表")
-            
-            # 检查并添加 tenant_id 字段
-            cursor.execute("SHOW COLUMNS FROM agents LIKE 'tenant_id'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE agents ADD COLUMN tenant_id INT AFTER status")
-                cursor.execute("ALTER TABLE agents ADD INDEX idx_tenant_id (tenant_id)")
-                print("数据库迁移：添加 tenant_id 字段到 agents 表")
-            
-            # 创建项目-Agent关联表（用于权限管理）
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS project_agents (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    project_id INT NOT NULL,
-                    agent_id VARCHAR(64) NOT NULL,
-                    can_execute BOOLEAN DEFAULT TRUE,
-                    can_terminal BOOLEAN DEFAULT TRUE,
-                    assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    assigned_by INT,
-                    status VARCHAR(20) DEFAULT 'active',
-                    FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE,
-                    FOREIGN KEY (agent_id) REFERENCES agents (id) ON DELETE CASCADE,
-                    UNIQUE KEY unique_project_agent (project_id, agent_id),
-                    INDEX idx_project_id (project_id),
-                    INDEX idx_agent_id (agent_id),
-                    INDEX idx_status (status)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            
-            # 创建执行历史表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS execution_history (
-                    id VARCHAR(64) PRIMARY KEY,
-                    script_name VARCHAR(255) NOT NULL,
-                    script_content LONGTEXT,
-                    script_params TEXT,
-                    target_hosts JSON,
-                    project_id INT,
-                    status VARCHAR(20) DEFAULT 'PENDING',
-                    created_at DATETIME,
-                    started_at DATETIME,
-                    completed_at DATETIME,
-                    timeout INT DEFAULT 7200,
-                    execution_user VARCHAR(100) DEFAULT 'root',
-                    results JSON,
-                    error_message TEXT,
-                    created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    INDEX idx_script_name (script_name),
-                    INDEX idx_status (status),
-                    INDEX idx_created_at (created_at),
-                    INDEX idx_execution_user (execution_user),
-                    INDEX idx_project_id (project_id)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 创建Agent系统信息表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS agent_system_info (
-                    agent_id VARCHAR(64) PRIMARY KEY,
-                    hostname VARCHAR(255) NOT NULL,
-                    ip_address VARCHAR(45) NOT NULL,
-                    last_heartbeat DATETIME,
-                    status VARCHAR(20) DEFAULT 'OFFLINE',
-                    register_time DATETIME,
-                    system_info JSON,
-                    network_info JSON,
-                    memory_info JSON,
-                    disk_info JSON,
-                    cpu_info JSON,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (agent_id) REFERENCES agents (id) ON DELETE CASCADE,
-                    INDEX idx_hostname (hostname),
-                    INDEX idx_ip_address (ip_address),
-                    INDEX idx_status (status)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            conn.close()
-            print("数据库表初始化完成")
+            applied = run_migrations(self)
+            if applied:
+                print(f"数据库迁移完成: {', '.join(str(v) for v in applied)}")
+            else:
+                print("数据库结构已是最新版本")
         except Exception as e:
             print(f"数据库初始化失败: {e}")
             raise
@@ -286,35 +207,287 @@ class DatabaseManager:
             rows = cursor.fetchall()
             conn.close()
             
-            history = []
+            return [self._history_row(row) for row in rows]
+        except Exception as e:
+            print(f"获取执行历史失败: {e}")
+            return []
+    
+    @staticmethod
+    def _history_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """执行历史完整记录（包含脚本和结果）"""
+        # 处理JSON字段
+        target_hosts = row['target_hosts'] if isinstance(row['target_hosts'], list) else json.loads(row['target_hosts']) if row['target_hosts'] else []
+        results = row['results'] if isinstance(row['results'], dict) else json.loads(row['results']) if row['results'] else {}
+        
+        return {
+            'id': row['id'],
+            'script_name': row['script_name'],
+            'script': row['script_content'],  # 保持script字段名一致
+            'script_content': row['script_content'],  # 同时提供script_content别名
+            'script_params': row['script_params'],
+            'target_hosts': target_hosts,
+            'project_id': row.get('project_id'),  # 添加project_id字段
+            'status': row['status'],
+            'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+            'started_at': row['started_at'].isoformat() if row['started_at'] else None,
+            'completed_at': row['completed_at'].isoformat() if row['completed_at'] else None,
+            'timeout': row['timeout'],
+            'execution_user': row['execution_user'],
+            'results': results,
+            'error_message': row['error_message']
+        }
+    
+    def get_execution_history_summaries(self, project_id: int = None, limit: int = 50,
+                                        before: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """
+        获取执行历史摘要（不包含脚本内容和执行结果），按 (created_at, id) 倒序键集分页
+        
+        Args:
+            project_id: 项目ID
+            limit: 返回条数
+            before: 上一页最后一条的 (created_at, id)，为空时从最新开始
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            conditions = []
+            params = []
+            if project_id:
+                conditions.append("project_id = %s")
+                params.append(project_id)
+            if before:
+                before_created_at, before_id = before
+                conditions.append("(created_at < %s OR (created_at = %s AND id < %s))")
+                params.extend([before_created_at, before_created_at, before_id])
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            params.append(limit)
+            
+            # 结果只取主机数，不读取和解析输出
+            cursor.execute(f'''
+                SELECT id, script_name, script_params, target_hosts, status,
+                       created_at, started_at, completed_at, timeout,
+                       execution_user, error_message, project_id,
+                       JSON_LENGTH(results) AS result_count
+                FROM execution_history
+                {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            ''', params)
+            
+            rows = cursor.fetchall()
+            conn.close()
+            
+            summaries = []
             for row in rows:
-                # 处理JSON字段
                 target_hosts = row['target_hosts'] if isinstance(row['target_hosts'], list) else json.loads(row['target_hosts']) if row['target_hosts'] else []
-                results = row['results'] if isinstance(row['results'], dict) else json.loads(row['results']) if row['results'] else {}
-                
-                history.append({
+                summaries.append({
                     'id': row['id'],
                     'script_name': row['script_name'],
-                    'script': row['script_content'],  # 保持script字段名一致
-                    'script_content': row['script_content'],  # 同时提供script_content别名
                     'script_params': row['script_params'],
                     'target_hosts': target_hosts,
-                    'project_id': row.get('project_id'),  # 添加project_id字段
+                    'project_id': row.get('project_id'),
                     'status': row['status'],
                     'created_at': row['created_at'].isoformat() if row['created_at'] else None,
                     'started_at': row['started_at'].isoformat() if row['started_at'] else None,
                     'completed_at': row['completed_at'].isoformat() if row['completed_at'] else None,
                     'timeout': row['timeout'],
                     'execution_user': row['execution_user'],
-                    'results': results,
-                    'error_message': row['error_message']
+                    'error_message': row['error_message'],
+                    'result_count': row['result_count'] or 0
                 })
-            
-            return history
+            return summaries
+        except Exception as e:
+            print(f"获取执行历史摘要失败: {e}")
+            return []
+    
+    def get_execution_history_by_id(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """按主键获取单条执行历史（包含脚本和结果）"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, script_name, script_content, script_params, target_hosts,
+                       status, created_at, started_at, completed_at, timeout,
+                       execution_user, results, error_message, project_id
+                FROM execution_history
+                WHERE id = %s
+            ''', (task_id,))
+            row = cursor.fetchone()
+            conn.close()
+            return self._history_row(row) if row else None
         except Exception as e:
             print(f"获取执行历史失败: {e}")
+            return None
+    
+    def save_execution_targets_batch(self, rows: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+        """
+        批量写入执行目标（多行 INSERT ... ON DUPLICATE KEY UPDATE）
+
+        每行是 ExecutionTargetBuffer 合并后的记录，finished_at 为空表示只有下发信息：
+        已有记录时只补上为空的 dispatched_at，不覆盖状态和结果（结果可能先于下发写入）。
+
+        Returns:
+            int: 写入的行数，失败返回 -1
+        """
+        if not rows:
+            return 0
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+
+            written = 0
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(chunk))
+                params = []
+                for row in chunk:
+                    params.extend([
+                        row['task_id'],
+                        row['agent_id'],
+                        row.get('status') or 'RUNNING',
+                        row.get('exit_code'),
+                        row.get('duration'),
+                        row.get('dispatched_at'),
+                        row.get('finished_at')
+                    ])
+                cursor.execute(f'''
+                    INSERT INTO execution_targets
+                    (task_id, agent_id, status, exit_code, duration, dispatched_at, finished_at)
+                    VALUES {placeholders}
+                    ON DUPLICATE KEY UPDATE
+                    dispatched_at = COALESCE(dispatched_at, VALUES(dispatched_at)),
+                    status = IF(VALUES(finished_at) IS NULL, status, VALUES(status)),
+                    exit_code = IF(VALUES(finished_at) IS NULL, exit_code, VALUES(exit_code)),
+                    duration = IF(VALUES(finished_at) IS NULL, duration, VALUES(duration)),
+                    finished_at = COALESCE(VALUES(finished_at), finished_at)
+                ''', tuple(params))
+                written += len(chunk)
+
+            conn.close()
+            return written
+        except Exception as e:
+            print(f"批量保存执行目标失败: {e}")
+            return -1
+    
+    def get_agent_executions(self, agent_id: str, limit: int = 50,
+                             before: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """
+        获取Agent的执行记录，按 (finished_at, task_id) 倒序键集分页
+        
+        第一页（before 为空）同时返回仍在执行中的记录。
+        
+        Args:
+            agent_id: Agent ID
+            limit: 已完成记录的返回条数
+            before: 上一页最后一条的 (finished_at, task_id)
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            columns = '''
+                SELECT t.task_id, t.agent_id, t.status, t.exit_code, t.duration,
+                       t.dispatched_at, t.finished_at,
+                       h.script_name, h.status AS task_status, h.project_id, h.created_at
+                FROM execution_targets t
+                LEFT JOIN execution_history h ON h.id = t.task_id
+            '''
+            rows = []
+            if not before:
+                cursor.execute(columns + '''
+                    WHERE t.agent_id = %s AND t.finished_at IS NULL
+                    ORDER BY t.dispatched_at DESC
+                    LIMIT %s
+                ''', (agent_id, limit))
+                rows.extend(cursor.fetchall())
+                cursor.execute(columns + '''
+                    WHERE t.agent_id = %s AND t.finished_at IS NOT NULL
+                    ORDER BY t.finished_at DESC, t.task_id DESC
+                    LIMIT %s
+                ''', (agent_id, limit))
+            else:
+                before_finished_at, before_task_id = before
+                cursor.execute(columns + '''
+                    WHERE t.agent_id = %s
+                      AND (t.finished_at < %s OR (t.finished_at = %s AND t.task_id < %s))
+                    ORDER BY t.finished_at DESC, t.task_id DESC
+                    LIMIT %s
+                ''', (agent_id, before_finished_at, before_finished_at, before_task_id, limit))
+            rows.extend(cursor.fetchall())
+            conn.close()
+            
+            executions = []
+            for row in rows:
+                executions.append({
+                    'task_id': row['task_id'],
+                    'agent_id': row['agent_id'],
+                    'status': row['status'],
+                    'exit_code': row['exit_code'],
+                    'duration': row['duration'],
+                    'dispatched_at': row['dispatched_at'].isoformat() if row['dispatched_at'] else None,
+                    'finished_at': row['finished_at'].isoformat() if row['finished_at'] else None,
+                    'script_name': row['script_name'],
+                    'task_status': row['task_status'],
+                    'project_id': row['project_id'],
+                    'created_at': row['created_at'].isoformat() if row['created_at'] else None
+                })
+            return executions
+        except Exception as e:
+            print(f"获取Agent执行记录失败: {e}")
             return []
     
+    def backfill_execution_targets(self, batch_size: int = 500) -> int:
+        """从执行历史回填执行目标表（按主键分批读取），返回写入的记录数"""
+        total = 0
+        last_id = ''
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            while True:
+                cursor.execute('''
+                    SELECT id, target_hosts, results, status, created_at, started_at, completed_at
+                    FROM execution_history
+                    WHERE id > %s
+                    ORDER BY id
+                    LIMIT %s
+                ''', (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                
+                values = []
+                for row in rows:
+                    target_hosts = row['target_hosts'] if isinstance(row['target_hosts'], list) else json.loads(row['target_hosts']) if row['target_hosts'] else []
+                    results = row['results'] if isinstance(row['results'], dict) else json.loads(row['results']) if row['results'] else {}
+                    dispatched_at = row['started_at'] or row['created_at']
+                    finished_at = row['completed_at'] or dispatched_at
+                    # 结果以agent_id为键；没有结果的目标（可能是IP）按任务状态记录
+                    for agent_id, result in results.items():
+                        result = result if isinstance(result, dict) else {}
+                        exit_code = result.get('exit_code')
+                        values.append((row['id'], agent_id, 'SUCCESS' if exit_code == 0 else 'FAILED',
+                                       exit_code, result.get('execution_time'), dispatched_at, finished_at))
+                    for target in target_hosts:
+                        if target not in results:
+                            finished = row['status'] in ('COMPLETED', 'FAILED', 'CANCELLED')
+                            values.append((row['id'], target, row['status'] or 'UNKNOWN', None, None,
+                                           dispatched_at, finished_at if finished else None))
+                
+                if values:
+                    cursor.executemany('''
+                        INSERT IGNORE INTO execution_targets
+                        (task_id, agent_id, status, exit_code, duration, dispatched_at, finished_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ''', values)
+                    total += len(values)
+            conn.close()
+            return total
+        except Exception as e:
+            print(f"回填执行目标失败: {e}")
+            return total
+    
     def save_agent_system_info(self, agent_id: str, system_info: Dict[str, Any]) -> bool:
         """保存Agent系统信息"""
         try:
@@ -440,22 +613,20 @@ class DatabaseManager:
             cursor = conn.cursor()
             
             # 使用JSON_SET直接更新JSON字段，避免先读取再写入
-            # 构建更新语句
-            update_parts = []
-            params = []
+            # 构建更新语句: [(赋值语句, 参数)]
+            updates = []
+            system_paths = []
+            system_params = []
             
             if 'cpu_usage' in resource_info:
-                update_parts.append("""
-                    system_info = JSON_SET(system_info, '$.cpu_usage', %s),
-                    cpu_info = JSON_SET(cpu_info, '$.cpu_percent', %s)
-                """)
-                params.extend([resource_info['cpu_usage'], resource_info['cpu_usage']])
+                system_paths.append("'$.cpu_usage', %s")
+                system_params.append(resource_info['cpu_usage'])
+                updates.append(("cpu_info = JSON_SET(cpu_info, '$.cpu_percent', %s)", [resource_info['cpu_usage']]))
             
             if 'memory_usage' in resource_info:
-                if not update_parts:
-                    update_parts.append("")
-                update_parts.append("""
-                    system_info = JSON_SET(system_info, '$.memory_usage', %s),
+                system_paths.append("'$.memory_usage', %s")
+                system_params.append(resource_info['memory_usage'])
+                updates.append(("""
                     memory_info = JSON_SET(
                         memory_info,
                         '$.percent', %s,
@@ -463,37 +634,34 @@ class DatabaseManager:
                         '$.used', %s,
                         '$.available', %s
                     )
-                """)
-                params.extend([
-                    resource_info['memory_usage'],
+                """, [
                     resource_info['memory_usage'],
                     resource_info.get('memory_total', 0),
                     resource_info.get('memory_used', 0),
                     resource_info.get('memory_available', 0)
-                ])
+                ]))
+            
+            if system_paths:
+                # system_info 只赋值一次：同一列多次赋值时 MySQL 依次生效，SQLite 只保留最后一次
+                updates.insert(0, (f"system_info = JSON_SET(system_info, {', '.join(system_paths)})", system_params))
             
             if 'disk_info' in resource_info and resource_info['disk_info']:
-                if not update_parts:
-                    update_parts.append("")
-                update_parts.append("disk_info = %s")
-                params.append(json.dumps(resource_info['disk_info']))
+                updates.append(("disk_info = %s", [json.dumps(resource_info['disk_info'])]))
             
             if 'last_heartbeat' in resource_info:
-                if not update_parts:
-                    update_parts.append("")
-                update_parts.append("last_heartbeat = %s")
-                params.append(resource_info['last_heartbeat'])
+                updates.append(("last_heartbeat = %s", [resource_info['last_heartbeat']]))
             
-            if not update_parts:
+            if not updates:
                 conn.close()
                 return True
             
+            params = [value for _, values in updates for value in values]
             params.append(agent_id)
             
             # 执行单条UPDATE语句，无需先SELECT
             sql = f"""
                 UPDATE agent_system_info
-                SET {', '.join(update_parts)}
+                SET {', '.join(clause for clause, _ in updates)}
                 WHERE agent_id = %s
             """
             
@@ -551,7 +719,59 @@ class DatabaseManager:
         except Exception as e:
             print(f"保存Agent信息失败: {e}")
             return False
-    
+
+    def save_agents_batch(self, agents: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+        """
+        批量写回Agent状态（多行 INSERT ... ON DUPLICATE KEY UPDATE）
+
+        只更新心跳相关字段，不覆盖 tenant_id/project_id/tags 等管理字段。
+
+        Returns:
+            int: 写入的行数，失败返回 -1
+        """
+        if not agents:
+            return 0
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+
+            written = 0
+            for start in range(0, len(agents), chunk_size):
+                chunk = agents[start:start + chunk_size]
+                placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk))
+                params = []
+                for agent in chunk:
+                    params.extend([
+                        agent.get('id'),
+                        agent.get('hostname') or '',
+                        agent.get('ip_address') or '',
+                        agent.get('external_ip') or '',
+                        agent.get('os_type') or 'unknown',
+                        agent.get('status', 'OFFLINE'),
+                        agent.get('last_heartbeat'),
+                        agent.get('register_time') or agent.get('last_heartbeat')
+                    ])
+                cursor.execute(f'''
+                    INSERT INTO agents
+                    (id, hostname, ip_address, external_ip, os_type, status,
+                     last_heartbeat, register_time)
+                    VALUES {placeholders}
+                    ON DUPLICATE KEY UPDATE
+                    hostname = IF(VALUES(hostname) = '', hostname, VALUES(hostname)),
+                    ip_address = IF(VALUES(ip_address) = '', ip_address, VALUES(ip_address)),
+                    external_ip = IF(VALUES(external_ip) = '', external_ip, VALUES(external_ip)),
+                    os_type = IF(VALUES(os_type) = 'unknown', os_type, VALUES(os_type)),
+                    status = VALUES(status),
+                    last_heartbeat = COALESCE(VALUES(last_heartbeat), last_heartbeat)
+                ''', tuple(params))
+                written += len(chunk)
+
+            conn.close()
+            return written
+        except Exception as e:
+            print(f"批量保存Agent状态失败: {e}")
+            return -1
+
     def get_all_agents(self, tenant_id: int = None, project_id: int = None) -> List[Dict[str, Any]]:
         """获取Agent信息（支持租户和项目过滤，严格隔离）"""
         try:
@@ -610,7 +830,20 @@ class DatabaseManager:
         except Exception as e:
             print(f"获取Agent列表失败: {e}")
             return []
-    
+
+    def get_agent_project_id(self, agent_id: str) -> Optional[int]:
+        """获取Agent的默认项目ID（主键查询）"""
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT project_id FROM agents WHERE id = %s', (agent_id,))
+            row = cursor.fetchone()
+            conn.close()
+            return row['project_id'] if row else None
+        except Exception as e:
+            print(f"获取Agent项目失败: {e}")
+            return None
+
     def assign_agent_to_project(self, project_id: int, agent_id: str,
                                 can_execute: bool = True, can_terminal: bool = True,
                                 assigned_by: int = None) -> bool:
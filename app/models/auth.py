@@ -7,85 +7,23 @@ import jwt
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 from app.models import DatabaseManager
+from app.auth_cache import AuthCache
+from app.permissions import get_permission_versions
+from app.password_hasher import PasswordHasher, PasswordHasherBusy, check_password, make_password
 
 class AuthManager:
     """用户认证管理器"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, cache: AuthCache = None,
+                 hasher: PasswordHasher = None):
         self.db = db_manager
         self.secret_key = "qunkong_secret_key_2024"  # 生产环境应使用环境变量
         self.token_expire_hours = 24
-        self.init_auth_tables()
-    
-    def init_auth_tables(self):
-        """初始化认证相关数据库表"""
-        try:
-            conn = self.db._get_connection()
-            cursor = conn.cursor()
-            
-            # 创建用户表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    username VARCHAR(50) UNIQUE NOT NULL,
-                    email VARCHAR(100) UNIQUE NOT NULL,
-                    password_hash VARCHAR(255) NOT NULL,
-                    salt VARCHAR(32) NOT NULL,
-                    role VARCHAR(20) DEFAULT 'user',
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP NULL,
-                    login_count INT DEFAULT 0,
-                    INDEX idx_username (username),
-                    INDEX idx_email (email),
-                    INDEX idx_role (role)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 创建用户会话表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_sessions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    token_hash VARCHAR(255) NOT NULL,
-                    expires_at TIMESTAMP NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    ip_address VARCHAR(45),
-                    user_agent TEXT,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                    INDEX idx_token_hash (token_hash),
-                    INDEX idx_user_id (user_id),
-                    INDEX idx_expires_at (expires_at)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 创建用户权限表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_permissions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    permission VARCHAR(50) NOT NULL,
-                    resource VARCHAR(100),
-                    granted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    granted_by INT,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                    FOREIGN KEY (granted_by) REFERENCES users (id) ON DELETE SET NULL,
-                    UNIQUE KEY unique_user_permission (user_id, permission, resource),
-                    INDEX idx_user_id (user_id),
-                    INDEX idx_permission (permission)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            conn.close()
-            
-            # 创建默认管理员账户
-            self.create_default_admin()
-            
-        except Exception as e:
-            print(f"初始化认证表失败: {e}")
-            raise
+        # 会话和用户角色缓存，热路径上的认证和权限检查不再访问数据库
+        self.cache = cache or AuthCache()
+        # 请求中的密码哈希和校验在专用线程池中执行，不阻塞事件循环
+        self.hasher = hasher or PasswordHasher()
+        self.create_default_admin()
     
     def create_default_admin(self):
         """创建默认管理员账户"""
@@ -94,37 +32,21 @@ class AuthManager:
             if self.get_user_by_username('admin'):
                 return
             
-            # 创建默认管理员
-            self.register_user(
-                username='admin',
-                email='admin@qunkong.com',
-                password='admin123',
-                role='admin'
-            )
+            # 创建默认管理员（启动时执行，直接同步计算哈希）
+            password_hash, salt = self.hash_password('admin123')
+            self._create_user('admin', 'admin@qunkong.com', password_hash, salt, 'admin')
             print("默认管理员账户已创建: admin/admin123")
             
         except Exception as e:
             print(f"创建默认管理员失败: {e}")
     
     def hash_password(self, password: str, salt: str = None) -> tuple:
-        """密码哈希"""
-        if salt is None:
-            salt = secrets.token_hex(16)
-        
-        # 使用PBKDF2进行密码哈希
-        password_hash = hashlib.pbkdf2_hmac(
-            'sha256',
-            password.encode('utf-8'),
-            salt.encode('utf-8'),
-            100000  # 迭代次数
-        ).hex()
-        
-        return password_hash, salt
+        """密码哈希（同步计算，请求中使用 self.hasher）"""
+        return make_password(password, self.hasher.iterations, salt)
     
     def verify_password(self, password: str, password_hash: str, salt: str) -> bool:
-        """验证密码"""
-        computed_hash, _ = self.hash_password(password, salt)
-        return computed_hash == password_hash
+        """验证密码（同步计算，请求中使用 self.hasher）"""
+        return check_password(password, password_hash, salt, self.hasher.iterations)[0]
     
     def generate_token(self, user_id: int, username: str) -> str:
         """生成JWT令牌"""
@@ -146,8 +68,33 @@ class AuthManager:
         except jwt.InvalidTokenError:
             return None
     
-    def register_user(self, username: str, email: str, password: str, role: str = 'user') -> bool:
-        """用户注册"""
+    async def register_user(self, username: str, email: str, password: str, role: str = 'user') -> bool:
+        """
+        用户注册
+
+        Raises:
+            PasswordHasherBusy: 密码哈希排队已满
+        """
+        if self._user_exists(username, email):
+            return False
+        password_hash, salt = await self.hasher.hash(password)
+        return self._create_user(username, email, password_hash, salt, role)
+    
+    def _user_exists(self, username: str, email: str) -> bool:
+        """用户名或邮箱是否已存在"""
+        try:
+            conn = self.db._get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM users WHERE username = %s OR email = %s', (username, email))
+            exists = cursor.fetchone() is not None
+            conn.close()
+            return exists
+        except Exception as e:
+            print(f"检查用户是否存在失败: {e}")
+            return False
+    
+    def _create_user(self, username: str, email: str, password_hash: str, salt: str, role: str) -> bool:
+        """插入用户记录（用户名或邮箱已存在时返回False）"""
         try:
             conn = self.db._get_connection()
             cursor = conn.cursor()
@@ -158,9 +105,6 @@ class AuthManager:
                 conn.close()
                 return False
             
-            # 哈希密码
-            password_hash, salt = self.hash_password(password)
-            
             # 插入用户记录
             cursor.execute('''
                 INSERT INTO users (username, email, password_hash, salt, role)
@@ -174,8 +118,13 @@ class AuthManager:
             print(f"用户注册失败: {e}")
             return False
     
-    def login_user(self, username: str, password: str, ip_address: str = None, user_agent: str = None) -> Optional[Dict[str, Any]]:
-        """用户登录"""
+    async def login_user(self, username: str, password: str, ip_address: str = None, user_agent: str = None) -> Optional[Dict[str, Any]]:
+        """
+        用户登录
+
+        Raises:
+            PasswordHasherBusy: 密码哈希排队已满
+        """
         try:
             conn = self.db._get_connection()
             cursor = conn.cursor()
@@ -188,14 +137,31 @@ class AuthManager:
             ''', (username, username))
             
             user = cursor.fetchone()
-            if not user or not user['is_active']:
-                conn.close()
-                return None
-            
-            # 验证密码
-            if not self.verify_password(password, user['password_hash'], user['salt']):
-                conn.close()
-                return None
+            conn.close()
+        except Exception as e:
+            print(f"用户登录失败: {e}")
+            return None
+        
+        if not user or not user['is_active']:
+            return None
+        
+        # 验证密码（不占用数据库连接）
+        ok, needs_rehash = await self.hasher.verify(password, user['password_hash'], user['salt'])
+        if not ok:
+            return None
+        
+        # 迭代次数已提高，按新的工作量重新哈希（排队已满时下次登录再升级）
+        if needs_rehash:
+            try:
+                password_hash, salt = await self.hasher.hash(password)
+                self._store_password(user['id'], password_hash, salt)
+                self.hasher.record_rehash()
+            except PasswordHasherBusy:
+                pass
+        
+        try:
+            conn = self.db._get_connection()
+            cursor = conn.cursor()
             
             # 生成令牌
             token = self.generate_token(user['id'], user['username'])
@@ -229,6 +195,22 @@ class AuthManager:
             print(f"用户登录失败: {e}")
             return None
     
+    def _store_password(self, user_id: int, password_hash: str, salt: str) -> bool:
+        """只更新密码哈希（登录时升级工作量，不影响会话）"""
+        try:
+            conn = self.db._get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE users
+                SET password_hash = %s, salt = %s
+                WHERE id = %s
+            ''', (password_hash, salt, user_id))
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"更新密码哈希失败: {e}")
+            return False
+    
     def logout_user(self, token: str) -> bool:
         """用户登出"""
         try:
@@ -244,6 +226,7 @@ class AuthManager:
             ''', (token_hash,))
             
             conn.close()
+            self.cache.revoke_token(token_hash)
             return True
             
         except Exception as e:
@@ -272,16 +255,19 @@ class AuthManager:
             return None
     
     def get_user_by_token(self, token: str) -> Optional[Dict[str, Any]]:
-        """根据令牌获取用户信息"""
+        """根据令牌获取用户信息（优先使用会话缓存）"""
         try:
+            token_hash = hashlib.sha256(token.encode()).hexdigest()
+            user = self.cache.get_session(token_hash)
+            if user is not None:
+                return user
+            
             # 验证令牌
             payload = self.verify_token(token)
             if not payload:
                 return None
             
             # 检查会话是否有效
-            token_hash = hashlib.sha256(token.encode()).hexdigest()
-            
             conn = self.db._get_connection()
             cursor = conn.cursor()
             
@@ -298,56 +284,60 @@ class AuthManager:
             if not session or not session['is_active']:
                 return None
             
-            return {
+            user = {
                 'user_id': session['user_id'],
                 'username': session['username'],
                 'email': session['email'],
                 'role': session['role']
             }
+            self.cache.put_session(token_hash, user, payload['exp'])
+            return user
             
         except Exception as e:
             print(f"根据令牌获取用户信息失败: {e}")
             return None
     
-    def check_permission(self, user_id: int, permission: str, resource: str = None) -> bool:
-        """检查用户权限"""
+    def get_user_access(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """获取用户角色和 user_permissions 中的权限（带缓存），用户不存在返回None"""
+        access = self.cache.get_user(user_id)
+        if access is not None:
+            return access
         try:
             conn = self.db._get_connection()
             cursor = conn.cursor()
             
-            # 检查用户角色
-            cursor.execute('SELECT role FROM users WHERE id = %s', (user_id,))
+            cursor.execute('SELECT role, is_active FROM users WHERE id = %s', (user_id,))
             user = cursor.fetchone()
-            
             if not user:
                 conn.close()
-                return False
-            
-            # 管理员拥有所有权限
-            if user['role'] == 'admin':
-                conn.close()
-                return True
-            
-            # 检查具体权限
-            if resource:
-                cursor.execute('''
-                    SELECT id FROM user_permissions 
-                    WHERE user_id = %s AND permission = %s AND (resource = %s OR resource IS NULL)
-                ''', (user_id, permission, resource))
-            else:
-                cursor.execute('''
-                    SELECT id FROM user_permissions 
-                    WHERE user_id = %s AND permission = %s
-                ''', (user_id, permission))
+                return None
             
-            result = cursor.fetchone()
+            cursor.execute('SELECT permission, resource FROM user_permissions WHERE user_id = %s', (user_id,))
+            permissions = frozenset((row['permission'], row['resource']) for row in cursor.fetchall())
             conn.close()
             
-            return result is not None
+            self.cache.put_user(user_id, user['role'], bool(user['is_active']), permissions)
+            return self.cache.get_user(user_id)
             
         except Exception as e:
-            print(f"检查用户权限失败: {e}")
+            print(f"获取用户权限失败: {e}")
+            return None
+    
+    def check_permission(self, user_id: int, permission: str, resource: str = None) -> bool:
+        """检查用户权限"""
+        access = self.get_user_access(user_id)
+        if not access:
             return False
+        
+        # 管理员拥有所有权限
+        if access['role'] == 'admin':
+            return True
+        
+        # 检查具体权限（resource 为空的授权适用于所有资源）
+        permissions = access['permissions']
+        if resource:
+            return (permission, resource) in permissions or (permission, None) in permissions
+        return any(granted == permission for granted, _ in permissions)
     
     def grant_permission(self, user_id: int, permission: str, resource: str = None, granted_by: int = None) -> bool:
         """授予用户权限"""
@@ -361,6 +351,7 @@ class AuthManager:
             ''', (user_id, permission, resource, granted_by))
             
             conn.close()
+            self.cache.revoke_user(user_id)
             return True
             
         except Exception as e:
@@ -516,34 +507,74 @@ class AuthManager:
 
             cursor.execute(sql, tuple(update_values))
             conn.close()
+            # 角色、启用状态、用户名等变更后，已缓存的会话需要重新加载
+            self.cache.revoke_user(user_id)
             return True
 
         except Exception as e:
             print(f"更新用户信息失败: {e}")
             return False
 
-    def change_user_password(self, user_id: int, new_password: str) -> bool:
-        """修改用户密码"""
+    async def change_user_password(self, user_id: int, new_password: str) -> bool:
+        """
+        修改用户密码，并使该用户的所有会话失效
+
+        Raises:
+            PasswordHasherBusy: 密码哈希排队已满
+        """
+        # 生成新的密码哈希
+        password_hash, salt = await self.hasher.hash(new_password)
         try:
             conn = self.db._get_connection()
             cursor = conn.cursor()
 
-            # 生成新的密码哈希
-            password_hash, salt = self.hash_password(new_password)
-
             cursor.execute('''
                 UPDATE users
                 SET password_hash = %s, salt = %s
                 WHERE id = %s
             ''', (password_hash, salt, user_id))
 
+            cursor.execute('''
+                UPDATE user_sessions
+                SET is_active = FALSE
+                WHERE user_id = %s
+            ''', (user_id,))
+
             conn.close()
+            self.cache.revoke_user(user_id)
             return True
 
         except Exception as e:
             print(f"修改用户密码失败: {e}")
             return False
 
+    async def change_password(self, user_id: int, current_password: str, new_password: str) -> bool:
+        """用户修改自己的密码（需验证当前密码）"""
+        try:
+            conn = self.db._get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT password_hash, salt FROM users WHERE id = %s', (user_id,))
+            user = cursor.fetchone()
+            conn.close()
+        except Exception as e:
+            print(f"修改密码失败: {e}")
+            return False
+
+        if not user:
+            return False
+        ok, _ = await self.hasher.verify(current_password, user['password_hash'], user['salt'])
+        if not ok:
+            return False
+
+        return await self.change_user_password(user_id, new_password)
+
+    async def reset_password(self, user_id: int) -> Optional[str]:
+        """管理员重置用户密码，返回生成的新密码"""
+        new_password = secrets.token_urlsafe(9)
+        if not await self.change_user_password(user_id, new_password):
+            return None
+        return new_password
+
     def delete_user(self, user_id: int) -> bool:
         """删除用户（物理删除）"""
         try:
@@ -557,6 +588,8 @@ class AuthManager:
             cursor.execute('DELETE FROM users WHERE id = %s', (user_id,))
             conn.commit()
             cursor.close()
+            self.cache.revoke_user(user_id)
+            get_permission_versions().bump_user(user_id)
             
             return cursor.rowcount > 0
         except Exception as e:
@@ -12,134 +12,6 @@ class JobManager:
     
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
-        self.init_job_tables()
-    
-    def init_job_tables(self):
-        """初始化作业相关数据库表"""
-        try:
-            conn = self.db._get_connection()
-            cursor = conn.cursor()
-            
-            # 创建作业模板表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS job_templates (
-                    id VARCHAR(64) PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    project_id INT NOT NULL,
-                    category VARCHAR(50) DEFAULT 'custom',
-                    tags JSON,
-                    steps JSON NOT NULL,
-                    default_params JSON,
-                    timeout INT DEFAULT 7200,
-                    created_by INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    version INT DEFAULT 1,
-                    INDEX idx_name (name),
-                    INDEX idx_category (category),
-                    INDEX idx_created_by (created_by),
-                    INDEX idx_created_at (created_at),
-                    INDEX idx_project_id (project_id)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 创建作业实例表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS job_instances (
-                    id VARCHAR(64) PRIMARY KEY,
-                    template_id VARCHAR(64),
-                    name VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    project_id INT NOT NULL,
-                    status VARCHAR(20) DEFAULT 'PENDING',
-                    priority INT DEFAULT 5,
-                    params JSON,
-                    target_hosts JSON,
-                    steps_status JSON,
-                    current_step INT DEFAULT 0,
-                    total_steps INT DEFAULT 0,
-                    created_by INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    started_at TIMESTAMP NULL,
-                    completed_at TIMESTAMP NULL,
-                    timeout INT DEFAULT 7200,
-                    retry_count INT DEFAULT 0,
-                    max_retries INT DEFAULT 3,
-                    error_message TEXT,
-                    execution_log JSON,
-                    FOREIGN KEY (template_id) REFERENCES job_templates (id) ON DELETE SET NULL,
-                    INDEX idx_template_id (template_id),
-                    INDEX idx_status (status),
-                    INDEX idx_priority (priority),
-                    INDEX idx_created_by (created_by),
-                    INDEX idx_created_at (created_at),
-                    INDEX idx_project_id (project_id)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 创建作业步骤执行记录表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS job_step_executions (
-                    id VARCHAR(64) PRIMARY KEY,
-                    job_instance_id VARCHAR(64) NOT NULL,
-                    project_id INT NOT NULL,
-                    step_index INT NOT NULL,
-                    step_name VARCHAR(255) NOT NULL,
-                    step_type VARCHAR(50) NOT NULL,
-                    status VARCHAR(20) DEFAULT 'PENDING',
-                    started_at TIMESTAMP NULL,
-                    completed_at TIMESTAMP NULL,
-                    execution_time DECIMAL(10,3),
-                    task_id VARCHAR(64),
-                    results JSON,
-                    error_message TEXT,
-                    retry_count INT DEFAULT 0,
-                    FOREIGN KEY (job_instance_id) REFERENCES job_instances (id) ON DELETE CASCADE,
-                    INDEX idx_job_instance_id (job_instance_id),
-                    INDEX idx_step_index (step_index),
-                    INDEX idx_status (status),
-                    INDEX idx_task_id (task_id),
-                    INDEX idx_project_id (project_id)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 创建作业调度表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS job_schedules (
-                    id VARCHAR(64) PRIMARY KEY,
-                    template_id VARCHAR(64) NOT NULL,
-                    name VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    cron_expression VARCHAR(100) NOT NULL,
-                    timezone VARCHAR(50) DEFAULT 'Asia/Shanghai',
-                    is_active BOOLEAN DEFAULT TRUE,
-                    params JSON,
-                    target_hosts JSON,
-                    created_by INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    last_run_at TIMESTAMP NULL,
-                    next_run_at TIMESTAMP NULL,
-                    run_count INT DEFAULT 0,
-                    FOREIGN KEY (template_id) REFERENCES job_templates (id) ON DELETE CASCADE,
-                    INDEX idx_template_id (template_id),
-                    INDEX idx_is_active (is_active),
-                    INDEX idx_next_run_at (next_run_at),
-                    INDEX idx_created_by (created_by)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            conn.close()
-            
-            # 注意：默认模板需要属于某个项目，暂不自动创建
-            # 用户可以在创建项目后手动创建模板
-            print("作业表初始化成功")
-            
-        except Exception as e:
-            print(f"初始化作业表失败: {e}")
-            raise
     
     def create_default_templates(self):
         """创建默认作业模板"""
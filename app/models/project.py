@@ -7,6 +7,9 @@ import uuid
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from app.models import DatabaseManager
+from app.permissions import (
+    PermissionSnapshot, ROLE_DEFAULT_PERMISSIONS, compile_snapshot, get_permission_versions
+)
 
 
 class ProjectManager:
@@ -14,57 +17,6 @@ class ProjectManager:
 
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
-        self.init_project_tables()
-
-    def init_project_tables(self):
-        """初始化项目相关数据库表"""
-        try:
-            conn = self.db._get_connection()
-            cursor = conn.cursor()
-
-            # 创建项目表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS projects (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    project_code VARCHAR(50) UNIQUE NOT NULL,
-                    project_name VARCHAR(100) NOT NULL,
-                    description TEXT,
-                    status VARCHAR(20) DEFAULT 'active',
-                    created_by INT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    INDEX idx_project_code (project_code),
-                    INDEX idx_status (status),
-                    INDEX idx_created_by (created_by),
-                    INDEX idx_created_at (created_at)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-
-            # 创建项目成员表（用户与项目的多对多关系）
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS project_members (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    project_id INT NOT NULL,
-                    user_id INT NOT NULL,
-                    role VARCHAR(50) DEFAULT 'readonly',
-                    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    invited_by INT,
-                    status VARCHAR(20) DEFAULT 'active',
-                    FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                    FOREIGN KEY (invited_by) REFERENCES users (id) ON DELETE SET NULL,
-                    UNIQUE KEY unique_project_user (project_id, user_id),
-                    INDEX idx_project_id (project_id),
-                    INDEX idx_user_id (user_id),
-                    INDEX idx_role (role)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-
-            conn.close()
-
-        except Exception as e:
-            print(f"初始化项目表失败: {e}")
-            raise
 
     def generate_project_code(self) -> str:
         """生成唯一的项目代码"""
@@ -126,6 +78,8 @@ class ProjectManager:
                 ''', (project_id, created_by, created_by))
 
             conn.close()
+            if created_by:
+                get_permission_versions().bump_user(created_by)
             
             # 返回创建的项目信息
             return self.get_project_by_id(project_id)
@@ -327,6 +281,7 @@ class ProjectManager:
                         SET status = 'active', role = %s, joined_at = CURRENT_TIMESTAMP
                         WHERE id = %s
                     ''', (role, existing['id']))
+                    get_permission_versions().bump_user(user_id)
                 conn.close()
                 return True
 
@@ -337,6 +292,7 @@ class ProjectManager:
             ''', (project_id, user_id, role, invited_by))
 
             conn.close()
+            get_permission_versions().bump_user(user_id)
             return True
 
         except Exception as e:
@@ -356,6 +312,7 @@ class ProjectManager:
             ''', (project_id, user_id))
 
             conn.close()
+            get_permission_versions().bump_user(user_id)
             return True
 
         except Exception as e:
@@ -454,6 +411,7 @@ class ProjectManager:
             ''', (role, project_id, user_id))
 
             conn.close()
+            get_permission_versions().bump_user(user_id)
             return True
 
         except Exception as e:
@@ -526,6 +484,7 @@ class ProjectManager:
             ''', (project_id, user_id, permission_key, granted_by, granted_by))
             
             conn.close()
+            get_permission_versions().bump_user(user_id)
             return True
             
         except Exception as e:
@@ -546,79 +505,61 @@ class ProjectManager:
             ''', (project_id, user_id, permission_key))
             
             conn.close()
+            get_permission_versions().bump_user(user_id)
             return True
             
         except Exception as e:
             print(f"撤销功能权限失败: {e}")
             return False
     
-    def check_permission(self, project_id: int, user_id: int,
-                        permission_key: str, user_role: str = None) -> bool:
-        """检查用户是否拥有某个功能权限"""
+    def load_permission_snapshot(self, project_id: int, user_id: int,
+                                 version: int = 0) -> Optional[PermissionSnapshot]:
+        """
+        一次查询加载用户在项目中的成员角色和显式权限设置，编译成权限快照
+
+        Args:
+            version: 快照版本（加载前读取的权限版本计数）
+
+        Returns:
+            权限快照（不是成员时 role 为 None），查询失败返回None
+        """
         try:
-            # 系统admin拥有所有权限
-            if user_role in ['admin', 'super_admin']:
-                return True
-            
             conn = self.db._get_connection()
             cursor = conn.cursor()
             
-            # 检查用户是否是项目成员
             cursor.execute('''
-                SELECT role FROM project_members
-                WHERE project_id = %s AND user_id = %s AND status = 'active'
+                SELECT pm.role, pmp.permission_key, pmp.is_allowed
+                FROM project_members pm
+                LEFT JOIN project_member_permissions pmp
+                    ON pmp.project_id = pm.project_id AND pmp.user_id = pm.user_id
+                WHERE pm.project_id = %s AND pm.user_id = %s AND pm.status = 'active'
             ''', (project_id, user_id))
             
-            member = cursor.fetchone()
-            if not member:
-                conn.close()
-                return False
-            
-            # 项目admin拥有所有权限
-            if member['role'] == 'admin':
-                conn.close()
-                return True
-            
-            # 检查具体的功能权限
-            cursor.execute('''
-                SELECT is_allowed FROM project_member_permissions
-                WHERE project_id = %s AND user_id = %s AND permission_key = %s
-            ''', (project_id, user_id, permission_key))
-            
-            permission = cursor.fetchone()
+            rows = cursor.fetchall()
             conn.close()
             
-            # 如果有明确的权限设置,使用该设置
-            if permission:
-                return permission['is_allowed']
+            if not rows:
+                return compile_snapshot(user_id, project_id, None, {}, version)
             
-            # 如果没有明确设置,使用默认权限
-            return self._get_default_permission(member['role'], permission_key)
+            overrides = {
+                row['permission_key']: bool(row['is_allowed'])
+                for row in rows if row['permission_key'] is not None
+            }
+            return compile_snapshot(user_id, project_id, rows[0]['role'], overrides, version)
             
         except Exception as e:
-            print(f"检查功能权限失败: {e}")
-            return False
+            print(f"加载权限快照失败: {e}")
+            return None
     
-    def _get_default_permission(self, role: str, permission_key: str) -> bool:
-        """获取角色的默认权限"""
-        # readwrite角色的默认权限
-        readwrite_permissions = [
-            'agent.view', 'agent.execute',
-            'job.view', 'job.create', 'job.execute',
-            'execution.view'
-        ]
-        
-        # readonly角色的默认权限
-        readonly_permissions = [
-            'agent.view', 'job.view', 'execution.view'
-        ]
-        
-        if role == 'readwrite':
-            return permission_key in readwrite_permissions
-        elif role == 'readonly':
-            return permission_key in readonly_permissions
+    def check_permission(self, project_id: int, user_id: int,
+                        permission_key: str, user_role: str = None) -> bool:
+        """检查用户是否拥有某个功能权限"""
+        # 系统admin拥有所有权限
+        if user_role in ['admin', 'super_admin']:
+            return True
         
-        return False
+        snapshot = self.load_permission_snapshot(project_id, user_id)
+        return snapshot is not None and snapshot.allows(permission_key)
     
     def get_user_permissions(self, project_id: int, user_id: int) -> List[str]:
         """获取用户在项目中的所有权限"""
@@ -668,22 +609,7 @@ class ProjectManager:
     
     def _get_all_default_permissions(self, role: str) -> List[str]:
         """获取角色的所有默认权限"""
-        readwrite_permissions = [
-            'agent.view', 'agent.execute',
-            'job.view', 'job.create', 'job.execute',
-            'execution.view'
-        ]
-        
-        readonly_permissions = [
-            'agent.view', 'job.view', 'execution.view'
-        ]
-        
-        if role == 'readwrite':
-            return readwrite_permissions
-        elif role == 'readonly':
-            return readonly_permissions
-        
-        return []
+        return list(ROLE_DEFAULT_PERMISSIONS.get(role, []))
     
     def set_user_permissions(self, project_id: int, user_id: int,
                             permissions: List[str], granted_by: int) -> bool:
@@ -708,6 +634,7 @@ class ProjectManager:
                 ''', values)
             
             conn.close()
+            get_permission_versions().bump_user(user_id)
             return True
             
         except Exception as e:
@@ -13,103 +13,6 @@ class SimpleJobManager:
     
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
-        self.init_tables()
-    
-    def init_tables(self):
-        """初始化数据库表"""
-        try:
-            conn = self.db._get_connection()
-            cursor = conn.cursor()
-            
-            # 作业表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS simple_jobs (
-                    id VARCHAR(64) PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    project_id INT NOT NULL,
-                    created_by INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    INDEX idx_name (name),
-                    INDEX idx_created_at (created_at),
-                    INDEX idx_project_id (project_id)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 作业主机组表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS simple_job_host_groups (
-                    id VARCHAR(64) PRIMARY KEY,
-                    job_id VARCHAR(64) NOT NULL,
-                    group_name VARCHAR(255) NOT NULL,
-                    host_ids JSON NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (job_id) REFERENCES simple_jobs (id) ON DELETE CASCADE,
-                    INDEX idx_job_id (job_id)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 作业变量表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS simple_job_variables (
-                    id VARCHAR(64) PRIMARY KEY,
-                    job_id VARCHAR(64) NOT NULL,
-                    var_name VARCHAR(255) NOT NULL,
-                    var_value TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (job_id) REFERENCES simple_jobs (id) ON DELETE CASCADE,
-                    INDEX idx_job_id (job_id),
-                    UNIQUE KEY unique_job_var (job_id, var_name)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 作业步骤表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS simple_job_steps (
-                    id VARCHAR(64) PRIMARY KEY,
-                    job_id VARCHAR(64) NOT NULL,
-                    step_order INT NOT NULL,
-                    step_name VARCHAR(255) NOT NULL,
-                    script_content TEXT NOT NULL,
-                    host_group_id VARCHAR(64),
-                    timeout INT DEFAULT 300,
-                    FOREIGN KEY (job_id) REFERENCES simple_jobs (id) ON DELETE CASCADE,
-                    FOREIGN KEY (host_group_id) REFERENCES simple_job_host_groups (id) ON DELETE SET NULL,
-                    INDEX idx_job_id (job_id),
-                    INDEX idx_step_order (step_order)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            # 作业执行历史表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS simple_job_executions (
-                    id VARCHAR(64) PRIMARY KEY,
-                    job_id VARCHAR(64) NOT NULL,
-                    job_name VARCHAR(255),
-                    project_id INT NOT NULL,
-                    status VARCHAR(20) DEFAULT 'PENDING',
-                    current_step INT DEFAULT 0,
-                    total_steps INT DEFAULT 0,
-                    started_at TIMESTAMP NULL,
-                    completed_at TIMESTAMP NULL,
-                    error_message TEXT,
-                    execution_log JSON,
-                    results JSON,
-                    FOREIGN KEY (job_id) REFERENCES simple_jobs (id) ON DELETE CASCADE,
-                    INDEX idx_job_id (job_id),
-                    INDEX idx_status (status),
-                    INDEX idx_started_at (started_at),
-                    INDEX idx_project_id (project_id)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-            
-            conn.close()
-            print("简单作业表初始化成功")
-            
-        except Exception as e:
-            print(f"初始化作业表失败: {e}")
-            raise
     
     # ==================== 作业管理 ====================
     
@@ -719,6 +622,7 @@ class SimpleJobManager:
                         current_step: int = None, error_message: str = None,
                         log_entry: str = None, results: Dict = None) -> bool:
         """更新作业执行状态"""
+        conn = None
         try:
             conn = self.db._get_connection()
             cursor = conn.cursor()
@@ -743,50 +647,120 @@ class SimpleJobManager:
                 params.append(error_message)
             
             if log_entry is not None:
-                # 获取当前日志并追加
-                cursor.execute('SELECT execution_log FROM simple_job_executions WHERE id = %s', (execution_id,))
-                result = cursor.fetchone()
-                current_log = json.loads(result['execution_log']) if result and result['execution_log'] else []
-                current_log.append({
-                    'time': datetime.now().isoformat(),
-                    'message': log_entry
-                })
-                updates.append("execution_log = %s")
-                params.append(json.dumps(current_log))
+                # 日志追加到执行日志表（不再读取和重写整个JSON数组）
+                cursor.execute('''
+                    INSERT INTO simple_job_execution_logs (execution_id, seq, created_at, message)
+                    SELECT %s, COALESCE(MAX(seq), 0) + 1, %s, %s
+                    FROM simple_job_execution_logs WHERE execution_id = %s
+                ''', (execution_id, datetime.now(), log_entry, execution_id))
             
             if results is not None:
                 updates.append("results = %s")
                 params.append(json.dumps(results))
             
-            if not updates:
-                return True
-            
-            params.append(execution_id)
-            sql = f"UPDATE simple_job_executions SET {', '.join(updates)} WHERE id = %s"
-            cursor.execute(sql, params)
+            if updates:
+                params.append(execution_id)
+                sql = f"UPDATE simple_job_executions SET {', '.join(updates)} WHERE id = %s"
+                cursor.execute(sql, params)
             
             conn.commit()
-            conn.close()
             return True
             
         except Exception as e:
             print(f"更新执行状态失败: {e}")
             return False
+        finally:
+            # 只追加日志时没有字段更新，也要归还连接
+            if conn is not None:
+                conn.close()
+    
+    def append_execution_logs(self, entries: List[tuple]) -> bool:
+        """
+        批量追加执行日志
+        
+        Args:
+            entries: [(execution_id, seq, created_at, message), ...]，序号由调用方分配
+        """
+        if not entries:
+            return True
+        try:
+            conn = self.db._get_connection()
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT IGNORE INTO simple_job_execution_logs (execution_id, seq, created_at, message)
+                VALUES (%s, %s, %s, %s)
+            ''', entries)
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"追加执行日志失败: {e}")
+            return False
     
-    def get_execution(self, execution_id: str) -> Optional[Dict]:
+    def get_execution_logs(self, execution_id: str, after_seq: int = 0, limit: int = 1000) -> List[Dict]:
+        """获取序号大于 after_seq 的执行日志"""
+        try:
+            conn = self.db._get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT seq, created_at, message
+                FROM simple_job_execution_logs
+                WHERE execution_id = %s AND seq > %s
+                ORDER BY seq
+                LIMIT %s
+            ''', (execution_id, after_seq, limit))
+            rows = cursor.fetchall()
+            conn.close()
+            return [
+                {
+                    'seq': row['seq'],
+                    'time': row['created_at'].isoformat() if row['created_at'] else None,
+                    'message': row['message']
+                }
+                for row in rows
+            ]
+        except Exception as e:
+            print(f"获取执行日志失败: {e}")
+            return []
+    
+    def get_execution(self, execution_id: str, include_log: bool = True) -> Optional[Dict]:
         """获取执行记录详情"""
         try:
             conn = self.db._get_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT e.*, j.name as job_name_ref
+                SELECT e.id, e.job_id, e.job_name, e.project_id, e.status, e.current_step,
+                       e.total_steps, e.started_at, e.completed_at, e.error_message, e.results,
+                       j.name as job_name_ref
                 FROM simple_job_executions e
                 LEFT JOIN simple_jobs j ON e.job_id = j.id
                 WHERE e.id = %s
             ''', (execution_id,))
             
             execution = cursor.fetchone()
+            
+            execution_log = []
+            if execution and include_log:
+                cursor.execute('''
+                    SELECT seq, created_at, message
+                    FROM simple_job_execution_logs
+                    WHERE execution_id = %s
+                    ORDER BY seq
+                ''', (execution_id,))
+                execution_log = [
+                    {
+                        'seq': row['seq'],
+                        'time': row['created_at'].isoformat() if row['created_at'] else None,
+                        'message': row['message']
+                    }
+                    for row in cursor.fetchall()
+                ]
+                if not execution_log:
+                    # 兼容日志表之前写入 execution_log 字段的旧记录
+                    cursor.execute('SELECT execution_log FROM simple_job_executions WHERE id = %s', (execution_id,))
+                    legacy = cursor.fetchone()
+                    execution_log = json.loads(legacy['execution_log']) if legacy and legacy['execution_log'] else []
             conn.close()
             
             if not execution:
@@ -803,7 +777,8 @@ class SimpleJobManager:
                 'started_at': execution['started_at'].isoformat() if execution['started_at'] else None,
                 'completed_at': execution['completed_at'].isoformat() if execution['completed_at'] else None,
                 'error_message': execution['error_message'],
-                'execution_log': json.loads(execution['execution_log']) if execution['execution_log'] else [],
+                'execution_log': execution_log,
+                'last_seq': execution_log[-1].get('seq', len(execution_log)) if execution_log else 0,
                 'results': json.loads(execution['results']) if execution['results'] else {}
             }
             
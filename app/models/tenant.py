@@ -14,94 +14,7 @@ class TenantManager:
 
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
-        self.init_tenant_tables()
-
-    def init_tenant_tables(self):
-        """初始化租户相关数据库表"""
-        try:
-            conn = self.db._get_connection()
-            cursor = conn.cursor()
-
-            # 创建租户表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tenants (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    tenant_code VARCHAR(50) UNIQUE NOT NULL,
-                    tenant_name VARCHAR(100) NOT NULL,
-                    description TEXT,
-                    status VARCHAR(20) DEFAULT 'active',
-                    max_users INT DEFAULT 10,
-                    max_agents INT DEFAULT 50,
-                    max_concurrent_jobs INT DEFAULT 10,
-                    storage_quota_gb INT DEFAULT 100,
-                    contact_name VARCHAR(100),
-                    contact_email VARCHAR(100),
-                    contact_phone VARCHAR(20),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    created_by INT,
-                    INDEX idx_tenant_code (tenant_code),
-                    INDEX idx_status (status),
-                    INDEX idx_created_at (created_at)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-
-            # 创建租户成员表（用户与租户的多对多关系）
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tenant_members (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    tenant_id INT NOT NULL,
-                    user_id INT NOT NULL,
-                    role VARCHAR(50) DEFAULT 'tenant_member',
-                    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    invited_by INT,
-                    status VARCHAR(20) DEFAULT 'active',
-                    FOREIGN KEY (tenant_id) REFERENCES tenants (id) ON DELETE CASCADE,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                    FOREIGN KEY (invited_by) REFERENCES users (id) ON DELETE SET NULL,
-                    UNIQUE KEY unique_tenant_user (tenant_id, user_id),
-                    INDEX idx_tenant_id (tenant_id),
-                    INDEX idx_user_id (user_id),
-                    INDEX idx_role (role)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-
-            # 创建租户资源使用统计表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tenant_usage_stats (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    tenant_id INT NOT NULL,
-                    stat_date DATE NOT NULL,
-                    active_users INT DEFAULT 0,
-                    active_agents INT DEFAULT 0,
-                    total_jobs INT DEFAULT 0,
-                    successful_jobs INT DEFAULT 0,
-                    failed_jobs INT DEFAULT 0,
-                    storage_used_gb DECIMAL(10,2) DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (tenant_id) REFERENCES tenants (id) ON DELETE CASCADE,
-                    UNIQUE KEY unique_tenant_date (tenant_id, stat_date),
-                    INDEX idx_tenant_id (tenant_id),
-                    INDEX idx_stat_date (stat_date)
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            ''')
-
-            # 检查users表是否存在default_tenant_id字段
-            cursor.execute("SHOW COLUMNS FROM users LIKE 'default_tenant_id'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE users ADD COLUMN default_tenant_id INT DEFAULT NULL AFTER role")
-                cursor.execute("ALTER TABLE users ADD INDEX idx_default_tenant_id (default_tenant_id)")
-                print("数据库迁移：添加default_tenant_id字段到users表")
-
-            conn.close()
-
-            # 创建默认租户
-            self.create_default_tenant()
-
-        except Exception as e:
-            print(f"初始化租户表失败: {e}")
-            raise
+        self.create_default_tenant()
 
     def create_default_tenant(self):
         """创建默认租户"""
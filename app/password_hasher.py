@@ -0,0 +1,179 @@
+"""
+密码哈希线程池
+
+PBKDF2-SHA256（默认10万次迭代）单次需要几十毫秒，直接在路由协程中计算会阻塞 API 事件循环，
+一波登录请求或撞库就能让 /health 和其他接口一起卡住。PasswordHasher 把哈希和校验放到
+专用的有界线程池中执行（hashlib 计算期间释放GIL），排队已满时立即抛出 PasswordHasherBusy，
+由 API 返回 429。
+
+哈希格式为 pbkdf2_sha256$<迭代次数>$<十六进制摘要>，迭代次数随哈希保存；
+旧格式（只有十六进制摘要）按10万次迭代校验。配置的迭代次数提高后，
+用户下次登录成功时按新的迭代次数重新计算哈希（needs_rehash）。
+"""
+import asyncio
+import functools
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = 'pbkdf2_sha256'
+LEGACY_ITERATIONS = 100000  # 旧格式哈希使用的迭代次数
+DEFAULT_ITERATIONS = 100000
+
+
+class PasswordHasherBusy(RuntimeError):
+    """密码哈希排队已满"""
+
+
+def pbkdf2(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), iterations).hex()
+
+
+def encode_hash(digest: str, iterations: int) -> str:
+    return f"{ALGORITHM}${iterations}${digest}"
+
+
+def parse_hash(password_hash: str) -> Tuple[int, str]:
+    """解析保存的哈希，返回 (迭代次数, 摘要)"""
+    if password_hash and password_hash.startswith(ALGORITHM + '$'):
+        _, iterations, digest = password_hash.split('$', 2)
+        return int(iterations), digest
+    return LEGACY_ITERATIONS, password_hash or ''
+
+
+def make_password(password: str, iterations: int = DEFAULT_ITERATIONS, salt: str = None) -> Tuple[str, str]:
+    """同步计算密码哈希，返回 (哈希, 盐)"""
+    if salt is None:
+        salt = secrets.token_hex(16)
+    return encode_hash(pbkdf2(password, salt, iterations), iterations), salt
+
+
+def check_password(password: str, password_hash: str, salt: str, iterations: int = DEFAULT_ITERATIONS) -> Tuple[bool, bool]:
+    """同步校验密码，返回 (是否正确, 是否需要按当前迭代次数重新哈希)"""
+    stored_iterations, digest = parse_hash(password_hash)
+    ok = hmac.compare_digest(pbkdf2(password, salt, stored_iterations), digest)
+    needs_rehash = ok and (stored_iterations < iterations or not password_hash.startswith(ALGORITHM + '$'))
+    return ok, needs_rehash
+
+
+class PasswordHasher:
+    """有界线程池中的密码哈希和校验"""
+
+    def __init__(self, iterations: int = DEFAULT_ITERATIONS, max_workers: int = 2, max_pending: int = 32):
+        """
+        Args:
+            iterations: 新哈希使用的迭代次数
+            max_workers: 哈希线程数
+            max_pending: 最大排队+执行中的请求数，超出时抛出 PasswordHasherBusy
+        """
+        self.iterations = iterations
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='qunkong-hash')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._latencies = deque(maxlen=1000)  # 最近的计算耗时（秒），用于分位数
+        self._stats = {
+            'hashes': 0,
+            'verifies': 0,
+            'failures': 0,
+            'rehashes': 0,
+            'rejected': 0,
+            'total_time': 0.0,
+            'max_time': 0.0,
+            'total_wait': 0.0,
+        }
+
+    @property
+    def pending(self) -> int:
+        """排队和执行中的请求数"""
+        return self._pending
+
+    async def _run(self, func, *args) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                raise PasswordHasherBusy(f"密码哈希排队已满: {self._pending}")
+            self._pending += 1
+
+        submitted = time.monotonic()
+        timing = {}
+
+        def timed():
+            timing['started'] = time.monotonic()
+            try:
+                return func(*args)
+            finally:
+                timing['finished'] = time.monotonic()
+
+        try:
+            work = self.executor.submit(timed)
+        except Exception:
+            self._release(None)
+            raise
+        # 名额挂在线程池的 future 上释放：await 被取消时哈希可能仍在线程中计算，算完才归还
+        work.add_done_callback(self._release)
+        try:
+            return await asyncio.wrap_future(work)
+        finally:
+            if 'finished' in timing:
+                elapsed = timing['finished'] - timing['started']
+                with self._lock:
+                    self._latencies.append(elapsed)
+                    self._stats['total_time'] += elapsed
+                    self._stats['total_wait'] += timing['started'] - submitted
+                    if elapsed > self._stats['max_time']:
+                        self._stats['max_time'] = elapsed
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> Tuple[str, str]:
+        """计算新密码的哈希，返回 (哈希, 盐)"""
+        result = await self._run(functools.partial(make_password, password, self.iterations))
+        with self._lock:
+            self._stats['hashes'] += 1
+        return result
+
+    async def verify(self, password: str, password_hash: str, salt: str) -> Tuple[bool, bool]:
+        """校验密码，返回 (是否正确, 是否需要重新哈希)"""
+        ok, needs_rehash = await self._run(check_password, password, password_hash, salt, self.iterations)
+        with self._lock:
+            self._stats['verifies'] += 1
+            if not ok:
+                self._stats['failures'] += 1
+        return ok, needs_rehash
+
+    def record_rehash(self):
+        with self._lock:
+            self._stats['rehashes'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """哈希耗时和排队统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        calls = stats['hashes'] + stats['verifies']
+        stats['pending'] = self._pending
+        stats['queue_depth'] = max(0, self._pending - self.max_workers)
+        stats['max_workers'] = self.max_workers
+        stats['max_pending'] = self.max_pending
+        stats['iterations'] = self.iterations
+        stats['avg_time'] = stats['total_time'] / calls if calls else 0.0
+        stats['avg_wait'] = stats['total_wait'] / calls if calls else 0.0
+        stats['p50_time'] = latencies[len(latencies) // 2] if latencies else 0.0
+        stats['p95_time'] = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else stats['max_time']
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        self.executor.shutdown(wait=wait)
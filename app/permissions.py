@@ -0,0 +1,177 @@
+"""
+项目功能权限快照
+
+用户在某个项目中的权限（成员角色、project_member_permissions 中的显式设置、角色默认权限）
+一次查询加载后编译成位集快照，之后的权限检查只是一次位运算。
+
+快照带版本号：PermissionVersions 维护一个递增计数器，成员或权限变更时把涉及的用户/项目
+标记为当前计数（bump），早于标记的快照立即作废；变更通过 ClusterManager 广播给其他节点。
+加载前先读取计数器作为快照版本，加载期间发生的变更同样会使这次加载的结果作废。
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 已知的功能权限（顺序决定位编号，只追加不调整；其他权限标识在首次使用时分配位）
+PERMISSION_KEYS = [
+    'agent.view', 'agent.batch_add', 'agent.execute', 'agent.terminal',
+    'agent.restart', 'agent.delete', 'terminal.access',
+    'job.view', 'job.create', 'job.edit', 'job.delete', 'job.execute',
+    'execution.view', 'execution.stop',
+    'project.member_manage',
+]
+
+# 项目角色的默认权限（项目 admin 拥有所有权限）
+ROLE_DEFAULT_PERMISSIONS = {
+    'readwrite': ['agent.view', 'agent.execute', 'job.view', 'job.create', 'job.execute', 'execution.view'],
+    'readonly': ['agent.view', 'job.view', 'execution.view'],
+}
+
+# 角色权限层级: admin > readwrite > readonly
+ROLE_LEVELS = {'admin': 3, 'readwrite': 2, 'readonly': 1}
+
+_bits: Dict[str, int] = {key: 1 << i for i, key in enumerate(PERMISSION_KEYS)}
+_bits_lock = threading.Lock()
+
+
+def permission_bit(permission_key: str) -> int:
+    """权限标识对应的位（未知标识分配新位）"""
+    bit = _bits.get(permission_key)
+    if bit is None:
+        with _bits_lock:
+            bit = _bits.get(permission_key)
+            if bit is None:
+                bit = 1 << len(_bits)
+                _bits[permission_key] = bit
+    return bit
+
+
+def permission_mask(permission_keys: Iterable[str]) -> int:
+    mask = 0
+    for key in permission_keys:
+        mask |= permission_bit(key)
+    return mask
+
+
+_role_masks = {role: permission_mask(keys) for role, keys in ROLE_DEFAULT_PERMISSIONS.items()}
+
+
+@dataclass(frozen=True)
+class PermissionSnapshot:
+    """用户在项目中的权限快照（role 为 None 表示不是项目成员）"""
+    user_id: int
+    project_id: int
+    role: Optional[str]
+    bits: int
+    version: int
+
+    @property
+    def is_member(self) -> bool:
+        return self.role is not None
+
+    def allows(self, permission_key: str) -> bool:
+        """是否拥有功能权限"""
+        if self.role is None:
+            return False
+        if self.role == 'admin':
+            return True
+        return bool(self.bits & permission_bit(permission_key))
+
+    def has_role(self, required_role: str = None) -> bool:
+        """是否满足项目角色要求（required_role 为空时只要求是成员）"""
+        if self.role is None:
+            return False
+        if required_role is None:
+            return True
+        return ROLE_LEVELS.get(self.role, 0) >= ROLE_LEVELS.get(required_role, 0)
+
+    def permission_keys(self):
+        """快照中允许的权限标识"""
+        return [key for key, bit in list(_bits.items()) if self.bits & bit]
+
+
+def compile_snapshot(user_id: int, project_id: int, role: Optional[str],
+                     overrides: Dict[str, bool], version: int = 0) -> PermissionSnapshot:
+    """
+    编译权限快照
+
+    Args:
+        role: 项目成员角色，None 表示不是成员
+        overrides: project_member_permissions 中的显式设置 {权限标识: 是否允许}，优先于角色默认权限
+    """
+    if role is None:
+        return PermissionSnapshot(user_id, project_id, None, 0, version)
+    allowed = permission_mask(key for key, is_allowed in overrides.items() if is_allowed)
+    denied = permission_mask(key for key, is_allowed in overrides.items() if not is_allowed)
+    bits = (_role_masks.get(role, 0) | allowed) & ~denied
+    return PermissionSnapshot(user_id, project_id, role, bits, version)
+
+
+class PermissionVersions:
+    """权限版本：记录每个用户/项目最近一次变更时的计数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._users: Dict[int, int] = {}
+        self._projects: Dict[int, int] = {}
+        self.cluster = None
+
+    def current(self) -> int:
+        """当前计数，加载快照前读取作为快照版本"""
+        return self._counter
+
+    def is_current(self, version: int, user_id: int, project_id: int = None) -> bool:
+        """用该版本加载的数据之后，用户和项目是否都没有变更"""
+        if self._users.get(user_id, 0) > version:
+            return False
+        if project_id is not None and self._projects.get(project_id, 0) > version:
+            return False
+        return True
+
+    def bump(self, user_ids: Iterable[int] = (), project_ids: Iterable[int] = (), broadcast: bool = True):
+        """标记用户/项目的成员或权限已变更，之前的快照全部作废"""
+        user_ids = [int(u) for u in user_ids]
+        project_ids = [int(p) for p in project_ids]
+        if not user_ids and not project_ids:
+            return
+        with self._lock:
+            self._counter += 1
+            for user_id in user_ids:
+                self._users[user_id] = self._counter
+            for project_id in project_ids:
+                self._projects[project_id] = self._counter
+        if broadcast and self.cluster is not None:
+            self.cluster.broadcast_threadsafe({
+                'type': 'permission_invalidate',
+                'user_ids': user_ids,
+                'project_ids': project_ids,
+            })
+
+    def bump_user(self, user_id: int):
+        self.bump(user_ids=[user_id])
+
+    def bump_project(self, project_id: int):
+        self.bump(project_ids=[project_id])
+
+    def attach_cluster(self, cluster):
+        """接收其他节点的权限变更广播，并在本节点变更时广播"""
+        if cluster is None or not cluster.is_cluster_mode:
+            return
+        self.cluster = cluster
+        cluster.register_handler('permission_invalidate', self._on_cluster_invalidate)
+
+    async def _on_cluster_invalidate(self, data: dict):
+        self.bump(data.get('user_ids') or (), data.get('project_ids') or (), broadcast=False)
+        logger.debug(f"收到权限变更广播: {data}")
+
+
+_permission_versions = PermissionVersions()
+
+
+def get_permission_versions() -> PermissionVersions:
+    """获取全局权限版本"""
+    return _permission_versions
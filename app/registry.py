@@ -0,0 +1,272 @@
+"""
+Agent 内存注册表
+
+Agent 记录使用 __slots__ 和单调时钟时间戳，注册表在主索引（agent_id）之外维护
+IP、主机名、状态、项目的二级索引，使目标解析的开销只与目标数量相关。
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class AgentRecord:
+    """Agent信息"""
+
+    __slots__ = ('id', '_hostname', '_ip', '_status', '_project_id',
+                 'last_seen', 'registered_at', 'websocket', '_registry')
+
+    def __init__(self, id: str, hostname: str, ip: str, status: str = "ONLINE",
+                 websocket=None, project_id: Optional[int] = None, last_seen: float = None):
+        self.id = id
+        self._hostname = hostname
+        self._ip = ip
+        self._status = status
+        self._project_id = project_id
+        now = time.monotonic()
+        self.last_seen = now if last_seen is None else last_seen  # 最后心跳（单调时间）
+        self.registered_at = now
+        self.websocket = websocket
+        self._registry = None
+
+    def _set_indexed(self, field: str, value):
+        old = getattr(self, field)
+        if old == value:
+            return
+        registry = self._registry
+        if registry is None:
+            object.__setattr__(self, field, value)
+        else:
+            registry._reindex(self, field, old, value)
+
+    @property
+    def hostname(self) -> str:
+        return self._hostname
+
+    @hostname.setter
+    def hostname(self, value: str):
+        self._set_indexed('_hostname', value)
+
+    @property
+    def ip(self) -> str:
+        return self._ip
+
+    @ip.setter
+    def ip(self, value: str):
+        self._set_indexed('_ip', value)
+
+    @property
+    def status(self) -> str:
+        return self._status
+
+    @status.setter
+    def status(self, value: str):
+        self._set_indexed('_status', value)
+
+    @property
+    def project_id(self) -> Optional[int]:
+        return self._project_id
+
+    @project_id.setter
+    def project_id(self, value: Optional[int]):
+        self._set_indexed('_project_id', value)
+
+    def touch(self, now: float = None):
+        """记录一次心跳"""
+        self.last_seen = time.monotonic() if now is None else now
+
+    @property
+    def last_heartbeat(self) -> str:
+        """最后心跳的墙上时间（ISO格式，仅用于展示和持久化）"""
+        wall = time.time() - (time.monotonic() - self.last_seen)
+        return datetime.fromtimestamp(wall).isoformat()
+
+    def __repr__(self) -> str:
+        return f"AgentRecord(id={self.id!r}, hostname={self._hostname!r}, ip={self._ip!r}, status={self._status!r})"
+
+
+class AgentRegistry:
+    """
+    Agent 注册表
+
+    对外保持与 dict 相同的读写方式（in / [] / get / values / items / del），
+    记录的索引字段被修改时自动更新二级索引。
+    """
+
+    # 字段名 -> 索引属性名
+    _INDEXES = {
+        '_ip': '_by_ip',
+        '_hostname': '_by_hostname',
+        '_status': '_by_status',
+        '_project_id': '_by_project',
+    }
+
+    def __init__(self):
+        self._agents: Dict[str, AgentRecord] = {}
+        self._by_ip: Dict[str, Set[str]] = {}
+        self._by_hostname: Dict[str, Set[str]] = {}
+        self._by_status: Dict[str, Set[str]] = {}
+        self._by_project: Dict[Optional[int], Set[str]] = {}
+        self._lock = threading.RLock()
+
+    # ---- dict 兼容接口 ----
+
+    def __contains__(self, agent_id) -> bool:
+        return agent_id in self._agents
+
+    def __getitem__(self, agent_id: str) -> AgentRecord:
+        return self._agents[agent_id]
+
+    def __setitem__(self, agent_id: str, record: AgentRecord):
+        if record.id != agent_id:
+            raise ValueError(f"agent_id 不匹配: {agent_id} != {record.id}")
+        self.add(record)
+
+    def __delitem__(self, agent_id: str):
+        if self.remove(agent_id) is None:
+            raise KeyError(agent_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._agents))
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def get(self, agent_id: str, default=None) -> Optional[AgentRecord]:
+        return self._agents.get(agent_id, default)
+
+    def keys(self) -> List[str]:
+        return list(self._agents.keys())
+
+    def values(self) -> List[AgentRecord]:
+        return list(self._agents.values())
+
+    def items(self) -> List[Tuple[str, AgentRecord]]:
+        return list(self._agents.items())
+
+    # ---- 增删 ----
+
+    def add(self, record: AgentRecord) -> AgentRecord:
+        """注册Agent，同ID的旧记录会被替换"""
+        with self._lock:
+            old = self._agents.get(record.id)
+            if old is not None:
+                self._unindex(old)
+                old._registry = None
+            self._agents[record.id] = record
+            record._registry = self
+            for field, index_name in self._INDEXES.items():
+                self._index_add(getattr(self, index_name), getattr(record, field), record.id)
+        return record
+
+    def remove(self, agent_id: str) -> Optional[AgentRecord]:
+        """移除Agent"""
+        with self._lock:
+            record = self._agents.pop(agent_id, None)
+            if record is not None:
+                self._unindex(record)
+                record._registry = None
+        return record
+
+    def _unindex(self, record: AgentRecord):
+        for field, index_name in self._INDEXES.items():
+            self._index_discard(getattr(self, index_name), getattr(record, field), record.id)
+
+    @staticmethod
+    def _index_add(index: dict, key, agent_id: str):
+        bucket = index.get(key)
+        if bucket is None:
+            index[key] = {agent_id}
+        else:
+            bucket.add(agent_id)
+
+    @staticmethod
+    def _index_discard(index: dict, key, agent_id: str):
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.discard(agent_id)
+            if not bucket:
+                del index[key]
+
+    def _reindex(self, record: AgentRecord, field: str, old, new):
+        """记录索引字段变化时由 AgentRecord 回调"""
+        with self._lock:
+            index = getattr(self, self._INDEXES[field])
+            self._index_discard(index, old, record.id)
+            object.__setattr__(record, field, new)
+            self._index_add(index, new, record.id)
+
+    # ---- 查询 ----
+
+    def _lookup(self, index: dict, key) -> List[AgentRecord]:
+        with self._lock:
+            ids = index.get(key)
+            if not ids:
+                return []
+            agents = self._agents
+            return [agents[agent_id] for agent_id in ids]
+
+    def by_ip(self, ip: str) -> List[AgentRecord]:
+        return self._lookup(self._by_ip, ip)
+
+    def by_hostname(self, hostname: str) -> List[AgentRecord]:
+        return self._lookup(self._by_hostname, hostname)
+
+    def by_status(self, status: str) -> List[AgentRecord]:
+        return self._lookup(self._by_status, status)
+
+    def by_project(self, project_id: Optional[int]) -> List[AgentRecord]:
+        return self._lookup(self._by_project, project_id)
+
+    def count_status(self, status: str) -> int:
+        """指定状态的Agent数量"""
+        return len(self._by_status.get(status, ()))
+
+    def status_counts(self) -> Dict[str, int]:
+        """各状态的Agent数量"""
+        with self._lock:
+            return {status: len(ids) for status, ids in self._by_status.items()}
+
+    def count_by_project(self, status: str = None) -> Dict[Optional[int], int]:
+        """各项目的Agent数量（可按状态过滤），只做索引集合运算"""
+        with self._lock:
+            if status is None:
+                return {project_id: len(ids) for project_id, ids in self._by_project.items()}
+            matched = self._by_status.get(status, set())
+            return {project_id: len(ids & matched) for project_id, ids in self._by_project.items()}
+
+    def set_project(self, agent_id: str, project_id: Optional[int]) -> bool:
+        """更新Agent的项目（Agent不在本节点时返回 False）"""
+        record = self._agents.get(agent_id)
+        if record is None:
+            return False
+        record.project_id = project_id
+        return True
+
+    def resolve(self, targets: Iterable[str], match_hostname: bool = False) -> Tuple[List[AgentRecord], List[str]]:
+        """
+        把目标列表（agent_id 或 IP，可选主机名）解析为Agent记录
+
+        开销与目标数量成正比，结果按目标顺序去重。
+
+        Returns:
+            (匹配到的Agent列表, 未匹配的目标列表)
+        """
+        found: Dict[str, AgentRecord] = {}
+        missing = []
+        agents = self._agents
+        with self._lock:
+            for target in targets:
+                record = agents.get(target)
+                if record is not None:
+                    found.setdefault(record.id, record)
+                    continue
+                ids = self._by_ip.get(target)
+                if not ids and match_hostname:
+                    ids = self._by_hostname.get(target)
+                if ids:
+                    for agent_id in ids:
+                        found.setdefault(agent_id, agents[agent_id])
+                else:
+                    missing.append(target)
+        return list(found.values()), missing
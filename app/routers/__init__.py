@@ -10,6 +10,7 @@ from app.routers.simple_jobs import router as simple_jobs_router
 from app.routers.users import router as users_router
 from app.routers.projects import router as projects_router
 from app.routers.tenants import router as tenants_router
+from app.routers.system import router as system_router
 
 __all__ = [
     'auth_router',
@@ -20,6 +21,7 @@ __all__ = [
     'simple_jobs_router',
     'users_router',
     'projects_router',
-    'tenants_router'
+    'tenants_router',
+    'system_router'
 ]
 
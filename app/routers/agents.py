@@ -1,16 +1,13 @@
 """
 Agent 管理 API 路由
 """
-import asyncio
-import json
 import logging
-from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel
 from app.routers.deps import (
-    get_current_user, get_server, BatchAgentRequest
+    get_current_user, get_server, BatchAgentRequest, encode_cursor, decode_cursor
 )
 from app.routers.rbac import (
     require_permission, require_project_access, require_system_admin
@@ -33,30 +30,14 @@ async def get_agents(
     """获取Agent列表（支持项目隔离）"""
     project_id = current_user.get('current_project_id')
     server = get_server()
-    user_role = current_user['role']
-    user_id = current_user['user_id']
     
-    # 非admin用户，只能看到自己有权限的项目的agents
-    if user_role not in ['admin', 'super_admin']:
-        # 如果指定了project_id，检查用户是否有该项目权限
-        if project_id:
-            # 检查project_members表
-            conn = server.db._get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT role FROM project_members
-                WHERE project_id = %s AND user_id = %s AND status = 'active'
-            ''', (project_id, user_id))
-            if not cursor.fetchone():
-                conn.close()
-                raise HTTPException(status_code=403, detail="无权访问此项目")
-            conn.close()
+    # 非admin用户的项目成员资格已由 require_permission 校验（带缓存），这里不再重复查询
     
     # 获取Agent信息（支持租户和项目过滤）
     db_agents = server.db.get_all_agents(tenant_id=tenant_id, project_id=project_id)
     
-    # 本地内存中的 Agent（当前节点连接的）
-    local_agents = {agent.id: agent for agent in server.agents.values()}
+    # 当前节点连接的 Agent 的实时状态（一次批量查询）
+    local_agents = await server.agent_states([db_agent['id'] for db_agent in db_agents])
     
     agents_list = []
     for db_agent in db_agents:
@@ -66,8 +47,8 @@ async def get_agents(
         # 判断状态：优先使用本地实时状态，否则使用数据库状态
         if local_agent:
             # Agent 连接在当前节点
-            status = local_agent.status.lower()  # 改为小写
-            last_heartbeat = local_agent.last_heartbeat
+            status = local_agent['status'].lower()  # 改为小写
+            last_heartbeat = local_agent['last_heartbeat']
         else:
             # Agent 可能连接在其他节点，或者已离线
             # 使用数据库中的状态
@@ -102,8 +83,8 @@ async def get_agent_details(
     """获取Agent详细信息（包含实时资源信息）"""
     server = get_server()
     
-    # 传递本地缓存实例，优先读取实时资源信息
-    agent_info = server.db.get_agent_system_info(agent_id, local_cache=server.local_cache)
+    # 优先读取本地缓存中的实时资源信息
+    agent_info = await server.agent_system_info(agent_id)
     if not agent_info:
         raise HTTPException(status_code=404, detail="Agent not found")
     
@@ -113,20 +94,25 @@ async def get_agent_details(
 @router.get("/agents/{agent_id}/tasks")
 async def get_agent_tasks(
     agent_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
     current_user: Dict[str, Any] = Depends(require_permission('agent.view'))
 ):
-    """获取指定Agent的执行历史"""
+    """
+    获取指定Agent的执行历史（按完成时间倒序分页，第一页包含执行中的任务）
+
+    响应仍是执行记录列表；还有下一页时通过响应头 X-Next-Cursor 返回游标。
+    """
     server = get_server()
     
-    all_history = server.db.get_execution_history(limit=1000)
+    executions = server.db.get_agent_executions(agent_id, limit=limit, before=decode_cursor(cursor))
     
-    agent_tasks = []
-    for task in all_history:
-        target_hosts = task.get('target_hosts', [])
-        if agent_id in target_hosts:
-            agent_tasks.append(task)
+    finished = [e for e in executions if e['finished_at']]
+    if len(finished) >= limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(finished[-1]['finished_at'], finished[-1]['task_id'])
     
-    return agent_tasks
+    return executions
 
 
 @router.post("/agents/{agent_id}/restart")
@@ -136,31 +122,13 @@ async def restart_agent(
 ):
     """重启Agent"""
     server = get_server()
-    
-    if agent_id not in server.agents:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    
-    agent = server.agents[agent_id]
-    if agent.status != 'ONLINE':
-        raise HTTPException(status_code=400, detail="Agent is not online")
+    await _require_online(server, agent_id)
     
     # 发送重启命令
     try:
-        if server.loop:
-            future = asyncio.run_coroutine_threadsafe(
-                server.send_agent_restart(agent_id),
-                server.loop
-            )
-            success, message = future.result(timeout=5)
-            if not success:
-                raise HTTPException(status_code=500, detail=message)
-        else:
-            restart_message = {
-                'type': 'restart_agent',
-                'agent_id': agent_id,
-                'message': 'Server requested agent restart'
-            }
-            await agent.websocket.send(json.dumps(restart_message))
+        success, message = await server.call(server.send_agent_restart(agent_id), timeout=5)
+        if not success:
+            raise HTTPException(status_code=500, detail=message)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"重启Agent失败: {str(e)}")
     
@@ -174,21 +142,12 @@ async def restart_host(
 ):
     """重启主机"""
     server = get_server()
-    
-    if agent_id not in server.agents:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    
-    agent = server.agents[agent_id]
-    if agent.status != 'ONLINE':
-        raise HTTPException(status_code=400, detail="Agent is not online")
+    await _require_online(server, agent_id)
     
     try:
-        restart_message = {
-            'type': 'restart_host',
-            'agent_id': agent_id,
-            'message': 'Server requested host restart'
-        }
-        await agent.websocket.send(json.dumps(restart_message))
+        success, message = await server.call(server.send_host_restart(agent_id), timeout=5)
+        if not success:
+            raise HTTPException(status_code=500, detail=message)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"重启主机失败: {str(e)}")
     
@@ -202,13 +161,7 @@ async def create_terminal_session(
 ):
     """创建终端会话"""
     server = get_server()
-    
-    if agent_id not in server.agents:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    
-    agent = server.agents[agent_id]
-    if agent.status != 'ONLINE':
-        raise HTTPException(status_code=400, detail="Agent is not online")
+    await _require_online(server, agent_id)
     
     return {
         'agent_id': agent_id,
@@ -217,6 +170,15 @@ async def create_terminal_session(
     }
 
 
+async def _require_online(server, agent_id: str):
+    """Agent必须连接在本节点且在线"""
+    state = (await server.agent_states([agent_id])).get(agent_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if state['status'] != 'ONLINE':
+        raise HTTPException(status_code=400, detail="Agent is not online")
+
+
 @router.post("/agents/batch")
 async def batch_manage_agents(
     data: BatchAgentRequest,
@@ -230,12 +192,11 @@ async def batch_manage_agents(
     agent_ids = data.agent_ids
     
     if action in ['delete_offline', 'delete_down']:
+        local_agents = await server.agent_states(agent_ids)
         for agent_id in agent_ids:
             try:
-                agent_status = None
-                if agent_id in server.agents:
-                    agent = server.agents[agent_id]
-                    agent_status = agent.status
+                if agent_id in local_agents:
+                    agent_status = local_agents[agent_id]['status']
                     
                     if agent_status not in ['OFFLINE', 'DOWN']:
                         results.append({
@@ -245,7 +206,7 @@ async def batch_manage_agents(
                         })
                         continue
                     
-                    del server.agents[agent_id]
+                    await server.remove_agent(agent_id)
                 
                 conn = server.db._get_connection()
                 cursor = conn.cursor()
@@ -270,30 +231,8 @@ async def batch_manage_agents(
         if not server.loop:
             raise HTTPException(status_code=500, detail="服务器事件循环未就绪")
         
-        for agent_id in agent_ids:
-            try:
-                future = asyncio.run_coroutine_threadsafe(
-                    server.send_agent_restart(agent_id),
-                    server.loop
-                )
-                success, message = future.result(timeout=5)
-                results.append({
-                    'agent_id': agent_id,
-                    'success': success,
-                    'message': message
-                })
-            except FutureTimeoutError:
-                results.append({
-                    'agent_id': agent_id,
-                    'success': False,
-                    'message': '发送超时'
-                })
-            except Exception as e:
-                results.append({
-                    'agent_id': agent_id,
-                    'success': False,
-                    'message': f'重启失败: {str(e)}'
-                })
+        # 在服务器事件循环中并发发送，整个批次只做一次跨循环等待
+        results = await server.call(server.send_agents_command('restart', agent_ids))
     
     elif action == 'update':
         if not data.version:
@@ -306,30 +245,9 @@ async def batch_manage_agents(
         if not server.loop:
             raise HTTPException(status_code=500, detail="服务器事件循环未就绪")
         
-        for agent_id in agent_ids:
-            try:
-                future = asyncio.run_coroutine_threadsafe(
-                    server.send_agent_update(agent_id, data.version, data.download_url, data.md5),
-                    server.loop
-                )
-                success, message = future.result(timeout=5)
-                results.append({
-                    'agent_id': agent_id,
-                    'success': success,
-                    'message': message
-                })
-            except FutureTimeoutError:
-                results.append({
-                    'agent_id': agent_id,
-                    'success': False,
-                    'message': '发送超时'
-                })
-            except Exception as e:
-                results.append({
-                    'agent_id': agent_id,
-                    'success': False,
-                    'message': f'发送失败: {str(e)}'
-                })
+        results = await server.call(server.send_agents_command('update', agent_ids, {
+            'version': data.version, 'download_url': data.download_url, 'md5': data.md5
+        }))
     
     else:
         raise HTTPException(status_code=400, detail=f"不支持的操作类型: {action}")
@@ -354,8 +272,8 @@ async def cleanup_offline_agents(
     
     offline_hours = data.offline_hours if data else 24
     
-    # 获取本地内存中的在线Agent
-    local_agents = {agent.id: agent for agent in server.agents.values()}
+    # 当前节点连接的Agent的实时状态
+    local_agents = await server.agent_states()
     
     all_agents = server.db.get_all_agents()
     deleted_agents = []
@@ -371,7 +289,7 @@ async def cleanup_offline_agents(
             local_agent = local_agents.get(agent_id)
             if local_agent:
                 # Agent在本地内存中，检查状态
-                is_online = local_agent.status.lower() in ['online', 'connected']
+                is_online = local_agent['status'].lower() in ['online', 'connected']
                 should_delete = not is_online
             else:
                 # Agent不在本地内存中，检查数据库状态
@@ -391,8 +309,8 @@ async def cleanup_offline_agents(
         # 执行删除
         if should_delete:
             try:
-                if agent_id in server.agents:
-                    del server.agents[agent_id]
+                if agent_id in local_agents:
+                    await server.remove_agent(agent_id)
                 
                 conn = server.db._get_connection()
                 cursor = conn.cursor()
@@ -448,19 +366,7 @@ async def get_terminal_sessions(
     """获取当前活跃的终端会话"""
     server = get_server()
     
-    sessions = []
-    for session_id, session in server.terminal_manager.sessions.items():
-        sessions.append({
-            'session_id': session_id,
-            'agent_id': session.agent_id,
-            'user_id': session.user_id,
-            'created_at': session.created_at,
-            'last_activity': session.last_activity,
-            'is_active': session.is_active,
-            'command_count': len(session.command_history)
-        })
-    
-    return sessions
+    return await server.terminal_sessions()
 
 
 @router.delete("/terminal/sessions/{session_id}")
@@ -471,8 +377,7 @@ async def close_terminal_session(
     """关闭指定的终端会话"""
     server = get_server()
     
-    session = server.terminal_manager.get_session(session_id)
-    if not session:
+    if not await server.has_terminal_session(session_id):
         raise HTTPException(status_code=404, detail="Terminal session not found")
     
 
@@ -561,6 +466,8 @@ async def update_agent_default_project(
     success = server.db.update_agent_project(agent_id, target_project_id)
     
     if success:
+        # 同步更新本节点注册表的项目索引
+        await server.set_agent_project(agent_id, target_project_id)
         return {'message': f'Agent {agent_id} 默认项目已更新', 'success': True}
     else:
         raise HTTPException(status_code=500, detail="更新失败")
@@ -606,11 +513,7 @@ async def batch_assign_agents(
     }
 
     if server.loop:
-        future = asyncio.run_coroutine_threadsafe(
-            server.close_terminal_session(session_id),
-            server.loop
-        )
-        future.result(timeout=5)
+        await server.call(server.close_terminal_session(session_id), timeout=5)
     
     return {'message': 'Terminal session closed successfully'}
 
@@ -622,10 +525,5 @@ async def get_allowed_commands(
     """获取允许的命令列表"""
     server = get_server()
     
-    return {
-        'allowed_commands': server.terminal_manager.allowed_commands,
-        'forbidden_commands': server.terminal_manager.forbidden_commands,
-        'session_timeout': server.terminal_manager.session_timeout,
-        'max_sessions_per_agent': server.terminal_manager.max_sessions_per_agent
-    }
+    return await server.terminal_policy()
 
@@ -25,7 +25,7 @@ async def register(data: RegisterRequest):
         raise HTTPException(status_code=400, detail="两次输入的密码不一致")
     
     # 注册用户
-    success = auth_manager.register_user(data.username, data.email, data.password)
+    success = await auth_manager.register_user(data.username, data.email, data.password)
     if not success:
         raise HTTPException(status_code=400, detail="用户名或邮箱已存在")
     
@@ -42,7 +42,7 @@ async def login(data: LoginRequest, request: Request):
     user_agent = request.headers.get("User-Agent", "")
     
     # 登录验证
-    user_info = auth_manager.login_user(data.username, data.password, ip_address, user_agent)
+    user_info = await auth_manager.login_user(data.username, data.password, ip_address, user_agent)
     if not user_info:
         raise HTTPException(status_code=401, detail="用户名或密码错误")
     
@@ -104,7 +104,7 @@ async def change_password(
         raise HTTPException(status_code=404, detail="用户不存在")
     
     # 修改密码
-    success = auth_manager.change_password(
+    success = await auth_manager.change_password(
         current_user['user_id'], 
         data.current_password, 
         data.new_password
@@ -1,8 +1,9 @@
 """
 FastAPI 依赖注入和通用模型
 """
+import base64
 from fastapi import Depends, HTTPException, Header, status
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -109,11 +110,34 @@ class TaskInfo(BaseModel):
     agent_count: int
 
 
+# ==================== 分页游标 ====================
+
+def encode_cursor(*values) -> str:
+    """键集分页游标：上一页最后一条记录的排序键"""
+    raw = '|'.join('' if v is None else str(v) for v in values)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: Optional[str], parts: int = 2) -> Optional[Tuple[str, ...]]:
+    """解析分页游标，格式不正确时返回400"""
+    if not cursor:
+        return None
+    try:
+        values = tuple(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', parts - 1))
+    except Exception:
+        values = ()
+    if len(values) != parts:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标")
+    return values
+
+
 # ==================== 全局状态 ====================
 
 # 服务器实例（将在 main.py 中设置）
 _server_instance = None
 _auth_manager = None
+# 模型管理器（创建应用时注册一次，请求中复用，不再每次请求新建）
+_model_managers: Dict[str, Any] = {}
 
 
 def set_server_instance(server):
@@ -148,6 +172,42 @@ def get_auth_manager():
     return _auth_manager
 
 
+def set_model_managers(**managers):
+    """注册模型管理器，如 set_model_managers(jobs=JobManager(db), ...)"""
+    _model_managers.update(managers)
+
+
+def get_model_manager(name: str):
+    """获取已注册的模型管理器"""
+    manager = _model_managers.get(name)
+    if manager is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务器未就绪"
+        )
+    return manager
+
+
+def get_job_manager():
+    """作业管理器"""
+    return get_model_manager('jobs')
+
+
+def get_simple_job_manager():
+    """简单作业管理器"""
+    return get_model_manager('simple_jobs')
+
+
+def get_project_manager():
+    """项目管理器"""
+    return get_model_manager('projects')
+
+
+def get_tenant_manager():
+    """租户管理器"""
+    return get_model_manager('tenants')
+
+
 # ==================== 认证依赖 ====================
 
 async def get_current_user(
@@ -4,7 +4,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel, Field
-from app.routers.deps import get_current_user, get_server, require_permission
+from app.routers.deps import get_current_user, require_permission, get_job_manager
 
 router = APIRouter(prefix="/api/jobs", tags=["作业管理"])
 
@@ -47,10 +47,7 @@ async def get_job_templates(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取作业模板列表"""
-    server = get_server()
-    
-    from app.models.jobs import JobManager
-    job_manager = JobManager(server.db)
+    job_manager = get_job_manager()
     
     offset = (page - 1) * page_size
     templates = job_manager.get_templates(
@@ -82,10 +79,7 @@ async def get_job_template(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取作业模板详情"""
-    server = get_server()
-    
-    from app.models.jobs import JobManager
-    job_manager = JobManager(server.db)
+    job_manager = get_job_manager()
     
     template = job_manager.get_template(template_id)
     if not template:
@@ -100,10 +94,7 @@ async def create_job_template(
     current_user: Dict[str, Any] = Depends(require_permission('job_management'))
 ):
     """创建作业模板"""
-    server = get_server()
-    
-    from app.models.jobs import JobManager
-    job_manager = JobManager(server.db)
+    job_manager = get_job_manager()
     
     template_id = job_manager.create_template(
         name=data.name,
@@ -130,10 +121,7 @@ async def update_job_template(
     current_user: Dict[str, Any] = Depends(require_permission('job_management'))
 ):
     """更新作业模板"""
-    server = get_server()
-    
-    from app.models.jobs import JobManager
-    job_manager = JobManager(server.db)
+    job_manager = get_job_manager()
     
     template = job_manager.get_template(template_id)
     if not template:
@@ -162,10 +150,7 @@ async def delete_job_template(
     current_user: Dict[str, Any] = Depends(require_permission('job_management'))
 ):
     """删除作业模板"""
-    server = get_server()
-    
-    from app.models.jobs import JobManager
-    job_manager = JobManager(server.db)
+    job_manager = get_job_manager()
     
     template = job_manager.get_template(template_id)
     if not template:
@@ -184,10 +169,7 @@ async def execute_job(
     current_user: Dict[str, Any] = Depends(require_permission('job_execution'))
 ):
     """执行作业"""
-    server = get_server()
-    
-    from app.models.jobs import JobManager
-    job_manager = JobManager(server.db)
+    job_manager = get_job_manager()
     
     template = job_manager.get_template(data.template_id)
     if not template:
@@ -215,10 +197,7 @@ async def get_job_instances(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取作业实例列表"""
-    server = get_server()
-    
-    from app.models.jobs import JobManager
-    job_manager = JobManager(server.db)
+    job_manager = get_job_manager()
     
     offset = (page - 1) * page_size
     instances = job_manager.get_instances(
@@ -245,10 +224,7 @@ async def get_job_instance(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取作业实例详情"""
-    server = get_server()
-    
-    from app.models.jobs import JobManager
-    job_manager = JobManager(server.db)
+    job_manager = get_job_manager()
     
     instance = job_manager.get_instance(job_id)
     if not instance:
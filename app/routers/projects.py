@@ -4,7 +4,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel, Field
-from app.routers.deps import get_current_user, get_server, require_permission
+from app.routers.deps import get_current_user, get_server, require_permission, get_project_manager
+from app.permissions import get_permission_versions
 
 router = APIRouter(prefix="/api/projects", tags=["项目管理"])
 
@@ -38,10 +39,7 @@ async def get_my_projects(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取当前用户的项目列表"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     projects = project_manager.get_user_projects(current_user['user_id'])
     
@@ -57,10 +55,7 @@ async def get_projects(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取项目列表"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     offset = (page - 1) * page_size
     projects = project_manager.get_all_projects(
@@ -84,10 +79,7 @@ async def get_project(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取项目详情"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     project = project_manager.get_project_by_id(project_id)
     if not project:
@@ -104,8 +96,7 @@ async def create_project(
     """创建项目"""
     server = get_server()
     
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     # 检查项目名是否唯一
     conn = server.db._get_connection()
@@ -169,8 +160,7 @@ async def update_project(
     """更新项目"""
     server = get_server()
     
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     project = project_manager.get_project_by_id(project_id)
     if not project:
@@ -214,6 +204,7 @@ async def update_project(
             WHERE project_id = %s AND user_id != %s
         """, (project_id, project['created_by']))
         conn.commit()
+        get_permission_versions().bump_project(project_id)
         
         # 添加新的管理员
         if data.admin_ids:
@@ -256,10 +247,7 @@ async def delete_project(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """删除项目"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     project = project_manager.get_project_by_id(project_id)
     if not project:
@@ -282,10 +270,7 @@ async def get_project_members(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取项目成员列表"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     project = project_manager.get_project_by_id(project_id)
     if not project:
@@ -303,10 +288,7 @@ async def add_project_member(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """添加项目成员"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     project = project_manager.get_project_by_id(project_id)
     if not project:
@@ -336,10 +318,7 @@ async def remove_project_member(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """移除项目成员"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     project = project_manager.get_project_by_id(project_id)
     if not project:
@@ -362,10 +341,7 @@ async def get_project_permissions(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取项目所有可用的功能权限列表"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     # 检查用户是否有权限查看
     if not project_manager.check_project_permission(current_user['user_id'], project_id):
@@ -388,10 +364,7 @@ async def get_member_permissions(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取项目成员的权限列表"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     # 用户可以查看自己的权限，或者管理员可以查看任何人的权限
     is_self = current_user['user_id'] == user_id
@@ -413,10 +386,7 @@ async def set_member_permissions(
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """设置项目成员的功能权限"""
-    server = get_server()
-    
-    from app.models.project import ProjectManager
-    project_manager = ProjectManager(server.db)
+    project_manager = get_project_manager()
     
     # 检查权限
     if not project_manager.check_project_permission(current_user['user_id'], project_id, 'admin'):
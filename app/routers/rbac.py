@@ -1,7 +1,8 @@
 """
 RBAC权限管理 - 简化的基于角色的访问控制
 只提供用户级和项目级的权限验证,移除租户管理
-使用本地缓存优化性能，避免每次请求都查询数据库
+用户在项目中的权限编译成带版本的快照缓存在本地，每次检查只查找一次快照；
+成员或权限变更时版本递增，旧快照立即作废（见 app/permissions.py）
 """
 from fastapi import Depends, HTTPException, status, Query
 from typing import Dict, Any, Optional, Callable
@@ -9,14 +10,15 @@ from app.routers.deps import get_current_user
 from app.models.project import ProjectManager
 from app.models import DatabaseManager
 from app.cache import get_local_cache
+from app.permissions import PermissionSnapshot, get_permission_versions
 import logging
 import time
 
 logger = logging.getLogger(__name__)
 
-# 权限缓存TTL（秒）
-PERMISSION_CACHE_TTL = 60  # 权限缓存60秒
-PROJECT_ACCESS_CACHE_TTL = 60  # 项目访问权限缓存60秒
+# 权限缓存TTL（秒）；变更通过版本号立即生效，TTL只限制快照在内存中的停留时间
+PERMISSION_CACHE_TTL = 300  # 权限快照缓存5分钟
+PROJECT_ACCESS_CACHE_TTL = 60  # 可访问项目列表缓存60秒
 
 
 class PermissionChecker:
@@ -45,6 +47,21 @@ class PermissionChecker:
         self.project_mgr = ProjectManager(self._db_manager)
         self._cache = get_local_cache()  # 使用本地缓存
     
+    def get_snapshot(self, user_id: int, project_id: int) -> Optional[PermissionSnapshot]:
+        """获取用户在项目中的权限快照（版本过期时重新加载），加载失败返回None"""
+        versions = get_permission_versions()
+        cache_key = f"permission_snapshot:{user_id}:{project_id}"
+        
+        snapshot = self._cache.get(cache_key)
+        if snapshot is not None and versions.is_current(snapshot.version, user_id, project_id):
+            return snapshot
+        
+        # 先读取版本再查询，加载期间发生的变更会使这次结果作废
+        snapshot = self.project_mgr.load_permission_snapshot(project_id, user_id, versions.current())
+        if snapshot is not None:
+            self._cache.set(cache_key, snapshot, PERMISSION_CACHE_TTL)
+        return snapshot
+    
     def check_project_access(self, user_id: int, project_id: int,
                             user_role: str, required_role: str = None) -> bool:
         """检查用户是否可以访问指定项目（带缓存）"""
@@ -52,23 +69,8 @@ class PermissionChecker:
         if user_role in ['admin', 'super_admin']:
             return True
         
-        # 构建缓存key
-        cache_key = f"project_access:{user_id}:{project_id}:{required_role or 'any'}"
-        
-        # 尝试从缓存获取
-        cached = self._cache.get(cache_key)
-        if cached is not None:
-            return cached
-        
-        # 查询数据库
-        result = self.project_mgr.check_project_permission(
-            user_id, project_id, required_role
-        )
-        
-        # 写入缓存
-        self._cache.set(cache_key, result, PROJECT_ACCESS_CACHE_TTL)
-        
-        return result
+        snapshot = self.get_snapshot(user_id, project_id)
+        return snapshot is not None and snapshot.has_role(required_role)
     
     def check_permission_key(self, user_id: int, project_id: int,
                             permission_key: str, user_role: str) -> bool:
@@ -77,34 +79,20 @@ class PermissionChecker:
         if user_role in ['admin', 'super_admin']:
             return True
         
-        # 构建缓存key
-        cache_key = f"permission:{user_id}:{project_id}:{permission_key}"
-        
-        # 尝试从缓存获取
-        cached = self._cache.get(cache_key)
-        if cached is not None:
-            return cached
-        
-        # 查询数据库
-        result = self.project_mgr.check_permission(
-            project_id, user_id, permission_key, user_role
-        )
-        
-        # 写入缓存
-        self._cache.set(cache_key, result, PERMISSION_CACHE_TTL)
-        
-        return result
+        snapshot = self.get_snapshot(user_id, project_id)
+        return snapshot is not None and snapshot.allows(permission_key)
     
     def get_user_accessible_projects(self, user_id: int, user_role: str) -> list:
         """获取用户可访问的所有项目ID列表（带缓存）"""
-        # 构建缓存key
+        versions = get_permission_versions()
         cache_key = f"accessible_projects:{user_id}:{user_role}"
         
         # 尝试从缓存获取
         cached = self._cache.get(cache_key)
-        if cached is not None:
-            return cached
+        if cached is not None and versions.is_current(cached[0], user_id):
+            return cached[1]
         
+        version = versions.current()
         if user_role in ['admin', 'super_admin']:
             # 管理员可以访问所有项目
             all_projects = self.project_mgr.get_all_projects()
@@ -115,14 +103,13 @@ class PermissionChecker:
             result = [p['id'] for p in user_projects]
         
         # 写入缓存
-        self._cache.set(cache_key, result, PROJECT_ACCESS_CACHE_TTL)
+        self._cache.set(cache_key, (version, result), PROJECT_ACCESS_CACHE_TTL)
         
         return result
     
     def invalidate_user_cache(self, user_id: int):
-        """使用户相关的缓存失效（当权限变更时调用）"""
-        # 简单实现：清除所有与该用户相关的缓存
-        # 更精细的实现可以只清除特定key
+        """使用户相关的缓存失效（当权限变更时调用，会广播到其他节点）"""
+        get_permission_versions().bump_user(user_id)
         logger.info(f"清除用户 {user_id} 的权限缓存")
     
     def validate_project_access(self, user_id: int, project_id: int,
@@ -2,13 +2,13 @@
 简单作业管理 API 路由 - 支持多步骤、多主机组、多变量
 """
 import asyncio
-import threading
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel, Field
-from app.routers.deps import get_current_user, get_server
+from app.routers.deps import get_current_user, get_server, get_simple_job_manager
 from app.routers.rbac import require_permission, require_project_access
+from app.fanout import FanoutPolicy, run_fanout
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/simple-jobs", tags=["简单作业"])
@@ -53,9 +53,19 @@ class UpdateJobRequest(BaseModel):
     description: Optional[str] = None
 
 
+# 步骤并发上限：每台执行中的主机都会产生日志和结果写入，上限远低于数据库线程池的
+# 排队上限（AsyncDatabase.max_pending=1000），避免一个步骤占满排队、挤占日志刷盘
+MAX_STEP_CONCURRENCY = 200
+
+
 class ExecuteJobRequest(BaseModel):
     """执行作业请求"""
     variables: Optional[Dict[str, str]] = None  # 运行时变量覆盖
+    concurrency: int = Field(50, ge=1, le=MAX_STEP_CONCURRENCY)  # 每个步骤同时执行的主机数上限
+    batch_size: Optional[int] = Field(None, ge=1)  # 滚动批次大小（主机数）
+    batch_percent: Optional[float] = Field(None, gt=0, le=100)  # 滚动批次大小（百分比）
+    failure_threshold: Optional[int] = Field(None, ge=0)  # 允许失败的主机数，超过后中止剩余批次和步骤
+    failure_percent: Optional[float] = Field(None, ge=0, le=100)  # 允许失败的主机百分比
 
 
 # ==================== 作业基本操作 ====================
@@ -68,10 +78,7 @@ async def get_all_executions(
 ):
     """获取所有作业执行历史"""
     project_id = current_user.get('current_project_id')
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     executions = job_manager.get_job_executions(
         project_id=project_id,
@@ -89,20 +96,44 @@ async def get_all_executions(
 @router.get("/executions/{execution_id}")
 async def get_execution_detail(
     execution_id: str,
+    include_log: bool = Query(True),
     current_user: Dict[str, Any] = Depends(require_project_access)
 ):
     """获取执行详情"""
     project_id = current_user.get('current_project_id')
+    job_manager = get_simple_job_manager()
+    
+    execution = job_manager.get_execution(execution_id, include_log=include_log)
+    if not execution:
+        raise HTTPException(status_code=404, detail="执行记录不存在")
+    
+    return {'execution': execution}
+
+
+@router.get("/executions/{execution_id}/logs")
+async def get_execution_logs(
+    execution_id: str,
+    after_seq: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=5000),
+    current_user: Dict[str, Any] = Depends(require_project_access)
+):
+    """增量获取执行日志（序号大于 after_seq 的部分）"""
     server = get_server()
     
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
-    execution = job_manager.get_execution(execution_id)
+    execution = await server.adb.run(job_manager.get_execution, execution_id, False)
     if not execution:
         raise HTTPException(status_code=404, detail="执行记录不存在")
     
-    return {'execution': execution}
+    logs = await server.adb.run(job_manager.get_execution_logs, execution_id, after_seq, limit)
+    
+    return {
+        'logs': logs,
+        'last_seq': logs[-1]['seq'] if logs else after_seq,
+        'status': execution['status'],
+        'current_step': execution['current_step']
+    }
 
 
 @router.get("")
@@ -113,10 +144,7 @@ async def get_simple_jobs(
 ):
     """获取简单作业列表"""
     project_id = current_user.get('current_project_id')
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     offset = (page - 1) * page_size
     jobs = job_manager.get_all_jobs(
@@ -139,10 +167,7 @@ async def get_simple_job(
     current_user: Dict[str, Any] = Depends(require_permission('job.view'))
 ):
     """获取简单作业详情"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     job = job_manager.get_job(job_id)
     if not job:
@@ -157,10 +182,7 @@ async def create_simple_job(
     current_user: Dict[str, Any] = Depends(require_permission('job.create'))
 ):
     """创建简单作业"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     # 获取project_id
     project_id = current_user.get('current_project_id', 1)
@@ -243,10 +265,7 @@ async def update_simple_job(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """完整更新简单作业（包括步骤、主机组、变量）"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     job = job_manager.get_job(job_id)
     if not job:
@@ -329,10 +348,7 @@ async def clone_simple_job(
     current_user: Dict[str, Any] = Depends(require_permission('job.create'))
 ):
     """克隆作业"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     # 获取原作业
     original_job = job_manager.get_job(job_id)
@@ -403,10 +419,7 @@ async def delete_simple_job(
     current_user: Dict[str, Any] = Depends(require_permission('job.delete'))
 ):
     """删除简单作业"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     job = job_manager.get_job(job_id)
     if not job:
@@ -428,10 +441,7 @@ async def add_host_group(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """添加主机组"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     job = job_manager.get_job(job_id)
     if not job:
@@ -455,10 +465,7 @@ async def get_host_groups(
     current_user: Dict[str, Any] = Depends(require_permission('job.view'))
 ):
     """获取作业的所有主机组"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     groups = job_manager.get_host_groups(job_id)
     return {'host_groups': groups}
@@ -472,10 +479,7 @@ async def update_host_group(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """更新主机组"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     success = job_manager.update_host_group(
         group_id=group_id,
@@ -496,10 +500,7 @@ async def delete_host_group(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """删除主机组"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     success = job_manager.delete_host_group(group_id)
     if not success:
@@ -517,10 +518,7 @@ async def add_variable(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """添加变量"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     job = job_manager.get_job(job_id)
     if not job:
@@ -544,10 +542,7 @@ async def get_variables(
     current_user: Dict[str, Any] = Depends(require_permission('job.view'))
 ):
     """获取作业的所有变量"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     variables = job_manager.get_variables(job_id)
     return {'variables': variables}
@@ -561,10 +556,7 @@ async def update_variable(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """更新变量"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     success = job_manager.update_variable(
         var_id=var_id,
@@ -585,10 +577,7 @@ async def delete_variable(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """删除变量"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     success = job_manager.delete_variable(var_id)
     if not success:
@@ -606,10 +595,7 @@ async def add_step(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """添加步骤"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     job = job_manager.get_job(job_id)
     if not job:
@@ -636,10 +622,7 @@ async def get_steps(
     current_user: Dict[str, Any] = Depends(require_permission('job.view'))
 ):
     """获取作业的所有步骤"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     steps = job_manager.get_steps(job_id)
     return {'steps': steps}
@@ -653,10 +636,7 @@ async def update_step(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """更新步骤"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     success = job_manager.update_step(
         step_id=step_id,
@@ -680,10 +660,7 @@ async def delete_step(
     current_user: Dict[str, Any] = Depends(require_permission('job.edit'))
 ):
     """删除步骤"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     success = job_manager.delete_step(step_id)
     if not success:
@@ -703,8 +680,7 @@ async def execute_simple_job(
     """执行简单作业 - 只记录到作业执行历史，不创建单独的task"""
     server = get_server()
     
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     job = job_manager.get_job(job_id)
     if not job:
@@ -731,22 +707,41 @@ async def execute_simple_job(
     if data and data.variables:
         runtime_vars.update(data.variables)
     
-    # 异步执行作业步骤
-    def run_job():
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
+    policy = FanoutPolicy(
+        concurrency=data.concurrency if data else 50,
+        batch_size=data.batch_size if data else None,
+        batch_percent=data.batch_percent if data else None,
+        failure_threshold=data.failure_threshold if data else None,
+        failure_percent=data.failure_percent if data else None
+    )
+    
+    async def update_execution(log_entry: str = None, **kwargs):
+        # 日志进入写缓冲批量落库，状态等字段直接更新
+        if log_entry is not None:
+            server.job_logs.append(execution_id, log_entry)
+        if kwargs:
+            if 'status' in kwargs:
+                # 结束状态之前先写入该执行的全部日志，保证读到结束状态时日志完整
+                await server.job_logs.flush()
+            ok = await server.adb.run(job_manager.update_execution, execution_id, **kwargs)
+            if not ok:
+                logger.error(f"更新执行记录失败: {execution_id}")
+            elif 'status' in kwargs:
+                # 结束状态写入成功后才释放序号；写入失败时保留，后续错误日志接着编号
+                server.job_logs.release(execution_id)
+    
+    # 在WebSocket服务器的事件循环中执行作业步骤
+    async def run_job():
         try:
             all_results = {}
+            aborted = False
             
             for i, step in enumerate(steps):
                 step_num = i + 1
                 logger.info(f"执行步骤 {step_num}/{len(steps)}: {step['step_name']}")
                 
                 # 更新当前步骤
-                job_manager.update_execution(
-                    execution_id,
+                await update_execution(
                     current_step=step_num,
                     log_entry=f"开始执行步骤 {step_num}: {step['step_name']}"
                 )
@@ -768,10 +763,7 @@ async def execute_simple_job(
                         target_hosts = job['host_groups'][0].get('host_ids', [])
                 
                 if not target_hosts:
-                    job_manager.update_execution(
-                        execution_id,
-                        log_entry=f"步骤 {step_num} 没有目标主机，跳过"
-                    )
+                    await update_execution(log_entry=f"步骤 {step_num} 没有目标主机，跳过")
                     continue
                 
                 # 替换脚本中的变量
@@ -780,60 +772,75 @@ async def execute_simple_job(
                     script = script.replace(f'${{{var_name}}}', var_value)
                     script = script.replace(f'${var_name}', var_value)
                 
-                # 执行脚本到所有目标主机
-                step_results = {}
-                for host_id in target_hosts:
-                    try:
-                        result = loop.run_until_complete(
-                            server.execute_script_on_agent(host_id, script, step.get('timeout', 300))
+                timeout = step.get('timeout', 300)
+                
+                async def run_host(host_id):
+                    return await server.execute_script_on_agent(host_id, script, timeout)
+                
+                async def on_batch(batch_no, batch_total, batch_hosts):
+                    if batch_total > 1:
+                        await update_execution(
+                            log_entry=f"步骤 {step_num} 批次 {batch_no}/{batch_total}: {len(batch_hosts)} 台主机"
                         )
-                        step_results[host_id] = result
-                        
-                        # 记录执行结果
+                
+                async def on_result(host_id, result):
+                    # 每台主机的结果到达时立即记录
+                    if result.get('error') and result.get('exit_code') == -1 and not result.get('output'):
+                        log_entry = f"主机 {host_id} 执行异常: {result.get('error')}"
+                    else:
                         status_text = "成功" if result.get('exit_code') == 0 else "失败"
-                        job_manager.update_execution(
-                            execution_id,
-                            log_entry=f"主机 {host_id} 执行{status_text}: exit_code={result.get('exit_code')}"
-                        )
-                    except Exception as e:
-                        step_results[host_id] = {
-                            'exit_code': -1,
-                            'error': str(e)
-                        }
-                        job_manager.update_execution(
-                            execution_id,
-                            log_entry=f"主机 {host_id} 执行异常: {str(e)}"
-                        )
+                        log_entry = f"主机 {host_id} 执行{status_text}: exit_code={result.get('exit_code')}"
+                    await update_execution(log_entry=log_entry)
                 
+                report = await run_fanout(target_hosts, run_host, policy,
+                                          on_result=on_result, on_batch=on_batch)
+                
+                step_results = dict(report.results)
+                for host_id in report.skipped:
+                    step_results[host_id] = {'exit_code': None, 'skipped': True}
                 all_results[f"step_{step_num}"] = {
                     'step_name': step['step_name'],
-                    'results': step_results
+                    'results': step_results,
+                    'succeeded': report.succeeded,
+                    'failed': report.failed,
+                    'skipped': len(report.skipped)
                 }
+                
+                if report.aborted:
+                    aborted = True
+                    await update_execution(
+                        log_entry=f"步骤 {step_num} 失败主机数 {report.failed} 超过阈值，"
+                                  f"跳过剩余 {len(report.skipped)} 台主机和后续步骤"
+                    )
+                    break
             
-            # 更新执行完成状态
-            job_manager.update_execution(
-                execution_id,
-                status='COMPLETED',
-                results=all_results,
-                log_entry="作业执行完成"
-            )
-            logger.info(f"作业执行完成: {execution_id}")
+            if aborted:
+                await update_execution(
+                    status='FAILED',
+                    results=all_results,
+                    error_message='失败主机数超过阈值，作业已中止',
+                    log_entry="作业执行中止"
+                )
+                logger.warning(f"作业执行中止: {execution_id}")
+            else:
+                # 更新执行完成状态
+                await update_execution(
+                    status='COMPLETED',
+                    results=all_results,
+                    log_entry="作业执行完成"
+                )
+                logger.info(f"作业执行完成: {execution_id}")
             
         except Exception as e:
             logger.error(f"作业执行失败: {e}")
-            job_manager.update_execution(
-                execution_id,
+            await update_execution(
                 status='FAILED',
                 error_message=str(e),
                 log_entry=f"作业执行失败: {str(e)}"
             )
-        finally:
-            loop.close()
     
-    # 在后台线程执行
-    thread = threading.Thread(target=run_job)
-    thread.daemon = True
-    thread.start()
+    # 提交到WebSocket服务器的事件循环，不等待执行完成
+    server.submit(run_job())
     
     return {
         'message': '作业已开始执行',
@@ -851,10 +858,7 @@ async def get_simple_job_history(
     current_user: Dict[str, Any] = Depends(require_permission('job.view'))
 ):
     """获取作业执行历史"""
-    server = get_server()
-    
-    from app.models.simple_jobs import SimpleJobManager
-    job_manager = SimpleJobManager(server.db)
+    job_manager = get_simple_job_manager()
     
     job = job_manager.get_job(job_id)
     if not job:
@@ -0,0 +1,63 @@
+"""
+系统监控 API 路由
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Dict, Any
+from app.routers.deps import get_server
+from app.routers.rbac import require_system_admin
+from app.loop_monitor import get_loop_monitors
+
+router = APIRouter(prefix="/api/system", tags=["系统监控"])
+
+
+def _get_instrumentation(server):
+    instrumentation = getattr(server.db, 'instrumentation', None)
+    if instrumentation is None:
+        raise HTTPException(status_code=503, detail="数据库监控未启用")
+    return instrumentation
+
+
+@router.get("/db")
+async def get_db_stats(
+    top: int = Query(50, ge=1, le=500),
+    order_by: str = Query('total_time', pattern='^(total_time|calls|max_time|rows|errors)$'),
+    current_user: Dict[str, Any] = Depends(require_system_admin),
+    server=Depends(get_server)
+):
+    """数据库连接池状态、SQL耗时排行和最近的慢查询"""
+    return {
+        'success': True,
+        'data': _get_instrumentation(server).snapshot(top=top, order_by=order_by)
+    }
+
+
+@router.post("/db/reset")
+async def reset_db_stats(
+    current_user: Dict[str, Any] = Depends(require_system_admin),
+    server=Depends(get_server)
+):
+    """清空SQL统计和慢查询日志"""
+    _get_instrumentation(server).reset()
+    return {'success': True, 'message': '数据库统计已清空'}
+
+
+@router.get("/loops")
+async def get_loop_stats(
+    top: int = Query(20, ge=1, le=200),
+    current_user: Dict[str, Any] = Depends(require_system_admin)
+):
+    """API 和 WebSocket 事件循环的调度延迟和阻塞位置（含调用栈）"""
+    return {
+        'success': True,
+        'data': [monitor.snapshot(limit=top) for monitor in get_loop_monitors().values()]
+    }
+
+
+@router.post("/loops/reset")
+async def reset_loop_stats(
+    current_user: Dict[str, Any] = Depends(require_system_admin)
+):
+    """清空事件循环的阻塞位置统计"""
+    for monitor in get_loop_monitors().values():
+        monitor.reset()
+    return {'success': True, 'message': '事件循环统计已清空'}
@@ -2,51 +2,46 @@
 任务执行 API 路由
 """
 import asyncio
-import threading
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Header
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, Optional
 from app.routers.deps import (
-    get_current_user, get_server, ExecuteScriptRequest
+    get_current_user, get_server, ExecuteScriptRequest, encode_cursor, decode_cursor
 )
 from app.routers.rbac import require_permission
 
 router = APIRouter(prefix="/api", tags=["任务执行"])
 
 
+def _schedule_dispatch(server, task_id: str):
+    """把任务分发提交到WebSocket服务器的事件循环，不等待分发完成"""
+    if not server.loop:
+        raise HTTPException(status_code=500, detail="服务器事件循环未就绪")
+    server.submit(server.dispatch_task(task_id))
+
+
 @router.get("/tasks")
 async def get_tasks(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
     current_user: Dict[str, Any] = Depends(require_permission('job.view'))
 ):
-    """获取执行历史"""
+    """获取执行历史（摘要，按创建时间倒序键集分页）"""
     project_id = current_user.get('current_project_id')
     server = get_server()
     
-    history = server.db.get_execution_history(project_id=project_id, limit=100)
+    before = decode_cursor(cursor)
+    history = server.db.get_execution_history_summaries(project_id=project_id, limit=limit, before=before)
     
+    # 第一页合并尚未写入历史的执行中任务
     running_tasks = []
-    for task_id, task in server.tasks.items():
-        task_exists = any(h['id'] == task_id for h in history)
-        if not task_exists:
-            task_data = {
-                'id': task.id,
-                'script_name': getattr(task, 'script_name', '未命名任务'),
-                'script': task.script,
-                'script_params': getattr(task, 'script_params', ''),
-                'target_hosts': task.target_hosts,
-                'status': task.status,
-                'created_at': task.created_at,
-                'started_at': task.started_at,
-                'completed_at': task.completed_at,
-                'timeout': task.timeout,
-                'execution_user': getattr(task, 'execution_user', 'root'),
-                'results': task.results,
-                'error_message': getattr(task, 'error_message', '')
-            }
-            running_tasks.append(task_data)
+    if before is None:
+        history_ids = {h['id'] for h in history}
+        running_tasks = [task for task in await server.running_task_summaries() if task['id'] not in history_ids]
     
     all_tasks = history + running_tasks
-    all_tasks.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    all_tasks.sort(key=lambda x: x.get('created_at') or '', reverse=True)
     
     formatted_tasks = []
     for task in all_tasks:
@@ -57,7 +52,8 @@ async def get_tasks(
             formatted_task['status'] = formatted_task['status'].lower()
         formatted_tasks.append(formatted_task)
     
-    return {'tasks': formatted_tasks}
+    next_cursor = encode_cursor(history[-1]['created_at'], history[-1]['id']) if len(history) >= limit else None
+    return {'tasks': formatted_tasks, 'next_cursor': next_cursor}
 
 
 @router.post("/tasks")
@@ -70,7 +66,7 @@ async def create_task(
     project_id = current_user.get('current_project_id')
     server = get_server()
     
-    task_id = server.create_task(
+    task_id = await server.create_task(
         script=data.script,
         target_hosts=data.target_hosts,
         script_name=data.script_name,
@@ -91,33 +87,10 @@ async def get_task_details(
     """获取任务详细信息"""
     server = get_server()
     
-    history = server.db.get_execution_history(limit=1000)
-    task_info = None
-    
-    for task in history:
-        if task['id'] == task_id:
-            task_info = task
-            break
+    task_info = server.db.get_execution_history_by_id(task_id)
     
     if not task_info:
-        for task_id_key, task in server.tasks.items():
-            if task_id_key == task_id:
-                task_info = {
-                    'id': task.id,
-                    'script_name': getattr(task, 'script_name', '未命名任务'),
-                    'script': task.script,
-                    'script_params': getattr(task, 'script_params', ''),
-                    'target_hosts': task.target_hosts,
-                    'status': task.status,
-                    'created_at': task.created_at,
-                    'started_at': task.started_at,
-                    'completed_at': task.completed_at,
-                    'timeout': task.timeout,
-                    'execution_user': getattr(task, 'execution_user', 'root'),
-                    'results': task.results,
-                    'error_message': getattr(task, 'error_message', '')
-                }
-                break
+        task_info = await server.task_detail(task_id)
     
     if not task_info:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -136,7 +109,7 @@ async def execute_script(
     # 从用户上下文获取project_id
     project_id = current_user.get('current_project_id')
     
-    task_id = server.create_task(
+    task_id = await server.create_task(
         script=data.script,
         target_hosts=data.target_hosts,
         script_name=data.script_name,
@@ -146,15 +119,8 @@ async def execute_script(
         project_id=project_id
     )
     
-    def run_task():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(server.dispatch_task(task_id))
-        loop.close()
-    
-    thread = threading.Thread(target=run_task)
-    thread.daemon = True
-    thread.start()
+    # 在WebSocket服务器的事件循环中分发任务（Agent连接属于该循环）
+    _schedule_dispatch(server, task_id)
     
     return {'task_id': task_id, 'message': 'Task started successfully'}
 
@@ -167,18 +133,11 @@ async def retry_task(
     """重试任务"""
     server = get_server()
     
-    history = server.db.get_execution_history(limit=1000)
-    original_task = None
-    
-    for task in history:
-        if task['id'] == task_id:
-            original_task = task
-            break
-    
+    original_task = server.db.get_execution_history_by_id(task_id)
     if not original_task:
         raise HTTPException(status_code=404, detail="Original task not found")
     
-    new_task_id = server.create_task(
+    new_task_id = await server.create_task(
         script=original_task.get('script_content', original_task.get('script', '')),
         target_hosts=original_task.get('target_hosts', []),
         script_name=f"[重试] {original_task.get('script_name', '未命名任务')}",
@@ -187,15 +146,7 @@ async def retry_task(
         execution_user=original_task.get('execution_user', 'root')
     )
     
-    def run_task():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(server.dispatch_task(new_task_id))
-        loop.close()
-    
-    thread = threading.Thread(target=run_task)
-    thread.daemon = True
-    thread.start()
+    _schedule_dispatch(server, new_task_id)
     
     return {
         'task_id': new_task_id,
@@ -212,34 +163,81 @@ async def stop_task(
     """停止任务"""
     server = get_server()
     
-    if task_id not in server.tasks:
+    result = await server.stop_task(task_id)
+    if result == 'not_found':
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    task = server.tasks[task_id]
-    if task.status != 'RUNNING':
+    if result == 'not_running':
         raise HTTPException(status_code=400, detail="Task is not running")
     
-    task.status = 'CANCELLED'
-    task.completed_at = datetime.now().isoformat()
-    task.error_message = '任务被用户手动停止'
-    
-    task_data = {
-        'id': task.id,
-        'script_name': getattr(task, 'script_name', '未命名任务'),
-        'script': task.script,
-        'script_params': getattr(task, 'script_params', ''),
-        'target_hosts': task.target_hosts,
-        'project_id': getattr(task, 'project_id', None),
-        'status': task.status,
-        'created_at': task.created_at,
-        'started_at': task.started_at,
-        'completed_at': task.completed_at,
-        'timeout': task.timeout,
-        'execution_user': getattr(task, 'execution_user', 'root'),
-        'results': task.results,
-        'error_message': task.error_message
-    }
-    server.db.save_execution_history(task_data)
-    
     return {'message': 'Task stopped successfully'}
 
+
+
+@router.get("/tasks/{task_id}/output/{agent_id}")
+async def get_task_output(
+    task_id: str,
+    agent_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(256 * 1024, ge=1, le=4 * 1024 * 1024),
+    current_user: Dict[str, Any] = Depends(require_permission('job.view'))
+):
+    """按偏移读取任务在指定Agent上的输出（返回的offset用于下一次读取）"""
+    server = get_server()
+    output = await server.read_task_output(task_id, agent_id, offset, limit)
+    if output is None:
+        raise HTTPException(status_code=404, detail="任务输出不存在")
+    return output
+
+
+@router.get("/tasks/{task_id}/output/{agent_id}/stream")
+async def stream_task_output(
+    task_id: str,
+    agent_id: str,
+    offset: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None),
+    current_user: Dict[str, Any] = Depends(require_permission('job.view'))
+):
+    """
+    实时跟随任务输出（Server-Sent Events）
+    
+    每个 output 事件的 id 为读取后的偏移，断线重连时通过 Last-Event-ID 或 offset 参数续读，
+    输出结束后发送 end 事件。
+    """
+    server = get_server()
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+    
+    if not await server.has_task(task_id):
+        # 任务已结束时仍可从内存缓冲或溢出文件读取
+        if await server.read_task_output(task_id, agent_id, offset, 1) is None:
+            raise HTTPException(status_code=404, detail="任务输出不存在")
+    
+    async def events():
+        nonlocal offset
+        while True:
+            output = await server.read_task_output(task_id, agent_id, offset)
+            if output is None:
+                # 任务已下发但Agent尚未产生输出
+                output = {'chunks': [], 'offset': offset, 'finished': not await server.has_task(task_id)}
+            for chunk in output['chunks']:
+                offset = chunk['offset'] + len(chunk['data'])
+                yield f"id: {offset}\nevent: output\ndata: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            offset = output['offset']
+            if output['finished']:
+                yield f"id: {offset}\nevent: end\ndata: {json.dumps({'offset': offset})}\n\n"
+                return
+            if output['chunks']:
+                continue
+            changed = await server.wait_task_output(task_id, agent_id, offset, 15)
+            if changed is None:
+                # 还没有实时输出缓冲
+                await asyncio.sleep(1)
+                yield ": keepalive\n\n"
+            elif not changed:
+                yield ": keepalive\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
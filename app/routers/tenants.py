@@ -4,7 +4,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Dict, Any, Optional
 from pydantic import BaseModel, Field
-from app.routers.deps import get_current_user, get_server
+from app.routers.deps import get_current_user, get_tenant_manager
 
 router = APIRouter(prefix="/api/tenants", tags=["租户管理"])
 
@@ -60,10 +60,7 @@ async def get_tenants(
     current_user: Dict[str, Any] = Depends(require_admin)
 ):
     """获取租户列表"""
-    server = get_server()
-    
-    from app.models.tenant import TenantManager
-    tenant_manager = TenantManager(server.db)
+    tenant_manager = get_tenant_manager()
     
     offset = (page - 1) * page_size
     tenants = tenant_manager.get_all_tenants(
@@ -89,10 +86,7 @@ async def get_tenant(
     current_user: Dict[str, Any] = Depends(require_super_admin)
 ):
     """获取租户详情"""
-    server = get_server()
-    
-    from app.models.tenant import TenantManager
-    tenant_manager = TenantManager(server.db)
+    tenant_manager = get_tenant_manager()
     
     tenant = tenant_manager.get_tenant_by_id(tenant_id)
     if not tenant:
@@ -107,10 +101,7 @@ async def create_tenant(
     current_user: Dict[str, Any] = Depends(require_super_admin)
 ):
     """创建租户"""
-    server = get_server()
-    
-    from app.models.tenant import TenantManager
-    tenant_manager = TenantManager(server.db)
+    tenant_manager = get_tenant_manager()
     
     tenant_id = tenant_manager.create_tenant(
         tenant_code=data.tenant_code,
@@ -139,10 +130,7 @@ async def update_tenant(
     current_user: Dict[str, Any] = Depends(require_super_admin)
 ):
     """更新租户"""
-    server = get_server()
-    
-    from app.models.tenant import TenantManager
-    tenant_manager = TenantManager(server.db)
+    tenant_manager = get_tenant_manager()
     
     tenant = tenant_manager.get_tenant_by_id(tenant_id)
     if not tenant:
@@ -163,10 +151,7 @@ async def delete_tenant(
     current_user: Dict[str, Any] = Depends(require_super_admin)
 ):
     """删除租户"""
-    server = get_server()
-    
-    from app.models.tenant import TenantManager
-    tenant_manager = TenantManager(server.db)
+    tenant_manager = get_tenant_manager()
     
     tenant = tenant_manager.get_tenant_by_id(tenant_id)
     if not tenant:
@@ -185,10 +170,7 @@ async def get_tenant_members(
     current_user: Dict[str, Any] = Depends(require_super_admin)
 ):
     """获取租户成员列表"""
-    server = get_server()
-    
-    from app.models.tenant import TenantManager
-    tenant_manager = TenantManager(server.db)
+    tenant_manager = get_tenant_manager()
     
     tenant = tenant_manager.get_tenant_by_id(tenant_id)
     if not tenant:
@@ -205,10 +187,7 @@ async def get_tenant_stats(
     current_user: Dict[str, Any] = Depends(require_super_admin)
 ):
     """获取租户统计信息"""
-    server = get_server()
-    
-    from app.models.tenant import TenantManager
-    tenant_manager = TenantManager(server.db)
+    tenant_manager = get_tenant_manager()
     
     tenant = tenant_manager.get_tenant_by_id(tenant_id)
     if not tenant:
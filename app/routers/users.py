@@ -4,7 +4,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel, Field
-from app.routers.deps import get_current_user, get_auth_manager, get_server
+from app.routers.deps import get_current_user, get_auth_manager, get_server, get_project_manager
+from app.permissions import get_permission_versions
 
 router = APIRouter(prefix="/api/users", tags=["用户管理"])
 
@@ -111,7 +112,7 @@ async def create_user(
     if data.role not in valid_roles:
         raise HTTPException(status_code=400, detail=f"无效的角色，允许的角色: {', '.join(valid_roles)}")
     
-    success = auth_manager.register_user(data.username, data.email, data.password, data.role)
+    success = await auth_manager.register_user(data.username, data.email, data.password, data.role)
     if not success:
         raise HTTPException(status_code=400, detail="用户名或邮箱已存在")
     
@@ -120,9 +121,7 @@ async def create_user(
     
     # 如果指定了项目角色，添加用户到项目
     if data.project_roles:
-        server = get_server()
-        from app.models.project import ProjectManager
-        project_manager = ProjectManager(server.db)
+        project_manager = get_project_manager()
         
         for project_role in data.project_roles:
             try:
@@ -173,14 +172,14 @@ async def update_user(
     # 如果指定了项目角色，更新用户的项目分配
     if data.project_roles is not None:
         server = get_server()
-        from app.models.project import ProjectManager
-        project_manager = ProjectManager(server.db)
+        project_manager = get_project_manager()
         
         # 先移除用户的所有项目分配
         conn = server.db._get_connection()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM project_members WHERE user_id = %s", (user_id,))
         conn.commit()
+        get_permission_versions().bump_user(user_id)
         
         # 添加新的项目分配
         for project_role in data.project_roles:
@@ -238,7 +237,7 @@ async def reset_password(
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
     
-    new_password = auth_manager.reset_password(user_id)
+    new_password = await auth_manager.reset_password(user_id)
     if not new_password:
         raise HTTPException(status_code=500, detail="重置密码失败")
     
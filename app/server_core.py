@@ -16,20 +16,41 @@ from dataclasses import dataclass, asdict
 from app.models import DatabaseManager, generate_agent_id
 from app.cluster import ClusterManager
 from app.cache import get_local_cache
+from app.agent_store import AgentStateStore
+from app.liveness import TimerWheel, LivenessTracker
+from app.registry import AgentRecord, AgentRegistry
+from app.db_async import AsyncDatabase
+from app.completion import TaskCompletionTracker
+from app.task_output import TaskOutputManager
+from app.job_logs import ExecutionLogBuffer
+from app.execution_targets import ExecutionTargetBuffer
+from app.metrics import get_registry
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
-class Agent:
-    """Agent信息"""
-    id: str
-    hostname: str
-    ip: str
-    status: str = "ONLINE"
-    last_heartbeat: str = ""
-    websocket: object = None
+# Agent 记录（__slots__ + 单调时钟时间戳），由 AgentRegistry 维护索引
+Agent = AgentRecord
+
+# Agent消息类型（其他类型统一记为 unknown，限制指标标签数量）
+AGENT_MESSAGE_TYPES = frozenset({
+    'register', 'heartbeat', 'task_output', 'task_result', 'restart_agent_response',
+    'restart_host_response', 'terminal_command', 'terminal_output', 'terminal_data',
+    'terminal_error', 'terminal_ready'
+})
+
+# 消息处理耗时的 _count 即消息数，不再单独计数
+AGENT_MESSAGE_TIME = get_registry().histogram(
+    'qunkong_agent_message_seconds', 'Agent消息处理耗时（按消息类型）', ['type'],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+HEARTBEAT_INTERVAL = get_registry().histogram(
+    'qunkong_agent_heartbeat_interval_seconds', '同一Agent相邻两次心跳的间隔',
+    buckets=(1, 2, 5, 7.5, 10, 15, 20, 30, 60, 120))
+TERMINAL_BYTES = get_registry().counter(
+    'qunkong_terminal_bytes_total', '终端转发的数据量（字符数）', ['direction'])
+TERMINAL_TO_AGENT = TERMINAL_BYTES.labels('to_agent')
+TERMINAL_TO_CLIENT = TERMINAL_BYTES.labels('to_client')
 
 @dataclass
 class Task:
@@ -80,6 +101,8 @@ class TerminalManager:
     def __init__(self):
         self.sessions: Dict[str, TerminalSession] = {}
         self.session_timeout = 1800  # 30分钟超时
+        # 空闲超时时间轮（5秒精度，一轮约43分钟），活动只重新调度对应会话
+        self.idle_wheel = TimerWheel(tick=5.0, slots=512)
         self.max_sessions_per_agent = 3  # 每个Agent最大并发会话数
         self.allowed_commands = [
             # 基本命令
@@ -124,6 +147,7 @@ class TerminalManager:
             websocket=websocket
         )
         self.sessions[session_id] = session
+        self.idle_wheel.schedule(session_id, self.session_timeout)
         logger.info(f"创建终端会话: {session_id} for agent {agent_id}")
         return session_id
     
@@ -138,11 +162,13 @@ class TerminalManager:
             session.is_active = False
             logger.info(f"关闭终端会话: {session_id}")
             del self.sessions[session_id]
+            self.idle_wheel.cancel(session_id)
     
     def update_activity(self, session_id: str):
         """更新会话活动时间"""
         if session_id in self.sessions:
             self.sessions[session_id].last_activity = datetime.now().isoformat()
+            self.idle_wheel.schedule(session_id, self.session_timeout)
     
     def is_command_allowed(self, command: str) -> tuple[bool, str]:
         """检查命令是否允许执行"""
@@ -168,14 +194,8 @@ class TerminalManager:
         return False, f"命令不在允许列表中: '{base_cmd}'"
     
     def cleanup_expired_sessions(self):
-        """清理过期会话"""
-        now = datetime.now()
-        expired_sessions = []
-        
-        for session_id, session in self.sessions.items():
-            last_activity = datetime.fromisoformat(session.last_activity)
-            if (now - last_activity).total_seconds() > self.session_timeout:
-                expired_sessions.append(session_id)
+        """清理过期会话（只访问时间轮中已到期的会话）"""
+        expired_sessions = self.idle_wheel.advance()
         
         for session_id in expired_sessions:
             self.close_session(session_id)
@@ -185,14 +205,16 @@ class TerminalManager:
 class QunkongServer:
     """Qunkong 服务端主类"""
     
-    def __init__(self, host="0.0.0.0", port=8765, web_port=5000, cluster_manager=None):
+    def __init__(self, host="0.0.0.0", port=8765, web_port=5000, cluster_manager=None, db=None):
         self.host = host
         self.port = port
         self.web_port = web_port
-        self.agents: Dict[str, Agent] = {}
+        self.agents = AgentRegistry()  # 带二级索引（IP/主机名/状态/项目）的Agent注册表
         self.tasks: Dict[str, Task] = {}
         self.running = False
-        self.db = DatabaseManager()  # 初始化数据库管理器
+        self.db = db or DatabaseManager()  # 初始化数据库管理器
+        # 异步数据库门面：服务器协程中的数据库调用都在专用线程池中执行，不阻塞事件循环
+        self.adb = AsyncDatabase(self.db, max_workers=8, timeouts={'save_agents_batch': 60})
         # 集群管理器
         self.cluster = cluster_manager
         # 心跳检查任务
@@ -203,12 +225,30 @@ class QunkongServer:
         self.session_cleanup_task = None
         # 主事件循环引用
         self.loop = None
+        # 在本循环内提交的后台协程（保持引用，避免任务被回收）
+        self._background_tasks = set()
         # 跨节点终端会话映射 {session_id: target_node_id}
         self.remote_terminal_sessions: Dict[str, str] = {}
         # 本地缓存（用于实时资源信息）
         self.local_cache = get_local_cache()
         # 资源信息数据库写入计数器
         self.resource_update_counters = {}  # agent_id -> counter
+        # Agent状态写回存储（心跳只更新内存，定期批量落库）
+        self.agent_store = AgentStateStore(self.adb)
+        # Agent存活跟踪（单调时钟时间轮）：20秒警告，30秒超时离线
+        self.heartbeat_warning = 20
+        self.heartbeat_timeout = 30
+        self.agent_liveness = LivenessTracker(timeout=self.heartbeat_timeout, warning=self.heartbeat_warning)
+        # 任务结果等待：结果到达时唤醒等待者，超时由集中的截止时间调度处理
+        self.task_waiters = TaskCompletionTracker()
+        self.task_result_grace = 10  # 在任务超时基础上额外等待的秒数
+        # 任务实时输出：每个(任务, Agent)一个有界缓冲，超出部分压缩写入溢出文件
+        self.task_output = TaskOutputManager()
+        # 作业执行日志：内存分配序号，定期批量写入日志表
+        self.job_logs = ExecutionLogBuffer(self._write_job_logs)
+        # 执行目标（按Agent查询执行历史的索引）：下发和结果合并后定期批量写入
+        self.execution_targets = ExecutionTargetBuffer(self.adb)
+        self._job_manager = None
 
     async def register_agent(self, websocket, agent_info: dict):
         """注册 Agent"""
@@ -219,18 +259,15 @@ class QunkongServer:
             client_ip = agent_info.get('ip', '127.0.0.1')
             agent_id = generate_agent_id(client_ip)
         
-        # 设置当前时间作为初始心跳时间
-        current_time = datetime.now().isoformat()
-        
         agent = Agent(
             id=agent_id,
             hostname=agent_info.get('hostname', 'Unknown'),
             ip=agent_info.get('ip', '127.0.0.1'),
-            last_heartbeat=current_time,
             websocket=websocket
         )
         
-        self.agents[agent.id] = agent
+        self.agents.add(agent)
+        self.agent_liveness.touch(agent.id)
         logger.info(f"Agent 注册成功: {agent.hostname} ({agent.ip}) - ID: {agent.id}")
 
         # 保存Agent信息到数据库
@@ -246,7 +283,13 @@ class QunkongServer:
             'websocket_info': {}
         }
         
-        self.db.save_agent(agent_data)
+        # 注册信息在后台立即落库，之后的心跳由写回存储合并
+        # 同一Agent的写入按顺序串行执行（agent_system_info 外键依赖 agents 记录）
+        db_key = ('agent', agent_id)
+        self.adb.spawn('save_agent', agent_data, key=db_key)
+        self.agent_store.put(agent_data, dirty=False)
+        # 保持任务引用（避免被回收），查询在数据库排队已满时等待而不是失败
+        self.submit(self._load_agent_project(agent_id))
 
         # 保存Agent系统信息到数据库
         if 'system_info' in agent_info:
@@ -259,7 +302,7 @@ class QunkongServer:
                 'register_time': datetime.now().isoformat(),
                 'system_info': agent_info['system_info']
             }
-            self.db.save_agent_system_info(agent_id, system_data)
+            self.adb.spawn('save_agent_system_info', agent_id, system_data, key=db_key)
 
         # 在集群模式下注册Agent位置
         if self.cluster:
@@ -273,20 +316,52 @@ class QunkongServer:
         }
         await websocket.send(json.dumps(response))
 
+    async def _load_agent_project(self, agent_id: str):
+        """从数据库加载Agent的默认项目，更新注册表的项目索引"""
+        try:
+            project_id = await self.adb.run(self.db.get_agent_project_id, agent_id, _wait=True)
+            self.agents.set_project(agent_id, project_id)
+        except Exception as e:
+            logger.error(f"加载Agent {agent_id} 项目信息失败: {e!r}")
+
+    @staticmethod
+    def _task_record(task: Task) -> dict:
+        """任务转换为执行历史记录"""
+        return {
+            'id': task.id,
+            'script_name': getattr(task, 'script_name', '未命名任务'),
+            'script': task.script,
+            'script_params': getattr(task, 'script_params', ''),
+            'target_hosts': task.target_hosts,
+            'project_id': getattr(task, 'project_id', None),
+            'status': task.status,
+            'created_at': task.created_at,
+            'started_at': task.started_at,
+            'completed_at': task.completed_at,
+            'timeout': task.timeout,
+            'execution_user': getattr(task, 'execution_user', 'root'),
+            'results': task.results,
+            'error_message': getattr(task, 'error_message', '')
+        }
+
     async def handle_agent_message(self, websocket, message: dict):
         """处理Agent消息"""
+        msg_type = message.get('type')
+        started = time.perf_counter()
         try:
-            msg_type = message.get('type')
-            
             if msg_type == 'register':
                 await self.register_agent(websocket, message)
             elif msg_type == 'heartbeat':
                 agent_id = message.get('agent_id')
                 if agent_id and agent_id in self.agents:
                     current_time = datetime.now().isoformat()
-                    # 更新内存中的Agent信息
-                    self.agents[agent_id].last_heartbeat = current_time
-                    self.agents[agent_id].status = "ONLINE"
+                    # 更新内存中的Agent信息（状态变化会同步更新注册表索引）
+                    agent = self.agents[agent_id]
+                    now = time.monotonic()
+                    HEARTBEAT_INTERVAL.observe(now - agent.last_seen)
+                    agent.touch(now)
+                    agent.status = "ONLINE"
+                    self.agent_liveness.touch(agent_id)
                     
                     # 如果心跳中包含资源信息，缓存到本地内存（不立即写数据库）
                     if any(k in message for k in ['cpu_usage', 'memory_usage', 'memory_total', 'disk_info']):
@@ -298,6 +373,7 @@ class QunkongServer:
                             'memory_used': message.get('memory_used', 0),
                             'memory_available': message.get('memory_available', 0),
                             'disk_info': message.get('disk_info', []),  # 添加磁盘信息
+                            'task_slots': message.get('task_slots'),  # 任务槽占用和排队深度
                             'last_heartbeat': current_time,  # 添加心跳时间
                             'last_update': current_time
                         }
@@ -312,36 +388,16 @@ class QunkongServer:
                         
                         # 每12次（约1分钟）或第一次时写入数据库
                         if self.resource_update_counters[agent_id] == 1 or self.resource_update_counters[agent_id] >= 12:
-                            self.db.update_agent_resource_info(agent_id, resource_info)
+                            self.adb.spawn('update_agent_resource_info', agent_id, resource_info,
+                                           key=('resource', agent_id))
                             self.resource_update_counters[agent_id] = 0  # 重置计数器
                             logger.debug(f"Agent {agent_id} 资源信息已写入数据库")
                     
-                    # 更新数据库中的心跳时间（轻量级更新，只更新状态和时间）
-                    # 先获取现有的Agent完整信息，避免覆盖其他字段
-                    existing_agents = self.db.get_all_agents()
-                    register_time = current_time  # 默认值
-                    external_ip = ''  # 默认值
-                    os_type = 'unknown'  # 默认值
-                    for existing_agent in existing_agents:
-                        if existing_agent['id'] == agent_id:
-                            register_time = existing_agent['register_time']
-                            external_ip = existing_agent.get('external_ip', '')
-                            os_type = existing_agent.get('os_type', 'unknown')
-                            break
-                    
-                    agent_data = {
-                        'id': agent_id,
-                        'hostname': self.agents[agent_id].hostname,
-                        'ip_address': self.agents[agent_id].ip,
-                        'external_ip': external_ip,  # 保持原有的外网IP
-                        'os_type': os_type,  # 保持原有的操作系统类型
-                        'status': 'ONLINE',
-                        'last_heartbeat': current_time,
-                        'register_time': register_time,
-                        'websocket_info': {}
-                    }
-                    self.db.save_agent(agent_data)
+                    # 心跳只更新写回存储，由后台任务批量写入数据库
+                    self.agent_store.touch(agent_id, current_time, agent.hostname, agent.ip)
                     logger.debug(f"Agent {agent_id} 心跳已更新: {current_time}")
+            elif msg_type == 'task_output':
+                self.handle_task_output(message)
             elif msg_type == 'task_result':
                 await self.handle_task_result(message)
             elif msg_type == 'restart_agent_response':
@@ -363,16 +419,42 @@ class QunkongServer:
                 
         except Exception as e:
             logger.error(f"处理消息时出错: {e}")
+        finally:
+            AGENT_MESSAGE_TIME.labels(msg_type if msg_type in AGENT_MESSAGE_TYPES else 'unknown').observe(
+                time.perf_counter() - started)
 
     async def handle_task_result(self, message: dict):
         """处理任务结果"""
         task_id = message.get('task_id')
         agent_id = message.get('agent_id')
         result = message.get('result', {})
+        self._record_task_result(task_id, agent_id, result)
+
+    def handle_task_output(self, message: dict):
+        """处理任务输出分片（只接收仍在执行中的任务）"""
+        task_id = message.get('task_id')
+        agent_id = message.get('agent_id')
+        task = self.tasks.get(task_id)
+        if task is None or not agent_id or agent_id in task.results:
+            return  # 该主机已有结果（含超时记为失败），迟到的输出丢弃
+        self.task_output.append(task_id, agent_id, message.get('seq'),
+                                message.get('stream', 'stdout'), message.get('data', ''))
+
+    def _record_task_result(self, task_id: str, agent_id: str, result: dict):
+        """记录单个Agent的任务结果，唤醒等待者，并在全部完成时保存执行历史"""
+        task = self.tasks.get(task_id)
+        if task is not None and agent_id in task.results:
+            # 每台主机只接受第一个结果：截止时间已记为超时之后到达的真实结果或重复上报直接丢弃，
+            # 否则会覆盖已保存的执行历史，并把执行目标索引改写成与历史不一致的状态
+            logger.warning(f"任务 {task_id} 在Agent {agent_id} 上已有结果，忽略重复或迟到的结果")
+            return
         
-        if task_id in self.tasks:
-            task = self.tasks[task_id]
-            
+        # 结束实时输出流；流式上报的结果只携带输出末尾，完整输出在输出缓冲/溢出文件中
+        output_info = self.task_output.finish(task_id, agent_id)
+        if output_info:
+            result.update(output_info)
+        
+        if task is not None:
             # 添加 agent 信息到结果中
             if agent_id in self.agents:
                 agent = self.agents[agent_id]
@@ -381,33 +463,45 @@ class QunkongServer:
             
             task.results[agent_id] = result
             
+            # 记录该主机的执行结果（按Agent查询执行历史的索引）
+            exit_code = result.get('exit_code')
+            self.execution_targets.finish(task_id, agent_id,
+                                          'SUCCESS' if exit_code == 0 else 'FAILED',
+                                          exit_code if isinstance(exit_code, int) else None,
+                                          result.get('execution_time'), datetime.now().isoformat())
+            
             # 检查是否所有目标主机都已完成
             completed_count = len(task.results)
             target_count = len(task.target_hosts)
             
-            if completed_count >= target_count:
+            if completed_count >= target_count and task.status not in ("COMPLETED", "FAILED"):
                 task.status = "COMPLETED" if all(r.get('exit_code') == 0 for r in task.results.values()) else "FAILED"
                 task.completed_at = datetime.now().isoformat()
                 logger.info(f"任务 {task_id} 完成: {task.status}")
 
                 # 保存执行历史到数据库
-                task_data = {
-                    'id': task.id,
-                    'script_name': getattr(task, 'script_name', '未命名任务'),
-                    'script': task.script,
-                    'script_params': getattr(task, 'script_params', ''),
-                    'target_hosts': task.target_hosts,
-                    'project_id': getattr(task, 'project_id', None),  # 添加 project_id
-                    'status': task.status,
-                    'created_at': task.created_at,
-                    'started_at': task.started_at,
-                    'completed_at': task.completed_at,
-                    'timeout': task.timeout,
-                    'execution_user': getattr(task, 'execution_user', 'root'),
-                    'results': task.results,
-                    'error_message': getattr(task, 'error_message', '')
-                }
-                self.db.save_execution_history(task_data)
+                self.adb.spawn('save_execution_history', self._task_record(task), key=('task', task_id))
+        
+        self.task_waiters.resolve(task_id, agent_id, result)
+
+    @staticmethod
+    def _failed_result(message: str) -> dict:
+        """构造失败结果（同时提供任务和作业两种字段格式）"""
+        return {
+            'exit_code': -1,
+            'stdout': '',
+            'stderr': message,
+            'output': '',
+            'error': message,
+            'execution_time': 0
+        }
+
+    async def _on_task_deadline(self, task_id: str, agent_id: str):
+        """等待项到达截止时间：记录超时结果"""
+        task = self.tasks.get(task_id)
+        timeout = task.timeout if task else 0
+        logger.warning(f"任务 {task_id} 在Agent {agent_id} 上超时未返回结果")
+        self._record_task_result(task_id, agent_id, self._failed_result(f'执行超时（{timeout}秒）'))
 
     async def handle_restart_response(self, message: dict):
         """处理重启响应"""
@@ -470,6 +564,7 @@ class QunkongServer:
                         'command': command
                     }
                     await agent.websocket.send(json.dumps(terminal_message))
+                    TERMINAL_TO_AGENT.inc(len(command))
                     logger.info(f"终端命令转发到Agent {session.agent_id}: {command}")
                 except Exception as e:
                     logger.error(f"转发终端命令失败: {e}")
@@ -506,6 +601,7 @@ class QunkongServer:
                 'error': error
             }
             await session.websocket.send(json.dumps(output_message))
+            TERMINAL_TO_CLIENT.inc(len(output))
         except Exception as e:
             logger.error(f"转发终端输出失败: {e}")
 
@@ -623,6 +719,7 @@ class QunkongServer:
                 'is_binary': is_binary
             }
             await agent.websocket.send(json.dumps(input_message))
+            TERMINAL_TO_AGENT.inc(len(input_data))
             
         except Exception as e:
             logger.error(f"处理PTY终端输入失败: {e}")
@@ -688,6 +785,7 @@ class QunkongServer:
                             'data': data
                         }
                         await session.websocket.send(json.dumps(response))
+                    TERMINAL_TO_CLIENT.inc(len(data))
                 except Exception as e:
                     logger.error(f"向前端发送PTY终端数据失败: {e}")
                     # 会话可能已断开，清理会话
@@ -1037,7 +1135,7 @@ class QunkongServer:
                         logger.info(f"检测到终端消息但路径为空，尝试从消息中获取agent信息")
                         # 这是一个备用方案，尝试从其他地方获取agent_id
                         # 暂时使用第一个在线agent进行测试
-                        online_agents = [aid for aid, agent in self.agents.items() if agent.status == 'ONLINE']
+                        online_agents = [agent.id for agent in self.agents.by_status('ONLINE')]
                         if online_agents:
                             target_agent_id = online_agents[0]  # 使用第一个在线agent
                             logger.info(f"使用在线Agent: {target_agent_id} 处理终端消息")
@@ -1092,23 +1190,15 @@ class QunkongServer:
                 # 更新Agent状态为离线
                 self.agents[agent_id].status = "OFFLINE"
                 
-                # 更新数据库中的状态
-                existing_agents = self.db.get_all_agents()
-                for existing_agent in existing_agents:
-                    if existing_agent['id'] == agent_id:
-                        agent_data = {
-                            'id': agent_id,
-                            'hostname': existing_agent['hostname'],
-                            'ip_address': existing_agent['ip_address'],
-                            'external_ip': existing_agent.get('external_ip', ''),  # 保持原有的外网IP
-                            'status': 'OFFLINE',
-                            'last_heartbeat': existing_agent['last_heartbeat'],
-                            'register_time': existing_agent['register_time'],
-                            'websocket_info': {}
-                        }
-                        self.db.save_agent(agent_data)
-                        logger.info(f"Agent {agent_id} 状态已更新为离线")
-                        break
+                self.agent_liveness.remove(agent_id)
+                
+                # 该Agent上仍在等待结果的任务直接记为失败
+                for task_id in self.task_waiters.pending_tasks_for_agent(agent_id):
+                    self._record_task_result(task_id, agent_id, self._failed_result('Agent连接断开'))
+                
+                # 更新写回存储中的状态，由后台任务写入数据库
+                self.agent_store.mark_offline(agent_id)
+                logger.info(f"Agent {agent_id} 状态已更新为离线")
                 
                 # 在集群模式下注销Agent位置
                 if self.cluster:
@@ -1290,59 +1380,38 @@ class QunkongServer:
             logger.error(f"处理集群终端响应失败: {e}")
 
     async def check_agent_heartbeats(self):
-        """检查Agent心跳，将超时的Agent标记为离线"""
+        """检查Agent心跳，将超时的Agent标记为离线（只处理时间轮中到期的Agent）"""
         check_count = 0
         while self.running:
             try:
                 check_count += 1
-                current_time = datetime.now()
-                timeout_agents = []
                 
-                # 每10次检查记录一次统计信息
-                if check_count % 10 == 0:
-                    online_count = sum(1 for agent in self.agents.values() if agent.status == "ONLINE")
-                    logger.debug(f"心跳检查 #{check_count}: 在线Agent数量: {online_count}/{len(self.agents)}")
+                # 每60次检查（约1分钟）记录一次统计信息
+                if check_count % 60 == 0:
+                    logger.debug(f"心跳检查 #{check_count}: 在线Agent数量: {len(self.agent_liveness)}/{len(self.agents)}")
                 
-                for agent_id, agent in self.agents.items():
-                    if agent.last_heartbeat:
-                        try:
-                            last_heartbeat_time = datetime.fromisoformat(agent.last_heartbeat)
-                            time_diff = (current_time - last_heartbeat_time).total_seconds()
-                            
-                            # 如果超过30秒没有心跳，标记为离线（从15秒调整为30秒）
-                            if time_diff > 30 and agent.status == "ONLINE":
-                                timeout_agents.append(agent_id)
-                                logger.info(f"Agent {agent_id} 心跳超时 ({time_diff:.1f}s)，标记为离线")
-                            elif time_diff > 20 and agent.status == "ONLINE":
-                                # 超过20秒给出警告，但不断开连接
-                                logger.warning(f"Agent {agent_id} 心跳延迟 ({time_diff:.1f}s)，接近超时阈值")
-                        except ValueError as e:
-                            logger.error(f"解析心跳时间失败 {agent.last_heartbeat}: {e}")
+                now = time.monotonic()
+                warning_agents, timeout_agents = self.agent_liveness.poll(now)
+                
+                for agent_id in warning_agents:
+                    agent = self.agents.get(agent_id)
+                    if agent and agent.status == "ONLINE":
+                        # 超过20秒给出警告，但不断开连接
+                        idle = self.agent_liveness.idle_time(agent_id, now) or self.heartbeat_warning
+                        logger.warning(f"Agent {agent_id} 心跳延迟 ({idle:.1f}s)，接近超时阈值")
                 
                 # 更新超时的Agent状态
                 for agent_id in timeout_agents:
-                    if agent_id in self.agents:
-                        self.agents[agent_id].status = "OFFLINE"
+                    agent = self.agents.get(agent_id)
+                    if agent and agent.status == "ONLINE":
+                        logger.info(f"Agent {agent_id} 心跳超时 (>{self.heartbeat_timeout}s)，标记为离线")
+                        agent.status = "OFFLINE"
                         
-                        # 更新数据库
-                        existing_agents = self.db.get_all_agents()
-                        for existing_agent in existing_agents:
-                            if existing_agent['id'] == agent_id:
-                                agent_data = {
-                                    'id': agent_id,
-                                    'hostname': existing_agent['hostname'],
-                                    'ip_address': existing_agent['ip_address'],
-                                    'external_ip': existing_agent.get('external_ip', ''),  # 保持原有的外网IP
-                                    'status': 'OFFLINE',
-                                    'last_heartbeat': existing_agent['last_heartbeat'],
-                                    'register_time': existing_agent['register_time'],
-                                    'websocket_info': {}
-                                }
-                                self.db.save_agent(agent_data)
-                                break
+                        # 更新写回存储，由后台任务写入数据库
+                        self.agent_store.mark_offline(agent_id)
                 
-                # 每5秒检查一次
-                await asyncio.sleep(5)
+                # 每秒推进一次时间轮
+                await asyncio.sleep(self.agent_liveness.tick)
                 
             except Exception as e:
                 logger.error(f"检查心跳时出错: {e}")
@@ -1356,14 +1425,17 @@ class QunkongServer:
                 if expired_count > 0:
                     logger.info(f"清理了 {expired_count} 个过期的终端会话")
                 
-                # 每60秒检查一次
-                await asyncio.sleep(60)
+                # 同时清理已结束任务的输出缓冲和过期的溢出文件
+                self.task_output.cleanup()
+                
+                # 按时间轮精度推进
+                await asyncio.sleep(self.terminal_manager.idle_wheel.tick)
                 
             except Exception as e:
                 logger.error(f"清理终端会话时出错: {e}")
                 await asyncio.sleep(60)
 
-    def create_task(self, script: str, target_hosts: List[str], **kwargs) -> str:
+    async def create_task(self, script: str, target_hosts: List[str], **kwargs) -> str:
         """创建任务"""
         task_id = str(uuid.uuid4())
         task = Task(
@@ -1375,24 +1447,8 @@ class QunkongServer:
         )
         self.tasks[task_id] = task
         
-        # 立即保存任务初始状态到数据库
-        task_data = {
-            'id': task.id,
-            'script_name': getattr(task, 'script_name', '未命名任务'),
-            'script': task.script,
-            'script_params': getattr(task, 'script_params', ''),
-            'target_hosts': task.target_hosts,
-            'project_id': getattr(task, 'project_id', None),  # 添加 project_id
-            'status': task.status,
-            'created_at': task.created_at,
-            'started_at': task.started_at,
-            'completed_at': task.completed_at,
-            'timeout': task.timeout,
-            'execution_user': getattr(task, 'execution_user', 'root'),
-            'results': task.results,
-            'error_message': getattr(task, 'error_message', '')
-        }
-        self.db.save_execution_history(task_data)
+        # 立即保存任务初始状态到数据库（在数据库线程池中执行）
+        await self.adb.save_execution_history(self._task_record(task))
         logger.info(f"任务 {task_id} 已创建并保存到数据库")
         
         return task_id
@@ -1400,7 +1456,7 @@ class QunkongServer:
     async def execute_script_on_agent(self, agent_id: str, script: str, timeout: int = 300) -> dict:
         """
         在指定agent上执行脚本并返回结果
-        用于作业执行等场景
+        用于作业执行等场景，结果到达时立即返回，超时由集中的截止时间调度处理
         
         Args:
             agent_id: Agent ID
@@ -1416,6 +1472,7 @@ class QunkongServer:
                 'agent_ip': str
             }
         """
+        task_id = None
         try:
             # 查找agent
             if agent_id not in self.agents:
@@ -1444,6 +1501,10 @@ class QunkongServer:
             )
             self.tasks[task_id] = task
             
+            # 先登记等待项，避免结果早于登记到达
+            future = self.task_waiters.expect(task_id, agent_id, timeout + self.task_result_grace)
+            self.execution_targets.dispatch(task_id, [agent_id], task.created_at)
+            
             # 发送执行任务
             task_message = {
                 'type': 'execute_task',
@@ -1457,36 +1518,13 @@ class QunkongServer:
             await agent.websocket.send(json.dumps(task_message))
             logger.debug(f"向Agent {agent_id} 发送脚本执行任务: {task_id}")
             
-            # 等待执行结果（轮询）
-            max_wait = timeout + 10
-            start_time = time.time()
-            
-            while time.time() - start_time < max_wait:
-                if agent_id in task.results:
-                    result = task.results[agent_id]
-                    # 添加agent信息
-                    result['agent_hostname'] = agent.hostname
-                    result['agent_ip'] = agent.ip
-                    
-                    # 清理临时任务
-                    if task_id in self.tasks:
-                        del self.tasks[task_id]
-                    
-                    return result
-                
-                await asyncio.sleep(0.5)
-            
-            # 超时
-            if task_id in self.tasks:
-                del self.tasks[task_id]
-            
-            return {
-                'exit_code': -1,
-                'output': '',
-                'error': f'执行超时（{timeout}秒）',
-                'agent_hostname': agent.hostname,
-                'agent_ip': agent.ip
-            }
+            result = await future
+            if result is None:
+                result = self._failed_result(f'执行超时（{timeout}秒）')
+            # 添加agent信息
+            result['agent_hostname'] = agent.hostname
+            result['agent_ip'] = agent.ip
+            return result
             
         except Exception as e:
             logger.error(f"执行脚本失败: {e}")
@@ -1497,6 +1535,11 @@ class QunkongServer:
                 'agent_hostname': '未知',
                 'agent_ip': ''
             }
+        finally:
+            # 清理临时任务
+            if task_id:
+                self.task_waiters.discard(task_id, agent_id)
+                self.tasks.pop(task_id, None)
 
     async def dispatch_task(self, task_id: str):
         """分发任务到目标主机"""
@@ -1508,30 +1551,14 @@ class QunkongServer:
         task.status = "RUNNING"
         task.started_at = datetime.now().isoformat()
         
-        # 更新数据库中的任务状态
-        task_data = {
-            'id': task.id,
-            'script_name': getattr(task, 'script_name', '未命名任务'),
-            'script': task.script,
-            'script_params': getattr(task, 'script_params', ''),
-            'target_hosts': task.target_hosts,
-            'project_id': getattr(task, 'project_id', None),  # 添加 project_id
-            'status': task.status,
-            'created_at': task.created_at,
-            'started_at': task.started_at,
-            'completed_at': task.completed_at,
-            'timeout': task.timeout,
-            'execution_user': getattr(task, 'execution_user', 'root'),
-            'results': task.results,
-            'error_message': getattr(task, 'error_message', '')
-        }
-        self.db.save_execution_history(task_data)
+        # 更新数据库中的任务状态（后台写入，同一任务按顺序执行）
+        self.adb.spawn('save_execution_history', self._task_record(task), key=('task', task_id))
         
-        # 查找目标Agent
-        target_agents = []
-        for agent in self.agents.values():
-            if agent.id in task.target_hosts or agent.ip in task.target_hosts:
-                target_agents.append(agent)
+        # 查找目标Agent（按agent_id或IP索引解析，开销与目标数量成正比）
+        target_agents, missing_targets = self.agents.resolve(task.target_hosts)
+        # 目标归一为 agent_id 并去重：同一Agent以 agent_id 和 IP 同时出现时只等待一个结果，
+        # 一个IP对应多个Agent时等待每个Agent的结果
+        task.target_hosts = [agent.id for agent in target_agents] + list(dict.fromkeys(missing_targets))
         
         if not target_agents:
             logger.error(f"未找到目标Agent: {task.target_hosts}")
@@ -1539,6 +1566,13 @@ class QunkongServer:
             task.error_message = "未找到目标Agent"
             return
         
+        # 记录下发的目标主机
+        self.execution_targets.dispatch(task_id, [agent.id for agent in target_agents], task.started_at)
+        
+        # 找不到的目标直接记为失败，避免任务一直等待
+        for target in missing_targets:
+            self._record_task_result(task_id, target, self._failed_result('未找到目标Agent'))
+        
         # 发送任务到目标Agent
         task_message = {
             'type': 'execute_task',
@@ -1549,18 +1583,17 @@ class QunkongServer:
             'execution_user': task.execution_user
         }
         
+        payload = json.dumps(task_message)
+        deadline = task.timeout + self.task_result_grace
         for agent in target_agents:
             try:
-                await agent.websocket.send(json.dumps(task_message))
+                # 登记截止时间，超时未返回的主机由截止时间调度记为失败
+                self.task_waiters.track(task_id, agent.id, deadline)
+                await agent.websocket.send(payload)
                 logger.info(f"任务 {task_id} 已发送到 {agent.hostname}")
             except Exception as e:
                 logger.error(f"发送任务到 {agent.hostname} 失败: {e}")
-                task.results[agent.id] = {
-                    'exit_code': -1,
-                    'stdout': '',
-                    'stderr': f'发送任务失败: {str(e)}',
-                    'execution_time': 0
-                }
+                self._record_task_result(task_id, agent.id, self._failed_result(f'发送任务失败: {str(e)}'))
 
     async def send_agent_update(self, agent_id: str, version: str, download_url: str, md5: str):
         """发送Agent更新命令"""
@@ -1636,11 +1669,225 @@ class QunkongServer:
             logger.error(traceback.format_exc())
             return False, f'重启失败: {str(e)}'
 
+    # ==================== 核心状态接口 ====================
+    # API 路由通过这些协程读写 Agent、任务和终端会话的内存状态。拆分模式下 API worker 进程
+    # 经本地 RPC 调用核心进程的同名方法（见 app/core_rpc.py），参数和返回值只用基本类型。
+
+    async def agent_states(self, agent_ids: Optional[List[str]] = None) -> Dict[str, dict]:
+        """本节点连接的Agent的实时状态 {agent_id: {'status', 'last_heartbeat'}}，不传ID时返回全部"""
+        if agent_ids is None:
+            records = self.agents.values()
+        else:
+            records = [record for record in map(self.agents.get, agent_ids) if record is not None]
+        return {record.id: {'status': record.status, 'last_heartbeat': record.last_heartbeat}
+                for record in records}
+
+    async def remove_agent(self, agent_id: str) -> bool:
+        """从本节点注册表移除Agent（删除Agent时调用）"""
+        return self.agents.remove(agent_id) is not None
+
+    async def set_agent_project(self, agent_id: str, project_id: Optional[int]) -> bool:
+        """同步更新注册表的项目索引"""
+        return self.agents.set_project(agent_id, project_id)
+
+    async def agent_system_info(self, agent_id: str) -> Optional[dict]:
+        """Agent详细信息（优先使用本地缓存中的实时资源信息）"""
+        return await self.adb.get_agent_system_info(agent_id, local_cache=self.local_cache)
+
+    async def send_host_restart(self, agent_id: str):
+        """发送主机重启命令"""
+        agent = self.agents.get(agent_id)
+        if agent is None or agent.status != 'ONLINE' or not agent.websocket:
+            return False, 'Agent不在线'
+        await agent.websocket.send(json.dumps({
+            'type': 'restart_host',
+            'agent_id': agent_id,
+            'message': 'Server requested host restart'
+        }))
+        return True, '主机重启命令已发送'
+
+    async def send_agents_command(self, command: str, agent_ids: List[str], params: Optional[dict] = None,
+                                  timeout: float = 5) -> List[dict]:
+        """
+        批量向Agent发送重启（restart）或更新（update）命令
+
+        先通过注册表一次性解析目标（开销与目标数量成正比），不在本节点的Agent直接返回失败；
+        其余命令并发发送，每个Agent单独计算超时。
+        """
+        params = params or {}
+        if command == 'restart':
+            make_coro, error_prefix = self.send_agent_restart, '重启失败'
+        elif command == 'update':
+            make_coro, error_prefix = (lambda agent_id: self.send_agent_update(
+                agent_id, params['version'], params['download_url'], params['md5'])), '发送失败'
+        else:
+            raise ValueError(f"不支持的命令: {command}")
+
+        found, missing = self.agents.resolve(agent_ids)
+        found_ids = [agent.id for agent in found]
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(make_coro(agent_id), timeout) for agent_id in found_ids),
+            return_exceptions=True
+        )
+
+        results = []
+        for agent_id, outcome in zip(found_ids, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                results.append({'agent_id': agent_id, 'success': False, 'message': '发送超时'})
+            elif isinstance(outcome, Exception):
+                results.append({'agent_id': agent_id, 'success': False, 'message': f'{error_prefix}: {str(outcome)}'})
+            else:
+                success, message = outcome
+                results.append({'agent_id': agent_id, 'success': success, 'message': message})
+        for agent_id in missing:
+            results.append({'agent_id': agent_id, 'success': False, 'message': 'Agent不存在'})
+        return results
+
+    @staticmethod
+    def _task_summary(task: Task) -> dict:
+        """内存中任务的摘要（与执行历史摘要字段一致，不包含脚本和输出）"""
+        return {
+            'id': task.id,
+            'script_name': getattr(task, 'script_name', '未命名任务'),
+            'script_params': getattr(task, 'script_params', ''),
+            'target_hosts': task.target_hosts,
+            'project_id': getattr(task, 'project_id', None),
+            'status': task.status,
+            'created_at': task.created_at,
+            'started_at': task.started_at,
+            'completed_at': task.completed_at,
+            'timeout': task.timeout,
+            'execution_user': getattr(task, 'execution_user', 'root'),
+            'error_message': getattr(task, 'error_message', ''),
+            'result_count': len(task.results)
+        }
+
+    async def running_task_summaries(self) -> List[dict]:
+        """内存中（尚未结束或尚未清理）的任务摘要"""
+        return [self._task_summary(task) for task in list(self.tasks.values())]
+
+    async def has_task(self, task_id: str) -> bool:
+        return task_id in self.tasks
+
+    async def task_detail(self, task_id: str) -> Optional[dict]:
+        """内存中任务的完整信息"""
+        task = self.tasks.get(task_id)
+        return self._task_record(task) if task is not None else None
+
+    async def stop_task(self, task_id: str) -> str:
+        """
+        手动停止任务
+
+        Returns:
+            'stopped'、'not_found' 或 'not_running'
+        """
+        task = self.tasks.get(task_id)
+        if task is None:
+            return 'not_found'
+        if task.status != 'RUNNING':
+            return 'not_running'
+
+        task.status = 'CANCELLED'
+        task.completed_at = datetime.now().isoformat()
+        task.error_message = '任务被用户手动停止'
+        await self.adb.save_execution_history(self._task_record(task))
+        return 'stopped'
+
+    async def read_task_output(self, task_id: str, agent_id: str, offset: int = 0,
+                               limit: int = 256 * 1024) -> Optional[dict]:
+        """按偏移读取任务输出（早期输出可能要从压缩的溢出文件读取，放到线程中执行）"""
+        return await asyncio.to_thread(self.task_output.read, task_id, agent_id, offset, limit)
+
+    async def wait_task_output(self, task_id: str, agent_id: str, offset: int, timeout: float) -> Optional[bool]:
+        """
+        等待偏移之后出现新输出或输出结束
+
+        Returns:
+            是否有变化；还没有实时输出缓冲时返回 None
+        """
+        stream = self.task_output.get(task_id, agent_id)
+        if stream is None:
+            return None
+        return await stream.wait(offset, timeout)
+
+    async def terminal_sessions(self) -> List[dict]:
+        """当前活跃的终端会话"""
+        return [{
+            'session_id': session_id,
+            'agent_id': session.agent_id,
+            'user_id': session.user_id,
+            'created_at': session.created_at,
+            'last_activity': session.last_activity,
+            'is_active': session.is_active,
+            'command_count': len(session.command_history)
+        } for session_id, session in list(self.terminal_manager.sessions.items())]
+
+    async def has_terminal_session(self, session_id: str) -> bool:
+        return self.terminal_manager.get_session(session_id) is not None
+
+    async def terminal_policy(self) -> dict:
+        """终端命令白名单/黑名单和会话限制"""
+        manager = self.terminal_manager
+        return {
+            'allowed_commands': manager.allowed_commands,
+            'forbidden_commands': manager.forbidden_commands,
+            'session_timeout': manager.session_timeout,
+            'max_sessions_per_agent': manager.max_sessions_per_agent
+        }
+
+    async def metrics_text(self) -> str:
+        """本进程的 Prometheus 指标文本"""
+        return get_registry().render()
+
+    async def _write_job_logs(self, rows) -> bool:
+        """批量写入作业执行日志"""
+        if self._job_manager is None:
+            from app.models.simple_jobs import SimpleJobManager
+            self._job_manager = SimpleJobManager(self.db)
+        return await self.adb.run(self._job_manager.append_execution_logs, rows)
+
+    def submit(self, coro):
+        """
+        把协程提交到服务器事件循环执行，不等待完成
+
+        调用方已经在服务器事件循环中（单循环模式）时直接创建任务，否则跨线程提交。
+        """
+        if self.loop is None:
+            coro.close()
+            raise RuntimeError("服务器事件循环未就绪")
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            task = self.loop.create_task(coro)
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            return task
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def call(self, coro, timeout: Optional[float] = None):
+        """在服务器事件循环中执行协程并等待结果，等待期间不阻塞调用方的事件循环"""
+        if self.loop is None:
+            coro.close()
+            raise RuntimeError("服务器事件循环未就绪")
+        if asyncio.get_running_loop() is self.loop:
+            return await asyncio.wait_for(coro, timeout)
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    async def flush_state(self):
+        """写回剩余的Agent状态和作业日志，并等待后台数据库写入完成（关闭时调用）"""
+        await self.agent_store.close()
+        await self.job_logs.close()
+        await self.execution_targets.close()
+        await self.adb.drain(timeout=10)
+
     async def start(self):
         """启动服务器"""
         self.running = True
         # 保存当前事件循环的引用
-        self.loop = asyncio.get_event_loop()
+        self.loop = asyncio.get_running_loop()
         logger.info(f"Qunkong 服务器启动在 ws://{self.host}:{self.port}")
         
         # 启动集群管理器
@@ -1651,6 +1898,18 @@ class QunkongServer:
         else:
             logger.info("单节点模式运行")
         
+        # 启动Agent状态写回任务
+        self.agent_store.start()
+        
+        # 启动作业日志写入任务
+        self.job_logs.start()
+        
+        # 启动执行目标写入任务
+        self.execution_targets.start()
+        
+        # 启动任务截止时间调度
+        self.task_waiters.start(self._on_task_deadline)
+        
         # 启动心跳检查任务
         self.heartbeat_check_task = asyncio.create_task(self.check_agent_heartbeats())
         logger.info("心跳检查任务已启动")
@@ -1716,3 +1975,8 @@ class QunkongServer:
                 except asyncio.CancelledError:
                     pass
                 logger.info("终端会话清理任务已停止")
+            
+            await self.task_waiters.stop()
+            
+            # 关闭前写回剩余状态
+            await self.flush_state()
@@ -0,0 +1,156 @@
+"""
+服务器状态指标采集
+
+消息处理耗时、心跳间隔、终端流量、集群消息等在各自的热路径上直接计数（见 server_core、
+cluster、completion、db_metrics）；这里注册的是抓取 /metrics 时才计算的状态：
+在线Agent（按项目）、WebSocket 发送缓冲、终端会话、等待中的任务、缓存命中、
+后台数据库线程池和密码哈希线程池。
+
+这些值都能从现有的索引和计数中直接读出，热路径上没有额外开销；
+抓取时遍历一次Agent连接读取发送缓冲大小，1万个Agent约几毫秒。
+"""
+import logging
+from typing import Any, Dict, List
+
+from app.cache import get_cache, get_local_cache
+from app.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+
+def _gauge(name: str, documentation: str, samples):
+    return (name, 'gauge', documentation, samples)
+
+
+def _counter(name: str, documentation: str, samples):
+    return (name, 'counter', documentation, samples)
+
+
+def _send_buffer_size(websocket) -> int:
+    """连接的待发送字节数（transport 写缓冲，对端读取慢时持续增长）"""
+    transport = getattr(websocket, 'transport', None)
+    if transport is None:
+        return 0
+    try:
+        return transport.get_write_buffer_size()
+    except Exception:
+        return 0
+
+
+def collect_agents(server) -> List:
+    """Agent 数量、按项目的在线数和 WebSocket 发送缓冲"""
+    agents = server.agents
+    online_by_project = agents.count_by_project('ONLINE')
+
+    total_buffer = 0
+    max_buffer = 0
+    backlogged = 0
+    for agent in agents.by_status('ONLINE'):
+        size = _send_buffer_size(agent.websocket)
+        if size:
+            total_buffer += size
+            backlogged += 1
+            if size > max_buffer:
+                max_buffer = size
+
+    return [
+        _gauge('qunkong_agents', 'Agent数量（按状态）',
+               [({'status': status}, count) for status, count in agents.status_counts().items()]),
+        _gauge('qunkong_agents_online', '在线Agent数量（按项目，none 为未分配项目）',
+               [({'project': 'none' if project_id is None else project_id}, count)
+                for project_id, count in online_by_project.items()]),
+        _gauge('qunkong_ws_send_buffer_bytes', '所有Agent连接待发送的字节数', [({}, total_buffer)]),
+        _gauge('qunkong_ws_send_buffer_max_bytes', '单个Agent连接待发送字节数的最大值', [({}, max_buffer)]),
+        _gauge('qunkong_ws_send_backlogged_connections', '发送缓冲非空的Agent连接数', [({}, backlogged)]),
+    ]
+
+
+def collect_server(server) -> List:
+    """终端会话、任务等待、状态写回和后台数据库线程池"""
+    store = server.agent_store.stats()
+    targets = server.execution_targets.stats()
+    adb = server.adb.stats()
+    output = server.task_output.stats()
+    return [
+        _gauge('qunkong_terminal_sessions', '终端会话数（local 为本节点Agent的会话，remote 为跨节点代理）',
+               [({'kind': 'local'}, len(server.terminal_manager.sessions)),
+                ({'kind': 'remote'}, len(server.remote_terminal_sessions))]),
+        _gauge('qunkong_tasks_in_memory', '内存中的任务数', [({}, len(server.tasks))]),
+        _gauge('qunkong_task_waiters', '等待结果的 (任务, Agent) 数', [({}, len(server.task_waiters))]),
+        _gauge('qunkong_task_output_streams', '任务实时输出缓冲数',
+               [({'state': 'active'}, output['active']),
+                ({'state': 'finished'}, output['streams'] - output['active'])]),
+        _gauge('qunkong_agent_store_pending', '待写回数据库的Agent状态数', [({}, store['pending'])]),
+        _gauge('qunkong_agent_store_lag_seconds', '最早一条未写回状态的等待时间', [({}, store['current_lag'])]),
+        _gauge('qunkong_execution_targets_pending', '待写入数据库的执行目标数', [({}, targets['pending'])]),
+        _gauge('qunkong_db_executor_pending', '后台数据库线程池中排队和执行中的调用数', [({}, adb['pending'])]),
+        _gauge('qunkong_db_background_writes', '未完成的后台数据库写入数', [({}, adb['background'])]),
+        _gauge('qunkong_db_executor_waiting', '排队已满时等待空位的后台数据库写入数', [({}, adb['waiting'])]),
+        _counter('qunkong_db_executor_rejected_total', '排队已满被拒绝的交互数据库调用数', [({}, adb['rejected'])]),
+        _counter('qunkong_db_executor_calls_total', '后台数据库线程池调用数', [({}, adb['calls'])]),
+    ]
+
+
+def _local_cache_samples(caches: Dict[str, Dict[str, Any]]) -> List:
+    families = []
+    for name, documentation in (('hits', '命中'), ('misses', '未命中'),
+                                ('evictions', '容量淘汰'), ('expirations', '过期清理')):
+        families.append(_counter(f'qunkong_local_cache_{name}_total', f'本地缓存{documentation}次数',
+                                 [({'cache': cache}, stats[name]) for cache, stats in caches.items()]))
+    families.append(_gauge('qunkong_local_cache_entries', '本地缓存条目数',
+                           [({'cache': cache}, stats['size']) for cache, stats in caches.items()]))
+    families.append(_gauge('qunkong_local_cache_bytes', '本地缓存估算占用字节数',
+                           [({'cache': cache}, stats['bytes']) for cache, stats in caches.items()]))
+    families.append(_gauge('qunkong_local_cache_hit_ratio', '本地缓存命中率',
+                           [({'cache': cache}, stats['hit_rate']) for cache, stats in caches.items()]))
+    return families
+
+
+def collect_caches(auth_manager=None) -> List:
+    """两级缓存（按命名空间）、本地缓存和认证缓存的命中统计"""
+    manager = get_cache()
+    namespaces = manager.stats()
+    lookups = []
+    for namespace, stats in namespaces.items():
+        lookups.append(({'namespace': namespace, 'result': 'l1_hit'}, stats['l1_hits']))
+        lookups.append(({'namespace': namespace, 'result': 'l2_hit'}, stats['l2_hits']))
+        lookups.append(({'namespace': namespace, 'result': 'miss'}, stats['misses']))
+
+    caches = {'shared': get_local_cache().stats(), 'cache_l1': manager.l1.stats()}
+    if auth_manager is not None and getattr(auth_manager, 'cache', None) is not None:
+        auth_stats = auth_manager.cache.stats()
+        caches['auth_sessions'] = auth_stats['sessions']
+        caches['auth_users'] = auth_stats['users']
+
+    return [
+        _counter('qunkong_cache_lookups_total', '两级缓存查询次数（按命名空间和结果）', lookups),
+        _gauge('qunkong_cache_hit_ratio', '两级缓存命中率（按命名空间）',
+               [({'namespace': namespace}, stats['hit_rate']) for namespace, stats in namespaces.items()]),
+        _counter('qunkong_cache_loads_total', '缓存未命中后回源加载次数',
+                 [({'namespace': namespace}, stats['loads']) for namespace, stats in namespaces.items()]),
+    ] + _local_cache_samples(caches)
+
+
+def collect_hasher(hasher) -> List:
+    """密码哈希线程池"""
+    stats = hasher.stats()
+    return [
+        _gauge('qunkong_password_hash_pending', '排队和执行中的密码哈希请求数', [({}, stats['pending'])]),
+        _counter('qunkong_password_hash_total', '密码哈希和校验次数',
+                 [({'op': 'hash'}, stats['hashes']), ({'op': 'verify'}, stats['verifies'])]),
+        _counter('qunkong_password_hash_rejected_total', '排队已满被拒绝（429）的请求数', [({}, stats['rejected'])]),
+        _gauge('qunkong_password_hash_p95_seconds', '最近1000次密码哈希耗时的 p95', [({}, stats['p95_time'])]),
+    ]
+
+
+def register_server_metrics(server, auth_manager=None, registry=None):
+    """注册服务器状态采集函数（进程启动时调用一次；API worker 进程不持有核心状态，server 传 None）"""
+    registry = registry or get_registry()
+    if server is not None:
+        registry.register_collector(lambda: collect_agents(server))
+        registry.register_collector(lambda: collect_server(server))
+    registry.register_collector(lambda: collect_caches(auth_manager))
+    hasher = getattr(auth_manager, 'hasher', None)
+    if hasher is not None:
+        registry.register_collector(lambda: collect_hasher(hasher))
+    logger.info("服务器指标采集已注册")
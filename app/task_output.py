@@ -0,0 +1,337 @@
+"""
+任务输出流
+
+Agent 在脚本运行期间按序号发送 task_output 分片，服务端为每个 (task_id, agent_id)
+保存一个有界的环形缓冲区，偏移量为该输出流的累计字符数。超出缓冲区容量的早期输出
+写入 gzip 压缩的溢出文件，读取时按偏移量从文件或内存中取回，实时跟随的读者在没有
+新数据时等待通知。
+
+溢出文件由单独的写线程批量写入：被挤出缓冲区的分片先放入待写队列（仍可从内存读取），
+写线程每批写入后同步刷新一次，写入完成才从内存移除，WebSocket 核心循环上不做文件IO。
+
+缓冲区可以被不同线程的事件循环读取（WebSocket 核心循环写入，API 循环读取），
+内部状态由线程锁保护，等待者通过 call_soon_threadsafe 唤醒。
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class OutputStream:
+    """单个 (任务, Agent) 的输出缓冲"""
+
+    def __init__(self, task_id: str, agent_id: str, capacity: int, spill_path: str,
+                 writer: Executor):
+        self.task_id = task_id
+        self.agent_id = agent_id
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.writer = writer  # 单线程执行器，保证同一输出流的写入顺序
+        self.start = 0  # 内存中最早数据的偏移
+        self.end = 0  # 累计输出长度
+        self.size = 0  # 内存中的字符数
+        self.last_seq = -1
+        self.dropped = 0  # 序号重复或乱序而丢弃的分片数
+        self.finished = False
+        self.finished_at = None
+        self.updated_at = time.monotonic()
+        self.spilled = False
+        self._chunks = deque()  # (offset, stream, data)
+        self._pending = deque()  # 已移出缓冲区、等待写入溢出文件的分片
+        self._writing = False  # 是否已提交写入任务
+        self._spill = None
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._lock = threading.Lock()
+
+    def append(self, seq: Optional[int], stream: str, data: str) -> bool:
+        """追加一个分片，返回是否被接受（重复或过期的序号会被丢弃）"""
+        if not data:
+            return False
+        with self._lock:
+            if self.finished:
+                return False
+            if seq is not None:
+                if seq <= self.last_seq:
+                    self.dropped += 1
+                    return False
+                if seq != self.last_seq + 1:
+                    logger.warning(f"任务 {self.task_id} 在Agent {self.agent_id} 上的输出缺少分片: "
+                                   f"期望 {self.last_seq + 1}, 收到 {seq}")
+                self.last_seq = seq
+            self.updated_at = time.monotonic()
+            self._chunks.append((self.end, stream, data))
+            self.end += len(data)
+            self.size += len(data)
+            # 超出容量时把最早的分片移入待写队列（至少保留最新的一个分片）
+            while self.size > self.capacity and len(self._chunks) > 1:
+                chunk = self._chunks.popleft()
+                self.size -= len(chunk[2])
+                self._pending.append(chunk)
+                self.spilled = True
+            if self._pending and not self._writing:
+                self._writing = True
+                self.writer.submit(self._write_pending)
+            waiters, self._waiters = self._waiters, []
+        self._wake(waiters)
+        return True
+
+    def _write_pending(self):
+        """写线程：批量写入待写分片，每批同步刷新一次；输出结束后写入剩余内容并关闭文件"""
+        while True:
+            with self._lock:
+                batch = list(self._pending)
+                finished = self.finished
+                if finished:
+                    batch.extend(self._chunks)
+            try:
+                if self._spill is None and batch:
+                    os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                    self._spill = gzip.open(self.spill_path, 'wb')
+                if batch:
+                    self._spill.write(b''.join(_spill_record(chunk) for chunk in batch))
+                if self._spill is not None:
+                    if finished:
+                        self._spill.close()
+                        self._spill = None
+                    else:
+                        self._spill.flush(zlib.Z_SYNC_FLUSH)
+            except Exception as e:
+                logger.error(f"写入任务输出溢出文件失败 {self.spill_path}: {e}")
+            with self._lock:
+                # 写入完成（或失败）后才移出内存，读者在此之前仍能从待写队列读到
+                for _ in range(min(len(batch), len(self._pending))):
+                    self._pending.popleft()
+                self.start = (self._pending or self._chunks)[0][0]
+                if finished or (not self._pending and not self.finished):
+                    self._writing = False
+                    return
+
+    def finish(self) -> Dict[str, Any]:
+        """输出结束：溢出时由写线程把剩余内容也写入文件，使文件保存完整输出"""
+        with self._lock:
+            if not self.finished:
+                self.finished = True
+                self.finished_at = time.monotonic()
+                if self.spilled and not self._writing:
+                    self._writing = True
+                    self.writer.submit(self._write_pending)
+            waiters, self._waiters = self._waiters, []
+        self._wake(waiters)
+        return self.info()
+
+    def info(self) -> Dict[str, Any]:
+        """输出概况（写入任务结果）"""
+        return {
+            'output_size': self.end,
+            'output_spilled': self.spilled,
+            'output_buffer_start': self.start,
+        }
+
+    def read(self, offset: int = 0, limit: int = 256 * 1024) -> Dict[str, Any]:
+        """
+        从指定偏移读取输出
+
+        偏移早于内存缓冲区时从溢出文件读取（同步文件IO，API中应放到线程里调用）。
+        """
+        offset = max(0, offset)
+        with self._lock:
+            start, end, finished = self.start, self.end, self.finished
+            memory = ([c for c in (*self._pending, *self._chunks) if c[0] + len(c[2]) > offset]
+                      if offset < end else [])
+            spilled = self.spilled
+        chunks = []
+        if offset < start and spilled:
+            chunks = read_spill_file(self.spill_path, offset, limit, stop=start)
+        elif offset < start:
+            offset = start  # 没有溢出文件时早期输出已不可用，从缓冲区起点开始
+        size = sum(len(c['data']) for c in chunks)
+        for chunk_offset, stream, data in memory:
+            if size >= limit:
+                break
+            if chunk_offset < offset:
+                data = data[offset - chunk_offset:]
+                chunk_offset = offset
+            data = data[:limit - size]
+            chunks.append({'offset': chunk_offset, 'stream': stream, 'data': data})
+            size += len(data)
+        next_offset = chunks[-1]['offset'] + len(chunks[-1]['data']) if chunks else offset
+        return {
+            'chunks': chunks,
+            'offset': next_offset,
+            'end': end,
+            'buffer_start': start,
+            'finished': finished and next_offset >= end,
+        }
+
+    async def wait(self, offset: int, timeout: float) -> bool:
+        """等待偏移之后出现新输出或输出结束，返回是否有变化"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self.end > offset or self.finished:
+                return True
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+
+    @staticmethod
+    def _wake(waiters):
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_set_done, future)
+            except RuntimeError:
+                pass  # 等待者所在的事件循环已关闭
+
+
+def _spill_record(chunk: Tuple[int, str, str]) -> bytes:
+    offset, stream, data = chunk
+    return (json.dumps({'o': offset, 's': stream, 'd': data}, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _set_done(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def read_spill_file(path: str, offset: int, limit: int, stop: int = None) -> List[Dict[str, Any]]:
+    """从溢出文件读取 [offset, stop) 范围内最多 limit 个字符"""
+    chunks = []
+    size = 0
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                chunk_offset, data = record['o'], record['d']
+                if stop is not None and chunk_offset >= stop:
+                    break
+                if chunk_offset + len(data) <= offset:
+                    continue
+                if chunk_offset < offset:
+                    data = data[offset - chunk_offset:]
+                    chunk_offset = offset
+                data = data[:limit - size]
+                chunks.append({'offset': chunk_offset, 'stream': record['s'], 'data': data})
+                size += len(data)
+                if size >= limit:
+                    break
+    except (EOFError, zlib.error):
+        pass  # 写入中的文件没有gzip结束标记，读到已同步的部分为止
+    except (OSError, ValueError) as e:
+        logger.error(f"读取任务输出溢出文件失败 {path}: {e}")
+    return chunks
+
+
+class TaskOutputManager:
+    """任务输出缓冲管理"""
+
+    def __init__(self, capacity: int = 256 * 1024, spill_dir: str = 'logs/task_output',
+                 retention: float = 1800, spill_retention: float = 7 * 86400):
+        """
+        Args:
+            capacity: 每个输出流在内存中保留的字符数
+            spill_dir: 溢出文件目录
+            retention: 输出结束后内存缓冲保留时间（秒）
+            spill_retention: 溢出文件保留时间（秒）
+        """
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self.retention = retention
+        self.spill_retention = spill_retention
+        self._streams: Dict[Tuple[str, str], OutputStream] = {}
+        self._lock = threading.Lock()
+        self._last_spill_scan = 0.0
+        self.spill_scan_interval = 600  # 溢出文件目录扫描间隔（秒）
+        # 所有输出流共用一个写线程，溢出文件IO不占用 WebSocket 核心循环
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qunkong-output')
+
+    def spill_path(self, task_id: str, agent_id: str) -> str:
+        name = f"{_UNSAFE_NAME.sub('_', task_id)}_{_UNSAFE_NAME.sub('_', agent_id)}.jsonl.gz"
+        return os.path.join(self.spill_dir, name)
+
+    def get(self, task_id: str, agent_id: str, create: bool = False) -> Optional[OutputStream]:
+        key = (task_id, agent_id)
+        stream = self._streams.get(key)
+        if stream is None and create:
+            with self._lock:
+                stream = self._streams.get(key)
+                if stream is None:
+                    stream = OutputStream(task_id, agent_id, self.capacity,
+                                          self.spill_path(task_id, agent_id), self.writer)
+                    self._streams[key] = stream
+        return stream
+
+    def append(self, task_id: str, agent_id: str, seq: Optional[int], stream: str, data: str) -> bool:
+        return self.get(task_id, agent_id, create=True).append(seq, stream, data)
+
+    def finish(self, task_id: str, agent_id: str) -> Optional[Dict[str, Any]]:
+        """结束输出流，返回输出概况；没有流式输出时返回 None"""
+        stream = self.get(task_id, agent_id)
+        return stream.finish() if stream is not None else None
+
+    def read(self, task_id: str, agent_id: str, offset: int = 0, limit: int = 256 * 1024) -> Optional[Dict[str, Any]]:
+        """读取输出；内存缓冲已清理时回退到溢出文件，都不存在时返回 None"""
+        stream = self.get(task_id, agent_id)
+        if stream is not None:
+            return stream.read(offset, limit)
+        path = self.spill_path(task_id, agent_id)
+        if not os.path.exists(path):
+            return None
+        chunks = read_spill_file(path, offset, limit)
+        next_offset = chunks[-1]['offset'] + len(chunks[-1]['data']) if chunks else offset
+        return {'chunks': chunks, 'offset': next_offset, 'end': None, 'buffer_start': 0,
+                'finished': not chunks}
+
+    def cleanup(self, now: float = None) -> int:
+        """清理过期的内存缓冲和溢出文件，返回清理的缓冲数"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            # 已结束的流保留 retention 秒；长时间没有新输出又没有结束的流视为遗留，一并清理
+            expired = [key for key, stream in self._streams.items()
+                       if (stream.finished and now - stream.finished_at > self.retention)
+                       or (not stream.finished and now - stream.updated_at > self.retention * 4)]
+            for key in expired:
+                stream = self._streams.pop(key)
+                if not stream.finished:
+                    stream.finish()
+        if expired:
+            logger.debug(f"清理任务输出缓冲: {len(expired)} 个")
+        if (self.spill_retention and now - self._last_spill_scan >= self.spill_scan_interval
+                and os.path.isdir(self.spill_dir)):
+            self._last_spill_scan = now
+            cutoff = time.time() - self.spill_retention
+            try:
+                for entry in os.scandir(self.spill_dir):
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+            except OSError as e:
+                logger.error(f"清理任务输出溢出文件失败: {e}")
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        streams = list(self._streams.values())
+        return {
+            'streams': len(streams),
+            'active': sum(1 for s in streams if not s.finished),
+            'buffered_chars': sum(s.size for s in streams),
+            'spilled': sum(1 for s in streams if s.spilled),
+        }
@@ -0,0 +1,5 @@
+"""
+Qunkong 性能基准测试
+
+在项目根目录执行，例如: python -m benchmarks.bench_agent_registry
+"""
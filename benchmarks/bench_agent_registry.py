@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Agent 目标解析基准测试
+
+对比原 dispatch_task 的线性扫描（O(agents × targets)）与 AgentRegistry 索引解析（O(targets)）。
+执行方式: python -m benchmarks.bench_agent_registry [--agents 10000] [--targets 10000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.registry import AgentRecord, AgentRegistry
+
+
+def build_registry(agent_count: int) -> AgentRegistry:
+    """构造指定规模的注册表"""
+    registry = AgentRegistry()
+    for i in range(agent_count):
+        registry.add(AgentRecord(
+            id=f"agent-{i:06d}",
+            hostname=f"host-{i:06d}",
+            ip=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            status="ONLINE" if i % 10 else "OFFLINE",
+            project_id=i % 20
+        ))
+    return registry
+
+
+def build_targets(agent_count: int, target_count: int) -> list:
+    """一半按 agent_id、一半按 IP 指定目标"""
+    targets = []
+    for n in range(target_count):
+        i = (n * 7919) % agent_count
+        if n % 2:
+            targets.append(f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}")
+        else:
+            targets.append(f"agent-{i:06d}")
+    return targets
+
+
+def legacy_resolve(agents: dict, target_hosts: list) -> list:
+    """原实现：遍历所有Agent并在目标列表中查找"""
+    target_agents = []
+    for agent in agents.values():
+        if agent.id in target_hosts or agent.ip in target_hosts:
+            target_agents.append(agent)
+    return target_agents
+
+
+def timeit(func, repeat: int) -> float:
+    """返回多次执行中的最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent 目标解析基准测试")
+    parser.add_argument('--agents', type=int, default=10000, help='Agent数量')
+    parser.add_argument('--targets', type=int, default=10000, help='目标数量')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数（取最优）')
+    parser.add_argument('--skip-legacy', action='store_true', help='跳过原线性扫描实现（规模很大时耗时较长）')
+    args = parser.parse_args()
+
+    print(f"构造注册表: {args.agents} 个Agent, {args.targets} 个目标")
+    registry = build_registry(args.agents)
+    targets = build_targets(args.agents, args.targets)
+    plain = {agent.id: agent for agent in registry.values()}
+
+    found, missing = registry.resolve(targets)
+    indexed = timeit(lambda: registry.resolve(targets), args.repeat)
+    print(f"索引解析:   {indexed * 1000:10.2f} ms  (匹配 {len(found)} 个Agent, 未匹配 {len(missing)} 个目标)")
+
+    status_time = timeit(lambda: registry.by_status('ONLINE'), args.repeat)
+    print(f"按状态查询: {status_time * 1000:10.2f} ms  (ONLINE {registry.count_status('ONLINE')} 个)")
+
+    if not args.skip_legacy:
+        legacy_found = legacy_resolve(plain, targets)
+        assert {a.id for a in legacy_found} == {a.id for a in found}, "两种实现的解析结果不一致"
+        legacy = timeit(lambda: legacy_resolve(plain, targets), 1)
+        print(f"线性扫描:   {legacy * 1000:10.2f} ms  (匹配 {len(legacy_found)} 个Agent)")
+        print(f"加速比:     {legacy / indexed:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
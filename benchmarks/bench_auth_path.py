@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+认证热路径基准测试
+
+对 GET /api/agents 发起请求，统计每个请求的数据库查询次数和延迟：
+  - uncached: 每个请求前清空认证缓存和权限缓存（相当于原实现，每次都查询会话、项目成员等）
+  - cached  : 缓存预热后的请求
+
+数据库是计数的替身，每次查询注入固定延迟（默认1ms）模拟网络往返。
+Agent 列表本身的查询（get_all_agents）单独计数，不属于认证路径。
+执行方式: python -m benchmarks.bench_auth_path [--requests 500] [--db-latency 1] [--role user]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.cache import get_local_cache
+from app.models.auth import AuthManager
+from app.routers import agents
+from app.routers.deps import set_auth_manager, set_server_instance
+from app.routers.rbac import PermissionChecker
+
+
+class CountingCursor:
+    """按SQL内容返回固定结果，并记录查询的表"""
+
+    def __init__(self, db):
+        self.db = db
+        self._sql = ''
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self._sql = ' '.join(sql.split())
+        table = self._sql.split(' FROM ', 1)[1].split()[0] if ' FROM ' in self._sql else self._sql.split()[0]
+        self.db.queries[table] += 1
+        if self.db.latency:
+            time.sleep(self.db.latency)
+
+    def fetchone(self):
+        if 'FROM user_sessions' in self._sql:
+            return {'id': 1, 'user_id': 2, 'username': 'bench', 'email': 'bench@example.com',
+                    'role': self.db.role, 'is_active': 1}
+        if 'FROM users' in self._sql:
+            return {'id': 1, 'username': 'admin', 'email': 'admin@qunkong.com', 'role': 'admin', 'is_active': 1}
+        if 'FROM project_members' in self._sql:
+            return {'role': 'readwrite'}
+        return None
+
+    def fetchall(self):
+        if 'FROM project_members' in self._sql:
+            return [{'role': 'readwrite', 'permission_key': None, 'is_allowed': None}]
+        return []
+
+    def close(self):
+        pass
+
+
+class CountingDatabase:
+    """计数的数据库替身"""
+
+    def __init__(self, latency: float, role: str):
+        self.latency = latency
+        self.role = role
+        self.queries = Counter()
+
+    def _get_connection(self):
+        return self
+
+    def cursor(self):
+        return CountingCursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def get_all_agents(self, tenant_id=None, project_id=None):
+        self.queries['agents(list)'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [{'id': f'agent-{i}', 'hostname': f'host-{i}', 'status': 'ONLINE'} for i in range(20)]
+
+
+class FakeServer:
+    def __init__(self, db):
+        self.db = db
+        self.agents = {}
+
+
+def run(client, db, auth_manager, headers, count: int, warm: bool):
+    """返回 (每请求查询次数, 延迟列表)"""
+    latencies = []
+    db.queries.clear()
+    for _ in range(count):
+        if not warm:
+            auth_manager.cache.clear()
+            get_local_cache().clear()
+        start = time.perf_counter()
+        response = client.get('/api/agents', params={'project_id': 1}, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    per_request = {table: n / count for table, n in db.queries.items()}
+    return per_request, latencies
+
+
+def report(name: str, per_request: dict, latencies: list):
+    auth_queries = sum(n for table, n in per_request.items() if table != 'agents(list)')
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:9s} 认证/权限查询 {auth_queries:4.1f} 次/请求  "
+          f"平均 {statistics.mean(latencies) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms")
+    for table, n in sorted(per_request.items()):
+        print(f"          {table:28s} {n:4.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="认证热路径基准测试")
+    parser.add_argument('--requests', type=int, default=500, help='每种模式的请求数')
+    parser.add_argument('--db-latency', type=float, default=1.0, help='每次数据库查询的延迟（毫秒）')
+    parser.add_argument('--role', default='user', choices=['user', 'admin'], help='请求用户的系统角色')
+    args = parser.parse_args()
+
+    db = CountingDatabase(args.db_latency / 1000, args.role)
+    auth_manager = AuthManager(db)
+    set_auth_manager(auth_manager)
+    set_server_instance(FakeServer(db))
+    PermissionChecker.initialize(db)
+    PermissionChecker._instance = None
+
+    app = FastAPI()
+    app.include_router(agents.router)
+    client = TestClient(app)
+    token = auth_manager.generate_token(2, 'bench')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"GET /api/agents, 角色 {args.role}, 数据库延迟 {args.db_latency}ms, {args.requests} 次请求")
+    per_request, latencies = run(client, db, auth_manager, headers, args.requests, warm=False)
+    report('uncached', per_request, latencies)
+    run(client, db, auth_manager, headers, 1, warm=True)
+    per_request, latencies = run(client, db, auth_manager, headers, args.requests, warm=True)
+    report('cached', per_request, latencies)
+
+
+if __name__ == '__main__':
+    main()
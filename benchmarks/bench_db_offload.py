@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+数据库慢查询隔离测试
+
+给数据库的每次调用注入固定延迟（默认2秒），同时让一个 Agent 持续触发数据库写入，
+测量另一个 Agent 的心跳处理延迟和终端往返延迟：
+  - async   : 使用 AsyncDatabase 门面（数据库调用在专用线程池中执行）
+  - blocking: 模拟原实现，在事件循环中直接调用同步数据库方法
+
+执行方式: python -m benchmarks.bench_db_offload [--delay 2] [--duration 8] [--mode both]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+
+from app.server_core import QunkongServer
+
+
+class SlowDatabase:
+    """每次调用都阻塞固定时间的数据库替身"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    def _slow(self, result=True):
+        self.calls += 1
+        time.sleep(self.delay)
+        return result
+
+    def save_agent(self, agent_data):
+        return self._slow()
+
+    def save_agent_system_info(self, agent_id, system_info):
+        return self._slow()
+
+    def update_agent_resource_info(self, agent_id, resource_info):
+        return self._slow()
+
+    def get_agent_project_id(self, agent_id):
+        return self._slow(None)
+
+    def save_agents_batch(self, agents, chunk_size=500):
+        return self._slow(len(agents))
+
+    def save_execution_history(self, task_data):
+        return self._slow()
+
+    def save_execution_targets_batch(self, rows, chunk_size=500):
+        return self._slow(len(rows))
+
+
+class BlockingDatabase:
+    """模拟原实现：在事件循环线程中直接执行同步数据库调用"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+    def spawn(self, name, *args, key=None, **kwargs):
+        getattr(self.db, name)(*args, **kwargs)
+
+    async def drain(self, timeout=None):
+        pass
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def summarize(samples: list) -> str:
+    if not samples:
+        return "无样本"
+    ordered = sorted(samples)
+    p50 = ordered[len(ordered) // 2] * 1000
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000
+    return (f"n={len(ordered):4d}  p50={p50:8.2f}ms  p99={p99:8.2f}ms  "
+            f"max={ordered[-1] * 1000:8.2f}ms  mean={statistics.mean(ordered) * 1000:8.2f}ms")
+
+
+async def run_scenario(mode: str, delay: float, duration: float) -> dict:
+    """运行一轮测试，返回心跳和终端延迟样本"""
+    db = SlowDatabase(delay)
+    port = free_port()
+    server = QunkongServer(host='127.0.0.1', port=port, db=db)
+    if mode == 'blocking':
+        server.adb = BlockingDatabase(db)
+        server.agent_store.db = server.adb
+        server.execution_targets.db = server.adb
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(0.3)
+    url = f"ws://127.0.0.1:{port}"
+
+    probe = await websockets.connect(url)
+    await probe.send(json.dumps({'type': 'register', 'agent_id': 'probe', 'hostname': 'probe', 'ip': '127.0.0.2'}))
+    while json.loads(await probe.recv()).get('type') != 'register_confirm':
+        pass
+
+    stop = asyncio.Event()
+    heartbeat_samples = []
+    terminal_samples = []
+
+    async def noisy_agent():
+        """持续重新注册并上报资源信息，每条消息都会触发数据库调用"""
+        ws = await websockets.connect(url)
+        n = 0
+        while not stop.is_set():
+            n += 1
+            await ws.send(json.dumps({'type': 'register', 'agent_id': 'noisy', 'hostname': 'noisy',
+                                      'ip': '127.0.0.3', 'system_info': {'cpu': n}}))
+            await asyncio.sleep(0.2)
+        await ws.close()
+
+    async def probe_agent():
+        """探测Agent：终端输入原样回显"""
+        try:
+            async for raw in probe:
+                message = json.loads(raw)
+                if message.get('type') == 'terminal_init':
+                    await probe.send(json.dumps({'type': 'terminal_ready', 'session_id': message['session_id']}))
+                elif message.get('type') == 'terminal_input':
+                    await probe.send(json.dumps({'type': 'terminal_data', 'session_id': message['session_id'],
+                                                 'data': message['data']}))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def heartbeat_probe():
+        """发送心跳并等待服务端更新最后心跳时间"""
+        while not stop.is_set():
+            record = server.agents.get('probe')
+            before = record.last_seen
+            sent = time.monotonic()
+            await probe.send(json.dumps({'type': 'heartbeat', 'agent_id': 'probe'}))
+            while record.last_seen == before and time.monotonic() - sent < delay * 10:
+                await asyncio.sleep(0.001)
+            heartbeat_samples.append(time.monotonic() - sent)
+            await asyncio.sleep(0.1)
+
+    async def terminal_probe():
+        """终端往返：浏览器 -> 服务端 -> Agent -> 服务端 -> 浏览器"""
+        term = await websockets.connect(f"{url}/terminal/probe")
+        while not stop.is_set():
+            sent = time.monotonic()
+            marker = f"echo-{sent}"
+            await term.send(json.dumps({'type': 'terminal_input', 'data': marker}))
+            while True:
+                message = json.loads(await term.recv())
+                if message.get('type') == 'terminal_data' and message.get('data') == marker:
+                    break
+            terminal_samples.append(time.monotonic() - sent)
+            await asyncio.sleep(0.1)
+        await term.close()
+
+    tasks = [asyncio.create_task(coro) for coro in (noisy_agent(), probe_agent(), heartbeat_probe(), terminal_probe())]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.wait(tasks, timeout=delay * 5)
+    for task in tasks:
+        task.cancel()
+    await probe.close()
+    server_task.cancel()
+    try:
+        await server_task
+    except (asyncio.CancelledError, Exception):
+        pass
+    return {'heartbeat': heartbeat_samples, 'terminal': terminal_samples, 'db_calls': db.calls}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库慢查询隔离测试")
+    parser.add_argument('--delay', type=float, default=2.0, help='每次数据库调用注入的延迟（秒）')
+    parser.add_argument('--duration', type=float, default=8.0, help='每轮测试时长（秒）')
+    parser.add_argument('--mode', choices=['async', 'blocking', 'both'], default='both')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    modes = ['blocking', 'async'] if args.mode == 'both' else [args.mode]
+    results = {}
+    for mode in modes:
+        print(f"\n== {mode}: 数据库延迟 {args.delay}s, 持续 {args.duration}s ==")
+        result = asyncio.run(run_scenario(mode, args.delay, args.duration))
+        results[mode] = result
+        print(f"心跳处理延迟: {summarize(result['heartbeat'])}")
+        print(f"终端往返延迟: {summarize(result['terminal'])}")
+        print(f"数据库调用次数: {result['db_calls']}")
+
+    if 'async' in results:
+        worst = max(results['async']['heartbeat'] + results['async']['terminal'], default=0)
+        status = "通过" if worst < args.delay / 4 else "未通过"
+        print(f"\n异步门面下最大延迟 {worst * 1000:.2f}ms（阈值 {args.delay / 4 * 1000:.0f}ms）: {status}")
+
+
+if __name__ == '__main__':
+    main()
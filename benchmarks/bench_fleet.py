@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Agent 集群负载模拟
+
+在一个 asyncio 进程中启动 QunkongServer（数据库使用空实现的替身），用 N 个模拟Agent驱动它。
+模拟Agent使用与 QunkongAgent 相同的协议（register / heartbeat / task_result / terminal_ready / terminal_data），
+按规模依次测量：
+  - 注册: N 个Agent全部注册完成的耗时
+  - 内存: 注册完成后进程 RSS 的增量 / N（包含模拟Agent一侧的连接，是服务器占用的上限）
+  - 心跳突发: 每个Agent连续发送 --burst 次心跳，服务器处理完所有心跳的吞吐，以及服务器侧每条心跳的处理耗时
+  - 稳定心跳: 每个Agent按 --heartbeat-interval 周期发送心跳 --steady-seconds 秒，期间的事件循环延迟和阻塞位置
+  - 任务下发: dispatch_task 向全部Agent下发任务，模拟Agent立即返回结果，统计下发到结果记录的延迟分位数
+  - 终端: --terminal-sessions 个终端会话各往返 --terminal-roundtrips 次（浏览器 -> 服务器 -> Agent -> 服务器 -> 浏览器）
+
+--db sqlite 使用 SQLite 后端（临时文件）代替空实现的数据库替身，把数据库写入也计入测量。
+
+--transport socket 使用真实的 WebSocket 连接（每个Agent两端各占一个文件描述符，2万个Agent需要 ulimit -n 大于4万）；
+--transport memory 使用进程内的连接对象直接调用 handle_client，不占用文件描述符，只测服务器的处理路径。
+
+每个规模在单独的子进程中运行，避免前一轮的内存和对象影响下一轮，结果汇总写入 JSON 文件便于对比。
+执行方式: python -m benchmarks.bench_fleet [--agents 1000,5000,20000] [--transport socket] [--db null] [--output bench_fleet.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+import websockets
+
+from app import server_core
+from app.loop_monitor import LoopMonitor
+from app.server_core import QunkongServer
+
+
+class LocalDatabase:
+    """数据库替身：所有方法立即返回 None（不测数据库，只测服务器内存路径）"""
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+    def save_agents_batch(self, rows, batch_size=500):
+        return len(rows)
+
+
+class BenchServer(QunkongServer):
+    """记录每个任务结果到达时间的服务器"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.result_times = {}  # task_id -> {agent_id: perf_counter}
+
+    def _record_task_result(self, task_id, agent_id, result):
+        times = self.result_times.get(task_id)
+        if times is not None:
+            times[agent_id] = time.perf_counter()
+        super()._record_task_result(task_id, agent_id, result)
+
+
+# ==================== 连接 ====================
+
+class MemoryConnection:
+    """进程内的双向连接端点，接口与 websockets 连接相同（send / recv / async for / close）"""
+
+    def __init__(self, remote_address):
+        self.remote_address = remote_address
+        self.inbox = asyncio.Queue()
+        self.peer = None
+        self.closed = False
+
+    async def send(self, message):
+        if self.closed:
+            raise ConnectionError("连接已关闭")
+        self.peer.inbox.put_nowait(message)
+
+    async def recv(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise ConnectionError("连接已关闭")
+        return message
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self.inbox.put_nowait(None)
+            self.peer.inbox.put_nowait(None)
+
+
+class Transport:
+    """建立Agent连接和终端连接"""
+
+    def __init__(self, server, kind: str, port: int):
+        self.server = server
+        self.kind = kind
+        self.uri = f"ws://127.0.0.1:{port}"
+        self._handlers = set()
+
+    async def connect(self, path: str, index: int):
+        if self.kind == 'socket':
+            return await websockets.connect(self.uri + path, max_size=10 * 1024 * 1024,
+                                            ping_interval=None, compression=None, open_timeout=60)
+        client = MemoryConnection(('127.0.0.1', 20000 + index))
+        server_end = MemoryConnection(('127.0.0.1', 20000 + index))
+        client.peer, server_end.peer = server_end, client
+        handler = asyncio.create_task(self.server.handle_client(server_end, path))
+        self._handlers.add(handler)
+        handler.add_done_callback(self._handlers.discard)
+        return client
+
+
+# ==================== 模拟Agent ====================
+
+class SimAgent:
+    """模拟Agent：注册，按需发送心跳，收到任务/终端消息时立即应答"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.agent_id = f"bench-agent-{index:06d}"
+        self.conn = None
+        self.registered = asyncio.Event()
+        self.reader = None
+        # 心跳内容与 QunkongAgent.send_heartbeat 一致（资源信息使用固定值，序列化一次）
+        self.heartbeat = json.dumps({
+            'type': 'heartbeat',
+            'agent_id': self.agent_id,
+            'timestamp': datetime.now().isoformat(),
+            'cpu_usage': 12.5,
+            'memory_usage': 41.0,
+            'memory_total': 16 * 1024 ** 3,
+            'memory_used': 6 * 1024 ** 3,
+            'memory_available': 10 * 1024 ** 3,
+            'disk_info': [{'device': '/dev/sda1', 'mountpoint': '/', 'fstype': 'ext4',
+                           'total': 500 * 1024 ** 3, 'used': 120 * 1024 ** 3,
+                           'free': 380 * 1024 ** 3, 'percent': 24.0}],
+            'task_slots': {'running': 0, 'queued': 0, 'max_concurrent': 4},
+        })
+
+    def register_message(self) -> str:
+        return json.dumps({
+            'type': 'register',
+            'agent_id': self.agent_id,
+            'hostname': f"bench-host-{self.index:06d}",
+            'ip': f"10.{(self.index >> 16) & 255}.{(self.index >> 8) & 255}.{self.index & 255}",
+            'external_ip': '',
+            'platform': 'Linux',
+            'python_version': platform.python_version(),
+            'system_info': {'cpu_count': 4, 'memory_total': 16 * 1024 ** 3},
+        })
+
+    async def start(self, transport: Transport):
+        self.conn = await transport.connect('/', self.index)
+        self.reader = asyncio.create_task(self._read())
+        await self.conn.send(self.register_message())
+
+    async def send_heartbeats(self, count: int):
+        for _ in range(count):
+            await self.conn.send(self.heartbeat)
+
+    async def _read(self):
+        try:
+            async for raw in self.conn:
+                data = json.loads(raw)
+                msg_type = data.get('type')
+                if msg_type == 'register_confirm':
+                    self.registered.set()
+                elif msg_type == 'execute_task':
+                    await self.conn.send(json.dumps({
+                        'type': 'task_result',
+                        'task_id': data.get('task_id'),
+                        'agent_id': self.agent_id,
+                        'result': {'exit_code': 0, 'stdout': 'ok\n', 'stderr': '', 'execution_time': 0.01},
+                    }))
+                elif msg_type == 'terminal_init':
+                    await self.conn.send(json.dumps({
+                        'type': 'terminal_ready', 'session_id': data.get('session_id'),
+                        'cols': data.get('cols', 80), 'rows': data.get('rows', 24),
+                    }))
+                elif msg_type == 'terminal_input':
+                    # 回显输入，模拟 PTY 输出
+                    await self.conn.send(json.dumps({
+                        'type': 'terminal_data', 'session_id': data.get('session_id'),
+                        'data': data.get('data', ''), 'is_binary': False,
+                    }))
+        except (ConnectionError, websockets.exceptions.ConnectionClosed):
+            pass
+
+    async def close(self):
+        try:
+            await self.conn.close()
+        except Exception:
+            pass
+
+
+# ==================== 统计 ====================
+
+def percentiles(values, scale: float = 1000.0) -> dict:
+    """p50/p90/p99/max（默认转换为毫秒）"""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(len(values) * q))] * scale, 3)
+
+    return {'count': len(values), 'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99),
+            'max': round(values[-1] * scale, 3)}
+
+
+def lag_summary(monitor: LoopMonitor) -> dict:
+    snapshot = monitor.snapshot(limit=3)
+    return {
+        'lag_ms': snapshot['lag_ms'],
+        'blocked': snapshot['blocked'],
+        'blocking_sites': [{'site': site['site'], 'leaf': site['leaf'], 'blocked_seconds': site['blocked_seconds']}
+                           for site in snapshot['top_sites']],
+    }
+
+
+def rss() -> int:
+    return psutil.Process().memory_info().rss
+
+
+def heartbeat_stats():
+    child = server_core.AGENT_MESSAGE_TIME.labels('heartbeat')
+    return child.count, child.sum
+
+
+async def wait_until(predicate, timeout: float, poll: float = 0.01) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(poll)
+    return True
+
+
+async def drain_db(server, timeout: float = 60):
+    """等待后台数据库调用完成，避免上一阶段的积压影响下一阶段"""
+    await wait_until(lambda: server.adb.pending == 0, timeout=timeout)
+
+
+# ==================== 测试阶段 ====================
+
+async def phase_register(agents, transport, monitor, concurrency: int) -> dict:
+    monitor.reset()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def connect(agent):
+        async with semaphore:
+            await agent.start(transport)
+            await agent.registered.wait()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connect(agent) for agent in agents))
+    elapsed = time.perf_counter() - started
+    return {'seconds': round(elapsed, 3), 'per_second': round(len(agents) / elapsed, 1), **lag_summary(monitor)}
+
+
+async def phase_burst(agents, monitor, burst: int) -> dict:
+    monitor.reset()
+    expected = len(agents) * burst
+    count_before, sum_before = heartbeat_stats()
+    started = time.perf_counter()
+    await asyncio.gather(*(agent.send_heartbeats(burst) for agent in agents))
+    completed = await wait_until(lambda: heartbeat_stats()[0] - count_before >= expected, timeout=300)
+    elapsed = time.perf_counter() - started
+    count_after, sum_after = heartbeat_stats()
+    handled = count_after - count_before
+    return {
+        'messages': handled,
+        'completed': completed,
+        'seconds': round(elapsed, 3),
+        'throughput_per_second': round(handled / elapsed, 1),
+        'server_us_per_message': round((sum_after - sum_before) / handled * 1e6, 2) if handled else None,
+        **lag_summary(monitor),
+    }
+
+
+async def phase_steady(agents, monitor, interval: float, seconds: float) -> dict:
+    monitor.reset()
+    count_before, _ = heartbeat_stats()
+    stop_at = time.monotonic() + seconds
+
+    async def run(agent):
+        await asyncio.sleep(random.uniform(0, interval))
+        while time.monotonic() < stop_at:
+            await agent.conn.send(agent.heartbeat)
+            await asyncio.sleep(interval)
+
+    await asyncio.gather(*(run(agent) for agent in agents))
+    handled = heartbeat_stats()[0] - count_before
+    return {'interval': interval, 'seconds': seconds, 'messages': handled,
+            'rate_per_second': round(handled / seconds, 1), **lag_summary(monitor)}
+
+
+async def phase_dispatch(server, agents, monitor, fanouts: int) -> dict:
+    monitor.reset()
+    agent_ids = [agent.agent_id for agent in agents]
+    latencies = []
+    fanout_seconds = []
+    for _ in range(fanouts):
+        await drain_db(server)
+        task_id = await server.create_task('echo bench', agent_ids, timeout=120, script_name='bench')
+        server.result_times[task_id] = {}
+        started = time.perf_counter()
+        await server.dispatch_task(task_id)
+        task = server.tasks[task_id]
+        await wait_until(lambda: len(task.results) >= len(agent_ids), timeout=120)
+        times = server.result_times.pop(task_id)
+        latencies.extend(t - started for t in times.values())
+        fanout_seconds.append(round(max(times.values()) - started, 3) if times else None)
+        server.tasks.pop(task_id, None)
+    return {'fanouts': fanouts, 'latency_ms': percentiles(latencies), 'fanout_seconds': fanout_seconds,
+            **lag_summary(monitor)}
+
+
+async def phase_terminal(agents, transport, sessions: int, roundtrips: int) -> dict:
+    rtts = []
+
+    async def session(agent):
+        conn = await transport.connect(f'/terminal/{agent.agent_id}', 100000 + agent.index)
+        try:
+            # 服务器的 terminal_ready 之后Agent的 terminal_ready 也会转发过来，收到数据前跳过
+            while json.loads(await conn.recv()).get('type') != 'terminal_ready':
+                pass
+            for n in range(roundtrips):
+                payload = f"echo {n}\n"
+                started = time.perf_counter()
+                await conn.send(json.dumps({'type': 'terminal_input', 'data': payload}))
+                while True:
+                    message = json.loads(await conn.recv())
+                    if message.get('type') == 'terminal_data' and message.get('data') == payload:
+                        break
+                rtts.append(time.perf_counter() - started)
+        finally:
+            await conn.close()
+
+    await asyncio.gather(*(session(agent) for agent in agents[:sessions]))
+    return {'sessions': min(sessions, len(agents)), 'roundtrips': roundtrips, 'rtt_ms': percentiles(rtts)}
+
+
+def make_database(kind: str):
+    if kind == 'sqlite':
+        from app.models import DatabaseManager
+        path = os.path.join(tempfile.mkdtemp(prefix='qunkong-bench-'), 'qunkong.db')
+        return DatabaseManager(db_config={'backend': 'sqlite', 'path': path})
+    return LocalDatabase()
+
+
+async def run_scale(args, agent_count: int) -> dict:
+    server = BenchServer(host='127.0.0.1', port=free_port(), db=make_database(args.db))
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(0.2)
+    transport = Transport(server, args.transport, server.port)
+    monitor = LoopMonitor('bench', interval=0.05, threshold=0.05)
+    monitor.start()
+
+    gc.collect()
+    rss_before = rss()
+    agents = [SimAgent(i) for i in range(agent_count)]
+    result = {'agents': agent_count, 'transport': args.transport, 'db': args.db}
+    try:
+        result['register'] = await phase_register(agents, transport, monitor, args.connect_concurrency)
+        report(agent_count, 'register', result['register'])
+        await drain_db(server)
+        gc.collect()
+        await asyncio.sleep(0.5)
+        rss_after = rss()
+        result['memory'] = {
+            'rss_before_mb': round(rss_before / 1024 ** 2, 1),
+            'rss_after_mb': round(rss_after / 1024 ** 2, 1),
+            'per_agent_kb': round((rss_after - rss_before) / agent_count / 1024, 2),
+        }
+        report(agent_count, 'memory', result['memory'])
+        phases = (
+            ('heartbeat_burst', lambda: phase_burst(agents, monitor, args.burst)),
+            ('heartbeat_steady', lambda: phase_steady(agents, monitor, args.heartbeat_interval, args.steady_seconds)),
+            ('dispatch', lambda: phase_dispatch(server, agents, monitor, args.fanouts)),
+            ('terminal', lambda: phase_terminal(agents, transport, args.terminal_sessions, args.terminal_roundtrips)),
+        )
+        for phase, run in phases:
+            # 单个阶段失败（如数据库线程池排队已满）时记录错误，继续后面的阶段
+            rejected = server.adb.stats()['rejected']
+            try:
+                result[phase] = await run()
+            except Exception as e:
+                result[phase] = {'error': repr(e)}
+            result[phase]['db_rejected'] = server.adb.stats()['rejected'] - rejected
+            report(agent_count, phase, result[phase])
+            await drain_db(server)
+        result['db_executor'] = server.adb.stats()
+    finally:
+        monitor.stop()
+        await asyncio.gather(*(agent.close() for agent in agents), return_exceptions=True)
+        server_task.cancel()
+        try:
+            await server_task
+        except (asyncio.CancelledError, Exception):
+            pass
+    return result
+
+
+# ==================== 入口 ====================
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def raise_fd_limit(needed: int) -> bool:
+    """把文件描述符软限制提高到硬限制，返回是否满足需要"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = hard if hard != resource.RLIM_INFINITY else needed
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, target), hard))
+        except (ValueError, OSError):
+            pass
+        soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    return soft >= needed
+
+
+def report(agent_count: int, phase: str, data: dict):
+    summary = {k: v for k, v in data.items() if k not in ('blocking_sites',)}
+    print(f"[{agent_count:>6}] {phase:16s} {json.dumps(summary, ensure_ascii=False)}", flush=True)
+
+
+def run_child(args, agent_count: int) -> dict:
+    """在子进程中运行单个规模"""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+        path = tmp.name
+    command = [sys.executable, '-m', 'benchmarks.bench_fleet', '--agents', str(agent_count), '--single', path,
+               '--transport', args.transport, '--db', args.db, '--burst', str(args.burst),
+               '--heartbeat-interval', str(args.heartbeat_interval), '--steady-seconds', str(args.steady_seconds),
+               '--fanouts', str(args.fanouts), '--terminal-sessions', str(args.terminal_sessions),
+               '--terminal-roundtrips', str(args.terminal_roundtrips),
+               '--connect-concurrency', str(args.connect_concurrency)]
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        completed = subprocess.run(command, cwd=cwd)
+        if completed.returncode != 0:
+            return {'agents': agent_count, 'error': f'子进程退出码 {completed.returncode}'}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.unlink(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent 集群负载模拟")
+    parser.add_argument('--agents', default='1000,5000,20000', help='Agent数量，逗号分隔的多个规模')
+    parser.add_argument('--transport', default='socket', choices=['socket', 'memory'], help='连接方式')
+    parser.add_argument('--db', default='null', choices=['null', 'sqlite'], help='数据库（空实现或 SQLite）')
+    parser.add_argument('--burst', type=int, default=5, help='心跳突发阶段每个Agent连续发送的心跳数')
+    parser.add_argument('--heartbeat-interval', type=float, default=5.0, help='稳定阶段的心跳间隔（秒）')
+    parser.add_argument('--steady-seconds', type=float, default=10.0, help='稳定阶段持续时间（秒）')
+    parser.add_argument('--fanouts', type=int, default=3, help='向全部Agent下发任务的次数')
+    parser.add_argument('--terminal-sessions', type=int, default=10, help='终端会话数')
+    parser.add_argument('--terminal-roundtrips', type=int, default=50, help='每个终端会话的往返次数')
+    parser.add_argument('--connect-concurrency', type=int, default=200, help='同时建立连接的Agent数')
+    parser.add_argument('--output', default='bench_fleet.json', help='结果JSON文件')
+    parser.add_argument('--single', help=argparse.SUPPRESS)  # 子进程：只运行一个规模，结果写入该文件
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in ('app', 'websockets'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    # 排队已满的后台写入逐条记录日志会淹没输出，改为在结果中统计 db_rejected
+    logging.getLogger('app.db_async').setLevel(logging.CRITICAL)
+
+    scales = [int(n) for n in args.agents.split(',') if n.strip()]
+
+    if args.single:
+        agent_count = scales[0]
+        if args.transport == 'socket' and not raise_fd_limit(agent_count * 2 + 256):
+            soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+            result = {'agents': agent_count, 'transport': args.transport,
+                      'error': f'文件描述符限制 {soft} 不足（需要约 {agent_count * 2 + 256}），可改用 --transport memory'}
+            print(f"[{agent_count:>6}] 跳过: {result['error']}", flush=True)
+        else:
+            result = asyncio.run(run_scale(args, agent_count))
+        with open(args.single, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    results = [run_child(args, agent_count) for agent_count in scales]
+    output = {
+        'benchmark': 'fleet',
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'websockets': websockets.__version__,
+        'args': {k: v for k, v in vars(args).items() if k != 'single'},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+热点函数微基准测试
+
+覆盖服务器和Agent热路径上的函数，每项报告吞吐（ops/s）和内存分配：
+  - cache.get / cache.set: LocalCache 在 --cache-size 条目下的命中读取、覆盖写入和淘汰写入
+  - server.heartbeat: handle_agent_message 处理完整心跳（数据库为空实现，后台写入计入耗时）
+  - terminal.is_command_allowed: 白名单/禁用/未知命令混合
+  - agent.zmodem_start / agent.zmodem_end: 4KB PTY 输出块（普通输出和包含标志的块）
+  - json.*: 心跳和 terminal_data 消息的编码/解码
+  - db.get_execution_history: 执行历史行解码（游标返回 --history-rows 行，不连接数据库）
+
+分配用 tracemalloc 测量：peak 为单次调用期间的峰值分配，retained 为连续调用
+--alloc-ops 次后每次净增的内存（持续增长说明有对象被保留）。
+完全离线运行，不需要 MySQL、Redis 或网络。
+执行方式: python -m benchmarks.bench_hot_paths [--filter cache] [--seconds 0.3] [--output hot_paths.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache import LocalCache
+from app.client import QunkongAgent
+from app.models import DatabaseManager
+from app.registry import AgentRecord
+from app.server_core import QunkongServer, TerminalManager
+
+CHUNK_SIZE = 4096
+
+
+class NullDatabase:
+    """所有方法都是空操作的数据库替身"""
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+class HistoryCursor:
+    """返回固定行的游标（行格式与 pymysql DictCursor 一致）"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        return len(self.rows)
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+class HistoryConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return HistoryCursor(self.rows)
+
+    def close(self):
+        pass
+
+
+# ==================== 测试项 ====================
+# 每个测试项返回 run(n)：连续执行 n 次操作
+
+def case_cache_get(args):
+    cache = LocalCache(max_size=args.cache_size)
+    keys = [f"agent_resource:agent-{i:06d}" for i in range(args.cache_size)]
+    for key in keys:
+        cache.set(key, {'cpu_usage': 12.5, 'memory_usage': 41.0}, ttl=300)
+    picks = [random.choice(keys) for _ in range(4096)]
+
+    def run(n):
+        get = cache.get
+        for i in range(n):
+            get(picks[i & 4095])
+    return run
+
+
+def case_cache_set(args):
+    cache = LocalCache(max_size=args.cache_size)
+    keys = [f"agent_resource:agent-{i:06d}" for i in range(args.cache_size)]
+    for key in keys:
+        cache.set(key, {'cpu_usage': 12.5}, ttl=300)
+    picks = [random.choice(keys) for _ in range(4096)]
+    value = {'cpu_usage': 12.5, 'memory_usage': 41.0}
+
+    def run(n):
+        put = cache.set
+        for i in range(n):
+            put(picks[i & 4095], value, 30)
+    return run
+
+
+def case_cache_set_evict(args):
+    # 缓存已满，每次写入新键都会淘汰最旧的条目
+    cache = LocalCache(max_size=args.cache_size)
+    for i in range(args.cache_size):
+        cache.set(f"warm:{i}", i, ttl=300)
+    counter = iter(range(10 ** 12))
+    value = {'cpu_usage': 12.5}
+
+    def run(n):
+        put = cache.set
+        for _ in range(n):
+            put(f"new:{next(counter)}", value, 30)
+    return run
+
+
+def heartbeat_message(agent_id: str) -> dict:
+    """与 QunkongAgent.send_heartbeat 相同的心跳内容"""
+    return {
+        'type': 'heartbeat',
+        'agent_id': agent_id,
+        'timestamp': datetime.now().isoformat(),
+        'cpu_usage': 12.5,
+        'memory_usage': 41.0,
+        'memory_total': 16 * 1024 ** 3,
+        'memory_used': 6 * 1024 ** 3,
+        'memory_available': 10 * 1024 ** 3,
+        'disk_info': [{'device': '/dev/sda1', 'mountpoint': '/', 'fstype': 'ext4',
+                       'total': 500 * 1024 ** 3, 'used': 120 * 1024 ** 3,
+                       'free': 380 * 1024 ** 3, 'percent': 24.0}],
+        'task_slots': {'running': 0, 'queued': 0, 'max_concurrent': 4},
+    }
+
+
+def case_server_heartbeat(args):
+    loop = asyncio.new_event_loop()
+    server = QunkongServer(db=NullDatabase())
+    agent_ids = [f"agent-{i:06d}" for i in range(args.agents)]
+    for i, agent_id in enumerate(agent_ids):
+        server.agents.add(AgentRecord(id=agent_id, hostname=f"host-{i:06d}",
+                                      ip=f"10.0.{(i >> 8) & 255}.{i & 255}", websocket=None))
+        server.agent_store.put({'id': agent_id, 'hostname': f"host-{i:06d}"}, dirty=False)
+    messages = [heartbeat_message(agent_id) for agent_id in agent_ids]
+
+    async def batch(n):
+        handle = server.handle_agent_message
+        count = len(messages)
+        for i in range(n):
+            await handle(None, messages[i % count])
+            if i % 200 == 199:
+                # 资源信息写入以后台任务提交，定期等待完成，避免超出数据库线程池排队上限
+                await server.adb.drain()
+        await server.adb.drain()
+
+    def run(n):
+        loop.run_until_complete(batch(n))
+    return run
+
+
+def case_terminal_command(args):
+    manager = TerminalManager()
+    commands = ['ls -la /var/log', 'tail -n 100 /var/log/messages', 'grep error app.log | wc -l',
+                'sudo reboot', 'rm -rf /tmp/cache', 'vim /etc/hosts', 'python3 manage.py', '   ',
+                'df -h', 'journalctl -u nginx --since today']
+
+    def run(n):
+        check = manager.is_command_allowed
+        for i in range(n):
+            check(commands[i % 10])
+    return run
+
+
+def pty_chunk(marker: bytes = b'') -> bytes:
+    """4KB 的终端输出（ls -l 风格），marker 放在块末尾"""
+    line = b'-rw-r--r-- 1 root root  4096 Oct 17 10:00 access.log.2026-10-17\r\n'
+    body = (line * (CHUNK_SIZE // len(line) + 1))[:CHUNK_SIZE - len(marker)]
+    return body + marker
+
+
+def _agent():
+    # 不调用 __init__（会探测外网IP），检测函数只读取参数
+    return QunkongAgent.__new__(QunkongAgent)
+
+
+def case_zmodem_start(args):
+    detect = _agent()._detect_zmodem_start
+    chunks = [pty_chunk(), pty_chunk(b'**\x18B00000000000000\r\x8a')]
+
+    def run(n):
+        for i in range(n):
+            detect(chunks[i & 1])
+    return run
+
+
+def case_zmodem_end(args):
+    detect = _agent()._detect_zmodem_end
+    chunks = [pty_chunk(), pty_chunk(b'\x18h' + b'\x00' * 12 + b'OO')]
+
+    def run(n):
+        for i in range(n):
+            detect(chunks[i & 1])
+    return run
+
+
+def terminal_data_message() -> dict:
+    return {'type': 'terminal_data', 'session_id': 'S' * 43,
+            'data': pty_chunk().decode('utf-8'), 'is_binary': False}
+
+
+def case_json_encode(message):
+    def factory(args):
+        def run(n):
+            dumps = json.dumps
+            for _ in range(n):
+                dumps(message)
+        return run
+    return factory
+
+
+def case_json_decode(message):
+    raw = json.dumps(message)
+
+    def factory(args):
+        def run(n):
+            loads = json.loads
+            for _ in range(n):
+                loads(raw)
+        return run
+    return factory
+
+
+def history_rows(count: int, targets: int):
+    created = datetime(2026, 10, 17, 10, 0, 0)
+    rows = []
+    for i in range(count):
+        hosts = [f"agent-{j:06d}" for j in range(targets)]
+        results = {host: {'exit_code': 0, 'stdout': 'ok\n', 'stderr': '', 'execution_time': 0.12} for host in hosts}
+        rows.append({
+            'id': f"task-{i:06d}", 'script_name': 'check_disk', 'script_content': 'df -h\n' * 20,
+            'script_params': '', 'target_hosts': json.dumps(hosts), 'status': 'completed',
+            'created_at': created, 'started_at': created + timedelta(seconds=1),
+            'completed_at': created + timedelta(seconds=5), 'timeout': 7200, 'execution_user': 'root',
+            'results': json.dumps(results), 'error_message': None, 'project_id': 1,
+        })
+    return rows
+
+
+def case_execution_history(args):
+    db = DatabaseManager.__new__(DatabaseManager)
+    rows = history_rows(args.history_rows, args.history_targets)
+    db._get_connection = lambda: HistoryConnection(rows)
+
+    def run(n):
+        for _ in range(n):
+            db.get_execution_history(limit=args.history_rows)
+    return run
+
+
+CASES = [
+    ('cache.get', case_cache_get),
+    ('cache.set', case_cache_set),
+    ('cache.set_evict', case_cache_set_evict),
+    ('server.heartbeat', case_server_heartbeat),
+    ('terminal.is_command_allowed', case_terminal_command),
+    ('agent.zmodem_start', case_zmodem_start),
+    ('agent.zmodem_end', case_zmodem_end),
+    ('json.encode_heartbeat', case_json_encode(heartbeat_message('agent-000000'))),
+    ('json.decode_heartbeat', case_json_decode(heartbeat_message('agent-000000'))),
+    ('json.encode_terminal_data', case_json_encode(terminal_data_message())),
+    ('json.decode_terminal_data', case_json_decode(terminal_data_message())),
+    ('db.get_execution_history', case_execution_history),
+]
+
+
+# ==================== 测量 ====================
+
+def calibrate(run, seconds: float) -> int:
+    """找到耗时约 seconds 的操作次数"""
+    n = 1
+    while True:
+        start = time.perf_counter()
+        run(n)
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds / 10 or n >= 10 ** 8:
+            return max(1, int(n * seconds / max(elapsed, 1e-9)))
+        n *= 10
+
+
+def measure_time(run, seconds: float, repeat: int) -> float:
+    """返回每次操作的最短平均耗时（秒）"""
+    n = calibrate(run, seconds)
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run(n)
+        best = min(best, (time.perf_counter() - start) / n)
+    return best
+
+
+def measure_alloc(run, ops: int):
+    """返回 (单次调用峰值分配字节, 每次调用净增字节)"""
+    run(ops)  # 预热（填充缓存、建立内部结构）
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run(1)
+        _, peak = tracemalloc.get_traced_memory()
+        start, _ = tracemalloc.get_traced_memory()
+        run(ops)
+        gc.collect()
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - before), (end - start) / ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点函数微基准测试")
+    parser.add_argument('--filter', default='', help='只运行名称包含该字符串的测试项（逗号分隔多个）')
+    parser.add_argument('--seconds', type=float, default=0.3, help='每轮测量的目标时长（秒）')
+    parser.add_argument('--repeat', type=int, default=5, help='测量轮数（取最优）')
+    parser.add_argument('--alloc-ops', type=int, default=1000, help='测量净增内存时的调用次数')
+    parser.add_argument('--cache-size', type=int, default=10000, help='LocalCache 条目数')
+    parser.add_argument('--agents', type=int, default=1000, help='心跳测试的Agent数量')
+    parser.add_argument('--history-rows', type=int, default=100, help='每次查询返回的执行历史行数')
+    parser.add_argument('--history-targets', type=int, default=10, help='每条执行历史的目标主机数')
+    parser.add_argument('--output', help='结果写入JSON文件')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    random.seed(0)
+    filters = [f.strip() for f in args.filter.split(',') if f.strip()]
+
+    results = []
+    print(f"{'测试项':32s} {'ops/s':>14s} {'耗时/次':>12s} {'峰值分配':>12s} {'净增/次':>10s}")
+    for name, factory in CASES:
+        if filters and not any(f in name for f in filters):
+            continue
+        run = factory(args)
+        per_op = measure_time(run, args.seconds, args.repeat)
+        peak, retained = measure_alloc(run, args.alloc_ops)
+        result = {
+            'name': name,
+            'ops_per_second': round(1 / per_op, 1),
+            'us_per_op': round(per_op * 1e6, 3),
+            'peak_alloc_bytes': peak,
+            'retained_bytes_per_op': round(retained, 1),
+        }
+        results.append(result)
+        print(f"{name:32s} {result['ops_per_second']:>14,.0f} {result['us_per_op']:>10.3f}us "
+              f"{peak:>10,d}B {retained:>9.1f}B")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'benchmark': 'hot_paths',
+                'timestamp': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'args': vars(args),
+                'results': results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+本地缓存基准测试
+
+对比原 LocalCache（dict + list 维护LRU顺序，get/set/delete 都要 list.remove，O(n)）
+与分片 OrderedDict 实现（O(1)）在大容量下的读写耗时，并测量多线程并发读写的吞吐。
+执行方式: python -m benchmarks.bench_local_cache [--keys 100000] [--ops 20000] [--threads 4]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache import LocalCache
+
+
+class LegacyLocalCache:
+    """原实现（无锁，LRU顺序保存在列表中）"""
+
+    def __init__(self, max_size: int = 1000):
+        self.cache = {}
+        self.max_size = max_size
+        self.access_order = []
+
+    def get(self, key, default=None):
+        if key in self.cache:
+            value, expire_at = self.cache[key]
+            if expire_at > time.time():
+                if key in self.access_order:
+                    self.access_order.remove(key)
+                self.access_order.append(key)
+                return value
+            del self.cache[key]
+            if key in self.access_order:
+                self.access_order.remove(key)
+        return default
+
+    def set(self, key, value, ttl=300):
+        if len(self.cache) >= self.max_size and self.access_order:
+            oldest_key = self.access_order.pop(0)
+            if oldest_key in self.cache:
+                del self.cache[oldest_key]
+        self.cache[key] = (value, time.time() + ttl)
+        if key in self.access_order:
+            self.access_order.remove(key)
+        self.access_order.append(key)
+
+
+def fill(cache, keys):
+    for key in keys:
+        cache.set(key, {'cpu': 1.5, 'memory': 2048}, ttl=300)
+
+
+def run_ops(cache, keys, ops: int, seed: int) -> float:
+    """90% 读、10% 写的随机访问，返回耗时（秒）"""
+    rnd = random.Random(seed)
+    picks = [rnd.choice(keys) for _ in range(ops)]
+    start = time.perf_counter()
+    for i, key in enumerate(picks):
+        if i % 10 == 0:
+            cache.set(key, i, ttl=300)
+        else:
+            cache.get(key)
+    return time.perf_counter() - start
+
+
+def run_threads(cache, keys, ops: int, threads: int) -> float:
+    """多个线程同时执行 run_ops，返回总耗时（秒）"""
+    workers = [threading.Thread(target=run_ops, args=(cache, keys, ops, n)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地缓存基准测试")
+    parser.add_argument('--keys', type=int, default=100000, help='缓存条目数（也是容量上限）')
+    parser.add_argument('--ops', type=int, default=20000, help='每轮操作次数')
+    parser.add_argument('--threads', type=int, default=4, help='并发测试的线程数')
+    parser.add_argument('--skip-legacy', action='store_true', help='跳过原实现（规模很大时耗时较长）')
+    args = parser.parse_args()
+
+    keys = [f"agent_resource:agent-{i:06d}" for i in range(args.keys)]
+    print(f"缓存条目: {args.keys}, 每轮操作: {args.ops}（90% 读 / 10% 写）")
+
+    cache = LocalCache(max_size=args.keys)
+    start = time.perf_counter()
+    fill(cache, keys)
+    print(f"分片LRU 填充: {(time.perf_counter() - start) * 1000:10.2f} ms")
+    new = run_ops(cache, keys, args.ops, 0)
+    print(f"分片LRU 读写: {new * 1000:10.2f} ms  ({args.ops / new:,.0f} ops/s)")
+
+    elapsed = run_threads(cache, keys, args.ops, args.threads)
+    total = args.ops * args.threads
+    print(f"分片LRU {args.threads}线程: {elapsed * 1000:8.2f} ms  ({total / elapsed:,.0f} ops/s)")
+
+    budget = LocalCache(max_size=args.keys, max_bytes=16 * 1024 * 1024)
+    fill(budget, keys)
+    stats = budget.stats()
+    print(f"16MB 上限:   {stats['size']} 条, {stats['bytes'] / 1024 / 1024:.1f} MB, 淘汰 {stats['evictions']} 条")
+
+    if not args.skip_legacy:
+        legacy = LegacyLocalCache(max_size=args.keys)
+        start = time.perf_counter()
+        fill(legacy, keys)
+        print(f"原实现 填充:  {(time.perf_counter() - start) * 1000:10.2f} ms")
+        old = run_ops(legacy, keys, args.ops, 0)
+        print(f"原实现 读写:  {old * 1000:10.2f} ms  ({args.ops / old:,.0f} ops/s)")
+        print(f"加速比:       {old / new:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@
 -- 创建时间: 2025-11-29
 -- 版本: v2.0 (RBAC简化版)
 -- 说明: 简化的RBAC模型,只保留用户管理和项目管理
+--       本脚本同时是应用启动迁移的基线版本(app/migrations),之后的结构变更
+--       放在 app/migrations/versions 下的编号迁移中
 -- ============================================================
 
 -- 创建数据库
@@ -23,6 +25,7 @@ CREATE TABLE IF NOT EXISTS users (
     password_hash VARCHAR(255) NOT NULL,
     salt VARCHAR(32) NOT NULL,
     role VARCHAR(20) DEFAULT 'user' COMMENT 'admin:系统管理员, user:普通用户',
+    default_tenant_id INT DEFAULT NULL COMMENT '保留字段,不再使用',
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -30,7 +33,8 @@ CREATE TABLE IF NOT EXISTS users (
     login_count INT DEFAULT 0,
     INDEX idx_username (username),
     INDEX idx_email (email),
-    INDEX idx_role (role)
+    INDEX idx_role (role),
+    INDEX idx_default_tenant_id (default_tenant_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户表';
 
 -- 用户会话表
@@ -142,6 +146,7 @@ CREATE TABLE IF NOT EXISTS agents (
     last_heartbeat DATETIME,
     register_time DATETIME,
     websocket_info JSON,
+    tags JSON,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_hostname (hostname),
@@ -149,10 +154,29 @@ CREATE TABLE IF NOT EXISTS agents (
     INDEX idx_external_ip (external_ip),
     INDEX idx_os_type (os_type),
     INDEX idx_status (status),
+    INDEX idx_tenant_id (tenant_id),
     INDEX idx_project_id (project_id),
     INDEX idx_last_heartbeat (last_heartbeat)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Agent基本信息表';
 
+-- 项目-Agent关联表
+CREATE TABLE IF NOT EXISTS project_agents (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    project_id INT NOT NULL,
+    agent_id VARCHAR(64) NOT NULL,
+    can_execute BOOLEAN DEFAULT TRUE,
+    can_terminal BOOLEAN DEFAULT TRUE,
+    assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    assigned_by INT,
+    status VARCHAR(20) DEFAULT 'active',
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    FOREIGN KEY (agent_id) REFERENCES agents(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_project_agent (project_id, agent_id),
+    INDEX idx_project_id (project_id),
+    INDEX idx_agent_id (agent_id),
+    INDEX idx_status (status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='项目-Agent关联表';
+
 -- Agent 系统信息表
 CREATE TABLE IF NOT EXISTS agent_system_info (
     agent_id VARCHAR(64) PRIMARY KEY,
@@ -272,28 +296,58 @@ CREATE TABLE IF NOT EXISTS simple_job_executions (
     INDEX idx_started_at (started_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='作业执行历史表';
 
+-- 作业执行日志表(只追加,按序号增量读取)
+CREATE TABLE IF NOT EXISTS simple_job_execution_logs (
+    execution_id VARCHAR(64) NOT NULL,
+    seq INT NOT NULL,
+    created_at DATETIME(3) NOT NULL,
+    message TEXT,
+    PRIMARY KEY (execution_id, seq)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='作业执行日志表';
+
 -- ============================================================
 -- 执行历史表(脚本执行)
 -- ============================================================
 
 CREATE TABLE IF NOT EXISTS execution_history (
     id VARCHAR(64) PRIMARY KEY,
-    task_name VARCHAR(255),
-    script_name VARCHAR(255),
+    script_name VARCHAR(255) NOT NULL,
+    script_content LONGTEXT,
+    script_params TEXT,
     target_hosts JSON,
-    execution_user VARCHAR(50),
-    start_time DATETIME,
-    end_time DATETIME,
-    status VARCHAR(20),
+    project_id INT,
+    status VARCHAR(20) DEFAULT 'PENDING',
+    created_at DATETIME,
+    started_at DATETIME,
+    completed_at DATETIME,
+    timeout INT DEFAULT 7200,
+    execution_user VARCHAR(100) DEFAULT 'root',
     results JSON,
     error_message TEXT,
-    project_id INT,
-    INDEX idx_task_name (task_name),
+    created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_script_name (script_name),
+    INDEX idx_status (status),
+    INDEX idx_created_at (created_at),
+    INDEX idx_execution_user (execution_user),
     INDEX idx_project_id (project_id),
-    INDEX idx_start_time (start_time),
-    INDEX idx_status (status)
+    INDEX idx_created_id (created_at, id),
+    INDEX idx_project_created_id (project_id, created_at, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='脚本执行历史表';
 
+-- 执行目标表(每个任务在每台主机上的执行记录,按Agent查询执行历史)
+CREATE TABLE IF NOT EXISTS execution_targets (
+    task_id VARCHAR(64) NOT NULL,
+    agent_id VARCHAR(64) NOT NULL,
+    status VARCHAR(20) DEFAULT 'RUNNING',
+    exit_code INT,
+    duration DOUBLE,
+    dispatched_at DATETIME,
+    finished_at DATETIME,
+    PRIMARY KEY (task_id, agent_id),
+    INDEX idx_agent_finished (agent_id, finished_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='执行目标表';
+
 -- ============================================================
 -- 作业模板表(复杂作业系统)
 -- ============================================================
@@ -374,6 +428,29 @@ CREATE TABLE IF NOT EXISTS job_step_executions (
     INDEX idx_task_id (task_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='作业步骤执行记录表';
 
+CREATE TABLE IF NOT EXISTS job_schedules (
+    id VARCHAR(64) PRIMARY KEY,
+    template_id VARCHAR(64) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    description TEXT,
+    cron_expression VARCHAR(100) NOT NULL,
+    timezone VARCHAR(50) DEFAULT 'Asia/Shanghai',
+    is_active BOOLEAN DEFAULT TRUE,
+    params JSON,
+    target_hosts JSON,
+    created_by INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    last_run_at TIMESTAMP NULL,
+    next_run_at TIMESTAMP NULL,
+    run_count INT DEFAULT 0,
+    FOREIGN KEY (template_id) REFERENCES job_templates(id) ON DELETE CASCADE,
+    INDEX idx_template_id (template_id),
+    INDEX idx_is_active (is_active),
+    INDEX idx_next_run_at (next_run_at),
+    INDEX idx_created_by (created_by)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='作业调度表';
+
 -- ============================================================
 -- 租户相关表(保留但不再使用)
 -- ============================================================
@@ -0,0 +1,450 @@
+-- ============================================================
+-- Qunkong SQLite 数据库结构
+-- 说明: SQLite 后端([database] backend = sqlite)启动时执行,与 init_complete.sql
+--       加上 app/migrations/versions 中所有迁移之后的 MySQL 结构一致。
+--       新增迁移时需要同步修改本文件(只使用 IF NOT EXISTS,可重复执行)。
+--       SQLite 的索引名在库内全局唯一,因此加上表名前缀。
+--       ON UPDATE CURRENT_TIMESTAMP 用触发器实现,只加在页面上显示 updated_at 的表上;
+--       agents/agent_system_info/execution_history 的写入频繁且不读取该字段,不加触发器。
+-- ============================================================
+
+-- ============================================================
+-- 用户认证相关表
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    salt VARCHAR(32) NOT NULL,
+    role VARCHAR(20) DEFAULT 'user',
+    default_tenant_id INT DEFAULT NULL,
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    last_login TIMESTAMP NULL,
+    login_count INT DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users (role);
+CREATE INDEX IF NOT EXISTS idx_users_default_tenant_id ON users (default_tenant_id);
+CREATE TRIGGER IF NOT EXISTS trg_users_updated_at AFTER UPDATE ON users FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at BEGIN UPDATE users SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+
+CREATE TABLE IF NOT EXISTS user_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash VARCHAR(255) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    ip_address VARCHAR(45),
+    user_agent TEXT,
+    is_active BOOLEAN DEFAULT TRUE
+);
+CREATE INDEX IF NOT EXISTS idx_user_sessions_token_hash ON user_sessions (token_hash);
+CREATE INDEX IF NOT EXISTS idx_user_sessions_user_id ON user_sessions (user_id);
+CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at ON user_sessions (expires_at);
+
+CREATE TABLE IF NOT EXISTS user_permissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    permission VARCHAR(50) NOT NULL,
+    resource VARCHAR(100),
+    granted_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    granted_by INT REFERENCES users(id) ON DELETE SET NULL,
+    UNIQUE (user_id, permission, resource)
+);
+CREATE INDEX IF NOT EXISTS idx_user_permissions_permission ON user_permissions (permission);
+
+-- ============================================================
+-- 项目管理表
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_code VARCHAR(50) UNIQUE NOT NULL,
+    project_name VARCHAR(100) NOT NULL,
+    description TEXT,
+    status VARCHAR(20) DEFAULT 'active',
+    created_by INT NOT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_projects_status ON projects (status);
+CREATE INDEX IF NOT EXISTS idx_projects_created_by ON projects (created_by);
+CREATE INDEX IF NOT EXISTS idx_projects_created_at ON projects (created_at);
+CREATE TRIGGER IF NOT EXISTS trg_projects_updated_at AFTER UPDATE ON projects FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at BEGIN UPDATE projects SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+
+CREATE TABLE IF NOT EXISTS project_members (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    role VARCHAR(50) DEFAULT 'readonly',
+    joined_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    invited_by INT REFERENCES users(id) ON DELETE SET NULL,
+    status VARCHAR(20) DEFAULT 'active',
+    UNIQUE (project_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_project_members_user_id ON project_members (user_id);
+CREATE INDEX IF NOT EXISTS idx_project_members_role ON project_members (role);
+
+CREATE TABLE IF NOT EXISTS project_member_permissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    permission_key VARCHAR(50) NOT NULL,
+    is_allowed BOOLEAN DEFAULT TRUE,
+    granted_by INT REFERENCES users(id) ON DELETE SET NULL,
+    granted_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (project_id, user_id, permission_key)
+);
+CREATE INDEX IF NOT EXISTS idx_project_member_permissions_key ON project_member_permissions (permission_key);
+
+-- ============================================================
+-- Agent 管理表
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS agents (
+    id VARCHAR(64) PRIMARY KEY,
+    hostname VARCHAR(255) NOT NULL,
+    ip_address VARCHAR(45) NOT NULL,
+    external_ip VARCHAR(45) DEFAULT '',
+    os_type VARCHAR(50) DEFAULT 'unknown',
+    os_version VARCHAR(100) DEFAULT '',
+    agent_version VARCHAR(20) DEFAULT '1.0.0',
+    cpu_count INT DEFAULT 0,
+    memory_total BIGINT DEFAULT 0,
+    disk_total BIGINT DEFAULT 0,
+    status VARCHAR(20) DEFAULT 'offline',
+    project_id INT DEFAULT NULL,
+    tenant_id INT DEFAULT NULL,
+    last_heartbeat DATETIME,
+    register_time DATETIME,
+    websocket_info TEXT,
+    tags TEXT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_agents_hostname ON agents (hostname);
+CREATE INDEX IF NOT EXISTS idx_agents_ip_address ON agents (ip_address);
+CREATE INDEX IF NOT EXISTS idx_agents_external_ip ON agents (external_ip);
+CREATE INDEX IF NOT EXISTS idx_agents_status ON agents (status);
+CREATE INDEX IF NOT EXISTS idx_agents_project_id ON agents (project_id);
+CREATE INDEX IF NOT EXISTS idx_agents_last_heartbeat ON agents (last_heartbeat);
+
+CREATE TABLE IF NOT EXISTS project_agents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    agent_id VARCHAR(64) NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+    can_execute BOOLEAN DEFAULT TRUE,
+    can_terminal BOOLEAN DEFAULT TRUE,
+    assigned_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    assigned_by INT,
+    status VARCHAR(20) DEFAULT 'active',
+    UNIQUE (project_id, agent_id)
+);
+CREATE INDEX IF NOT EXISTS idx_project_agents_agent_id ON project_agents (agent_id);
+CREATE INDEX IF NOT EXISTS idx_project_agents_status ON project_agents (status);
+
+CREATE TABLE IF NOT EXISTS agent_system_info (
+    agent_id VARCHAR(64) PRIMARY KEY REFERENCES agents(id) ON DELETE CASCADE,
+    hostname VARCHAR(255),
+    ip_address VARCHAR(45),
+    project_id INT DEFAULT NULL,
+    last_heartbeat DATETIME,
+    status VARCHAR(20),
+    register_time DATETIME,
+    system_info TEXT,
+    network_info TEXT,
+    memory_info TEXT,
+    disk_info TEXT,
+    cpu_info TEXT,
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS agent_install_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INT NOT NULL,
+    user_id INT NOT NULL,
+    batch_id VARCHAR(64) NOT NULL,
+    ip VARCHAR(50) NOT NULL,
+    username VARCHAR(50) NOT NULL,
+    port INT NOT NULL DEFAULT 22,
+    agent_id VARCHAR(64),
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'success', 'failed')),
+    message TEXT,
+    command_output TEXT,
+    download_url VARCHAR(500),
+    agent_md5 VARCHAR(64),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_agent_install_history_project_id ON agent_install_history (project_id);
+CREATE INDEX IF NOT EXISTS idx_agent_install_history_batch_id ON agent_install_history (batch_id);
+CREATE INDEX IF NOT EXISTS idx_agent_install_history_created_at ON agent_install_history (created_at);
+
+-- ============================================================
+-- 作业管理表
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS simple_jobs (
+    id VARCHAR(64) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    description TEXT,
+    project_id INT NOT NULL,
+    created_by INT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_simple_jobs_name ON simple_jobs (name);
+CREATE INDEX IF NOT EXISTS idx_simple_jobs_project_id ON simple_jobs (project_id);
+CREATE INDEX IF NOT EXISTS idx_simple_jobs_created_at ON simple_jobs (created_at);
+CREATE TRIGGER IF NOT EXISTS trg_simple_jobs_updated_at AFTER UPDATE ON simple_jobs FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at BEGIN UPDATE simple_jobs SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+
+CREATE TABLE IF NOT EXISTS simple_job_host_groups (
+    id VARCHAR(64) PRIMARY KEY,
+    job_id VARCHAR(64) NOT NULL REFERENCES simple_jobs(id) ON DELETE CASCADE,
+    group_name VARCHAR(255) NOT NULL,
+    host_ids TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_simple_job_host_groups_job_id ON simple_job_host_groups (job_id);
+
+CREATE TABLE IF NOT EXISTS simple_job_variables (
+    id VARCHAR(64) PRIMARY KEY,
+    job_id VARCHAR(64) NOT NULL REFERENCES simple_jobs(id) ON DELETE CASCADE,
+    var_name VARCHAR(255) NOT NULL,
+    var_value TEXT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (job_id, var_name)
+);
+
+CREATE TABLE IF NOT EXISTS simple_job_steps (
+    id VARCHAR(64) PRIMARY KEY,
+    job_id VARCHAR(64) NOT NULL REFERENCES simple_jobs(id) ON DELETE CASCADE,
+    step_order INT NOT NULL,
+    step_name VARCHAR(255) NOT NULL,
+    script_content TEXT NOT NULL,
+    host_group_id VARCHAR(64) REFERENCES simple_job_host_groups(id) ON DELETE SET NULL,
+    timeout INT DEFAULT 300
+);
+CREATE INDEX IF NOT EXISTS idx_simple_job_steps_job_id ON simple_job_steps (job_id);
+CREATE INDEX IF NOT EXISTS idx_simple_job_steps_step_order ON simple_job_steps (step_order);
+
+CREATE TABLE IF NOT EXISTS simple_job_executions (
+    id VARCHAR(64) PRIMARY KEY,
+    job_id VARCHAR(64) NOT NULL REFERENCES simple_jobs(id) ON DELETE CASCADE,
+    job_name VARCHAR(255),
+    project_id INT NOT NULL,
+    status VARCHAR(20) DEFAULT 'PENDING',
+    current_step INT DEFAULT 0,
+    total_steps INT DEFAULT 0,
+    started_at TIMESTAMP NULL,
+    completed_at TIMESTAMP NULL,
+    error_message TEXT,
+    execution_log TEXT,
+    results TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_simple_job_executions_job_id ON simple_job_executions (job_id);
+CREATE INDEX IF NOT EXISTS idx_simple_job_executions_project_id ON simple_job_executions (project_id);
+CREATE INDEX IF NOT EXISTS idx_simple_job_executions_status ON simple_job_executions (status);
+CREATE INDEX IF NOT EXISTS idx_simple_job_executions_started_at ON simple_job_executions (started_at);
+
+CREATE TABLE IF NOT EXISTS simple_job_execution_logs (
+    execution_id VARCHAR(64) NOT NULL,
+    seq INT NOT NULL,
+    created_at DATETIME NOT NULL,
+    message TEXT,
+    PRIMARY KEY (execution_id, seq)
+);
+
+-- ============================================================
+-- 执行历史表(脚本执行)
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS execution_history (
+    id VARCHAR(64) PRIMARY KEY,
+    script_name VARCHAR(255) NOT NULL,
+    script_content TEXT,
+    script_params TEXT,
+    target_hosts TEXT,
+    project_id INT,
+    status VARCHAR(20) DEFAULT 'PENDING',
+    created_at DATETIME,
+    started_at DATETIME,
+    completed_at DATETIME,
+    timeout INT DEFAULT 7200,
+    execution_user VARCHAR(100) DEFAULT 'root',
+    results TEXT,
+    error_message TEXT,
+    created_timestamp TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_timestamp TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_execution_history_script_name ON execution_history (script_name);
+CREATE INDEX IF NOT EXISTS idx_execution_history_status ON execution_history (status);
+CREATE INDEX IF NOT EXISTS idx_execution_history_execution_user ON execution_history (execution_user);
+CREATE INDEX IF NOT EXISTS idx_execution_history_created_id ON execution_history (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_execution_history_project_created_id ON execution_history (project_id, created_at, id);
+
+CREATE TABLE IF NOT EXISTS execution_targets (
+    task_id VARCHAR(64) NOT NULL,
+    agent_id VARCHAR(64) NOT NULL,
+    status VARCHAR(20) DEFAULT 'RUNNING',
+    exit_code INT,
+    duration DOUBLE,
+    dispatched_at DATETIME,
+    finished_at DATETIME,
+    PRIMARY KEY (task_id, agent_id)
+);
+CREATE INDEX IF NOT EXISTS idx_execution_targets_agent_finished ON execution_targets (agent_id, finished_at);
+
+-- ============================================================
+-- 作业模板表(复杂作业系统)
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS job_templates (
+    id VARCHAR(64) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    description TEXT,
+    project_id INT NOT NULL,
+    category VARCHAR(50) DEFAULT 'custom',
+    tags TEXT,
+    steps TEXT NOT NULL,
+    default_params TEXT,
+    timeout INT DEFAULT 7200,
+    created_by INT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    is_active BOOLEAN DEFAULT TRUE,
+    version INT DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_job_templates_project_id ON job_templates (project_id);
+CREATE INDEX IF NOT EXISTS idx_job_templates_category ON job_templates (category);
+CREATE INDEX IF NOT EXISTS idx_job_templates_created_at ON job_templates (created_at);
+CREATE TRIGGER IF NOT EXISTS trg_job_templates_updated_at AFTER UPDATE ON job_templates FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at BEGIN UPDATE job_templates SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+
+CREATE TABLE IF NOT EXISTS job_instances (
+    id VARCHAR(64) PRIMARY KEY,
+    template_id VARCHAR(64) REFERENCES job_templates(id) ON DELETE SET NULL,
+    name VARCHAR(255) NOT NULL,
+    description TEXT,
+    project_id INT NOT NULL,
+    status VARCHAR(20) DEFAULT 'PENDING',
+    priority INT DEFAULT 5,
+    params TEXT,
+    target_hosts TEXT,
+    steps_status TEXT,
+    current_step INT DEFAULT 0,
+    total_steps INT DEFAULT 0,
+    created_by INT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    started_at TIMESTAMP NULL,
+    completed_at TIMESTAMP NULL,
+    timeout INT DEFAULT 7200,
+    retry_count INT DEFAULT 0,
+    max_retries INT DEFAULT 3,
+    error_message TEXT,
+    execution_log TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_job_instances_template_id ON job_instances (template_id);
+CREATE INDEX IF NOT EXISTS idx_job_instances_project_id ON job_instances (project_id);
+CREATE INDEX IF NOT EXISTS idx_job_instances_status ON job_instances (status);
+CREATE INDEX IF NOT EXISTS idx_job_instances_created_at ON job_instances (created_at);
+
+CREATE TABLE IF NOT EXISTS job_step_executions (
+    id VARCHAR(64) PRIMARY KEY,
+    job_instance_id VARCHAR(64) NOT NULL REFERENCES job_instances(id) ON DELETE CASCADE,
+    project_id INT NOT NULL,
+    step_index INT NOT NULL,
+    step_name VARCHAR(255) NOT NULL,
+    step_type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) DEFAULT 'PENDING',
+    started_at TIMESTAMP NULL,
+    completed_at TIMESTAMP NULL,
+    execution_time DECIMAL(10,3),
+    task_id VARCHAR(64),
+    results TEXT,
+    error_message TEXT,
+    retry_count INT DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_job_step_executions_instance ON job_step_executions (job_instance_id);
+CREATE INDEX IF NOT EXISTS idx_job_step_executions_task_id ON job_step_executions (task_id);
+
+CREATE TABLE IF NOT EXISTS job_schedules (
+    id VARCHAR(64) PRIMARY KEY,
+    template_id VARCHAR(64) NOT NULL REFERENCES job_templates(id) ON DELETE CASCADE,
+    name VARCHAR(255) NOT NULL,
+    description TEXT,
+    cron_expression VARCHAR(100) NOT NULL,
+    timezone VARCHAR(50) DEFAULT 'Asia/Shanghai',
+    is_active BOOLEAN DEFAULT TRUE,
+    params TEXT,
+    target_hosts TEXT,
+    created_by INT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    last_run_at TIMESTAMP NULL,
+    next_run_at TIMESTAMP NULL,
+    run_count INT DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_job_schedules_template_id ON job_schedules (template_id);
+CREATE INDEX IF NOT EXISTS idx_job_schedules_next_run_at ON job_schedules (next_run_at);
+CREATE TRIGGER IF NOT EXISTS trg_job_schedules_updated_at AFTER UPDATE ON job_schedules FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at BEGIN UPDATE job_schedules SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+
+-- ============================================================
+-- 租户相关表(保留但不再使用)
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS tenants (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant_code VARCHAR(50) UNIQUE NOT NULL,
+    tenant_name VARCHAR(100) NOT NULL,
+    description TEXT,
+    status VARCHAR(20) DEFAULT 'active',
+    max_users INT DEFAULT 10,
+    max_agents INT DEFAULT 50,
+    max_concurrent_jobs INT DEFAULT 10,
+    storage_quota_gb INT DEFAULT 100,
+    contact_name VARCHAR(100),
+    contact_email VARCHAR(100),
+    contact_phone VARCHAR(20),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    created_by INT
+);
+CREATE TRIGGER IF NOT EXISTS trg_tenants_updated_at AFTER UPDATE ON tenants FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at BEGIN UPDATE tenants SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id; END;
+
+CREATE TABLE IF NOT EXISTS tenant_members (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant_id INT NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    role VARCHAR(50) DEFAULT 'tenant_member',
+    joined_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    invited_by INT REFERENCES users(id) ON DELETE SET NULL,
+    status VARCHAR(20) DEFAULT 'active',
+    UNIQUE (tenant_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_tenant_members_user_id ON tenant_members (user_id);
+
+CREATE TABLE IF NOT EXISTS tenant_usage_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant_id INT NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    stat_date DATE NOT NULL,
+    active_users INT DEFAULT 0,
+    active_agents INT DEFAULT 0,
+    total_jobs INT DEFAULT 0,
+    successful_jobs INT DEFAULT 0,
+    failed_jobs INT DEFAULT 0,
+    storage_used_gb DECIMAL(10,2) DEFAULT 0,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (tenant_id, stat_date)
+);
+
+-- 已应用的迁移版本(与 MySQL 后端共用同一张表的结构)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at DATETIME NOT NULL,
+    duration_ms INT DEFAULT 0
+);
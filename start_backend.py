@@ -57,6 +57,9 @@ def check_database_config():
         config = configparser.ConfigParser()
         config.read(config_file, encoding='utf-8')
         
+        if config.get('database', 'backend', fallback='mysql').strip().lower() == 'sqlite':
+            return True
+        
         username = config.get('mysql', 'username')
         if username == 'your_username':
             print("警告: 数据库配置文件未填写")
@@ -82,7 +85,7 @@ def test_database_connection():
     except Exception as e:
         print(f"数据库连接失败: {e}")
         print("请检查:")
-        print("1. MySQL服务是否运行")
+        print("1. MySQL服务是否运行（或在配置文件中设置 [database] backend = sqlite）")
         print("2. 数据库配置是否正确")
         print("3. 数据库用户权限是否足够")
         return False
@@ -22,7 +22,8 @@ port = get_port()
 
 # Worker 配置
 # 注意：由于 WebSocket 需要共享状态，建议使用单 worker
-# 如果需要多 worker，必须启用 Redis 集群模式
+# 如果需要多 worker，在 config/database.conf 中设置 [server] api_workers 并用 python -m app.main 启动
+# （核心进程持有 Agent 连接，API worker 经 Unix 套接字访问），或者启用 Redis 集群模式
 workers = 1
 
 # 异步配置
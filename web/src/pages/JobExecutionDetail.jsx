@@ -12,6 +12,7 @@ const JobExecutionDetail = () => {
   const [execution, setExecution] = useState(null)
   const [autoRefresh, setAutoRefresh] = useState(true)
   const timerRef = useRef(null)
+  const lastSeqRef = useRef(0) // 已加载的作业日志最大序号
   const executionType = searchParams.get('type') // 'job' or 'script'
 
   useEffect(() => {
@@ -43,6 +44,28 @@ const JobExecutionDetail = () => {
     }
   }, [autoRefresh, execution?.status])
 
+  // 作业执行：首次加载完整详情，自动刷新时只取状态和新增日志
+  const loadJobExecution = async (silent) => {
+    if (!silent || !execution?.execution_log) {
+      const response = await simpleJobsApi.getExecution(executionId)
+      const detail = response.execution || response
+      lastSeqRef.current = detail.last_seq || 0
+      setExecution(detail)
+      return
+    }
+    const [detailResponse, logResponse] = await Promise.all([
+      simpleJobsApi.getExecution(executionId, { include_log: false }),
+      simpleJobsApi.getExecutionLogs(executionId, { after_seq: lastSeqRef.current })
+    ])
+    const detail = detailResponse.execution || detailResponse
+    const newLogs = logResponse.logs || []
+    lastSeqRef.current = logResponse.last_seq ?? lastSeqRef.current
+    setExecution(prev => ({
+      ...detail,
+      execution_log: [...(prev?.execution_log || []), ...newLogs]
+    }))
+  }
+
   const loadExecutionDetail = async (silent = false) => {
     try {
       if (!silent) {
@@ -56,13 +79,11 @@ const JobExecutionDetail = () => {
         setExecution(response)
       } else if (executionType === 'job') {
         // 作业执行
-        const response = await simpleJobsApi.getExecution(executionId)
-        setExecution(response.execution || response)
+        await loadJobExecution(silent)
       } else {
         // 如果没有指定类型，先尝试作业执行API
         try {
-          const response = await simpleJobsApi.getExecution(executionId)
-          setExecution(response.execution || response)
+          await loadJobExecution(silent)
         } catch (jobError) {
           // 如果失败，尝试脚本执行API
           const response = await scriptApi.getTaskDetails(executionId)
@@ -164,7 +164,8 @@ export const simpleJobsApi = {
   deleteStep: (jobId, stepId) => api.delete(`/simple-jobs/${jobId}/steps/${stepId}`),
   // 执行相关
   executeJob: (jobId) => api.post(`/simple-jobs/${jobId}/execute`),
-  getExecution: (executionId) => api.get(`/simple-jobs/executions/${executionId}`),
+  getExecution: (executionId, params) => api.get(`/simple-jobs/executions/${executionId}`, { params }),
+  getExecutionLogs: (executionId, params) => api.get(`/simple-jobs/executions/${executionId}/logs`, { params }),
   getExecutions: (params) => api.get('/simple-jobs/executions', { params })
 }
 